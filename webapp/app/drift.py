@@ -0,0 +1,357 @@
+"""
+detection and repair of differences between the database and the system (drift)
+
+The system may differ from the database if the configuration is changed by hand (e.g. `wg set`) or if a change was
+only applied partially. The leader compares the peers of every interface with the operational data (`wg-json`), the
+routes of the active peers with the routing table and the filter rules of the policy with iptables. The peers are
+compared by a fingerprint (hash of the allowed IPs, the keepalive and the preshared key, the endpoint of a peer may
+change by roaming), only the peers, routes and rules that differ are repaired.
+"""
+import hashlib
+import ipaddress
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import app.jobs
+import app.peer_routes
+import app.peer_tracking
+import app.wg_config_adapter
+import models
+import utils.config
+import utils.generics
+import utils.revision
+import utils.wireguard
+
+
+# kinds of drift, used as label of the counters
+DRIFT_KINDS = ("interface", "missing_peer", "unexpected_peer", "changed_peer", "missing_route", "firewall")
+
+
+def peer_fingerprint(allowed_ips: Iterable[str], persistent_keepalive: Optional[int], preshared_key: Optional[str]) -> str:
+    """hash of the attributes of a peer that are compared with the system
+
+    :param allowed_ips: allowed IPs of the peer (host bits are ignored)
+    :type allowed_ips: Iterable[str]
+    :param persistent_keepalive: keepalive interval in seconds (disabled if None or not positive, the model uses -1)
+    :type persistent_keepalive: Optional[int]
+    :param preshared_key: preshared key of the peer
+    :type preshared_key: Optional[str]
+    :return: fingerprint of the peer
+    :rtype: str
+    """
+    networks = sorted(str(ipaddress.ip_interface(value.strip()).network).lower() for value in allowed_ips if value.strip())
+    keepalive = persistent_keepalive if persistent_keepalive and persistent_keepalive > 0 else 0
+    value = f"{','.join(networks)}|{keepalive}|{preshared_key or ''}"
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class InterfaceDrift:
+    """
+    differences of a single interface
+    """
+    __slots__ = ("intf_name", "interface_missing", "missing_peers", "unexpected_peers", "changed_peers", "missing_routes",
+                 "firewall_rules")
+
+    def __init__(self, intf_name: str):
+        self.intf_name = intf_name
+        self.interface_missing = False
+        self.missing_peers: List[str] = []
+        self.unexpected_peers: List[str] = []
+        self.changed_peers: List[str] = []
+        self.missing_routes: List[str] = []
+        # add commands of the filter rules that are missing
+        self.firewall_rules: List[str] = []
+
+    def counts(self) -> Dict[str, int]:
+        """number of differences per kind
+
+        :return: dictionary with the kinds of `DRIFT_KINDS`
+        :rtype: Dict[str, int]
+        """
+        return {
+            "interface": int(self.interface_missing),
+            "missing_peer": len(self.missing_peers),
+            "unexpected_peer": len(self.unexpected_peers),
+            "changed_peer": len(self.changed_peers),
+            "missing_route": len(self.missing_routes),
+            "firewall": len(self.firewall_rules),
+        }
+
+    def __bool__(self):
+        return any(self.counts().values())
+
+    def __repr__(self):
+        return f"<InterfaceDrift {self.intf_name} {self.counts()}>"
+
+
+class DriftDetector(utils.generics.AsyncSubProcessMixin, metaclass=utils.generics.SingletonMeta):
+    """
+    periodic comparison of the database with the system and targeted repair within the leader
+    """
+    _desired_peers: Dict[str, Dict[str, Tuple[str, tuple]]]
+    _desired_revision: Optional[int]
+
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._logger = logging.getLogger("drift")
+        # the first check is done one interval after the start, the system was reconciled on startup
+        self._next_check = time.monotonic() + self._config.drift_check_interval
+        # fingerprints and attributes of the peers per interface, valid for a revision of the route index
+        self._desired_peers = dict()
+        self._desired_revision = None
+        self.last_check: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.reports: Dict[str, InterfaceDrift] = dict()
+        self.detected = {kind: 0 for kind in DRIFT_KINDS}
+        self.repaired = {kind: 0 for kind in DRIFT_KINDS}
+
+    def invalidate(self) -> None:
+        """reload the peers from the database on the next check"""
+        self._desired_revision = None
+
+    @property
+    def enabled(self) -> bool:
+        """False if the drift detection is disabled (`APP_DRIFT_CHECK_INTERVAL=0`)"""
+        return self._config.drift_check_interval > 0
+
+    async def _load_desired_peers(self) -> Dict[str, Dict[str, Tuple[str, tuple]]]:
+        """get the fingerprints of the peers from the database (cached until a peer or interface is changed)"""
+        revision = utils.revision.RevisionRegistry().get(app.peer_routes.PeerRouteIndex.revision_key)
+        if revision == self._desired_revision:
+            return self._desired_peers
+
+        desired = dict()
+        rows = await models.WgPeerModel.all().values_list(
+            "wg_interface__intf_name", "public_key", "cidr_routes", "persistent_keepalives", "preshared_key", "endpoint"
+        )
+        for intf_name, public_key, cidr_routes, keepalive, preshared_key, endpoint in rows:
+            allowed_ips = [value.strip() for value in cidr_routes.split(",") if value.strip()]
+            desired.setdefault(intf_name, dict())[public_key] = (
+                peer_fingerprint(allowed_ips, keepalive, preshared_key),
+                (allowed_ips, keepalive, preshared_key, endpoint)
+            )
+
+        self._desired_peers = desired
+        self._desired_revision = revision
+        return desired
+
+    async def _missing_firewall_rules(self, wgintf: models.WgInterfaceModel) -> List[str]:
+        """add commands of the filter rules of the interface that are not found in iptables"""
+        await wgintf.fetch_related("policy_rule_list")
+        if wgintf.policy_rule_list is None:
+            return []
+
+        compiled_policy = await wgintf.policy_rule_list.compile(intf_name=wgintf.intf_name)
+        missing = []
+        for command in [*compiled_policy.ipv4_add, *compiled_policy.ipv6_add]:
+            _, _, success = await self._execute_subprocess(command.replace(" --append ", " --check ", 1))
+            if not success:
+                missing.append(command)
+
+        return missing
+
+    async def check_interface(self, wgintf: models.WgInterfaceModel, snapshot: utils.wireguard.WgOperationalSnapshot) -> InterfaceDrift:
+        """compare an interface with the system
+
+        :param wgintf: interface
+        :type wgintf: models.WgInterfaceModel
+        :param snapshot: operational data of the system
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :return: differences of the interface
+        :rtype: InterfaceDrift
+        """
+        drift = InterfaceDrift(wgintf.intf_name)
+        live = snapshot.data.get(wgintf.intf_name)
+        if live is None or live.get("listenPort", wgintf.listen_port) != wgintf.listen_port:
+            # the entire interface is recreated, no further checks required
+            drift.interface_missing = True
+            return drift
+
+        desired = (await self._load_desired_peers()).get(wgintf.intf_name, {})
+        live_peers = live.get("peers", {})
+        for public_key, (fingerprint, _) in desired.items():
+            peer_data = live_peers.get(public_key)
+            if peer_data is None:
+                drift.missing_peers.append(public_key)
+
+            elif peer_fingerprint(peer_data.get("allowedIps", []), peer_data.get("persistentKeepalive"), peer_data.get("presharedKey")) != fingerprint:
+                drift.changed_peers.append(public_key)
+
+        drift.unexpected_peers = [public_key for public_key in live_peers if public_key not in desired]
+
+        # routes of the active peers (as installed by the peer tracking)
+        shard = app.peer_tracking.PeerTracker().shards.get(wgintf.intf_name)
+        if shard is not None:
+            expected_routes = shard.installed_routes if self._config.route_aggregation else shard.active_routes()
+            if expected_routes:
+                ip_adapter = utils.wireguard.IpRouteAdapter()
+                system_routes = ip_adapter.get_routes(wgintf.intf_name)
+                if system_routes is not None:
+                    system_routes = set(system_routes)
+                    drift.missing_routes = sorted({
+                        route for route in expected_routes if str(ipaddress.ip_interface(route).network).lower() not in system_routes
+                    })
+
+        drift.firewall_rules = await self._missing_firewall_rules(wgintf)
+        return drift
+
+    async def repair(self, wgintf: models.WgInterfaceModel, drift: InterfaceDrift) -> None:
+        """repair the differences of an interface
+
+        :param wgintf: interface
+        :type wgintf: models.WgInterfaceModel
+        :param drift: differences of the interface
+        :type drift: InterfaceDrift
+        """
+        intf_name = wgintf.intf_name
+        if drift.interface_missing:
+            self._logger.warning(f"interface '{intf_name}' is missing or differs, recreate the interface")
+            adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+            await adapter.init_config(force_overwrite=True)
+            await adapter.rebuild_peer_config()
+            if await adapter.apply_config(recreate_interface=True):
+                self.repaired["interface"] += 1
+
+            app.peer_tracking.PeerTracker().invalidate(intf_name, reset_state=True)
+            return
+
+        desired = (await self._load_desired_peers()).get(intf_name, {})
+        for kind, public_keys in (("missing_peer", drift.missing_peers), ("changed_peer", drift.changed_peers)):
+            for public_key in public_keys:
+                allowed_ips, keepalive, preshared_key, endpoint = desired[public_key][1]
+                command = f"wg set {intf_name} peer {public_key} allowed-ips {','.join(allowed_ips)} persistent-keepalive {keepalive if keepalive and keepalive > 0 else 'off'}"
+                if endpoint and kind == "missing_peer":
+                    command += f" endpoint {endpoint}"
+
+                # the preshared key is passed through the standard input, wg accepts an empty key file only if it
+                # is seekable (not a pipe), therefore /dev/null is used to clear the key of a changed peer
+                input_data = None
+                if preshared_key:
+                    command += " preshared-key /dev/stdin"
+                    input_data = f"{preshared_key}\n"
+
+                elif kind == "changed_peer":
+                    command += " preshared-key /dev/null"
+
+                _, err, success = await self._execute_subprocess(command, input_data=input_data)
+                if success:
+                    self.repaired[kind] += 1
+
+                else:
+                    self._logger.error(f"unable to repair peer '{public_key}' on interface '{intf_name}'\n{err}")
+
+        for public_key in drift.unexpected_peers:
+            _, err, success = await self._execute_subprocess(f"wg set {intf_name} peer {public_key} remove")
+            if success:
+                self.repaired["unexpected_peer"] += 1
+
+            else:
+                self._logger.error(f"unable to remove peer '{public_key}' from interface '{intf_name}'\n{err}")
+
+        ip_adapter = utils.wireguard.IpRouteAdapter()
+        for ip_net in drift.missing_routes:
+            if ip_adapter.add_ip_route(intf_name=intf_name, ip_network=ip_net):
+                self.repaired["missing_route"] += 1
+
+        if drift.firewall_rules:
+            # the rules are re-applied in the order of the policy
+            await wgintf.fetch_related("policy_rule_list")
+            compiled_policy = await wgintf.policy_rule_list.compile(intf_name=intf_name)
+            for command in [*compiled_policy.ipv4_delete, *compiled_policy.ipv6_delete]:
+                await self._execute_subprocess(command)
+
+            failed = 0
+            for command in [*compiled_policy.ipv4_add, *compiled_policy.ipv6_add]:
+                _, err, success = await self._execute_subprocess(command)
+                if not success:
+                    failed += 1
+                    self._logger.error(f"unable to apply filter rule on interface '{intf_name}'\n{err}")
+
+            if not failed:
+                self.repaired["firewall"] += len(drift.firewall_rules)
+
+    async def run(self, snapshot: utils.wireguard.WgOperationalSnapshot, force: bool=False) -> Dict[str, InterfaceDrift]:
+        """compare all interfaces with the system and repair the differences (if the check is due)
+
+        :param snapshot: operational data of the system
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :param force: run the check even if it is not due, defaults to False
+        :type force: bool, optional
+        :return: differences per interface (only interfaces with differences)
+        :rtype: Dict[str, InterfaceDrift]
+        """
+        if not force and (not self.enabled or time.monotonic() < self._next_check):
+            return {}
+
+        if app.jobs.JobRunner().running:
+            # the interface may be recreated by the job
+            self._logger.debug("configuration job is running, skip drift detection")
+            return {}
+
+        self._next_check = time.monotonic() + self._config.drift_check_interval
+        start = time.perf_counter()
+        reports = dict()
+        for wgintf in await models.WgInterfaceModel.all():
+            drift = await self.check_interface(wgintf, snapshot)
+            if not drift:
+                continue
+
+            self._logger.warning(f"drift detected on interface '{wgintf.intf_name}': {drift.counts()}")
+            for kind, count in drift.counts().items():
+                self.detected[kind] += count
+
+            try:
+                await self.repair(wgintf, drift)
+
+            except Exception:
+                self._logger.error(f"unable to repair interface '{wgintf.intf_name}'", exc_info=True)
+
+            reports[wgintf.intf_name] = drift
+
+        self.reports = reports
+        self.last_check = time.time()
+        self.last_duration = time.perf_counter() - start
+        self._logger.debug(f"drift detection finished after {self.last_duration:.3f} seconds")
+        return reports
+
+    def to_dict(self) -> dict:
+        """state of the drift detection
+
+        :return: result of the last check and the counters since the start
+        :rtype: dict
+        """
+        return {
+            "enabled": self.enabled,
+            "interval": self._config.drift_check_interval,
+            "last_check": self.last_check,
+            "last_duration": self.last_duration,
+            "interfaces": {
+                intf_name: {
+                    "counts": drift.counts(),
+                    "missing_peers": drift.missing_peers,
+                    "unexpected_peers": drift.unexpected_peers,
+                    "changed_peers": drift.changed_peers,
+                    "missing_routes": drift.missing_routes,
+                    "firewall_rules": len(drift.firewall_rules),
+                }
+                for intf_name, drift in self.reports.items()
+            },
+            "detected": dict(self.detected),
+            "repaired": dict(self.repaired),
+        }
+
+    def to_openmetrics(self) -> List[str]:
+        """counters of the detected and repaired differences in the OpenMetrics text format
+
+        :return: lines of the metric families
+        :rtype: List[str]
+        """
+        return [
+            "# HELP wgce_drift_detected differences between the database and the system",
+            "# TYPE wgce_drift_detected counter",
+            *[f'wgce_drift_detected_total{{kind="{kind}"}} {count}' for kind, count in self.detected.items()],
+            "# HELP wgce_drift_repaired differences that were repaired",
+            "# TYPE wgce_drift_repaired counter",
+            *[f'wgce_drift_repaired_total{{kind="{kind}"}} {count}' for kind, count in self.repaired.items()],
+        ]
@@ -11,11 +11,13 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from tortoise.exceptions import ValidationError,  DoesNotExist, IntegrityError
 
-import app.wg_config_adapter
 import app.peer_tracking
 import app.init_config
+import app.jobs
+import app.reconciler
 import models
 import routers
+import utils.coordination
 from utils.config import ConfigUtil
 from utils.log import LoggingUtil
 
@@ -72,10 +74,7 @@ async def startup_app() -> None:
         _ = config_util.admin_password
         logger.warning(f"AUTO-GENERATED ADMIN PASSWORD IS AVAILABLE AT {config_util.admin_password_file}")
 
-    # ORM initialize
-    tortoise.Tortoise.init_models(
-        config_util.db_models, "models"
-    )
+    # ORM initialize (also initializes the relations of the models)
     await tortoise.Tortoise.init(
         db_url=config_util.db_url,
         modules={
@@ -88,33 +87,33 @@ async def startup_app() -> None:
     logger.info("ORM generating schema")
     await tortoise.Tortoise.generate_schemas(safe=True)
 
-    # create wireguard configuration based on loaded database
-    for wgintf in await models.WgInterfaceModel.all():
-        logger.warning(f"re-initialize wireguard config and interface '{wgintf}'...")
-        instance = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
-        await instance.interface_down()
-        await instance.delete_config()
-        await instance.init_config(force_overwrite=True)
-        await instance.rebuild_peer_config()
-        await instance.interface_up()
-        await instance.apply_config()
+    # only the leader changes the system, the other workers serve the API
+    election = utils.coordination.LeaderElection()
+    await election.renew()
+    if not election.is_leader:
+        logger.info(f"worker is a follower, the system is managed by {election.store.lease_owner(election.lease_name)}")
+        return
+
+    await app.reconciler.Reconciler().reconcile_all()
 
     # apply initial configuration
     if os.environ.get("SKIP_INIT_CONFIG", "") == "":
         await app.init_config.run()
 
+    # jobs that were interrupted by the restart or submitted while no leader was available
+    await app.jobs.JobRunner().resume()
+
 
 async def shutdown_app() -> None:
     """close app
     """
     logger = LoggingUtil().logger
 
-    # remove wireguard configuration from system
-    for wgintf in await models.WgInterfaceModel.all():
-        logger.warning(f"remove wireguard interface '{wgintf}'...")
-        instance = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
-        await instance.interface_down()
-        await instance.delete_config()
+    # remove wireguard configuration from system (only by the leader, the followers stop without changes on the system)
+    election = utils.coordination.LeaderElection()
+    if election.is_leader:
+        await app.reconciler.Reconciler().teardown()
+        await election.release()
 
     # ORM shutdown
     await tortoise.Tortoise.close_connections()
@@ -163,7 +162,9 @@ def create() -> FastAPI:
     fast_api.include_router(routers.healthcheck_router, prefix="/api/healthcheck", tags=["healthcheck"])
     fast_api.include_router(routers.wireguard_router, prefix="/api/wg", tags=["wireguard"])
     fast_api.include_router(routers.rules_router, prefix="/api/rules", tags=["rules"])
+    fast_api.include_router(routers.network_set_router, prefix="/api/network_sets", tags=["network sets"])
     fast_api.include_router(routers.utility_router, prefix="/api/utils", tags=["utils"])
+    fast_api.include_router(routers.metrics_router, tags=["metrics"])
 
     log_util.logger.info("finished API application")
     return fast_api
@@ -0,0 +1,128 @@
+"""
+ipset adapter for the network sets of the application
+"""
+# pylint: disable=logging-fstring-interpolation
+import os
+import logging
+import tempfile
+from typing import List
+
+import utils.config
+import utils.generics
+import utils.instrumentation
+
+
+# minimum number of elements of a hash:net set (default of ipset)
+IPSET_MIN_MAXELEM = 65536
+
+
+class IpsetAdapter(utils.generics.AsyncSubProcessMixin, metaclass=utils.generics.SingletonMeta):
+    """
+    manage the ipsets (hash:net) of the network sets
+
+    A set is always replaced atomically: the new content is loaded into a temporary set that is swapped with the
+    active set within a single `ipset restore` call, the iptables rules that reference the set are not changed.
+    """
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._logger = logging.getLogger("ipset_adapter")
+
+    @staticmethod
+    def temporary_set_name(name: str) -> str:
+        """name of the temporary set that is used to update a set
+
+        :param name: name of the set
+        :type name: str
+        :return: name of the temporary set
+        :rtype: str
+        """
+        return f"{name}_tmp"
+
+    def build_restore_script(self, name: str, family: str, networks: List[str]) -> str:
+        """create the `ipset restore` input that replaces the content of a set
+
+        :param name: name of the set
+        :type name: str
+        :param family: address family of the set (inet or inet6)
+        :type family: str
+        :param networks: networks of the set
+        :type networks: List[str]
+        :return: content for `ipset restore`
+        :rtype: str
+        """
+        tmp_name = self.temporary_set_name(name)
+        set_options = f"hash:net family {family} maxelem {max(IPSET_MIN_MAXELEM, len(networks))}"
+        lines = [
+            # the active set is only created if it doesn't exist yet
+            f"create {name} {set_options} -exist",
+            f"create {tmp_name} {set_options} -exist",
+            f"flush {tmp_name}",
+            *[f"add {tmp_name} {network} -exist" for network in networks],
+            f"swap {tmp_name} {name}",
+            f"destroy {tmp_name}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    @utils.instrumentation.timed("ipset_adapter.apply_set")
+    async def apply_set(self, name: str, family: str, networks: List[str]) -> bool:
+        """create or replace a set atomically
+
+        :param name: name of the set
+        :type name: str
+        :param family: address family of the set (inet or inet6)
+        :type family: str
+        :param networks: networks of the set
+        :type networks: List[str]
+        :return: True if successful, otherwise False
+        :rtype: bool
+        """
+        script = self.build_restore_script(name, family, networks)
+        try:
+            os.makedirs(self._config.wg_tmp_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(delete=not self._config.debug, suffix=".ipset", dir=self._config.wg_tmp_dir) as tmp_file:
+                tmp_file.write(script.encode("utf-8"))
+                tmp_file.flush()
+
+                _, err, success = await self._execute_subprocess(f"ipset restore -file {tmp_file.name}")
+                if not success:
+                    self._logger.error(f"unable to update ipset '{name}':\n{err}")
+                    # remove the temporary set if the restore was aborted before the swap
+                    await self._execute_subprocess(f"ipset destroy {self.temporary_set_name(name)}")
+                    return False
+
+        except Exception as ex:
+            self._logger.fatal(f"failed to update ipset '{name}': {ex}", exc_info=True)
+            return False
+
+        self._logger.info(f"ipset '{name}' updated with {len(networks)} entries")
+        return True
+
+    async def rename_set(self, name: str, new_name: str) -> bool:
+        """rename a set, the iptables rules reference the set by its index and match the renamed set
+
+        :param name: current name of the set
+        :type name: str
+        :param new_name: new name of the set
+        :type new_name: str
+        :return: True if successful, otherwise False
+        :rtype: bool
+        """
+        _, err, success = await self._execute_subprocess(f"ipset rename {name} {new_name}")
+        if not success:
+            self._logger.error(f"unable to rename ipset '{name}' to '{new_name}':\n{err}")
+
+        return success
+
+    async def destroy_set(self, name: str) -> bool:
+        """remove a set from the system (not possible as long as the set is used within an iptables rule)
+
+        :param name: name of the set
+        :type name: str
+        :return: True if successful, otherwise False
+        :rtype: bool
+        """
+        _, err, success = await self._execute_subprocess(f"ipset destroy {name}")
+        if not success:
+            self._logger.error(f"unable to remove ipset '{name}':\n{err}")
+
+        return success
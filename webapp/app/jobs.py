@@ -0,0 +1,214 @@
+"""
+execution of the configuration jobs (`models.ConfigJobModel`)
+
+A job is stored in the database and executed in the background by the process that changes the system (the leader or
+the reconciler process), so the HTTP request returns immediately. The jobs are executed one after another, the
+progress, the duration and the error output (the error messages of the adapters) are stored per step.
+"""
+import asyncio
+import contextlib
+import datetime
+import logging
+import time
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import app.peer_tracking
+import app.wg_config_adapter
+import models
+import utils.coordination
+import utils.generics
+import utils.revision
+
+
+# loggers of the adapters whose error messages are stored as error output of a step
+CAPTURED_LOGGERS = ("wg_adapter", "ipset_adapter")
+
+
+class _ErrorOutputHandler(logging.Handler):
+    """
+    collect the error messages that are logged during a step
+    """
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+@contextlib.contextmanager
+def capture_error_output() -> Iterator[_ErrorOutputHandler]:
+    """collect the error messages of the adapters within the context"""
+    handler = _ErrorOutputHandler()
+    for name in CAPTURED_LOGGERS:
+        logging.getLogger(name).addHandler(handler)
+
+    try:
+        yield handler
+
+    finally:
+        for name in CAPTURED_LOGGERS:
+            logging.getLogger(name).removeHandler(handler)
+
+
+class JobRunner(metaclass=utils.generics.SingletonMeta):
+    """
+    execute the queued configuration jobs
+    """
+    def __init__(self):
+        self._logger = logging.getLogger("jobs")
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def running(self) -> bool:
+        """True while a job is executed"""
+        return self._lock.locked()
+
+    async def submit(self, kind: models.ConfigJobKindEnum, wg_interface: models.WgInterfaceModel) -> models.ConfigJobModel:
+        """queue a job, the job is started immediately if the process changes the system
+
+        :param kind: operation of the job
+        :type kind: models.ConfigJobKindEnum
+        :param wg_interface: interface of the job
+        :type wg_interface: models.WgInterfaceModel
+        :return: queued job
+        :rtype: models.ConfigJobModel
+        """
+        job = await models.ConfigJobModel.create(
+            kind=kind,
+            wg_interface=wg_interface,
+            intf_name=wg_interface.intf_name,
+            steps=[{"name": name, "status": models.ConfigJobStatusEnum.QUEUED.value} for name in self.step_names(kind)]
+        )
+        self._logger.info(f"job {job} queued")
+        if utils.coordination.LeaderElection().is_leader:
+            self.start()
+
+        return job
+
+    def start(self) -> None:
+        """execute the queued jobs in the background (if not already running)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run_pending())
+
+    async def wait(self) -> None:
+        """wait until the background execution is finished"""
+        if self._task is not None:
+            await self._task
+
+    async def resume(self) -> None:
+        """mark the jobs that were interrupted (e.g. by a restart) as failed and execute the queued jobs"""
+        interrupted = await models.ConfigJobModel.filter(status=models.ConfigJobStatusEnum.RUNNING).update(
+            status=models.ConfigJobStatusEnum.FAILED,
+            error="job was interrupted",
+            finished_at=datetime.datetime.now(datetime.timezone.utc)
+        )
+        if interrupted:
+            await utils.revision.RevisionRegistry().bump_resources(models.ConfigJobModel.resource_type)
+            self._logger.warning(f"{interrupted} interrupted jobs marked as failed")
+
+        self.start()
+
+    async def run_pending(self) -> int:
+        """execute all queued jobs in the order of creation
+
+        :return: number of executed jobs
+        :rtype: int
+        """
+        executed = 0
+        async with self._lock:
+            while await utils.coordination.LeaderElection().keep_alive():
+                job = await models.ConfigJobModel.filter(status=models.ConfigJobStatusEnum.QUEUED).order_by("created_at").first()
+                if job is None:
+                    break
+
+                # the status is changed only if the job is still queued (another process may run the queue)
+                claimed = await models.ConfigJobModel.filter(
+                    instance_id=job.instance_id, status=models.ConfigJobStatusEnum.QUEUED
+                ).update(status=models.ConfigJobStatusEnum.RUNNING, started_at=datetime.datetime.now(datetime.timezone.utc))
+                if not claimed:
+                    continue
+
+                await utils.revision.RevisionRegistry().bump_resources(models.ConfigJobModel.resource_type)
+                await self._execute(job)
+                executed += 1
+
+        return executed
+
+    @staticmethod
+    def step_names(kind: models.ConfigJobKindEnum) -> List[str]:
+        """names of the steps of a job
+
+        :param kind: operation of the job
+        :type kind: models.ConfigJobKindEnum
+        :return: list of step names
+        :rtype: List[str]
+        """
+        return [name for name, _ in JobRunner._steps(kind, None)]
+
+    @staticmethod
+    def _steps(kind: models.ConfigJobKindEnum, adapter: Optional[app.wg_config_adapter.WgConfigAdapter]) -> List[Tuple[str, Callable[[], Awaitable]]]:
+        """steps of a job (name and coroutine function)"""
+        if kind == models.ConfigJobKindEnum.RECONFIGURE:
+            return [
+                ("init_config", lambda: adapter.init_config(force_overwrite=True)),
+                ("rebuild_peer_config", lambda: adapter.rebuild_peer_config()),
+                ("apply_config", lambda: adapter.apply_config(recreate_interface=True)),
+            ]
+
+        raise ValueError(f"unknown job '{kind}'")
+
+    async def _execute(self, job: models.ConfigJobModel) -> None:
+        """execute the steps of a job and store the progress after every step"""
+        self._logger.info(f"job {job} started")
+        job_start = time.perf_counter()
+        error = None
+        steps = [dict(step) for step in job.steps]
+        wgintf = await models.WgInterfaceModel.get_or_none(instance_id=job.wg_interface_id) if job.wg_interface_id else None
+        if wgintf is None:
+            error = f"interface '{job.intf_name}' no longer exists"
+
+        else:
+            adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+            for step, (name, func) in zip(steps, self._steps(job.kind, adapter)):
+                if not await utils.coordination.LeaderElection().keep_alive():
+                    error = "the worker lost the lease of the leader"
+                    break
+
+                step.update(status=models.ConfigJobStatusEnum.RUNNING.value)
+                await models.ConfigJobModel.filter(instance_id=job.instance_id).update(steps=steps)
+                await utils.revision.RevisionRegistry().bump_resources(models.ConfigJobModel.resource_type)
+
+                start = time.perf_counter()
+                with capture_error_output() as error_output:
+                    try:
+                        result = await func()
+                        step_error = f"step '{name}' failed" if result is False else None
+
+                    except Exception as ex:
+                        self._logger.error(f"step '{name}' of job {job} failed", exc_info=True)
+                        step_error = str(ex) or type(ex).__name__
+
+                step.update(
+                    status=models.ConfigJobStatusEnum.DONE.value if step_error is None else models.ConfigJobStatusEnum.FAILED.value,
+                    duration=time.perf_counter() - start,
+                    output="\n".join(error_output.messages) or None,
+                    error=step_error
+                )
+                if step_error is not None:
+                    error = step_error
+                    break
+
+            if job.kind == models.ConfigJobKindEnum.RECONFIGURE:
+                # the interface is recreated (also if a step failed), the routes of the active peers are applied again
+                app.peer_tracking.PeerTracker().invalidate(wgintf.intf_name, reset_state=True)
+
+        await models.ConfigJobModel.filter(instance_id=job.instance_id).update(
+            status=models.ConfigJobStatusEnum.DONE if error is None else models.ConfigJobStatusEnum.FAILED,
+            steps=steps,
+            error=error,
+            finished_at=datetime.datetime.now(datetime.timezone.utc)
+        )
+        await utils.revision.RevisionRegistry().bump_resources(models.ConfigJobModel.resource_type)
+        self._logger.info(f"job {job} {'finished' if error is None else 'failed'} after {time.perf_counter() - job_start:.3f} seconds")
@@ -0,0 +1,208 @@
+"""
+OpenMetrics exporter for the wireguard operational data
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+import app.drift
+import app.response_cache
+import models.wg_interface
+import utils.config
+import utils.generics
+import utils.instrumentation
+import utils.wireguard
+
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    """escape a label value according to the OpenMetrics text format
+
+    :param value: raw label value
+    :type value: str
+    :return: escaped label value
+    :rtype: str
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+class WgMetricsExporter(metaclass=utils.generics.SingletonMeta):
+    """
+    render the wireguard operational data in the OpenMetrics text format
+
+    The exporter works on the cached operational snapshot of the WgSystemInfoAdapter (refreshed as part of
+    the peer tracking). All values that only depend on the snapshot are rendered once per snapshot, only the
+    time dependent values (handshake age, active state) are computed per scrape.
+    """
+    _label_cache: Dict[Tuple[str, ...], str]
+    _snapshot_serial: Optional[int]
+    _static_families: str
+    _interface_handshakes: Dict[str, List[Tuple[str, int]]]
+
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._label_cache = dict()
+        self._snapshot_serial = None
+        self._static_families = ""
+        self._interface_handshakes = dict()
+
+    def _labels(self, *key: str) -> str:
+        """get the (cached) label set for an interface or a peer on an interface
+
+        :return: label set including the curly brackets
+        :rtype: str
+        """
+        labels = self._label_cache.get(key)
+        if labels is None:
+            if len(key) == 1:
+                labels = f'{{interface="{_escape_label_value(key[0])}"}}'
+
+            else:
+                labels = f'{{interface="{_escape_label_value(key[0])}",public_key="{_escape_label_value(key[1])}"}}'
+
+            self._label_cache[key] = labels
+
+        return labels
+
+    def _build_static_families(self, snapshot: utils.wireguard.WgOperationalSnapshot) -> None:
+        """render all metric families that only depend on the given snapshot
+
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        """
+        intf_listen_port = []
+        intf_peers = []
+        intf_rx = []
+        intf_tx = []
+        peer_rx = []
+        peer_tx = []
+        peer_handshake = []
+        interface_handshakes = dict()
+        used_label_keys = set()
+
+        for intf_name, intf_data in snapshot.data.items():
+            intf_labels = self._labels(intf_name)
+            used_label_keys.add((intf_name,))
+            peers = intf_data.get("peers", {})
+            handshakes = []
+            rx_sum = 0
+            tx_sum = 0
+
+            for public_key, peer_data in peers.items():
+                labels = self._labels(intf_name, public_key)
+                used_label_keys.add((intf_name, public_key))
+                rx = peer_data.get("transferRx", 0)
+                tx = peer_data.get("transferTx", 0)
+                latest_handshake = peer_data.get("latestHandshake", 0)
+                rx_sum += rx
+                tx_sum += tx
+
+                peer_rx.append(f"wireguard_peer_receive_bytes_total{labels} {rx}")
+                peer_tx.append(f"wireguard_peer_transmit_bytes_total{labels} {tx}")
+                peer_handshake.append(f"wireguard_peer_latest_handshake_seconds{labels} {latest_handshake}")
+                handshakes.append((labels, latest_handshake))
+
+            interface_handshakes[intf_name] = handshakes
+            intf_listen_port.append(f"wireguard_interface_listen_port{intf_labels} {intf_data.get('listenPort', 0)}")
+            intf_peers.append(f"wireguard_interface_peers{intf_labels} {len(peers)}")
+            intf_rx.append(f"wireguard_interface_receive_bytes_total{intf_labels} {rx_sum}")
+            intf_tx.append(f"wireguard_interface_transmit_bytes_total{intf_labels} {tx_sum}")
+
+        # drop label sets of peers that are no longer part of the operational data
+        for key in set(self._label_cache.keys()) - used_label_keys:
+            del self._label_cache[key]
+
+        lines = [
+            "# HELP wireguard_interface_listen_port listen port of the wireguard interface",
+            "# TYPE wireguard_interface_listen_port gauge",
+            *intf_listen_port,
+            "# HELP wireguard_interface_peers number of peers configured on the wireguard interface",
+            "# TYPE wireguard_interface_peers gauge",
+            *intf_peers,
+            "# HELP wireguard_interface_receive_bytes bytes received by all peers of the wireguard interface",
+            "# TYPE wireguard_interface_receive_bytes counter",
+            *intf_rx,
+            "# HELP wireguard_interface_transmit_bytes bytes sent to all peers of the wireguard interface",
+            "# TYPE wireguard_interface_transmit_bytes counter",
+            *intf_tx,
+            "# HELP wireguard_peer_receive_bytes bytes received from the peer",
+            "# TYPE wireguard_peer_receive_bytes counter",
+            *peer_rx,
+            "# HELP wireguard_peer_transmit_bytes bytes sent to the peer",
+            "# TYPE wireguard_peer_transmit_bytes counter",
+            *peer_tx,
+            "# HELP wireguard_peer_latest_handshake_seconds unix timestamp of the latest handshake (0 if never)",
+            "# TYPE wireguard_peer_latest_handshake_seconds gauge",
+            *peer_handshake,
+        ]
+        self._static_families = "\n".join(lines) + "\n"
+        self._interface_handshakes = interface_handshakes
+        self._snapshot_serial = snapshot.serial
+
+    def render_snapshot(self, snapshot: utils.wireguard.WgOperationalSnapshot, now: Optional[float]=None) -> str:
+        """render the metrics for the given snapshot
+
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :param now: reference time for the time dependent values, defaults to the current time
+        :type now: float, optional
+        :return: metrics in OpenMetrics text format
+        :rtype: str
+        """
+        now = int(time.time()) if now is None else int(now)
+        if snapshot.serial != self._snapshot_serial:
+            self._build_static_families(snapshot)
+
+        wg_si_adapter = utils.wireguard.WgSystemInfoAdapter()
+        intf_active = []
+        peer_active = []
+        peer_age = []
+        for intf_name, handshakes in self._interface_handshakes.items():
+            threshold = wg_si_adapter.get_inactivity_timeout(intf_name)
+            active_count = 0
+            for labels, latest_handshake in handshakes:
+                if latest_handshake:
+                    age = now - latest_handshake
+                    peer_age.append(f"wireguard_peer_handshake_age_seconds{labels} {age}")
+                    if threshold >= age:
+                        active_count += 1
+                        peer_active.append(f"wireguard_peer_active{labels} 1")
+                        continue
+
+                peer_active.append(f"wireguard_peer_active{labels} 0")
+
+            intf_active.append(f"wireguard_interface_active_peers{self._labels(intf_name)} {active_count}")
+
+        lines = [
+            "# HELP wireguard_interface_active_peers number of active peers on the wireguard interface",
+            "# TYPE wireguard_interface_active_peers gauge",
+            *intf_active,
+            "# HELP wireguard_peer_handshake_age_seconds seconds since the latest handshake of the peer",
+            "# TYPE wireguard_peer_handshake_age_seconds gauge",
+            *peer_age,
+            "# HELP wireguard_peer_active 1 if the peer is considered active, otherwise 0",
+            "# TYPE wireguard_peer_active gauge",
+            *peer_active,
+            "# HELP wireguard_snapshot_age_seconds age of the operational data used for the metrics",
+            "# TYPE wireguard_snapshot_age_seconds gauge",
+            f"wireguard_snapshot_age_seconds {snapshot.age(now):.3f}",
+            *utils.instrumentation.InstrumentationUtil().to_openmetrics(),
+            *app.drift.DriftDetector().to_openmetrics(),
+            *app.response_cache.ResponseCache().to_openmetrics(),
+            "# EOF",
+        ]
+        return self._static_families + "\n".join(lines) + "\n"
+
+    async def render(self) -> str:
+        """render the metrics based on the cached operational snapshot, the snapshot is only fetched
+        from the system if it is older than the peer tracking timer
+
+        :return: metrics in OpenMetrics text format
+        :rtype: str
+        """
+        snapshot = await utils.wireguard.WgSystemInfoAdapter().get_snapshot(
+            max_age=self._config.peer_tracking_timer
+        )
+        await models.wg_interface.load_inactivity_timeouts()
+        return self.render_snapshot(snapshot)
@@ -0,0 +1,163 @@
+"""
+peer state change events that are computed from consecutive operational snapshots
+"""
+import json
+import asyncio
+import logging
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+import utils.generics
+import utils.wireguard
+
+
+# state of a peer that is relevant for the events: active, endpoint and latest handshake
+PeerState = Tuple[bool, Optional[str], int]
+
+
+class PeerEventBroker(metaclass=utils.generics.SingletonMeta):
+    """
+    compute peer state change events from the operational snapshots of the peer tracking and
+    distribute them to all subscribers
+
+    The events are computed once per snapshot and encoded once for all subscribers, a subscriber
+    won't add any load on the system (no polling per client).
+    """
+    max_queue_size = 1000
+    _subscribers: Set[asyncio.Queue]
+    _peer_states: Optional[Dict[Tuple[str, str], PeerState]]
+
+    def __init__(self):
+        self._logger = logging.getLogger("peer_tracking")
+        self._subscribers = set()
+        self._peer_states = None
+
+    @property
+    def subscriber_count(self) -> int:
+        """number of active subscribers"""
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """register a new subscriber
+
+        :return: queue that receives the encoded events
+        :rtype: asyncio.Queue
+        """
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """remove a subscriber
+
+        :param queue: queue of the subscriber
+        :type queue: asyncio.Queue
+        """
+        self._subscribers.discard(queue)
+
+    def _get_peer_states(self, snapshot: utils.wireguard.WgOperationalSnapshot) -> Dict[Tuple[str, str], PeerState]:
+        """extract the peer states from the snapshot
+
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :return: state per interface and public key
+        :rtype: Dict[Tuple[str, str], PeerState]
+        """
+        wg_si_adapter = utils.wireguard.WgSystemInfoAdapter()
+        result = dict()
+        for intf_name, intf_data in snapshot.data.items():
+            for public_key, peer_data in intf_data.get("peers", {}).items():
+                latest_handshake = peer_data.get("latestHandshake", 0)
+                active = latest_handshake != 0 and wg_si_adapter.is_handshake_active(
+                    latest_handshake, now=snapshot.timestamp, intf_name=intf_name
+                )
+                result[(intf_name, public_key)] = (active, peer_data.get("endpoint"), latest_handshake)
+
+        return result
+
+    def publish_snapshot(self, snapshot: utils.wireguard.WgOperationalSnapshot) -> List[dict]:
+        """compare the snapshot with the previous one and publish an event for every peer that changed
+        the active state, the endpoint or the latest handshake
+
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :return: list of published events
+        :rtype: List[dict]
+        """
+        peer_states = self._get_peer_states(snapshot)
+        previous_states = self._peer_states
+        self._peer_states = peer_states
+
+        # the first snapshot is used as baseline
+        if previous_states is None:
+            return []
+
+        events = []
+        for key, state in peer_states.items():
+            previous_state = previous_states.get(key, (False, None, 0))
+            if state == previous_state:
+                continue
+
+            changes = [
+                name for name, old, new in zip(("active", "endpoint", "handshake"), previous_state, state) if old != new
+            ]
+            events.append({
+                "interface": key[0],
+                "public_key": key[1],
+                "active": state[0],
+                "endpoint": state[1],
+                "latest_handshake": state[2],
+                "changes": changes
+            })
+
+        # peers that are removed from the operational data are no longer active
+        for key in previous_states.keys() - peer_states.keys():
+            if previous_states[key][0]:
+                events.append({
+                    "interface": key[0],
+                    "public_key": key[1],
+                    "active": False,
+                    "endpoint": None,
+                    "latest_handshake": previous_states[key][2],
+                    "changes": ["active"]
+                })
+
+        for event in events:
+            self._broadcast(f"event: peer_state\ndata: {json.dumps(event)}\n\n")
+
+        if events:
+            self._logger.debug(f"published {len(events)} peer events to {len(self._subscribers)} subscribers")
+
+        return events
+
+    def _broadcast(self, message: str) -> None:
+        """put the encoded message into the queue of every subscriber, the oldest message is dropped if
+        a subscriber is too slow
+
+        :param message: encoded server-sent event
+        :type message: str
+        """
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+
+            queue.put_nowait(message)
+
+    async def stream(self, keepalive_interval: float=15.0) -> AsyncGenerator[str, None]:
+        """stream the events as server-sent events (sends a comment as keepalive if there are no events)
+
+        :param keepalive_interval: seconds without events before a keepalive is sent, defaults to 15.0
+        :type keepalive_interval: float, optional
+        :yield: encoded server-sent events
+        :rtype: AsyncGenerator[str, None]
+        """
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=keepalive_interval)
+
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+
+        finally:
+            self.unsubscribe(queue)
@@ -0,0 +1,231 @@
+"""
+index of the peer routes (AllowedIPs) per wireguard interface
+
+The routes of all peers of an interface are stored in a prefix trie per address family. The index is loaded once per
+interface from the database and updated incrementally if a peer is saved or deleted, an overlap check or a lookup of
+an address takes O(prefix length) steps.
+
+WireGuard assigns a network that is used by multiple peers to the peer that was configured last, the traffic to the
+network is silently moved between the peers. Nested networks are valid, the most specific network is used.
+
+Every change of the routes increases the revision `peer_routes` (`utils.revision.RevisionRegistry`). If the revision
+was increased by another worker, the loaded interfaces are outdated and loaded again on the next use.
+"""
+import ipaddress
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import utils.config
+import utils.generics
+import utils.prefix_trie
+
+
+class PeerRouteOverlap(NamedTuple):
+    """
+    route of a peer that overlaps with a route of another peer
+    """
+    network: str
+    peer_id: str
+    peer_network: str
+
+    @property
+    def is_duplicate(self) -> bool:
+        """True if both peers use the same network (WireGuard uses only the last configured peer)"""
+        return ipaddress.ip_network(self.network, strict=False) == ipaddress.ip_network(self.peer_network, strict=False)
+
+
+class InterfaceRouteIndex:
+    """
+    routes of the peers of a single wireguard interface
+    """
+    __slots__ = ("tries", "peer_routes")
+
+    def __init__(self):
+        # peer IDs per network
+        self.tries = {4: utils.prefix_trie.PrefixTrie(4), 6: utils.prefix_trie.PrefixTrie(6)}
+        # networks per peer ID
+        self.peer_routes: Dict[str, List] = dict()
+
+    def add_peer(self, peer_id: str, routes: Iterable[str]) -> None:
+        """add or replace the routes of a peer
+
+        :param peer_id: instance ID of the peer
+        :type peer_id: str
+        :param routes: CIDR routes of the peer
+        :type routes: Iterable[str]
+        """
+        self.remove_peer(peer_id)
+        networks = [ipaddress.ip_network(route, strict=False) for route in routes]
+        self.peer_routes[peer_id] = networks
+        for network in networks:
+            trie = self.tries[network.version]
+            peer_ids = trie.get(network)
+            if peer_ids is None:
+                peer_ids = set()
+                trie.insert(network, peer_ids)
+
+            peer_ids.add(peer_id)
+
+    def remove_peer(self, peer_id: str) -> None:
+        """remove the routes of a peer (if part of the index)
+
+        :param peer_id: instance ID of the peer
+        :type peer_id: str
+        """
+        for network in self.peer_routes.pop(peer_id, []):
+            trie = self.tries[network.version]
+            peer_ids: Optional[Set[str]] = trie.get(network)
+            if peer_ids is None:
+                continue
+
+            peer_ids.discard(peer_id)
+            if not peer_ids:
+                trie.remove(network)
+
+    def overlaps(self, routes: Iterable[str], peer_id: Optional[str]=None) -> List[PeerRouteOverlap]:
+        """get the routes of other peers that overlap with the given CIDR routes
+
+        :param routes: CIDR routes
+        :type routes: Iterable[str]
+        :param peer_id: instance ID of the peer that owns the routes (ignored in the result), defaults to None
+        :type peer_id: Optional[str], optional
+        :return: list of overlapping routes
+        :rtype: List[PeerRouteOverlap]
+        """
+        result = list()
+        for network in (ipaddress.ip_network(route, strict=False) for route in routes):
+            for peer_network, peer_ids in self.tries[network.version].overlaps(network):
+                result.extend(
+                    PeerRouteOverlap(str(network), other_peer_id, str(peer_network))
+                    for other_peer_id in sorted(peer_ids) if other_peer_id != peer_id
+                )
+
+        return result
+
+    def lookup(self, address: str) -> Tuple[Optional[str], List[str]]:
+        """get the peers that receive the traffic to an address (most specific network)
+
+        :param address: IPv4 or IPv6 address
+        :type address: str
+        :return: network and IDs of the peers (more than one peer if the network is used by multiple peers)
+        :rtype: Tuple[Optional[str], List[str]]
+        """
+        address = ipaddress.ip_address(address)
+        result = self.tries[address.version].longest_match(address)
+        if result is None:
+            return None, []
+
+        return str(result[0]), sorted(result[1])
+
+
+class PeerRouteIndex(metaclass=utils.generics.SingletonMeta):
+    """
+    index of the peer routes of all wireguard interfaces
+    """
+    revision_key = "peer_routes"
+    _interfaces: Dict[str, InterfaceRouteIndex]
+    _peer_interfaces: Dict[str, str]
+    _revision: int
+
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._interfaces = dict()
+        # interface ID per peer ID, used to move a peer between the interfaces
+        self._peer_interfaces = dict()
+        # revision of the routes that is represented by the loaded interfaces
+        self._revision = 0
+
+    def sync_revision(self, revision: int) -> None:
+        """drop the loaded interfaces if they don't represent the current revision of the routes
+
+        :param revision: current revision of the routes
+        :type revision: int
+        """
+        if revision != self._revision:
+            self.invalidate()
+            self._revision = revision
+
+    def begin_change(self, revision: int) -> None:
+        """prepare an incremental update of the loaded interfaces (the routes are changed to the given revision), the
+        loaded interfaces are dropped if the routes were changed by another worker in the meantime
+
+        :param revision: new revision of the routes
+        :type revision: int
+        """
+        self.sync_revision(revision - 1)
+        self._revision = revision
+
+    @property
+    def reject_duplicates(self) -> bool:
+        """True if a network that is already used by another peer of the interface is rejected"""
+        return self._config.peer_overlap_policy == "reject"
+
+    def load(self, wg_interface_id: str, routes: Iterable[Tuple[str, str]]) -> InterfaceRouteIndex:
+        """load the routes of all peers of an interface
+
+        :param wg_interface_id: instance ID of the interface
+        :type wg_interface_id: str
+        :param routes: instance ID of the peer and CIDR route (one entry per route)
+        :type routes: Iterable[Tuple[str, str]]
+        :return: index of the interface
+        :rtype: InterfaceRouteIndex
+        """
+        wg_interface_id = str(wg_interface_id)
+        self.invalidate(wg_interface_id)
+        peer_routes: Dict[str, List[str]] = dict()
+        for peer_id, route in routes:
+            peer_routes.setdefault(str(peer_id), []).append(route)
+
+        index = InterfaceRouteIndex()
+        for peer_id, peer_route_list in peer_routes.items():
+            index.add_peer(peer_id, peer_route_list)
+            self._peer_interfaces[peer_id] = wg_interface_id
+
+        self._interfaces[wg_interface_id] = index
+        return index
+
+    def get(self, wg_interface_id: str) -> Optional[InterfaceRouteIndex]:
+        """get the index of an interface (None if not loaded)"""
+        return self._interfaces.get(str(wg_interface_id))
+
+    def update_peer(self, wg_interface_id: str, peer_id: str, routes: Iterable[str]) -> None:
+        """update the routes of a peer (the interface is skipped if not loaded)
+
+        :param wg_interface_id: instance ID of the interface
+        :type wg_interface_id: str
+        :param peer_id: instance ID of the peer
+        :type peer_id: str
+        :param routes: CIDR routes of the peer
+        :type routes: Iterable[str]
+        """
+        self.remove_peer(peer_id)
+        index = self.get(wg_interface_id)
+        if index is not None:
+            index.add_peer(str(peer_id), routes)
+            self._peer_interfaces[str(peer_id)] = str(wg_interface_id)
+
+    def remove_peer(self, peer_id: str) -> None:
+        """remove the routes of a peer
+
+        :param peer_id: instance ID of the peer
+        :type peer_id: str
+        """
+        wg_interface_id = self._peer_interfaces.pop(str(peer_id), None)
+        index = self._interfaces.get(wg_interface_id)
+        if index is not None:
+            index.remove_peer(str(peer_id))
+
+    def invalidate(self, wg_interface_id: Optional[str]=None) -> None:
+        """remove the given interface (or all interfaces) from the index, the routes are loaded on the next use
+
+        :param wg_interface_id: instance ID of the interface, defaults to None (all interfaces)
+        :type wg_interface_id: Optional[str], optional
+        """
+        if wg_interface_id is None:
+            self._interfaces.clear()
+            self._peer_interfaces.clear()
+            return
+
+        index = self._interfaces.pop(str(wg_interface_id), None)
+        if index is not None:
+            for peer_id in index.peer_routes:
+                self._peer_interfaces.pop(peer_id, None)
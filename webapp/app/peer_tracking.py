@@ -1,33 +1,450 @@
 """
 Peer tracking module
+
+The peers are tracked per wireguard interface (shard). Every peer has its own due time for the next check:
+
+* active peers are checked when the latest handshake exceeds the inactivity timeout of the interface
+* inactive (idle) peers are checked every `peer_tracking_timer * peer_tracking_idle_factor` seconds
+
+Routes are only changed on a state transition, so the work per run depends on the number of peers that are
+due and not on the total number of peers. If an active peer expires before the next regular run, an additional
+run is scheduled for the expiry time, so the routes are withdrawn when the peer is due.
+
+With route aggregation (`APP_ROUTE_AGGREGATION`), the routes of all active peers of an interface are collapsed
+into the minimal list of covering prefixes after a state transition. All routes of an interface point to the same
+wireguard device (the peer is selected by wireguard), so the collapsed prefixes cover exactly the same addresses.
+Only the difference to the installed prefixes is applied.
 """
+import asyncio
+import ipaddress
 import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from fastapi_utils.tasks import repeat_every
 
+import app.peer_events
 import models
 import utils.config
+import utils.coordination
+import utils.expiry
 import utils.generics
+import utils.instrumentation
 import utils.wireguard
 
 
+def aggregate_routes(routes: Iterable[str]) -> List[str]:
+    """collapse routes into the minimal list of prefixes that cover the same addresses
+
+    :param routes: IPv4/IPv6 routes (host bits are ignored)
+    :type routes: Iterable[str]
+    :return: sorted list of prefixes (IPv4 first)
+    :rtype: List[str]
+    """
+    networks = {4: set(), 6: set()}
+    for route in routes:
+        network = ipaddress.ip_interface(route).network
+        networks[network.version].add(network)
+
+    return [str(network) for version in (4, 6) for network in ipaddress.collapse_addresses(networks[version])]
+
+
+class PeerTrackingEntry:
+    """
+    tracking state of a single peer
+    """
+    __slots__ = ("public_key", "routes", "active", "next_check", "stale_routes")
+
+    def __init__(self, public_key: str, routes: List[str]):
+        self.public_key = public_key
+        self.routes = routes
+        # None if the state is unknown (routes are applied on the next check)
+        self.active = None
+        self.next_check = 0.0
+        self.stale_routes = []
+
+
+class InterfaceTrackingShard:
+    """
+    tracking state of all peers of a single wireguard interface
+    """
+    intf_name: str
+    inactivity_timeout: int
+    peers: Dict[str, PeerTrackingEntry]
+    loaded_at: Optional[float]
+    installed_routes: Set[str]
+    routes_changed: bool
+    removed_routes: List[str]
+    _schedule: utils.expiry.ExpiryIndex
+
+    def __init__(self, intf_name: str, inactivity_timeout: int=utils.wireguard.DEFAULT_PEER_INACTIVITY_TIMEOUT):
+        self.intf_name = intf_name
+        self.inactivity_timeout = inactivity_timeout
+        self.peers = dict()
+        self.loaded_at = None
+        # aggregated prefixes that are installed for the interface (only used with route aggregation)
+        self.installed_routes = set()
+        self.routes_changed = False
+        # routes of active peers that were removed from the database
+        self.removed_routes = []
+        self._schedule = utils.expiry.ExpiryIndex()
+
+    def load(self, peers: List[Tuple[str, List[str]]], now: float) -> None:
+        """update the tracked peers, the state of unchanged peers is kept
+
+        :param peers: list of public key and CIDR routes of the peers
+        :type peers: List[Tuple[str, List[str]]]
+        :param now: current time
+        :type now: float
+        """
+        tracked_peers = dict()
+        for public_key, routes in peers:
+            entry = self.peers.get(public_key)
+            if entry is None:
+                entry = PeerTrackingEntry(public_key, routes)
+                self.schedule(entry, now)
+
+            elif entry.routes != routes:
+                # apply the new routes on the next check and remove the routes that are no longer used
+                current_routes = set(routes)
+                entry.stale_routes = [x for x in entry.routes if x not in current_routes]
+                entry.routes = routes
+                entry.active = None
+                self.schedule(entry, now)
+
+            tracked_peers[public_key] = entry
+
+        for public_key in self.peers.keys() - tracked_peers.keys():
+            self._schedule.remove(public_key)
+            if self.peers[public_key].active:
+                self.routes_changed = True
+                self.removed_routes.extend(self.peers[public_key].routes)
+
+        self.peers = tracked_peers
+        self.loaded_at = now
+
+    def reset_state(self) -> None:
+        """forget the state of the peers and the installed routes (e.g. after the interface was recreated), the routes
+        of the active peers are applied again on the next check
+        """
+        for entry in self.peers.values():
+            entry.active = None
+            self.schedule(entry, 0.0)
+
+        self.installed_routes = set()
+
+    def schedule(self, entry: PeerTrackingEntry, when: float) -> None:
+        """schedule the next check of a peer
+
+        :param entry: tracked peer
+        :type entry: PeerTrackingEntry
+        :param when: time of the next check
+        :type when: float
+        """
+        entry.next_check = when
+        self._schedule.update(entry.public_key, when)
+
+    def active_routes(self) -> List[str]:
+        """routes of all active peers"""
+        return [route for entry in self.peers.values() if entry.active for route in entry.routes]
+
+    def pop_due(self, now: float) -> List[PeerTrackingEntry]:
+        """get all peers that are due for a check
+
+        :param now: current time
+        :type now: float
+        :return: list of peers
+        :rtype: List[PeerTrackingEntry]
+        """
+        return [self.peers[public_key] for public_key in self._schedule.pop_expired(now)]
+
+    @property
+    def next_due(self) -> Optional[float]:
+        """time of the next scheduled check"""
+        return self._schedule.next_due
+
+
+class PeerTracker(metaclass=utils.generics.SingletonMeta):
+    """
+    update the ip routing table based on the state of the peers
+    """
+    # seconds after which the peers of an interface are reloaded from the database
+    resync_interval = 60
+    _shards: Dict[str, InterfaceTrackingShard]
+    _invalidated: Optional[Set[str]]
+    _wakeup_handle: Optional[asyncio.TimerHandle]
+
+    def __init__(self):
+        self._logger = logging.getLogger("peer_tracking")
+        self._config = utils.config.ConfigUtil()
+        self._shards = dict()
+        # None means that all interfaces must be reloaded
+        self._invalidated = None
+        self._wakeup_handle = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def shards(self) -> Dict[str, InterfaceTrackingShard]:
+        """tracking state per interface"""
+        return self._shards
+
+    @property
+    def idle_interval(self) -> float:
+        """seconds between two checks of an inactive peer"""
+        return self._config.peer_tracking_timer * self._config.peer_tracking_idle_factor
+
+    def invalidate(self, intf_name: Optional[str]=None, reset_state: bool=False) -> None:
+        """reload the peers of the given interface (or all interfaces) from the database on the next run
+
+        :param intf_name: name of the interface, defaults to None (all interfaces)
+        :type intf_name: str, optional
+        :param reset_state: the interface was recreated (the routes were removed by wg-quick), the routes of the active
+                            peers are applied again on the next run, defaults to False
+        :type reset_state: bool, optional
+        """
+        if reset_state:
+            for shard in self._shards.values():
+                if intf_name is None or shard.intf_name == intf_name:
+                    shard.reset_state()
+
+        if intf_name is None or self._invalidated is None:
+            self._invalidated = None
+
+        else:
+            self._invalidated.add(intf_name)
+
+    async def _load_shards(self, now: float) -> None:
+        """reload all shards that are invalidated or expired
+
+        :param now: current time
+        :type now: float
+        """
+        if self._invalidated is None:
+            intf_names = set(await models.WgInterfaceModel.all().values_list("intf_name", flat=True))
+            for intf_name in self._shards.keys() - intf_names:
+                del self._shards[intf_name]
+
+            for intf_name in intf_names - self._shards.keys():
+                self._shards[intf_name] = InterfaceTrackingShard(intf_name)
+
+            reload_shards = list(self._shards.values())
+
+        else:
+            for intf_name in self._invalidated - self._shards.keys():
+                self._shards[intf_name] = InterfaceTrackingShard(intf_name)
+
+            reload_shards = [
+                shard for shard in self._shards.values()
+                if shard.intf_name in self._invalidated or shard.loaded_at is None or now - shard.loaded_at >= self.resync_interval
+            ]
+
+        self._invalidated = set()
+        for shard in reload_shards:
+            inactivity_timeout = await models.WgInterfaceModel.filter(intf_name=shard.intf_name).values_list(
+                "peer_inactivity_timeout", flat=True
+            )
+            if inactivity_timeout:
+                shard.inactivity_timeout = inactivity_timeout[0]
+
+            # the routes are loaded from the prefix table (no parsing of the CIDR lists)
+            peers = {
+                public_key: [] for public_key in await models.WgPeerModel.filter(
+                    wg_interface__intf_name=shard.intf_name
+                ).values_list("public_key", flat=True)
+            }
+            for public_key, route in await models.WgPeerRouteModel.filter(
+                peer__wg_interface__intf_name=shard.intf_name
+            ).order_by("peer_id", "position").values_list("peer__public_key", "cidr"):
+                peers.setdefault(public_key, []).append(route)
+
+            shard.load(list(peers.items()), now)
+            self._logger.debug(f"tracking data for interface '{shard.intf_name}' loaded ({len(shard.peers)} peers)")
+
+    def _check_peer(self, shard: InterfaceTrackingShard, entry: PeerTrackingEntry, snapshot: utils.wireguard.WgOperationalSnapshot) -> None:
+        """check the state of a peer, update the routes on a state transition and schedule the next check
+
+        :param shard: shard of the peer
+        :type shard: InterfaceTrackingShard
+        :param entry: tracked peer
+        :type entry: PeerTrackingEntry
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        """
+        ip_adapter = utils.wireguard.IpRouteAdapter()
+        now = snapshot.timestamp
+
+        peer_data = snapshot.data.get(shard.intf_name, {}).get("peers", {}).get(entry.public_key, {})
+        latest_handshake = peer_data.get("latestHandshake", 0)
+        expires_at = latest_handshake + shard.inactivity_timeout
+        active = latest_handshake != 0 and expires_at >= int(now)
+
+        if entry.stale_routes:
+            if self._config.route_aggregation:
+                shard.routes_changed = True
+
+            else:
+                for ip_net in entry.stale_routes:
+                    ip_adapter.remove_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+            entry.stale_routes = []
+
+        if active != entry.active:
+            self._logger.debug(f"peer '{entry.public_key}' on interface '{shard.intf_name}' changed state to {'ACTIVE' if active else 'INACTIVE'}")
+            if self._config.route_aggregation:
+                # the routes of the interface are updated once after all due peers are checked
+                shard.routes_changed = True
+
+            else:
+                for ip_net in entry.routes:
+                    if active:
+                        ip_adapter.add_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+                    else:
+                        ip_adapter.remove_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+            entry.active = active
+
+        if active:
+            # check again as soon as the peer expires
+            shard.schedule(entry, expires_at + 1)
+
+        else:
+            shard.schedule(entry, now + self.idle_interval)
+
+    def _apply_aggregated_routes(self, shard: InterfaceTrackingShard) -> None:
+        """install the aggregated routes of the active peers of an interface (only the difference is applied)
+
+        :param shard: shard of the interface
+        :type shard: InterfaceTrackingShard
+        """
+        ip_adapter = utils.wireguard.IpRouteAdapter()
+        routes = shard.active_routes()
+        prefixes = set(aggregate_routes(routes))
+        added = prefixes - shard.installed_routes
+        removed = shard.installed_routes - prefixes
+        # add before remove, a more specific prefix that replaces a collapsed prefix is routed without a gap
+        for ip_net in sorted(added):
+            ip_adapter.add_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+        for ip_net in sorted(removed):
+            ip_adapter.remove_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+        shard.installed_routes = prefixes
+        shard.routes_changed = False
+        self._logger.info(
+            f"route aggregation for interface '{shard.intf_name}': {len(routes)} routes of active peers, "
+            f"{len(prefixes)} prefixes installed ({len(added)} added, {len(removed)} removed)"
+        )
+
+    async def run(self, snapshot: utils.wireguard.WgOperationalSnapshot) -> int:
+        """check all peers that are due
+
+        :param snapshot: operational snapshot
+        :type snapshot: utils.wireguard.WgOperationalSnapshot
+        :return: number of checked peers
+        :rtype: int
+        """
+        now = snapshot.timestamp
+        async with self._lock:
+            await self._load_shards(now)
+
+            checked_peers = 0
+            for shard in self._shards.values():
+                for entry in shard.pop_due(now):
+                    self._check_peer(shard, entry, snapshot)
+                    checked_peers += 1
+
+                if shard.routes_changed and self._config.route_aggregation:
+                    self._apply_aggregated_routes(shard)
+
+                elif shard.removed_routes and not self._config.route_aggregation:
+                    # the peer was removed by another worker (or the routes were already removed on delete)
+                    for ip_net in shard.removed_routes:
+                        utils.wireguard.IpRouteAdapter().remove_ip_route(intf_name=shard.intf_name, ip_network=ip_net)
+
+                shard.removed_routes = []
+
+        self._logger.debug(f"peer tracking checked {checked_peers} peers")
+        self._schedule_wakeup(now)
+        return checked_peers
+
+    def _schedule_wakeup(self, now: float) -> None:
+        """schedule an additional run if a peer is due before the next regular run
+
+        :param now: current time
+        :type now: float
+        """
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+            self._wakeup_handle = None
+
+        next_due = min((shard.next_due for shard in self._shards.values() if shard.next_due is not None), default=None)
+        if next_due is None or next_due - now >= self._config.peer_tracking_timer:
+            return
+
+        self._wakeup_handle = asyncio.get_running_loop().call_later(
+            max(next_due - now, 0),
+            lambda: asyncio.ensure_future(self._wakeup())
+        )
+        self._logger.debug(f"next peer expires in {next_due - now:.1f} seconds, additional run scheduled")
+
+    async def _wakeup(self) -> None:
+        """check the peers that expire before the next regular run, the lease, the pending events and the drift
+        detection are left to the regular run (`track_peers`)
+        """
+        self._wakeup_handle = None
+        if not utils.coordination.LeaderElection().is_leader:
+            return
+
+        try:
+            snapshot = await utils.wireguard.WgSystemInfoAdapter().refresh_snapshot()
+
+        except utils.wireguard.WgSystemInfoException:
+            self._logger.error("unable to fetch operational data, skip additional peer tracking run", exc_info=True)
+            return
+
+        await models.wg_interface.load_inactivity_timeouts()
+        app.peer_events.PeerEventBroker().publish_snapshot(snapshot)
+        await self.run(snapshot)
+
+
+@utils.instrumentation.timed("peer_tracking.tick")
+async def track_peers() -> None:
+    """fetch the operational data, publish the peer events and update the ip routing table
+    """
+    logger = logging.getLogger("peer_tracking")
+    logger.debug("run peer tracking...")
+
+    # the lease of the leader is renewed on every run, only the leader changes the routing table
+    # imported here to avoid a circular import (the reconciler depends on the peer tracking)
+    from app.reconciler import run_leader_tasks  # pylint: disable=import-outside-toplevel
+    is_leader = await run_leader_tasks()
+
+    # fetch the operational data once per run, the snapshot is also used by the metrics endpoint
+    try:
+        snapshot = await utils.wireguard.WgSystemInfoAdapter().refresh_snapshot()
+
+    except utils.wireguard.WgSystemInfoException:
+        logger.error("unable to fetch operational data, skip peer tracking", exc_info=True)
+        return
+
+    # the peer events of all workers use the inactivity timeouts of the interfaces
+    await models.wg_interface.load_inactivity_timeouts()
+    app.peer_events.PeerEventBroker().publish_snapshot(snapshot)
+    if is_leader and await utils.coordination.LeaderElection().keep_alive():
+        await PeerTracker().run(snapshot)
+
+        # the system is compared with the database after the routes are updated
+        # imported here to avoid a circular import (the drift detection depends on the peer tracking)
+        from app.drift import DriftDetector  # pylint: disable=import-outside-toplevel
+        if await utils.coordination.LeaderElection().keep_alive():
+            await DriftDetector().run(snapshot)
+
+
 @repeat_every(
     seconds=utils.config.ConfigUtil().peer_tracking_timer,
     wait_first=True
 )
 async def run_peer_tracking() -> None:
-    """update ip routing table based on the
+    """update ip routing table based on the state of the peers
     """
-    logger = logging.getLogger("peer_tracking")
-    logger.debug("run peer tracking...")
-
-    ip_adapter = utils.wireguard.IpRouteAdapter()
-    for entry in await models.WgPeerModel.all():
-        # create ip route entries if not exists
-        await entry.fetch_related("wg_interface")
-        if await entry.is_active():
-            for ip_net in entry.cidr_routes_list:
-                ip_adapter.add_ip_route(intf_name=entry.wg_interface.intf_name, ip_network=ip_net)
-        else:
-            for ip_net in entry.cidr_routes_list:
-                ip_adapter.remove_ip_route(intf_name=entry.wg_interface.intf_name, ip_network=ip_net)
+    await track_peers()
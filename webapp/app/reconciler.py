@@ -0,0 +1,285 @@
+"""
+reconciliation of the system (wireguard interfaces, routes and ipsets) with the database
+
+Only the leader (`utils.coordination.LeaderElection`) changes the system. The model signals of the other workers
+record the affected interface or network set as event (`models.ReconcileEventModel`), the leader applies the events
+on its next run and stores the result (status, duration and error) within the event. A worker that becomes the leader
+reconciles the entire system first.
+
+With `APP_RECONCILER_MODE=external`, the API workers never change the system. The events are applied by a separate
+process (`cli.py run-reconciler`) that also runs the peer tracking, so the latency of the API doesn't depend on the
+duration of the changes on the system.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import signal
+import time
+from typing import Dict, List, Optional, Tuple
+
+import tortoise
+
+import app.init_config
+import app.jobs
+import app.wg_config_adapter
+import app.ipset_adapter
+import app.peer_tracking
+import models
+import utils.config
+import utils.coordination
+import utils.generics
+
+
+# order in which the changes are applied (the filter rules of the interfaces may reference the network sets, a renamed
+# network set must be renamed before the entries are applied)
+EVENT_ORDER = (
+    models.ReconcileEventKindEnum.NETWORK_SET_RENAME,
+    models.ReconcileEventKindEnum.NETWORK_SET,
+    models.ReconcileEventKindEnum.INTERFACE,
+    models.ReconcileEventKindEnum.PEERS,
+)
+
+
+class Reconciler(metaclass=utils.generics.SingletonMeta):
+    """
+    apply the database state to the system within the leader
+    """
+    # seconds after which the processed events are removed
+    event_retention = 86400
+
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._logger = logging.getLogger("reconciler")
+        # the leader tasks are started by the peer tracking and the main loop of the reconciler, a second run waits
+        # for the first one (otherwise the pending events would be applied twice)
+        self.leader_tasks_lock = asyncio.Lock()
+
+    async def reconcile_all(self) -> None:
+        """apply all network sets and re-initialize all wireguard interfaces"""
+        # the pending events are part of the database state
+        last_event_ids = await models.ReconcileEventModel.filter(
+            status=models.ReconcileEventStatusEnum.PENDING
+        ).order_by("-id").limit(1).values_list("id", flat=True)
+
+        # the prefix tables are derived from the CIDR lists of the peers and interfaces
+        await models.route.sync_prefix_tables()
+
+        # the network sets must exist before the filter rules of the interfaces are applied
+        election = utils.coordination.LeaderElection()
+        for network_set in await models.NetworkSetModel.all():
+            if not await election.keep_alive():
+                self._logger.error("lost the lease of the leader, stop reconciling the system")
+                return
+
+            self._logger.info(f"apply network set '{network_set}'...")
+            await network_set.apply()
+
+        # create wireguard configuration based on loaded database
+        for wgintf in await models.WgInterfaceModel.all():
+            if not await election.keep_alive():
+                self._logger.error("lost the lease of the leader, stop reconciling the system")
+                return
+
+            self._logger.warning(f"re-initialize wireguard config and interface '{wgintf}'...")
+            instance = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+            await instance.interface_down()
+            await instance.delete_config()
+            await instance.init_config(force_overwrite=True)
+            await instance.rebuild_peer_config()
+            await instance.interface_up()
+            await instance.apply_config()
+
+        app.peer_tracking.PeerTracker().invalidate(reset_state=True)
+        if last_event_ids:
+            await models.ReconcileEventModel.filter(
+                status=models.ReconcileEventStatusEnum.PENDING, id__lte=last_event_ids[0]
+            ).update(status=models.ReconcileEventStatusEnum.DONE, processed_at=datetime.datetime.now(datetime.timezone.utc))
+
+    async def teardown(self) -> None:
+        """remove all wireguard interfaces from the system"""
+        for wgintf in await models.WgInterfaceModel.all():
+            self._logger.warning(f"remove wireguard interface '{wgintf}'...")
+            instance = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+            await instance.interface_down()
+            await instance.delete_config()
+
+    async def apply_pending(self) -> int:
+        """apply the pending events, multiple events of the same interface or network set are applied once
+
+        :return: number of applied events
+        :rtype: int
+        """
+        events = await models.ReconcileEventModel.filter(
+            status=models.ReconcileEventStatusEnum.PENDING
+        ).order_by("id").values_list("id", "kind", "name")
+        if not events:
+            return 0
+
+        changes: Dict[Tuple[models.ReconcileEventKindEnum, str], List[int]] = dict()
+        for event_id, kind, name in events:
+            changes.setdefault((models.ReconcileEventKindEnum(kind), name), []).append(event_id)
+
+        applied = 0
+        recreated_interfaces = set()
+        election = utils.coordination.LeaderElection()
+        for (kind, name), event_ids in sorted(changes.items(), key=lambda x: EVENT_ORDER.index(x[0][0])):
+            if not await election.keep_alive():
+                # the remaining events are applied by the new leader
+                self._logger.error("lost the lease of the leader, stop applying the pending events")
+                break
+
+            self._logger.info(f"apply {kind.value} '{name}' ({len(event_ids)} events)")
+            start = time.perf_counter()
+            error = None
+            try:
+                if kind == models.ReconcileEventKindEnum.NETWORK_SET_RENAME:
+                    success = await self._rename_network_set(*name.split(" ", 1))
+
+                elif kind == models.ReconcileEventKindEnum.NETWORK_SET:
+                    success = await self._apply_network_set(name)
+
+                elif kind == models.ReconcileEventKindEnum.INTERFACE:
+                    success = await self._apply_interface(name, recreate=True)
+                    recreated_interfaces.add(name)
+
+                elif name not in recreated_interfaces:
+                    success = await self._apply_interface(name, recreate=False)
+
+                else:
+                    # the peers are part of the recreated interface
+                    success = True
+
+                if not success:
+                    error = f"unable to apply {kind.value} '{name}', see the log of the reconciler for details"
+
+            except Exception as ex:
+                self._logger.error(f"unable to apply {kind.value} '{name}'", exc_info=True)
+                error = str(ex) or type(ex).__name__
+
+            await models.ReconcileEventModel.filter(id__in=event_ids).update(
+                status=models.ReconcileEventStatusEnum.DONE if error is None else models.ReconcileEventStatusEnum.FAILED,
+                processed_at=datetime.datetime.now(datetime.timezone.utc),
+                duration=time.perf_counter() - start,
+                error=error
+            )
+            applied += len(event_ids)
+
+        await models.ReconcileEventModel.filter(
+            processed_at__lt=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.event_retention)
+        ).delete()
+        return applied
+
+    async def _apply_network_set(self, name: str) -> bool:
+        """apply or remove the ipset of a network set"""
+        network_set: Optional[models.NetworkSetModel] = await models.NetworkSetModel.get_or_none(name=name)
+        if network_set is None:
+            return await app.ipset_adapter.IpsetAdapter().destroy_set(name)
+
+        return await network_set.apply()
+
+    async def _rename_network_set(self, previous_name: str, name: str) -> bool:
+        """rename the ipset of a network set (the set may be renamed again or removed by a later event)"""
+        network_set: Optional[models.NetworkSetModel] = await models.NetworkSetModel.get_or_none(name=name)
+        if network_set is None:
+            return await app.ipset_adapter.IpsetAdapter().rename_set(previous_name, name)
+
+        return await network_set.rename(previous_name)
+
+    async def _apply_interface(self, intf_name: str, recreate: bool) -> bool:
+        """apply the configuration of an interface (the interface is removed if it no longer exists)"""
+        wgintf: Optional[models.WgInterfaceModel] = await models.WgInterfaceModel.get_or_none(intf_name=intf_name)
+        if wgintf is None:
+            # only the name is required to remove the interface and its configuration file
+            await app.wg_config_adapter.WgConfigAdapter(wg_interface=models.WgInterfaceModel(intf_name=intf_name)).delete_config()
+            app.peer_tracking.PeerTracker().invalidate()
+            return True
+
+        adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+        await adapter.init_config(force_overwrite=recreate)
+        await adapter.rebuild_peer_config()
+        success = await adapter.apply_config(recreate_interface=recreate)
+        app.peer_tracking.PeerTracker().invalidate(intf_name, reset_state=recreate)
+        if recreate:
+            # all interfaces are reloaded, an interface that was renamed is no longer tracked
+            app.peer_tracking.PeerTracker().invalidate()
+        return success
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """apply the events until the stop event is set (main loop of the reconciler process)
+
+        :param stop_event: event to stop the loop
+        :type stop_event: asyncio.Event
+        """
+        election = utils.coordination.LeaderElection()
+        election.candidate = True
+        next_tracking = 0.0
+        try:
+            while True:
+                if await run_leader_tasks():
+                    if time.monotonic() >= next_tracking:
+                        await app.peer_tracking.track_peers()
+                        next_tracking = time.monotonic() + self._config.peer_tracking_timer
+
+                if stop_event.is_set():
+                    break
+
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self._config.reconciler_poll_interval)
+
+                except asyncio.TimeoutError:
+                    pass
+
+        finally:
+            if election.is_leader:
+                await self.teardown()
+                await election.release()
+
+
+async def run_leader_tasks() -> bool:
+    """renew the lease of the leader, reconcile the system if the worker became the leader or apply the pending events
+    and jobs
+
+    :return: True if the worker is the leader
+    :rtype: bool
+    """
+    election = utils.coordination.LeaderElection()
+    async with Reconciler().leader_tasks_lock:
+        if await election.renew():
+            await Reconciler().reconcile_all()
+
+            # apply the initial configuration if the API workers don't change the system
+            if utils.config.ConfigUtil().reconciler_mode == "external" and os.environ.get("SKIP_INIT_CONFIG", "") == "":
+                await app.init_config.run()
+
+            await app.jobs.JobRunner().resume()
+
+        elif election.is_leader and election.enabled:
+            await Reconciler().apply_pending()
+
+            # the jobs that were submitted by the other workers
+            await app.jobs.JobRunner().run_pending()
+
+    return election.is_leader
+
+
+async def run_process() -> None:
+    """run the reconciler process until SIGINT or SIGTERM is received"""
+    config_util = utils.config.ConfigUtil()
+    logger = logging.getLogger("reconciler")
+    if config_util.reconciler_mode != "external":
+        logger.warning("APP_RECONCILER_MODE is not 'external', the API workers also change the system")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_event.set)
+
+    await tortoise.Tortoise.init(db_url=config_util.db_url, modules={"models": config_util.db_models})
+    try:
+        logger.info("reconciler started")
+        await Reconciler().run(stop_event)
+
+    finally:
+        await tortoise.Tortoise.close_connections()
+        logger.info("reconciler stopped")
@@ -0,0 +1,156 @@
+"""
+read-through cache for the encoded responses of the list endpoints
+
+The responses are stored as encoded bytes together with the ETag of the request (see `routers.conditional`). The
+ETag is derived from the revisions of the resource types of the response, the revisions are bumped by the model
+signals. An entry with an outdated ETag is dropped on the next lookup. The size of the cache is limited by
+`APP_RESPONSE_CACHE_SIZE` (MiB), the least recently used entries are evicted first.
+
+The cache is kept per process, the revisions are shared between the workers (`APP_LEADER_ELECTION`), a change within
+one worker invalidates the entries of all workers.
+"""
+import collections
+from typing import List, NamedTuple, Optional
+
+import utils.config
+import utils.generics
+
+
+class CacheEntry(NamedTuple):
+    """encoded response for the ETag of the request"""
+    etag: str
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        """size of the body and the ETag in bytes"""
+        return len(self.body) + len(self.etag)
+
+
+class ResponseCache(metaclass=utils.generics.SingletonMeta):
+    """
+    LRU cache for the encoded responses with a memory budget
+    """
+    max_bytes: int
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    _entries: "collections.OrderedDict[str, CacheEntry]"
+
+    def __init__(self):
+        self.max_bytes = utils.config.ConfigUtil().response_cache_size * 1024 * 1024
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        """False if the memory budget is 0"""
+        return self.max_bytes > 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """hits per lookup (0 if there was no lookup)"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: str, etag: str) -> Optional[bytes]:
+        """get the encoded response for the current ETag
+
+        :param key: cache key (e.g. the path of the request)
+        :type key: str
+        :param etag: current ETag of the response
+        :type etag: str
+        :return: encoded response or None if not cached or outdated
+        :rtype: Optional[bytes]
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.etag != etag:
+            self._remove(key)
+            self.invalidations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.body
+
+    def put(self, key: str, etag: str, body: bytes) -> None:
+        """store an encoded response, the least recently used entries are evicted if the memory budget is exceeded
+
+        :param key: cache key
+        :type key: str
+        :param etag: ETag of the request (read before the response was created)
+        :type etag: str
+        :param body: encoded response
+        :type body: bytes
+        """
+        entry = CacheEntry(etag=etag, body=body)
+        if entry.size + len(key) > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = entry
+        self.size += entry.size + len(key)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """remove all entries"""
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size + len(key)
+
+    def to_dict(self) -> dict:
+        """state and counters of the cache
+
+        :return: memory use and hit ratio
+        :rtype: dict
+        """
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def to_openmetrics(self) -> List[str]:
+        """counters and memory use of the cache in the OpenMetrics text format
+
+        :return: lines of the metric families
+        :rtype: List[str]
+        """
+        return [
+            "# HELP wgce_response_cache_lookups lookups of the cached list responses",
+            "# TYPE wgce_response_cache_lookups counter",
+            f'wgce_response_cache_lookups_total{{result="hit"}} {self.hits}',
+            f'wgce_response_cache_lookups_total{{result="miss"}} {self.misses}',
+            "# HELP wgce_response_cache_evictions entries that were evicted to stay within the memory budget",
+            "# TYPE wgce_response_cache_evictions counter",
+            f"wgce_response_cache_evictions_total {self.evictions}",
+            "# HELP wgce_response_cache_size_bytes memory used by the cached responses",
+            "# TYPE wgce_response_cache_size_bytes gauge",
+            f"wgce_response_cache_size_bytes {self.size}",
+            "# HELP wgce_response_cache_entries number of cached responses",
+            "# TYPE wgce_response_cache_entries gauge",
+            f"wgce_response_cache_entries {len(self._entries)}",
+        ]
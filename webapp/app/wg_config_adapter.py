@@ -2,26 +2,62 @@
 wireguard configuration adapter for the application
 """
 # pylint: disable=logging-fstring-interpolation
+import hashlib
 import os
 import logging
 import tempfile
-
-import wgconfig
+from typing import Dict, Optional
 
 import utils.config
 import utils.log
 import utils.generics
+import utils.instrumentation
+import utils.wg_config
 import utils.wireguard
 
 
+class ConfigFileState(metaclass=utils.generics.SingletonMeta):
+    """
+    content hashes of the configuration files that were written and applied to the system by this process (key is
+    the path of the configuration file)
+    """
+    written: Dict[str, str]
+    applied: Dict[str, str]
+
+    def __init__(self):
+        self.written = dict()
+        self.applied = dict()
+
+    def discard(self, path: str) -> None:
+        """forget the state of a configuration file
+
+        :param path: path of the configuration file
+        :type path: str
+        """
+        self.written.pop(path, None)
+        self.applied.pop(path, None)
+
+
+def content_hash(content: str) -> str:
+    """hash of the content of a configuration file
+
+    :param content: content of the configuration file
+    :type content: str
+    :return: hex digest of the content
+    :rtype: str
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
 class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
     """interface for the wireguatd configuration
     """
-    _config: utils.config.ConfigUtil()
+    _config: utils.config.ConfigUtil
     _logger: logging.Logger
     _config_path: str
     _wg_interface_instance: "Type[models.WgInterfaceModel]"
-    _wg_config: wgconfig.WGConfig
+    _wg_config: utils.wg_config.WgInterfaceConfig
+    _loaded: bool
 
     def __init__(self, wg_interface: "Type[models.WgInterfaceModel]"):
         """Initialize the configuration adapter for the given interface
@@ -37,7 +73,8 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
 
         os.makedirs(self._config.wg_config_dir, exist_ok=True)
         self._config_path = os.path.join(self._config.wg_config_dir, f"{self._wg_interface_instance.intf_name}.conf")
-        self._wg_config = wgconfig.WGConfig(self._config_path)
+        self._wg_config = utils.wg_config.WgInterfaceConfig()
+        self._loaded = False
 
     def __str__(self):
         return f"Config Adapter {self._wg_interface_instance}"
@@ -71,6 +108,64 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         self._logger.debug(f"wireguard configuration read:\n{content}")
         return content
 
+    def _read_config(self) -> None:
+        """read the configuration file into memory"""
+        with open(self._config_path, encoding="utf-8") as f:
+            self._wg_config = utils.wg_config.WgInterfaceConfig.parse(f)
+
+        self._loaded = True
+
+    def _write_config(self) -> bool:
+        """write the configuration from memory to disk if the content changed, the file is replaced atomically
+
+        :return: True if the file was written, False if the content was already on disk
+        :rtype: bool
+        """
+        state = ConfigFileState()
+        content = self._wg_config.render()
+        new_hash = content_hash(content)
+        if state.written.get(self._config_path) == new_hash and os.path.exists(self._config_path):
+            self._logger.debug(f"configuration file {self._config_path} unchanged")
+            return False
+
+        # the temporary file must be on the same file system to rename it
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._config_path), prefix=".", suffix=".conf.tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+
+            os.chmod(tmp_path, 0o640)
+            os.replace(tmp_path, self._config_path)
+
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        state.written[self._config_path] = new_hash
+        return True
+
+    def _config_hash(self) -> Optional[str]:
+        """hash of the configuration file on disk
+
+        :return: hex digest of the content, None if the file doesn't exist
+        :rtype: Optional[str]
+        """
+        state = ConfigFileState()
+        file_hash = state.written.get(self._config_path)
+        if file_hash is None and self.is_initialized():
+            with open(self._config_path, encoding="utf-8") as f:
+                file_hash = content_hash(f.read())
+
+            state.written[self._config_path] = file_hash
+
+        return file_hash
+
+    def discard_applied_state(self) -> None:
+        """forget the configuration that was applied to the system, the next `apply_config` call runs unconditionally
+        """
+        ConfigFileState().applied.pop(self._config_path, None)
+
     async def interface_exists(self) -> bool:
         """check if the interface exists on the system
 
@@ -82,6 +177,7 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         # on interface level
         return self._wg_interface_instance.intf_name in wg_json.keys()
 
+    @utils.instrumentation.timed("wg_adapter.interface_up")
     async def interface_up(self) -> bool:
         """enable interface using wg-quick and the given configuration of the interface
 
@@ -99,6 +195,11 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
                 self._logger.error(f"failed to create wireguard interface {wg_interface}:\n{err}")
                 return False
 
+            # wg-quick applies the configuration file as it is on disk
+            file_hash = self._config_hash()
+            if file_hash is not None:
+                ConfigFileState().applied[self._config_path] = file_hash
+
             self._logger.info(f"wireguard interface {wg_interface} created")
 
         except Exception as ex:
@@ -107,6 +208,7 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
 
         return True
 
+    @utils.instrumentation.timed("wg_adapter.interface_down")
     async def interface_down(self) -> bool:
         """disable interface using wg-quick and the given configuration of the interface
 
@@ -119,6 +221,7 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         wg_interface = self._wg_interface_instance.intf_name
         try:
             self._logger.info(f"try to remove wireguard interface {wg_interface}...")
+            self.discard_applied_state()
             out, err, success = await self._execute_subprocess(f"wg-quick down {self._config_path}")
             if not success:
                 self._logger.error(f"failed to remove wireguard interface {wg_interface}:\n{err}")
@@ -132,6 +235,7 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
 
         return True
 
+    @utils.instrumentation.timed("wg_adapter.init_config")
     async def init_config(self, force_overwrite: bool=False):
         """initialize wireguard configuration adapter with interface specific configuration settings
 
@@ -141,51 +245,17 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         # initialize configuration if not exists
         if not self.is_initialized() or force_overwrite:
             # reset the file
-            self._wg_config.initialize_file(f"# configuration managed by script - please don't change - {self._wg_interface_instance.description} ({self._wg_interface_instance.instance_id})")
-            self._wg_config.add_attr(None, "PrivateKey", self._wg_interface_instance.private_key, append_as_line=False)
-            self._wg_config.add_attr(None, "Address", self._wg_interface_instance.cidr_addresses, append_as_line=False)
-            self._wg_config.add_attr(None, "ListenPort", self._wg_interface_instance.listen_port, append_as_line=False)
-            self._wg_config.add_attr(None, "Table", self._wg_interface_instance.table.value, append_as_line=False)
-
-            await self._wg_interface_instance.fetch_related("policy_rule_list")
-
-            if self._wg_interface_instance.policy_rule_list:
-                ipv4_rules = await self._wg_interface_instance.policy_rule_list.to_ipv4_iptables_list(intf_name="%i", drop_rule=False)
-                ipv6_rules = await self._wg_interface_instance.policy_rule_list.to_ipv6_iptables_list(intf_name="%i", drop_rule=False)
-
-                # add IPv4 policy if defined
-                if len(ipv4_rules) != 0:
-                    drop_ipv4_rules = await self._wg_interface_instance.policy_rule_list.to_ipv4_iptables_list(intf_name="%i", drop_rule=True)
-                    self._wg_config.add_attr(
-                        None,
-                        "PostUp",
-                        "; ".join(ipv4_rules),
-                        append_as_line=True
-                    )
-                    self._wg_config.add_attr(
-                        None,
-                        "PostDown",
-                        "; ".join(drop_ipv4_rules),
-                        append_as_line=True
-                    )
-
-                # add IPv6 policy if defined
-                if len(ipv6_rules) != 0:
-                    drop_ipv6_rules = await self._wg_interface_instance.policy_rule_list.to_ipv6_iptables_list(intf_name="%i", drop_rule=True)
-                    self._wg_config.add_attr(
-                        None,
-                        "PostUp",
-                        "; ".join(ipv6_rules),
-                        append_as_line=True
-                    )
-                    self._wg_config.add_attr(
-                        None,
-                        "PostDown",
-                        "; ".join(drop_ipv6_rules),
-                        append_as_line=True
-                    )
-
-            self._wg_config.write_file()
+            instance = self._wg_interface_instance
+            self._wg_config = utils.wg_config.WgInterfaceConfig(
+                comment=f"# configuration managed by script - please don't change - {instance.description} ({instance.instance_id})",
+                private_key=instance.private_key,
+                address=instance.cidr_addresses,
+                listen_port=str(instance.listen_port),
+                table=instance.table.value
+            )
+            await self._render_policy()
+            self._write_config()
+            self._loaded = True
 
             # create interface if not existing or recreate with force_overwrite
             if force_overwrite:
@@ -196,13 +266,52 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
                 await self.interface_up()
 
             self._logger.info(f"interface configuration for {self._wg_interface_instance.intf_name} initialized")
-            self._logger.debug(f"wireguard config created:\n{self._wg_config.interface}\n{self._wg_config.peers}")
+            self._logger.debug(f"wireguard config created: {self._wg_config!r}")
 
         else:
-            self._wg_config.read_file()
+            self._read_config()
             self._logger.debug(f"interface configuration for {self._wg_interface_instance.intf_name} read from disk")
-            self._logger.debug(f"wireguard config read from disk:\n{self._wg_config.interface}\n{self._wg_config.peers}")
+            self._logger.debug(f"wireguard config read from disk: {self._wg_config!r}")
+
+    async def _render_policy(self) -> None:
+        """render the iptables commands of the policy of the interface as PostUp and PostDown commands"""
+        instance = self._wg_interface_instance
+        self._wg_config.post_up = []
+        self._wg_config.post_down = []
+        await instance.fetch_related("policy_rule_list")
+
+        if instance.policy_rule_list:
+            # compiled once per policy revision and shared by all interfaces that use the policy
+            compiled_policy = await instance.policy_rule_list.compile(intf_name="%i")
+
+            # add IPv4 policy if defined
+            if len(compiled_policy.ipv4_add) != 0:
+                self._wg_config.post_up.append("; ".join(compiled_policy.ipv4_add))
+                self._wg_config.post_down.append("; ".join(compiled_policy.ipv4_delete))
+
+            # add IPv6 policy if defined
+            if len(compiled_policy.ipv6_add) != 0:
+                self._wg_config.post_up.append("; ".join(compiled_policy.ipv6_add))
+                self._wg_config.post_down.append("; ".join(compiled_policy.ipv6_delete))
+
+    async def rebuild_policy_config(self) -> bool:
+        """render the policy of the interface again and write the configuration file, the iptables rules on the system
+        are not changed (e.g. after a network set was renamed, the PostDown commands must use the new name)
+
+        :return: True if the configuration was updated, False if the interface is not initialized
+        :rtype: bool
+        """
+        if not self.is_initialized():
+            return False
+
+        if not self._loaded:
+            self._read_config()
+
+        await self._render_policy()
+        self._write_config()
+        return True
 
+    @utils.instrumentation.timed("wg_adapter.rebuild_peer_config")
     async def rebuild_peer_config(self) -> bool:
         """rebuild peer section in configuration
 
@@ -211,32 +320,30 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         """
         if not self.is_initialized():
             self._logger.warning("call sync peer without proper initialization, initial configuration...")
-            self.init_config()
+            await self.init_config()
 
         await self._wg_interface_instance.fetch_related("peers")
 
-        # drop existing entries
-        for public_key in self._wg_config.peers.keys():
-            self._wg_config.del_peer(public_key)
-
-        # rebuild wireguard peer table
+        # update the peer table in place, the peers keep their position
         try:
+            public_keys = set()
             for peer in self._wg_interface_instance.peers:
-                # add a comment with some information about the peer to make the configuration more readable
-                self._wg_config.add_peer(peer.public_key, f"# {peer.instance_id} / {peer.friendly_name} / {peer.description}")
-                self._wg_config.add_attr(peer.public_key, "AllowedIPs", peer.cidr_routes)
-
-                if peer.endpoint:
-                    self._wg_config.add_attr(peer.public_key, "Endpoint", peer.endpoint)
-
-                if peer.persistent_keepalives > 0:
-                    self._wg_config.add_attr(peer.public_key, "PersistentKeepalive", peer.persistent_keepalives)
-
-                if peer.preshared_key:
-                    self._wg_config.add_attr(peer.public_key, "PresharedKey", peer.preshared_key)
-
-            self._logger.debug(f"persist configuration files for {repr(self)}")
-            self._wg_config.write_file()
+                public_keys.add(peer.public_key)
+                self._wg_config.upsert_peer(utils.wg_config.WgPeerConfig(
+                    public_key=peer.public_key,
+                    # add a comment with some information about the peer to make the configuration more readable
+                    comment=f"# {peer.instance_id} / {peer.friendly_name} / {peer.description}",
+                    allowed_ips=peer.cidr_routes,
+                    endpoint=peer.endpoint or None,
+                    persistent_keepalive=str(peer.persistent_keepalives) if peer.persistent_keepalives > 0 else None,
+                    preshared_key=peer.preshared_key or None
+                ))
+
+            for public_key in [key for key in self._wg_config.peers if key not in public_keys]:
+                self._wg_config.remove_peer(public_key)
+
+            if self._write_config():
+                self._logger.debug(f"configuration file for {repr(self)} written")
 
         except Exception as ex:
             self._logger.error(f"unable to update peer list: {ex}")
@@ -245,6 +352,7 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         self._logger.debug(f"peer config for '{self._wg_interface_instance.intf_name}' updated")
         return True
 
+    @utils.instrumentation.timed("wg_adapter.apply_config")
     async def apply_config(self, recreate_interface: bool=False) -> bool:
         """apply new configuration to system
 
@@ -254,38 +362,39 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
         :rtype: bool
         """
         wg_interface = self._wg_interface_instance.intf_name
+        state = ConfigFileState()
+        file_hash = self._config_hash()
+        if not recreate_interface and file_hash is not None and state.applied.get(self._config_path) == file_hash:
+            self._logger.debug(f"configuration of interface {wg_interface} unchanged, skip apply")
+            return True
+
         success_state = True
+        self.discard_applied_state()
         interface_exists = await self.interface_exists()
 
         try:
-            shell_command = f"wg-quick strip {self._config_path}"
-            self._logger.debug(f"execute '{shell_command}'...")
-            config, err, success = await self._execute_subprocess(shell_command)
-            if not success:
-                self._logger.fatal("unable to strip wireguard configuration file")
-                return False
+            # the configuration is stripped in memory and passed to wg through the standard input
+            if not self._loaded and self.is_initialized():
+                self._read_config()
 
-            # create temporary file with the config to apply sync
-            with tempfile.NamedTemporaryFile(delete=not self._config.debug, suffix=".wgtempconf", dir=self._config.wg_tmp_dir) as tmp_file:
-                # write configuration results to file
-                self._logger.debug(f"write temporary wireguard configuration file to disk at {tmp_file.name}")
-                tmp_file.write(config.encode("utf-8"))
-                tmp_file.flush()
+            config = self._wg_config.render(stripped=True)
 
-                # sync the wireguard configuration with the configuration file
-                # this WON'T update the routing table (handled by another component)
-                shell_command = f"wg syncconf {wg_interface} {tmp_file.name}"
-                self._logger.debug(f"execute '{shell_command}'...")
-                out, err, success = await self._execute_subprocess(shell_command)
-                if not success:
-                    if "Unable to modify interface: Operation not permitted" in err:  # cov-ignore
-                        self._logger.fatal("unable to update network configuration, permission denied")
+            # sync the wireguard configuration with the configuration file
+            # this WON'T update the routing table (handled by another component)
+            shell_command = f"wg syncconf {wg_interface} /dev/stdin"
+            self._logger.debug(f"execute '{shell_command}'...")
+            out, err, success = await self._execute_subprocess(shell_command, input_data=config)
+            if not success:
+                if "Unable to modify interface: Operation not permitted" in err:  # cov-ignore
+                    self._logger.fatal("unable to update network configuration, permission denied")
 
-                    self._logger.error(f"unable to update configuration for interface {wg_interface}\n{err}")
-                    success_state = False
+                self._logger.error(f"unable to update configuration for interface {wg_interface}\n{err}")
+                success_state = False
 
-                else:
-                    self._logger.info(f"sync wireguard config file with interface {wg_interface}")
+            else:
+                self._logger.info(f"sync wireguard config file with interface {wg_interface}")
+                if file_hash is not None:
+                    state.applied[self._config_path] = file_hash
 
         except Exception as ex:
             self._logger.fatal(f"failed to apply the Wireguard configuration for interface {wg_interface} at system level: {str(ex)}", exc_info=True)
@@ -312,3 +421,5 @@ class WgConfigAdapter(utils.generics.AsyncSubProcessMixin):
 
         if os.path.exists(self._config_path):
             os.remove(self._config_path)
+
+        ConfigFileState().discard(self._config_path)
@@ -51,5 +51,374 @@ def run_dev_server():
         pass
 
 
+@cli.command()
+def run_reconciler():
+    """
+    apply the configuration to the system and run the peer tracking in a separate process (requires
+    APP_RECONCILER_MODE=external for the API server)
+    """
+    import asyncio
+
+    import app.reconciler
+
+    asyncio.run(app.reconciler.run_process())
+
+
+@cli.command()
+@click.option("--top", default=15, show_default=True, help="number of modules and packages with the longest import time")
+def profile_startup(top):
+    """
+    measure the cold start of the API server up to the first served request in a new interpreter (the system is not
+    changed, a temporary data directory is used)
+    """
+    import utils.startup_profile
+
+    profile = utils.startup_profile.run_profile()
+
+    click.echo(f"startup of the API server (first request: HTTP {profile.status_code})")
+    for stage in utils.startup_profile.STAGES:
+        click.echo(f"    {stage:16} {profile.stages[stage] * 1000:10.1f} ms")
+
+    click.echo(f"    {'process total':16} {profile.total * 1000:10.1f} ms (including the interpreter)")
+    click.echo("")
+    click.echo("import time per package:")
+    for package, duration in profile.imports_per_package()[:top]:
+        click.echo(f"    {package:40} {duration / 1000:10.1f} ms")
+
+    click.echo("")
+    click.echo("modules with the longest import time (excluding their imports):")
+    for entry in profile.top_imports(top):
+        click.echo(f"    {entry.module:40} {entry.self_us / 1000:10.1f} ms")
+
+
+@cli.command()
+@click.option("--rules", default=50000, show_default=True, help="number of filter rules")
+@click.option("--rounds", default=3, show_default=True, help="number of rounds per compiler, the best round is reported")
+def benchmark_rule_compiler(rules, rounds):
+    """
+    compare the batch rule compiler with the per-object rendering of the rule models
+    """
+    import logging
+    import random
+    import time
+
+    import utils.config
+    import utils.iptables
+    import utils.log
+    import models
+
+    rnd = random.Random(42)
+    rows = []
+    for i in range(rules):
+        rows.append((
+            f"10.{i % 256}.{rnd.randint(0, 255)}.0/24" if rnd.random() < 0.8 else "0.0.0.0/0",
+            f"172.16.{rnd.randint(0, 255)}.0/24" if rnd.random() < 0.5 else "0.0.0.0/0",
+            rnd.random() < 0.1,
+            rnd.random() < 0.1,
+            rnd.choice([None, models.FilterProtocolEnum.TCP, models.FilterProtocolEnum.UDP]),
+            rnd.choice([None, 22, 80, 443, 8080]),
+            rnd.choice(list(models.IpTableActionEnum)),
+            rnd.choice(list(models.IpTableNameEnum)),
+        ))
+
+    instances = [
+        models.Ipv4FilterRuleModel(**dict(zip(utils.iptables.FILTER_RULE_COLUMNS, row)))
+        for row in rows
+    ]
+    columns = utils.iptables.to_columns(rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+
+    # the debug messages are still formatted by the per-object path, but not written
+    logger = utils.log.LoggingUtil().logger
+    log_level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        # both paths must produce the same commands, otherwise the speedup is meaningless
+        for drop_rule in (False, True):
+            per_object = [rule.to_iptables_rule(intf_name="%i", drop_rule=drop_rule) for rule in instances]
+            batch = utils.iptables.compile_filter_rules(*columns, intf_name="%i", drop_rule=drop_rule)
+            if per_object != batch:
+                raise click.ClickException("per-object and batch compilation disagree")
+
+        per_object_times = []
+        batch_times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for drop_rule in (False, True):
+                per_object = [rule.to_iptables_rule(intf_name="%i", drop_rule=drop_rule) for rule in instances]
+            per_object_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for drop_rule in (False, True):
+                batch = utils.iptables.compile_filter_rules(*columns, intf_name="%i", drop_rule=drop_rule)
+            batch_times.append(time.perf_counter() - start)
+
+    finally:
+        logger.setLevel(log_level)
+
+    click.echo(f"compiled {rules} rules (add and delete) in {rounds} rounds")
+    click.echo(f"    per-object: {min(per_object_times) * 1000:10.1f} ms")
+    click.echo(f"    batch:      {min(batch_times) * 1000:10.1f} ms")
+    click.echo(f"    speedup:    {min(per_object_times) / min(batch_times):10.1f}x")
+
+
+@cli.command()
+@click.option("--routes", default=200, show_default=True, help="number of routes in the long lists")
+@click.option("--adversarial", default=14, show_default=True, help="number of routes in the adversarial list (the regex runtime doubles per route)")
+@click.option("--rounds", default=100, show_default=True, help="number of rounds per validator, the best round is reported")
+def benchmark_validators(routes, adversarial, rounds):
+    """
+    compare the CIDR list validator with the regular expression that was used before
+    """
+    import re
+    import time
+
+    import utils.regex
+    import utils.tortoise.validators
+
+    regex = re.compile(utils.regex.IPV4_OR_IPV6_INTERFACE_CSV_LIST_REGEX, re.I)
+    validator = utils.tortoise.validators.find_invalid_ip_interface
+    values = {
+        "ipv4 list": ", ".join(f"10.{i // 256 % 256}.{i % 256}.1/32" for i in range(routes)),
+        "ipv6 list": ", ".join(f"fd00:{i:x}::1/128" for i in range(routes)),
+        # compressed IPv6 addresses followed by an invalid element cause a backtracking of the regex
+        "adversarial": ",".join(f"fd00:{i:x}::1:2:3/128, 10.0.{i % 256}.1/32" for i in range(adversarial)) + ",fd00::1:2:3:4:5:6:7/128",
+    }
+
+    def best_time(func, value, rounds):
+        result = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func(value)
+            result.append(time.perf_counter() - start)
+
+        return min(result) * 1000
+
+    def uncached(value):
+        validator.cache_clear()
+        validator(value)
+
+    click.echo(f"{'':12} {'regex':>12} {'validator':>12} {'cached':>12}")
+    for name, value in values.items():
+        # the regex is measured once for the adversarial input
+        regex_time = best_time(regex.match, value, 1 if name == "adversarial" else rounds)
+        click.echo(
+            f"{name:12} {regex_time:9.3f} ms {best_time(uncached, value, rounds):9.3f} ms {best_time(validator, value, rounds):9.3f} ms"
+        )
+
+
+@cli.command()
+@click.option("--rows", default="1000,10000,50000", show_default=True, help="comma separated number of rows per run")
+@click.option("--rounds", default=3, show_default=True, help="number of rounds per serializer, the best round is reported")
+def benchmark_list_endpoints(rows, rounds):
+    """
+    compare the response of the list endpoints with the pydantic schemas (validated response model, JSON encoder) and
+    with the rows from values() queries (orjson) on a temporary database
+    """
+    import asyncio
+    import base64
+    import json
+    import tempfile
+    import time
+    from typing import List
+
+    import fastapi.routing
+    import fastapi.utils
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    import models
+    import models.route
+    import schemas
+    import utils.config
+    import utils.tortoise.serializers
+
+    async def schema_response(schema, queryset):
+        field = fastapi.utils.create_cloned_field(fastapi.utils.create_response_field(name="Response", type_=List[schema]))
+        content = await fastapi.routing.serialize_response(field=field, response_content=await schema.from_queryset(queryset))
+        return JSONResponse(content).body
+
+    async def rows_response(schema, queryset):
+        return ORJSONResponse(await utils.tortoise.serializers.get_row_builder(schema).build(queryset)).body
+
+    async def create_data(count):
+        # the rows are created without signals, the system is not changed (the routes of the peers are created separately)
+        prl = models.PolicyRuleListModel(name="benchmark")
+        peers_prl = models.PolicyRuleListModel(name="peers")
+        await models.PolicyRuleListModel.bulk_create([prl, peers_prl])
+        await models.Ipv4FilterRuleModel.bulk_create([
+            models.Ipv4FilterRuleModel(policy_rule_list_id=prl.instance_id, src_network=f"10.{i // 256 % 256}.{i % 256}.0/24", dst_port_number=443)
+            for i in range(count)
+        ])
+        wg_intf = models.WgInterfaceModel(
+            intf_name="wg0", cidr_addresses="10.0.0.1/8", policy_rule_list_id=peers_prl.instance_id,
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgInterfaceModel.bulk_create([wg_intf])
+        await models.WgPeerModel.bulk_create([
+            models.WgPeerModel(
+                wg_interface_id=wg_intf.instance_id,
+                public_key=base64.b64encode(i.to_bytes(32, "big")).decode(),
+                cidr_routes=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/32"
+            )
+            for i in range(count)
+        ])
+        routes = []
+        for peer_id, cidr_routes in await models.WgPeerModel.all().values_list("instance_id", "cidr_routes"):
+            routes.extend(
+                models.WgPeerRouteModel(peer_id=peer_id, **values)
+                for values in models.route.parse_cidr_list(models.route.split_cidr_list(cidr_routes))
+            )
+
+        await models.WgPeerRouteModel.bulk_create(routes)
+
+    async def run(count):
+        with tempfile.TemporaryDirectory() as data_dir:
+            config_util = utils.config.ConfigUtil()
+            await Tortoise.init(db_url=f"sqlite://{data_dir}/benchmark.sqlite3", modules={"models": config_util.db_models})
+            try:
+                await Tortoise.generate_schemas()
+                await create_data(count)
+
+                endpoints = (
+                    ("/api/wg/interfaces", schemas.WgInterfaceSchema, models.WgInterfaceModel.all),
+                    ("/api/wg/interface/peers", schemas.WgPeerSchema, models.WgPeerModel.all),
+                    ("/api/rules/filters/ipv4", schemas.Ipv4FilterRuleSchema, models.Ipv4FilterRuleModel.all),
+                )
+                for path, schema, queryset in endpoints:
+                    times = {schema_response: [], rows_response: []}
+                    for _ in range(rounds):
+                        for serializer, result in times.items():
+                            start = time.perf_counter()
+                            body = await serializer(schema, queryset())
+                            result.append(time.perf_counter() - start)
+
+                    # both responses must contain the same data
+                    if json.loads(await schema_response(schema, queryset())) != json.loads(body):
+                        raise click.ClickException(f"responses of {path} differ")
+
+                    schema_time, rows_time = min(times[schema_response]), min(times[rows_response])
+                    click.echo(
+                        f"{count:>8} {path:28} {schema_time * 1000:10.1f} ms {rows_time * 1000:10.1f} ms "
+                        f"{schema_time / rows_time:8.1f}x {len(body) / 1024 / 1024:8.1f} MB"
+                    )
+
+            finally:
+                await Tortoise.close_connections()
+
+    click.echo(f"{'rows':>8} {'endpoint':28} {'schema':>13} {'values':>13} {'speedup':>9} {'size':>11}")
+    for count in [int(value) for value in rows.split(",")]:
+        asyncio.run(run(count))
+
+
+@cli.command()
+@click.argument("policy")
+@click.option("--flows", default=1000000, show_default=True, help="number of synthetic flows")
+@click.option("--seed", default=42, show_default=True, help="seed for the synthetic flows")
+@click.option("--verify", default=10000, show_default=True, help="number of flows that are verified with a linear scan over the rules")
+def simulate_policy(policy, flows, seed, verify):
+    """
+    evaluate synthetic flows against the filter rules of a POLICY (name or instance ID) from the database, the command
+    fails if the result of the simulator differs from a linear scan over the rules (regression test)
+    """
+    import asyncio
+    import ipaddress
+    import random
+    import time
+    from collections import Counter
+
+    import utils.config
+    import utils.iptables
+    import utils.policy_simulator
+    import models
+
+    async def build_simulator():
+        config_util = utils.config.ConfigUtil()
+        await Tortoise.init(db_url=config_util.db_url, modules={"models": config_util.db_models})
+        try:
+            prl = await models.PolicyRuleListModel.get_or_none(name=policy)
+            if prl is None:
+                prl = await models.PolicyRuleListModel.get(instance_id=policy)
+
+            return await prl.build_simulator()
+
+        finally:
+            await Tortoise.close_connections()
+
+    simulator = asyncio.run(build_simulator())
+
+    # the flows hit the networks and ports of the rules with a higher probability than random traffic
+    rnd = random.Random(seed)
+    networks = {4: [], 6: []}
+    ports = set()
+    for version, any_network in ((4, utils.iptables.IPV4_ANY_NETWORK), (6, utils.iptables.IPV6_ANY_NETWORK)):
+        for index, row in enumerate(simulator.rows[version]):
+            rule = utils.iptables.FilterRule(index, row, any_network)
+            networks[version].extend(network for network in (rule.src, rule.dst) if network is not None)
+            for network_set in (rule.src_set, rule.dst_set):
+                networks[version].extend(ipaddress.ip_network(value) for value in simulator.network_sets.get(network_set, []))
+
+            if rule.dport:
+                ports.add(rule.dport)
+
+    ports = sorted(ports) or [443]
+    versions = [4, 6] if networks[6] else [4]
+
+    def random_address(version):
+        if networks[version] and rnd.random() < 0.8:
+            network = rnd.choice(networks[version])
+            return network.network_address + rnd.randrange(network.num_addresses)
+
+        if version == 4:
+            return ipaddress.IPv4Address(rnd.getrandbits(32))
+
+        return ipaddress.IPv6Address(rnd.getrandbits(128))
+
+    def random_flow():
+        version = rnd.choice(versions)
+        return (
+            random_address(version),
+            random_address(version),
+            rnd.choice([None, "tcp", "udp"]),
+            rnd.choice(ports) if rnd.random() < 0.7 else rnd.randint(1, 65535),
+            rnd.choice(["INPUT", "FORWARD"])
+        )
+
+    actions = Counter()
+    rules = Counter()
+    mismatches = 0
+    evaluation_time = 0
+    chunk_size = 100000
+    for offset in range(0, flows, chunk_size):
+        chunk = [random_flow() for _ in range(min(chunk_size, flows - offset))]
+
+        start = time.perf_counter()
+        results = [simulator.evaluate(*flow) for flow in chunk]
+        evaluation_time += time.perf_counter() - start
+
+        for flow, result in zip(chunk, results):
+            actions[result.action] += 1
+            rules[result.rule_id] += 1
+
+        for flow, result in list(zip(chunk, results))[:max(0, verify - offset)]:
+            version = flow[0].version
+            expected = utils.policy_simulator.reference_evaluate(
+                simulator.rows[version],
+                utils.iptables.IPV4_ANY_NETWORK if version == 4 else utils.iptables.IPV6_ANY_NETWORK,
+                *flow,
+                network_sets=simulator.network_sets
+            )
+            if (expected.action, expected.rule_index) != (result.action, result.rule_index):
+                mismatches += 1
+                click.echo(f"MISMATCH {flow}: simulator {result.action}/{result.rule_index}, expected {expected.action}/{expected.rule_index}")
+
+    click.echo(f"evaluated {flows} flows in {evaluation_time * 1000:.1f} ms ({evaluation_time / max(flows, 1) * 1000000:.2f} us per flow)")
+    for action, count in actions.most_common():
+        click.echo(f"    {action:8} {count:10}")
+
+    click.echo(f"matched rules: {len([rule_id for rule_id in rules if rule_id is not None])}, default policy: {rules[None]}")
+    click.echo(f"verified {min(verify, flows)} flows with {mismatches} mismatches")
+    if mismatches:
+        raise click.ClickException("simulator and linear scan disagree")
+
+
 if __name__ == "__main__":
     cli()
@@ -10,9 +10,12 @@ import pytest
 from httpx import AsyncClient
 
 import models
+import app.drift
 import app.fast_api
+import app.peer_routes
 import utils.os_func
 import utils.config
+import utils.revision
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -28,9 +31,13 @@ def disable_os_level_commands(monkeypatch):
     def disable_configure_route(**kwargs):
         pass
 
+    def disable_get_interface_routes(**kwargs):
+        return None
+
     with monkeypatch.context() as m:
         m.setattr(utils.os_func, "run_subprocess", disabled_run_subprocess)
         m.setattr(utils.os_func, "configure_route", disable_configure_route)
+        m.setattr(utils.os_func, "get_interface_routes", disable_get_interface_routes)
         yield
 
 
@@ -113,6 +120,13 @@ async def clean_db():
     await models.Ipv6FilterRuleModel.all().delete()
     await models.Ipv4NatRuleModel.all().delete()
     await models.Ipv6NatRuleModel.all().delete()
+    await models.NetworkSetModel.all().delete()
     await models.PolicyRuleListModel.all().delete()
     await models.WgInterfaceModel.all().delete()
     await models.WgPeerModel.all().delete()
+    await models.ReconcileEventModel.all().delete()
+    await models.ConfigJobModel.all().delete()
+    # the bulk deletes don't trigger the model signals
+    app.peer_routes.PeerRouteIndex().invalidate()
+    app.drift.DriftDetector().invalidate()
+    await utils.revision.RevisionRegistry().bump_resources(*{model.resource_type for model in models.RESOURCE_MODELS})
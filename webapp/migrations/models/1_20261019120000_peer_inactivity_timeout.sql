@@ -0,0 +1,4 @@
+-- upgrade --
+ALTER TABLE "wg_interfaces" ADD "peer_inactivity_timeout" INT NOT NULL  DEFAULT 120 /* seconds without a handshake before a peer is considered inactive and its routes are removed */;
+-- downgrade --
+ALTER TABLE "wg_interfaces" DROP COLUMN "peer_inactivity_timeout";
@@ -0,0 +1,24 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "network_sets" (
+    "instance_id" CHAR(36) NOT NULL  PRIMARY KEY,
+    "name" VARCHAR(27) NOT NULL UNIQUE /* name of the network set (used as ipset name) */,
+    "family" VARCHAR(8) NOT NULL  DEFAULT 'inet' /* address family of the network set */,
+    "description" VARCHAR(2048)   DEFAULT ''
+) /* Named set of networks, rendered as ipset (hash:net) */;
+CREATE TABLE IF NOT EXISTS "network_set_entries" (
+    "instance_id" CHAR(36) NOT NULL  PRIMARY KEY,
+    "network" VARCHAR(64) NOT NULL  /* IPv4 or IPv6 network (must match the family of the network set) */,
+    "network_set_id" CHAR(36) NOT NULL REFERENCES "network_sets" ("instance_id") ON DELETE CASCADE,
+    CONSTRAINT "uid_network_set_network_7a0445" UNIQUE ("network_set_id", "network")
+) /* Network within a network set */;
+ALTER TABLE "ipv4_filter_rules" ADD "src_network_set_id" CHAR(36) REFERENCES "network_sets" ("instance_id") ON DELETE RESTRICT /* network set that is used instead of the src_network */;
+ALTER TABLE "ipv4_filter_rules" ADD "dst_network_set_id" CHAR(36) REFERENCES "network_sets" ("instance_id") ON DELETE RESTRICT /* network set that is used instead of the dst_network */;
+ALTER TABLE "ipv6_filter_rules" ADD "src_network_set_id" CHAR(36) REFERENCES "network_sets" ("instance_id") ON DELETE RESTRICT /* network set that is used instead of the src_network */;
+ALTER TABLE "ipv6_filter_rules" ADD "dst_network_set_id" CHAR(36) REFERENCES "network_sets" ("instance_id") ON DELETE RESTRICT /* network set that is used instead of the dst_network */;
+-- downgrade --
+ALTER TABLE "ipv4_filter_rules" DROP COLUMN "src_network_set_id";
+ALTER TABLE "ipv4_filter_rules" DROP COLUMN "dst_network_set_id";
+ALTER TABLE "ipv6_filter_rules" DROP COLUMN "src_network_set_id";
+ALTER TABLE "ipv6_filter_rules" DROP COLUMN "dst_network_set_id";
+DROP TABLE IF EXISTS "network_set_entries";
+DROP TABLE IF EXISTS "network_sets";
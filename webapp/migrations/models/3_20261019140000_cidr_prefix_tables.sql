@@ -0,0 +1,28 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "wg_interface_addresses" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "position" INT NOT NULL  /* position within the CIDR list */,
+    "cidr" VARCHAR(64) NOT NULL  /* value within the CIDR list */,
+    "family" INT NOT NULL  /* IP version (4 or 6) */,
+    "network" VARCHAR(32) NOT NULL  /* network address (zero-padded hex) */,
+    "last_address" VARCHAR(32) NOT NULL  /* last address of the network (zero-padded hex) */,
+    "prefixlen" INT NOT NULL  /* prefix length */,
+    "wg_interface_id" CHAR(36) NOT NULL REFERENCES "wg_interfaces" ("instance_id") ON DELETE CASCADE
+) /* CIDR address of an interface (parsed from the cidr_addresses field) */;
+CREATE INDEX IF NOT EXISTS "idx_wg_interfac_family_f40f0a" ON "wg_interface_addresses" ("family", "network");
+CREATE INDEX IF NOT EXISTS "idx_wg_interfac_wg_inte_a6f2e5" ON "wg_interface_addresses" ("wg_interface_id", "position");
+CREATE TABLE IF NOT EXISTS "wg_peer_routes" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "position" INT NOT NULL  /* position within the CIDR list */,
+    "cidr" VARCHAR(64) NOT NULL  /* value within the CIDR list */,
+    "family" INT NOT NULL  /* IP version (4 or 6) */,
+    "network" VARCHAR(32) NOT NULL  /* network address (zero-padded hex) */,
+    "last_address" VARCHAR(32) NOT NULL  /* last address of the network (zero-padded hex) */,
+    "prefixlen" INT NOT NULL  /* prefix length */,
+    "peer_id" CHAR(36) NOT NULL REFERENCES "wg_peers" ("instance_id") ON DELETE CASCADE
+) /* CIDR route of a peer (parsed from the cidr_routes field) */;
+CREATE INDEX IF NOT EXISTS "idx_wg_peer_rou_family_6589f9" ON "wg_peer_routes" ("family", "network");
+CREATE INDEX IF NOT EXISTS "idx_wg_peer_rou_peer_id_7fe4eb" ON "wg_peer_routes" ("peer_id", "position");
+-- downgrade --
+DROP TABLE IF EXISTS "wg_peer_routes";
+DROP TABLE IF EXISTS "wg_interface_addresses";
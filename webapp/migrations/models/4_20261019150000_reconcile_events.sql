@@ -0,0 +1,14 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "reconcile_events" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "kind" VARCHAR(16) NOT NULL  /* type of the change */,
+    "name" VARCHAR(64) NOT NULL  /* name of the interface or network set */,
+    "status" VARCHAR(8) NOT NULL  DEFAULT 'pending' /* state of the change */,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "processed_at" TIMESTAMP,
+    "duration" REAL   /* seconds to apply the change */,
+    "error" TEXT   /* error message if the change failed */
+) /* change of an interface, the peers of an interface or a network set that must be applied to the system */;
+CREATE INDEX IF NOT EXISTS "idx_reconcile_e_status_3436b3" ON "reconcile_events" ("status", "id");
+-- downgrade --
+DROP TABLE IF EXISTS "reconcile_events";
@@ -0,0 +1,16 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "config_jobs" (
+    "instance_id" CHAR(36) NOT NULL  PRIMARY KEY,
+    "kind" VARCHAR(16) NOT NULL  /* operation of the job */,
+    "intf_name" VARCHAR(64) NOT NULL  /* name of the interface (kept if the interface is removed) */,
+    "status" VARCHAR(8) NOT NULL  DEFAULT 'queued' /* state of the job */,
+    "steps" JSON NOT NULL  /* progress of the job */,
+    "error" TEXT   /* error message if the job failed */,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "started_at" TIMESTAMP,
+    "finished_at" TIMESTAMP,
+    "wg_interface_id" CHAR(36) REFERENCES "wg_interfaces" ("instance_id") ON DELETE SET NULL
+) /* configuration job, the steps contain the name, status, duration and error output per step */;
+CREATE INDEX IF NOT EXISTS "idx_config_jobs_status_23653f" ON "config_jobs" ("status", "created_at");
+-- downgrade --
+DROP TABLE IF EXISTS "config_jobs";
@@ -1,8 +1,18 @@
 """
 data models for the application
 """
+import utils.startup_patches
+
+# the model classes are created with the patches of the startup time
+utils.startup_patches.apply("tortoise")
+
 from models.wg_interface import WgInterfaceModel, WgInterfaceTableEnum
 from models.peer import WgPeerModel
 from models.rules import AbstractIpTableRuleModel, Ipv4FilterRuleModel, Ipv4NatRuleModel, \
         FilterProtocolEnum, IpTableActionEnum, IpTableNameEnum, Ipv6FilterRuleModel, Ipv6NatRuleModel, \
         PolicyRuleListModel
+from models.network_set import NetworkSetModel, NetworkSetEntryModel, NetworkSetFamilyEnum
+from models.route import WgPeerRouteModel, WgInterfaceAddressModel
+from models.reconcile import ReconcileEventModel, ReconcileEventKindEnum, ReconcileEventStatusEnum
+from models.job import ConfigJobModel, ConfigJobKindEnum, ConfigJobStatusEnum
+from models.resources import RESOURCE_MODELS
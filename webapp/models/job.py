@@ -0,0 +1,67 @@
+"""
+model classes for the configuration jobs (long running operations that are executed in the background)
+"""
+# pylint: disable=missing-class-docstring
+# pylint: disable=too-few-public-methods
+from enum import Enum
+
+import tortoise.fields
+import tortoise.models
+
+
+class ConfigJobKindEnum(str, Enum):
+    """Enum for the operation of a job
+    """
+    RECONFIGURE = "reconfigure"
+
+
+class ConfigJobStatusEnum(str, Enum):
+    """Enum for the state of a job or a step of a job
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ConfigJobModel(tortoise.models.Model):
+    """
+    configuration job, the steps contain the name, status, duration and error output per step
+    """
+    instance_id = tortoise.fields.UUIDField(pk=True)
+    kind: str = tortoise.fields.CharEnumField(
+        enum_type=ConfigJobKindEnum,
+        max_length=16,
+        description="operation of the job"
+    )
+    wg_interface = tortoise.fields.ForeignKeyField(
+        "models.WgInterfaceModel",
+        related_name="jobs",
+        null=True,
+        on_delete=tortoise.fields.SET_NULL
+    )
+    intf_name: str = tortoise.fields.CharField(
+        max_length=64,
+        description="name of the interface (kept if the interface is removed)"
+    )
+    status: str = tortoise.fields.CharEnumField(
+        enum_type=ConfigJobStatusEnum,
+        max_length=8,
+        default=ConfigJobStatusEnum.QUEUED,
+        description="state of the job"
+    )
+    steps = tortoise.fields.JSONField(default=list, description="progress of the job")
+    error = tortoise.fields.TextField(null=True, description="error message if the job failed")
+    created_at = tortoise.fields.DatetimeField(auto_now_add=True)
+    started_at = tortoise.fields.DatetimeField(null=True)
+    finished_at = tortoise.fields.DatetimeField(null=True)
+
+    def __str__(self):
+        return f"{self.kind.value} {self.intf_name} ({self.instance_id})"
+
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "jobs"
+
+    class Meta:
+        table = "config_jobs"
+        indexes = (("status", "created_at"),)
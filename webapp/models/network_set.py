@@ -0,0 +1,285 @@
+"""
+model classes for the named network sets that are used within the filter rules (rendered as ipset)
+"""
+# pylint: disable=missing-class-docstring
+# pylint: disable=too-few-public-methods
+import re
+import ipaddress
+from enum import Enum
+from typing import List, Optional, Type
+
+import tortoise.fields
+import tortoise.models
+import tortoise.signals
+import tortoise.transactions
+import tortoise.validators
+from tortoise import BaseDBAsyncClient
+from tortoise.exceptions import ValidationError
+
+import app.ipset_adapter
+import app.wg_config_adapter
+import models.reconcile
+import models.rules
+import models.wg_interface
+import utils.coordination
+import utils.iptables
+import utils.log
+import utils.revision
+import utils.tortoise.validators
+
+
+class NetworkSetFamilyEnum(str, Enum):
+    """Enum for the address family of a network set (ipset family)
+    """
+    INET = "inet"
+    INET6 = "inet6"
+
+
+class NetworkSetModel(tortoise.models.Model):
+    """
+    Named set of networks, rendered as ipset (hash:net)
+    """
+    instance_id = tortoise.fields.UUIDField(pk=True)
+    name: str = tortoise.fields.CharField(
+        max_length=27,
+        null=False,
+        unique=True,
+        validators=[
+            # the ipset name is limited to 31 characters, the remaining characters are used for the temporary set
+            tortoise.validators.RegexValidator(r"^[a-zA-Z0-9_\-]{1,27}$", re.I)
+        ],
+        description="name of the network set (used as ipset name)"
+    )
+    family: str = tortoise.fields.CharEnumField(
+        enum_type=NetworkSetFamilyEnum,
+        max_length=8,
+        default=NetworkSetFamilyEnum.INET,
+        description="address family of the network set"
+    )
+    description: str = tortoise.fields.CharField(
+        max_length=2048,
+        default="",
+        null=True
+    )
+    entries: tortoise.fields.ReverseRelation["NetworkSetEntryModel"]
+
+    # name of the set within the database before the instance is saved (set by the pre_save signal)
+    previous_name: Optional[str] = None
+
+    async def get_networks(self) -> List[str]:
+        """get the networks of the set
+
+        :return: list of networks
+        :rtype: List[str]
+        """
+        return await NetworkSetEntryModel.filter(network_set_id=self.instance_id).values_list("network", flat=True)
+
+    def normalize_network(self, network: str) -> str:
+        """verify that a network matches the address family of the set
+
+        :param network: IPv4 or IPv6 network
+        :type network: str
+        :raises ValidationError: if the network is invalid or doesn't match the family of the set
+        :return: normalized network (ipset stores the network address)
+        :rtype: str
+        """
+        utils.tortoise.validators.validate_ip_network(network)
+        result = ipaddress.ip_network(network)
+        if (result.version == 6) != (self.family == NetworkSetFamilyEnum.INET6):
+            raise ValidationError(f"'{network}' doesn't match the family of network set '{self.name}'")
+
+        return str(result)
+
+    async def replace_networks(self, networks: List[str]) -> List[str]:
+        """replace all entries of the set and apply the set once (instead of once per entry)
+
+        :param networks: list of networks
+        :type networks: List[str]
+        :raises ValidationError: if a network is invalid or doesn't match the family of the set
+        :return: normalized networks of the set
+        :rtype: List[str]
+        """
+        networks = list(dict.fromkeys(self.normalize_network(network) for network in networks))
+        async with tortoise.transactions.in_transaction():
+            # bulk operations don't trigger the signals of the entries
+            await NetworkSetEntryModel.filter(network_set_id=self.instance_id).delete()
+            await NetworkSetEntryModel.bulk_create([
+                NetworkSetEntryModel(network_set_id=self.instance_id, network=network) for network in networks
+            ])
+
+        await utils.revision.RevisionRegistry().bump_resources(NetworkSetEntryModel.resource_type)
+        await self.apply()
+        return networks
+
+    async def apply(self) -> bool:
+        """apply the network set with all entries to the system (by the leader if multiple workers are used)
+
+        :return: True if successful, otherwise False
+        :rtype: bool
+        """
+        if not utils.coordination.LeaderElection().is_leader:
+            await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.NETWORK_SET, self.name)
+            return True
+
+        return await app.ipset_adapter.IpsetAdapter().apply_set(
+            name=self.name,
+            family=utils.iptables.raw_value(self.family),
+            networks=await self.get_networks()
+        )
+
+    async def rename(self, previous_name: str) -> bool:
+        """rename the ipset of the network set, the active iptables rules reference the set by its index and keep
+        matching the renamed set. The configuration files of the interfaces that use the set within their policy are
+        rendered again, otherwise the PostDown commands would refer to the previous name.
+
+        :param previous_name: previous name of the network set
+        :type previous_name: str
+        :return: True if successful, otherwise False
+        :rtype: bool
+        """
+        policy_ids = await models.rules.PolicyRuleListModel.invalidate_network_set(self.instance_id)
+        if not utils.coordination.LeaderElection().is_leader:
+            await models.reconcile.ReconcileEventModel.enqueue(
+                models.reconcile.ReconcileEventKindEnum.NETWORK_SET_RENAME, f"{previous_name} {self.name}"
+            )
+            return True
+
+        success = await app.ipset_adapter.IpsetAdapter().rename_set(previous_name, self.name)
+        if policy_ids:
+            for wgintf in await models.wg_interface.WgInterfaceModel.filter(policy_rule_list_id__in=policy_ids):
+                await app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf).rebuild_policy_config()
+
+        return success
+
+    def __str__(self):
+        return self.name
+
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "network_sets"
+
+    class Meta:
+        table = "network_sets"
+
+    class PydanticMeta:
+        exclude = (
+            "entries",
+        )
+
+
+class NetworkSetEntryModel(tortoise.models.Model):
+    """
+    Network within a network set
+    """
+    instance_id = tortoise.fields.UUIDField(pk=True)
+    network_set: NetworkSetModel = tortoise.fields.ForeignKeyField(
+        "models.NetworkSetModel",
+        related_name="entries",
+        on_delete=tortoise.fields.CASCADE
+    )
+    network: str = tortoise.fields.CharField(
+        max_length=64,
+        null=False,
+        validators=[utils.tortoise.validators.validate_ip_network],
+        description="IPv4 or IPv6 network (must match the family of the network set)"
+    )
+
+    def __str__(self):
+        return self.network
+
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "network_sets"
+
+    class Meta:
+        table = "network_set_entries"
+        unique_together = (("network_set", "network"),)
+
+    class PydanticMeta:
+        exclude = (
+            "network_set",
+        )
+
+
+@tortoise.signals.pre_save(NetworkSetEntryModel)
+async def networksetentrymodel_pre_save(
+    sender: Type[NetworkSetEntryModel],
+    instance: NetworkSetEntryModel,
+    using_db: Optional[BaseDBAsyncClient],
+    update_fields: List[str],
+) -> None:
+    """verify that the network matches the address family of the network set"""
+    await instance.fetch_related("network_set")
+    instance.network = instance.network_set.normalize_network(instance.network)
+
+
+@tortoise.signals.post_save(NetworkSetEntryModel)
+async def networksetentrymodel_post_save(
+    sender: Type[NetworkSetEntryModel],
+    instance: NetworkSetEntryModel,
+    created: bool,
+    using_db: Optional[BaseDBAsyncClient],
+    update_fields: List[str],
+) -> None:
+    """update the ipset of the network set"""
+    await instance.fetch_related("network_set")
+    await instance.network_set.apply()
+
+
+@tortoise.signals.post_delete(NetworkSetEntryModel)
+async def networksetentrymodel_post_delete(
+    sender: Type[NetworkSetEntryModel],
+    instance: NetworkSetEntryModel,
+    using_db: Optional[BaseDBAsyncClient]
+) -> None:
+    """update the ipset of the network set"""
+    network_set = await NetworkSetModel.get_or_none(instance_id=instance.network_set_id)
+    if network_set is not None:
+        await network_set.apply()
+
+
+@tortoise.signals.pre_save(NetworkSetModel)
+async def networksetmodel_pre_save(
+    sender: Type[NetworkSetModel],
+    instance: NetworkSetModel,
+    using_db: Optional[BaseDBAsyncClient],
+    update_fields: List[str],
+) -> None:
+    """the family of an existing network set can't be changed (the entries would be invalid)"""
+    result = await NetworkSetModel.filter(instance_id=instance.instance_id).values_list("name", "family")
+    instance.previous_name = result[0][0] if result else None
+    if result and result[0][1] != instance.family:
+        raise ValidationError(f"the family of network set '{result[0][0]}' can't be changed")
+
+
+@tortoise.signals.post_save(NetworkSetModel)
+async def networksetmodel_post_save(
+    sender: Type[NetworkSetModel],
+    instance: NetworkSetModel,
+    created: bool,
+    using_db: Optional[BaseDBAsyncClient],
+    update_fields: List[str],
+) -> None:
+    """create or update the ipset of the network set"""
+    logger = utils.log.LoggingUtil().logger
+    logger.info(f"update network set '{instance.name}'")
+    if instance.previous_name is not None and instance.previous_name != instance.name:
+        # the previous set is used by the active rules and can't be destroyed, it's renamed before the entries are
+        # applied
+        await instance.rename(instance.previous_name)
+
+    await instance.apply()
+
+
+@tortoise.signals.post_delete(NetworkSetModel)
+async def networksetmodel_post_delete(
+    sender: Type[NetworkSetModel],
+    instance: NetworkSetModel,
+    using_db: Optional[BaseDBAsyncClient]
+) -> None:
+    """remove the ipset of the network set"""
+    logger = utils.log.LoggingUtil().logger
+    logger.info(f"remove network set '{instance.name}'")
+    if not utils.coordination.LeaderElection().is_leader:
+        await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.NETWORK_SET, instance.name)
+        return
+
+    await app.ipset_adapter.IpsetAdapter().destroy_set(instance.name)
@@ -6,9 +6,16 @@ import tortoise.fields
 import tortoise.validators
 import tortoise.models
 from tortoise import BaseDBAsyncClient
+from tortoise.exceptions import ValidationError
 
+import app.peer_routes
 import app.wg_config_adapter
+import models.reconcile
+import models.route
+import utils.config
+import utils.coordination
 import utils.regex
+import utils.revision
 import utils.wireguard
 import utils.log
 import utils.tortoise.validators
@@ -69,7 +76,7 @@ class WgPeerModel(tortoise.models.Model):
         max_length=2048,
         null=False,
         validators=[
-            utils.tortoise.validators.RegexOrNoneValidator(utils.regex.IPV4_OR_IPV6_INTERFACE_CSV_LIST_REGEX, re.I)
+            utils.tortoise.validators.IpInterfaceListOrNoneValidator()
         ],
         description="comma separated list of IPv4/IPv6 for the client"
     )
@@ -81,7 +88,7 @@ class WgPeerModel(tortoise.models.Model):
         :return: [description]
         :rtype: List
         """
-        return [x.strip() for x in self.cidr_routes.split(",") if x != ""]
+        return models.route.split_cidr_list(self.cidr_routes)
 
     @cidr_routes_list.setter
     def cidr_routes_list(self, value: list) -> None:
@@ -92,14 +99,35 @@ class WgPeerModel(tortoise.models.Model):
         """
         self.cidr_routes = ", ".join(value)
 
+    @classmethod
+    async def get_route_index(cls, wg_interface_id: str) -> app.peer_routes.InterfaceRouteIndex:
+        """get the index of the peer routes of an interface (loaded from the database on the first use)
+
+        :param wg_interface_id: instance ID of the interface
+        :type wg_interface_id: str
+        :return: index of the peer routes
+        :rtype: app.peer_routes.InterfaceRouteIndex
+        """
+        route_index = app.peer_routes.PeerRouteIndex()
+        route_index.sync_revision(utils.revision.RevisionRegistry().get(route_index.revision_key))
+        result = route_index.get(wg_interface_id)
+        if result is None:
+            routes = await models.route.WgPeerRouteModel.filter(peer__wg_interface_id=wg_interface_id).values_list("peer_id", "cidr")
+            result = route_index.load(wg_interface_id, routes)
+
+        return result
+
     async def is_active(self) -> bool:
         """identify if the peer is active
 
         :return: True if the peer is considered active, otherwise False
         :rtype: bool
         """
+        # imported here to avoid a circular import (the interface model depends on the peer model)
+        from models.wg_interface import load_inactivity_timeouts  # pylint: disable=import-outside-toplevel
         wg_si_adapter = utils.wireguard.WgSystemInfoAdapter()
         await self.fetch_related("wg_interface")
+        await load_inactivity_timeouts()
         result = await wg_si_adapter.is_peer_active(
             wg_interface_name=self.wg_interface.intf_name,
             public_key=self.public_key
@@ -112,10 +140,37 @@ class WgPeerModel(tortoise.models.Model):
 
         return self.public_key
 
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "peers"
+
     class Meta:
         table = "wg_peers"
 
 
+@tortoise.signals.pre_save(WgPeerModel)
+async def wgpeermodel_verify_routes(
+    sender: "Type[WgPeerModel]",
+    instance: WgPeerModel,
+    using_db: "Optional[BaseDBAsyncClient]",
+    update_fields: List[str],
+) -> None:
+    """detect routes that overlap with the routes of other peers of the interface"""
+    route_index = await WgPeerModel.get_route_index(instance.wg_interface_id)
+    overlaps = route_index.overlaps(instance.cidr_routes_list, peer_id=str(instance.instance_id))
+    if not overlaps:
+        return
+
+    logger = utils.log.LoggingUtil().logger
+    duplicates = [overlap for overlap in overlaps if overlap.is_duplicate]
+    if duplicates and app.peer_routes.PeerRouteIndex().reject_duplicates:
+        raise ValidationError(
+            "cidr_routes: " + ", ".join(f"{overlap.network} is already used by peer {overlap.peer_id}" for overlap in duplicates)
+        )
+
+    for overlap in overlaps:
+        logger.warning(f"route {overlap.network} of peer {instance} overlaps with {overlap.peer_network} of peer {overlap.peer_id}")
+
+
 @tortoise.signals.post_save(WgPeerModel)
 async def wgpeermodel_pre_save(
     sender: "Type[WgPeerModel]",
@@ -126,7 +181,16 @@ async def wgpeermodel_pre_save(
 ) -> None:
     """trigger sync with wgconfig"""
     logger = utils.log.LoggingUtil().logger
+    await models.route.WgPeerRouteModel.replace_prefixes(instance.instance_id, instance.cidr_routes_list)
+    route_index = app.peer_routes.PeerRouteIndex()
+    route_index.begin_change(await utils.revision.RevisionRegistry().bump(route_index.revision_key))
+    route_index.update_peer(instance.wg_interface_id, str(instance.instance_id), instance.cidr_routes_list)
     await instance.fetch_related("wg_interface")
+
+    if not utils.coordination.LeaderElection().is_leader:
+        await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.PEERS, instance.wg_interface.intf_name)
+        return
+
     logger.info(f"update peer configuration for {instance.wg_interface.intf_name}")
 
     # update wireguard configuration
@@ -135,7 +199,10 @@ async def wgpeermodel_pre_save(
     await adapter.rebuild_peer_config()
     await adapter.apply_config()
 
-    # routes are updated based on the model signals when adding and deleting peers
+    # routes are updated by the peer tracking
+    # imported here to avoid a circular import (the peer tracking depends on the models)
+    from app.peer_tracking import PeerTracker  # pylint: disable=import-outside-toplevel
+    PeerTracker().invalidate(instance.wg_interface.intf_name)
 
 
 @tortoise.signals.post_delete(WgPeerModel)
@@ -146,7 +213,15 @@ async def wgpeermodel_pre_delete(
 ) -> None:
     """trigger sync with wgconfig"""
     logger = utils.log.LoggingUtil().logger
+    route_index = app.peer_routes.PeerRouteIndex()
+    route_index.begin_change(await utils.revision.RevisionRegistry().bump(route_index.revision_key))
+    route_index.remove_peer(str(instance.instance_id))
     await instance.fetch_related("wg_interface")
+
+    if not utils.coordination.LeaderElection().is_leader:
+        await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.PEERS, instance.wg_interface.intf_name)
+        return
+
     logger.info(f"update peer configuration for {instance.wg_interface.intf_name}")
 
     # update wireguard configuration
@@ -155,7 +230,12 @@ async def wgpeermodel_pre_delete(
     await adapter.rebuild_peer_config()
     await adapter.apply_config()
 
-    # remove routes for peer
-    ip_adapter = utils.wireguard.IpRouteAdapter()
-    for ip_net in instance.cidr_routes_list:
-        ip_adapter.remove_ip_route(intf_name=instance.wg_interface.intf_name, ip_network=ip_net)
+    # remove routes for peer (the aggregated routes are updated by the peer tracking)
+    if not utils.config.ConfigUtil().route_aggregation:
+        ip_adapter = utils.wireguard.IpRouteAdapter()
+        for ip_net in instance.cidr_routes_list:
+            ip_adapter.remove_ip_route(intf_name=instance.wg_interface.intf_name, ip_network=ip_net)
+
+    # imported here to avoid a circular import (the peer tracking depends on the models)
+    from app.peer_tracking import PeerTracker  # pylint: disable=import-outside-toplevel
+    PeerTracker().invalidate(instance.wg_interface.intf_name)
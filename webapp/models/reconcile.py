@@ -0,0 +1,73 @@
+"""
+model classes for the changes that are applied to the system by the leader or the reconciler process
+"""
+# pylint: disable=missing-class-docstring
+# pylint: disable=too-few-public-methods
+from enum import Enum
+
+import tortoise.fields
+import tortoise.models
+
+
+class ReconcileEventKindEnum(str, Enum):
+    """Enum for the type of a change
+    """
+    INTERFACE = "interface"
+    PEERS = "peers"
+    NETWORK_SET = "network_set"
+    # the name of the event contains the previous and the new name of the network set
+    NETWORK_SET_RENAME = "set_rename"
+
+
+class ReconcileEventStatusEnum(str, Enum):
+    """Enum for the state of a change
+    """
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ReconcileEventModel(tortoise.models.Model):
+    """
+    change of an interface, the peers of an interface or a network set that must be applied to the system
+    """
+    id = tortoise.fields.IntField(pk=True)
+    kind: str = tortoise.fields.CharEnumField(
+        enum_type=ReconcileEventKindEnum,
+        max_length=16,
+        description="type of the change"
+    )
+    name: str = tortoise.fields.CharField(
+        max_length=64,
+        description="name of the interface or network set"
+    )
+    status: str = tortoise.fields.CharEnumField(
+        enum_type=ReconcileEventStatusEnum,
+        max_length=8,
+        default=ReconcileEventStatusEnum.PENDING,
+        description="state of the change"
+    )
+    created_at = tortoise.fields.DatetimeField(auto_now_add=True)
+    processed_at = tortoise.fields.DatetimeField(null=True)
+    duration = tortoise.fields.FloatField(null=True, description="seconds to apply the change")
+    error = tortoise.fields.TextField(null=True, description="error message if the change failed")
+
+    @classmethod
+    async def enqueue(cls, kind: ReconcileEventKindEnum, name: str) -> "ReconcileEventModel":
+        """record a change that must be applied to the system
+
+        :param kind: type of the change
+        :type kind: ReconcileEventKindEnum
+        :param name: name of the interface or network set
+        :type name: str
+        :return: created event
+        :rtype: ReconcileEventModel
+        """
+        return await cls.create(kind=kind, name=name)
+
+    def __str__(self):
+        return f"{self.kind.value} '{self.name}'"
+
+    class Meta:
+        table = "reconcile_events"
+        indexes = (("status", "id"),)
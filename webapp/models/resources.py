@@ -0,0 +1,86 @@
+"""
+revisions of the resource types of the API (used for the ETags of the responses, see `routers.conditional`)
+
+Every model that is returned by the API declares its resource type (`resource_type`), the revision of the resource type
+is bumped if an instance is saved or deleted. Queryset updates and bulk operations don't trigger the signals, the
+revision is bumped explicitly after these operations (`utils.revision.RevisionRegistry().bump_resources`).
+"""
+from typing import List, Optional, Set, Type
+
+import tortoise.models
+import tortoise.signals
+from tortoise import BaseDBAsyncClient
+
+import utils.revision
+from models.wg_interface import WgInterfaceModel
+from models.peer import WgPeerModel
+from models.rules import PolicyRuleListModel, Ipv4FilterRuleModel, Ipv6FilterRuleModel, Ipv4NatRuleModel, Ipv6NatRuleModel
+from models.network_set import NetworkSetModel, NetworkSetEntryModel
+from models.route import WgPeerRouteModel, WgInterfaceAddressModel
+from models.job import ConfigJobModel
+
+
+RESOURCE_MODELS = (
+    WgInterfaceModel,
+    WgInterfaceAddressModel,
+    WgPeerModel,
+    WgPeerRouteModel,
+    PolicyRuleListModel,
+    Ipv4FilterRuleModel,
+    Ipv6FilterRuleModel,
+    Ipv4NatRuleModel,
+    Ipv6NatRuleModel,
+    NetworkSetModel,
+    NetworkSetEntryModel,
+    ConfigJobModel,
+)
+
+
+def deleted_resource_types(model: Type[tortoise.models.Model]) -> Set[str]:
+    """resource types that change if an instance of the model is deleted, the related rows are deleted (or set to null)
+    by the database without signals
+
+    :param model: model class
+    :type model: Type[tortoise.models.Model]
+    :return: names of the resource types
+    :rtype: Set[str]
+    """
+    result = set()
+    pending = [model]
+    visited = set()
+    while pending:
+        current = pending.pop()
+        if current in visited:
+            continue
+
+        visited.add(current)
+        if getattr(current, "resource_type", None):
+            result.add(current.resource_type)
+
+        meta = current._meta  # pylint: disable=protected-access
+        for name in meta.backward_fk_fields | meta.backward_o2o_fields:
+            pending.append(meta.fields_map[name].related_model)
+
+    return result
+
+
+@tortoise.signals.post_save(*RESOURCE_MODELS)
+async def resource_post_save(
+    sender: Type[tortoise.models.Model],
+    instance: tortoise.models.Model,
+    created: bool,
+    using_db: Optional[BaseDBAsyncClient],
+    update_fields: List[str],
+) -> None:
+    """bump the revision of the resource type"""
+    await utils.revision.RevisionRegistry().bump_resources(sender.resource_type)
+
+
+@tortoise.signals.post_delete(*RESOURCE_MODELS)
+async def resource_post_delete(
+    sender: Type[tortoise.models.Model],
+    instance: tortoise.models.Model,
+    using_db: Optional[BaseDBAsyncClient]
+) -> None:
+    """bump the revision of the resource type and of the related rows that are removed by the database"""
+    await utils.revision.RevisionRegistry().bump_resources(*sorted(deleted_resource_types(sender)))
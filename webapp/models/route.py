@@ -0,0 +1,155 @@
+"""
+model classes for the parsed prefixes of the CIDR lists of the peers (cidr_routes) and interfaces (cidr_addresses)
+
+The comma separated fields remain the source of the API, the prefix tables are updated if the field changes. The
+addresses are stored as zero-padded hex strings (an IPv6 address doesn't fit into an SQLite integer), the string order
+is the numeric order of the addresses within an address family.
+"""
+# pylint: disable=missing-class-docstring
+# pylint: disable=too-few-public-methods
+import ipaddress
+from typing import Dict, Iterable, List, Type, Union
+
+import tortoise.fields
+import tortoise.models
+import tortoise.transactions
+
+import utils.revision
+
+
+def to_hex(address: int) -> str:
+    """convert an address to the representation within the prefix tables"""
+    return f"{address:032x}"
+
+
+def split_cidr_list(value: str) -> List[str]:
+    """split a comma separated CIDR list"""
+    return [x.strip() for x in value.split(",") if x.strip() != ""]
+
+
+def parse_cidr_list(cidr_list: Iterable[str]) -> List[Dict[str, Union[int, str]]]:
+    """parse CIDR values (e.g. `cidr_routes_list`) to the fields of the prefix tables
+
+    :param cidr_list: list of IPv4/IPv6 interfaces or networks
+    :type cidr_list: Iterable[str]
+    :return: fields of the prefix table per value
+    :rtype: List[Dict[str, Union[int, str]]]
+    """
+    result = list()
+    for position, cidr in enumerate(cidr_list):
+        network = ipaddress.ip_network(cidr, strict=False)
+        result.append(dict(
+            position=position,
+            cidr=cidr,
+            family=network.version,
+            network=to_hex(int(network.network_address)),
+            last_address=to_hex(int(network.broadcast_address)),
+            prefixlen=network.prefixlen
+        ))
+
+    return result
+
+
+class AbstractCidrPrefixModel(tortoise.models.Model):
+    """
+    parsed prefix of a comma separated CIDR list
+    """
+    id = tortoise.fields.IntField(pk=True)
+    position = tortoise.fields.IntField(description="position within the CIDR list")
+    cidr = tortoise.fields.CharField(max_length=64, description="value within the CIDR list")
+    family = tortoise.fields.IntField(description="IP version (4 or 6)")
+    network = tortoise.fields.CharField(max_length=32, description="network address (zero-padded hex)")
+    last_address = tortoise.fields.CharField(max_length=32, description="last address of the network (zero-padded hex)")
+    prefixlen = tortoise.fields.IntField(description="prefix length")
+
+    # name of the foreign key to the owner of the CIDR list
+    owner_field = None
+
+    # resource type of the API responses (see `models.resources`)
+    resource_type = None
+
+    @classmethod
+    async def replace_prefixes(cls, owner_id: str, cidr_list: List[str]) -> bool:
+        """update the prefixes of an owner (skipped if unchanged)
+
+        :param owner_id: instance ID of the peer or interface
+        :type owner_id: str
+        :param cidr_list: list of IPv4/IPv6 interfaces or networks
+        :type cidr_list: List[str]
+        :return: True if the prefixes are changed
+        :rtype: bool
+        """
+        filter_kwargs = {f"{cls.owner_field}_id": owner_id}
+        current = await cls.filter(**filter_kwargs).order_by("position").values_list("cidr", flat=True)
+        if list(current) == list(cidr_list):
+            return False
+
+        async with tortoise.transactions.in_transaction():
+            await cls.filter(**filter_kwargs).delete()
+            await cls.bulk_create([cls(**filter_kwargs, **fields) for fields in parse_cidr_list(cidr_list)])
+
+        await utils.revision.RevisionRegistry().bump_resources(cls.resource_type)
+        return True
+
+    def __str__(self):
+        return self.cidr
+
+    class Meta:
+        abstract = True
+
+
+class WgPeerRouteModel(AbstractCidrPrefixModel):
+    """
+    CIDR route of a peer (parsed from the cidr_routes field)
+    """
+    peer = tortoise.fields.ForeignKeyField(
+        "models.WgPeerModel",
+        related_name="routes",
+        on_delete=tortoise.fields.CASCADE
+    )
+
+    owner_field = "peer"
+    resource_type = "peers"
+
+    class Meta:
+        table = "wg_peer_routes"
+        indexes = (("family", "network"), ("peer_id", "position"))
+
+
+class WgInterfaceAddressModel(AbstractCidrPrefixModel):
+    """
+    CIDR address of an interface (parsed from the cidr_addresses field)
+    """
+    wg_interface = tortoise.fields.ForeignKeyField(
+        "models.WgInterfaceModel",
+        related_name="addresses",
+        on_delete=tortoise.fields.CASCADE
+    )
+
+    owner_field = "wg_interface"
+    resource_type = "interfaces"
+
+    class Meta:
+        table = "wg_interface_addresses"
+        indexes = (("family", "network"), ("wg_interface_id", "position"))
+
+
+async def sync_prefix_tables() -> None:
+    """update the prefix tables of all peers and interfaces (e.g. after an upgrade of the database)"""
+    # imported here to avoid a circular import (the peer and interface models import this module)
+    from models.peer import WgPeerModel  # pylint: disable=import-outside-toplevel
+    from models.wg_interface import WgInterfaceModel  # pylint: disable=import-outside-toplevel
+
+    model: Type[AbstractCidrPrefixModel]
+    for model, owner_model, field in (
+        (WgPeerRouteModel, WgPeerModel, "cidr_routes"),
+        (WgInterfaceAddressModel, WgInterfaceModel, "cidr_addresses"),
+    ):
+        current = dict()
+        for owner_id, cidr in await model.all().order_by("position").values_list(f"{model.owner_field}_id", "cidr"):
+            current.setdefault(str(owner_id), []).append(cidr)
+
+        for owner_id, value in await owner_model.all().values_list("instance_id", field):
+            cidr_list = split_cidr_list(value)
+            if current.get(str(owner_id), []) != cidr_list:
+                await model.replace_prefixes(owner_id, cidr_list)
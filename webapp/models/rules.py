@@ -6,16 +6,24 @@ model classes, enums and exceptions for the rules and policy list of the applica
 from enum import Enum
 import logging
 from abc import abstractmethod
-from typing import List
+from typing import ClassVar, Dict, List, NamedTuple, Optional, Tuple, Type
 from uuid import uuid4
 
+import tortoise.exceptions
+import tortoise.expressions
 import tortoise.query_utils
 import tortoise.fields
 import tortoise.models
+import tortoise.signals
 import tortoise.validators
+from tortoise import BaseDBAsyncClient
 
+import utils.config
+import utils.iptables
+import utils.policy_optimizer
+import utils.policy_simulator
+import utils.revision
 import utils.tortoise.validators
-from utils.log import LoggingUtil
 
 
 class FilterProtocolEnum(str, Enum):
@@ -33,6 +41,16 @@ class IpTableNameEnum(str, Enum):
     FORWARD = "FORWARD"
 
 
+class CompiledPolicy(NamedTuple):
+    """
+    iptables commands of a policy to add and delete the rules
+    """
+    ipv4_add: List[str]
+    ipv4_delete: List[str]
+    ipv6_add: List[str]
+    ipv6_delete: List[str]
+
+
 class PolicyRuleListModel(tortoise.models.Model):
     """
     Policy Rule List
@@ -46,6 +64,150 @@ class PolicyRuleListModel(tortoise.models.Model):
     ipv6_filter_rules: tortoise.fields.ReverseRelation["Ipv6FilterRuleModel"]
     ipv4_nat_rules: tortoise.fields.ReverseRelation["Ipv4NatRuleModel"]
     ipv6_nat_rules: tortoise.fields.ReverseRelation["Ipv6NatRuleModel"]
+    # compiled policies per policy and interface name, stored with the revision of the policy
+    _compiled_policies: ClassVar[Dict[Tuple[str, str], Tuple[int, CompiledPolicy]]] = dict()
+
+    @staticmethod
+    def revision_key(instance_id) -> str:
+        """key of the policy within the revision registry
+
+        :param instance_id: instance ID of the policy
+        :return: revision key
+        :rtype: str
+        """
+        return f"policy:{instance_id}"
+
+    @classmethod
+    async def invalidate_compiled_policy(cls, instance_id) -> None:
+        """mark the compiled policy as outdated (called by the rule signals)
+
+        :param instance_id: instance ID of the policy
+        """
+        if instance_id is not None:
+            await utils.revision.RevisionRegistry().bump(cls.revision_key(instance_id))
+
+    @classmethod
+    async def invalidate_network_set(cls, network_set_id) -> List:
+        """mark the compiled policies that use a network set as outdated (e.g. if the network set is renamed)
+
+        :param network_set_id: instance ID of the network set
+        :return: instance IDs of the policies that use the network set
+        :rtype: List
+        """
+        result = []
+        for model in (Ipv4FilterRuleModel, Ipv6FilterRuleModel):
+            policy_ids = await model.filter(
+                tortoise.expressions.Q(src_network_set_id=network_set_id) | tortoise.expressions.Q(dst_network_set_id=network_set_id)
+            ).distinct().values_list("policy_rule_list_id", flat=True)
+            for policy_id in policy_ids:
+                await cls.invalidate_compiled_policy(policy_id)
+                if policy_id not in result:
+                    result.append(policy_id)
+
+        return result
+
+    async def compile(self, intf_name: str="%i") -> CompiledPolicy:
+        """get the iptables commands to add and delete the rules of the policy, the result is cached until a rule
+        of the policy is changed
+
+        :param intf_name: name of the interface that should be used for the rule which represents the interface in the wireguard configuration, defaults to "%i"
+        :type intf_name: str, optional
+        :return: compiled policy
+        :rtype: CompiledPolicy
+        """
+        cache_key = (str(self.instance_id), intf_name)
+        revision = utils.revision.RevisionRegistry().get(self.revision_key(self.instance_id))
+        cached = self._compiled_policies.get(cache_key)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+
+        # the rules are fetched as columns and compiled in one pass without creating the model instances
+        ipv4_filter_rows = await _filter_rule_rows(Ipv4FilterRuleModel, self.instance_id)
+        ipv6_filter_rows = await _filter_rule_rows(Ipv6FilterRuleModel, self.instance_id)
+        if utils.config.ConfigUtil().policy_optimizer:
+            ipv4_filter_rows = [
+                row for _, row in utils.policy_optimizer.optimize_filter_rules(ipv4_filter_rows, utils.iptables.IPV4_ANY_NETWORK)[0]
+            ]
+            ipv6_filter_rows = [
+                row for _, row in utils.policy_optimizer.optimize_filter_rules(ipv6_filter_rows, utils.iptables.IPV6_ANY_NETWORK)[0]
+            ]
+
+        ipv4_filter_columns = utils.iptables.to_columns(ipv4_filter_rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+        ipv6_filter_columns = utils.iptables.to_columns(ipv6_filter_rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+        ipv4_nat_interfaces = await Ipv4NatRuleModel.filter(policy_rule_list_id=self.instance_id).values_list("target_interface", flat=True)
+        ipv6_nat_interfaces = await Ipv6NatRuleModel.filter(policy_rule_list_id=self.instance_id).values_list("target_interface", flat=True)
+
+        compiled_rules = dict()
+        for drop_rule in (False, True):
+            compiled_rules[drop_rule] = (
+                [
+                    *utils.iptables.compile_filter_rules(*ipv4_filter_columns, base_command="iptables", intf_name=intf_name, drop_rule=drop_rule),
+                    *utils.iptables.compile_nat_rules(ipv4_nat_interfaces, base_command="iptables", drop_rule=drop_rule),
+                ],
+                [
+                    *utils.iptables.compile_filter_rules(*ipv6_filter_columns, base_command="ip6tables", intf_name=intf_name, drop_rule=drop_rule),
+                    *utils.iptables.compile_nat_rules(ipv6_nat_interfaces, base_command="ip6tables", drop_rule=drop_rule),
+                ]
+            )
+
+        compiled_policy = CompiledPolicy(
+            ipv4_add=compiled_rules[False][0],
+            ipv4_delete=compiled_rules[True][0],
+            ipv6_add=compiled_rules[False][1],
+            ipv6_delete=compiled_rules[True][1],
+        )
+        # a rule change during the compilation bumps the revision, the result is then recompiled on the next call
+        self._compiled_policies[cache_key] = (revision, compiled_policy)
+        return compiled_policy
+
+    async def optimization_report(self) -> Dict[str, List[dict]]:
+        """get the filter rules that are removed or merged by the policy optimizer
+
+        :return: list of optimizer actions per address family ("ipv4" and "ipv6")
+        :rtype: Dict[str, List[dict]]
+        """
+        result = dict()
+        for family, model, any_network in (
+            ("ipv4", Ipv4FilterRuleModel, utils.iptables.IPV4_ANY_NETWORK),
+            ("ipv6", Ipv6FilterRuleModel, utils.iptables.IPV6_ANY_NETWORK),
+        ):
+            rows = await _filter_rule_rows(model, self.instance_id, "instance_id")
+            _, actions = utils.policy_optimizer.optimize_filter_rules([row[:-1] for row in rows], any_network)
+            result[family] = [
+                {
+                    "action": action.action,
+                    "rule_id": str(rows[action.index][-1]),
+                    "by_rule_id": str(rows[action.by][-1]) if action.by is not None else None
+                }
+                for action in actions
+            ]
+
+        return result
+
+    async def build_simulator(self) -> utils.policy_simulator.PolicySimulator:
+        """create a simulator to evaluate packets against the filter rules of the policy
+
+        :return: policy simulator
+        :rtype: utils.policy_simulator.PolicySimulator
+        """
+        from models.network_set import NetworkSetEntryModel  # pylint: disable=import-outside-toplevel
+
+        ipv4_rows = await _filter_rule_rows(Ipv4FilterRuleModel, self.instance_id, "instance_id")
+        ipv6_rows = await _filter_rule_rows(Ipv6FilterRuleModel, self.instance_id, "instance_id")
+        set_columns = [index for index, column in enumerate(utils.iptables.FILTER_RULE_COLUMNS) if column.endswith("_network_set")]
+        set_names = {row[index] for row in (*ipv4_rows, *ipv6_rows) for index in set_columns if row[index] is not None}
+
+        network_sets = dict()
+        if set_names:
+            for name, network in await NetworkSetEntryModel.filter(network_set__name__in=set_names).values_list("network_set__name", "network"):
+                network_sets.setdefault(name, []).append(network)
+
+        return utils.policy_simulator.PolicySimulator(
+            ipv4_rows=[row[:-1] for row in ipv4_rows],
+            ipv6_rows=[row[:-1] for row in ipv6_rows],
+            network_sets=network_sets,
+            rule_ids={4: [row[-1] for row in ipv4_rows], 6: [row[-1] for row in ipv6_rows]}
+        )
 
     async def to_ipv4_iptables_list(self, intf_name: str="%i", drop_rule: bool=False) -> List[str]:
         """convert ipv4 elements from policy to list of string values containing the iptable commands
@@ -60,7 +222,8 @@ class PolicyRuleListModel(tortoise.models.Model):
         iptable_rules = list()
 
         await self.fetch_related(
-            "ipv4_filter_rules",
+            "ipv4_filter_rules__src_network_set",
+            "ipv4_filter_rules__dst_network_set",
             "ipv4_nat_rules",
         )
 
@@ -85,7 +248,8 @@ class PolicyRuleListModel(tortoise.models.Model):
         iptable_rules = list()
 
         await self.fetch_related(
-            "ipv6_filter_rules",
+            "ipv6_filter_rules__src_network_set",
+            "ipv6_filter_rules__dst_network_set",
             "ipv6_nat_rules",
         )
 
@@ -110,8 +274,10 @@ class PolicyRuleListModel(tortoise.models.Model):
         iptable_rules = list()
 
         await self.fetch_related(
-            "ipv4_filter_rules",
-            "ipv6_filter_rules",
+            "ipv4_filter_rules__src_network_set",
+            "ipv4_filter_rules__dst_network_set",
+            "ipv6_filter_rules__src_network_set",
+            "ipv6_filter_rules__dst_network_set",
             "ipv4_nat_rules",
             "ipv6_nat_rules"
         )
@@ -130,6 +296,9 @@ class PolicyRuleListModel(tortoise.models.Model):
 
         return iptable_rules
 
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "rules"
+
     class Meta:
         table = "policy_rule_list"
 
@@ -139,7 +308,7 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
     base class for iptable rules
     """
     instance_id = tortoise.fields.UUIDField(pk=True, default=uuid4)
-    _logger: logging.Logger = LoggingUtil().logger
+    _logger: logging.Logger = logging.getLogger("applog")
 
     def _to_iptables_rule(
         self,
@@ -154,7 +323,9 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
         except_dst: bool=False,
         protocol: str=None,
         dst_port_number: int=None,
-        outgoing_intf_name: str=None
+        outgoing_intf_name: str=None,
+        src_network_set: str=None,
+        dst_network_set: str=None
     ) -> str:
         """utility to generate iptables commands
 
@@ -183,6 +354,10 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
         :type dst_port_number: int, optional
         :param outgoing_intf_name: outgoing interface name
         :type outgoing_intf_name: str, optional
+        :param src_network_set: name of the network set for the source (replaces src_net), defaults to None
+        :type src_network_set: str, optional
+        :param dst_network_set: name of the network set for the destination (replaces dst_net), defaults to None
+        :type dst_network_set: str, optional
         :return: iptables command string
         :rtype: str
         """
@@ -195,11 +370,17 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
             rule_intf_name = f" --in-interface {intf_name}"
 
         rule_src = ""
-        if src_network:
+        if src_network_set:
+            rule_src = f" --match set --match-set {src_network_set} src" if not except_src else f" --match set ! --match-set {src_network_set} src"
+
+        elif src_network:
             rule_src = f" --source {src_network}" if not except_src else f" ! --source {src_network}"
 
         rule_dst = ""
-        if dst_network:
+        if dst_network_set:
+            rule_dst = f" --match set --match-set {dst_network_set} dst" if not except_dst else f" --match set ! --match-set {dst_network_set} dst"
+
+        elif dst_network:
             rule_dst = f" --destination {dst_network}" if not except_dst else f" ! --destination {dst_network}"
 
         rule_protocol = "" if not protocol else f" --protocol {protocol}"
@@ -221,6 +402,30 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
         self._logger.debug(f"RULE {repr(self)} CONVERTED TO {result_rule}")
         return result_rule
 
+    def _network_set_name(self, field_name: str, strict: bool=True) -> Optional[str]:
+        """get the name of a related network set (the network set must be fetched before)
+
+        :param field_name: name of the foreign key field
+        :type field_name: str
+        :param strict: raise an error if the network set isn't fetched, otherwise the ID is used, defaults to True
+        :type strict: bool, optional
+        :raises ValueError: if the network set isn't fetched (only if strict)
+        :return: name of the network set or None if not set
+        :rtype: Optional[str]
+        """
+        network_set_id = getattr(self, f"{field_name}_id", None)
+        if network_set_id is None:
+            return None
+
+        network_set = getattr(self, field_name)
+        if not hasattr(network_set, "name"):
+            if not strict:
+                return str(network_set_id)
+
+            raise ValueError(f"network set '{field_name}' of {repr(self)} is not fetched")
+
+        return network_set.name
+
     @abstractmethod
     def to_iptables_rule(self, intf_name: str="%i", drop_rule: bool=False) -> str:
         """get the rule as iptables statement
@@ -242,6 +447,9 @@ class AbstractIpTableRuleModel(tortoise.models.Model):
     def __repr__(self):
         pass
 
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "rules"
+
     class Meta:
         abstract = True
 
@@ -256,6 +464,21 @@ class Ipv4FilterRuleModel(AbstractIpTableRuleModel):
         null=True,
         on_delete=tortoise.fields.CASCADE
     )
+    # network sets replace the src_network/dst_network (the network set must match the address family)
+    src_network_set = tortoise.fields.ForeignKeyField(
+        "models.NetworkSetModel",
+        related_name=False,
+        null=True,
+        on_delete=tortoise.fields.RESTRICT,
+        description="network set that is used instead of the src_network"
+    )
+    dst_network_set = tortoise.fields.ForeignKeyField(
+        "models.NetworkSetModel",
+        related_name=False,
+        null=True,
+        on_delete=tortoise.fields.RESTRICT,
+        description="network set that is used instead of the dst_network"
+    )
     src_network = tortoise.fields.CharField(
         max_length=64,
         null=False,
@@ -298,7 +521,7 @@ class Ipv4FilterRuleModel(AbstractIpTableRuleModel):
         ]
     )
 
-    def to_iptables_rule(self, intf_name: str="%i", drop_rule: bool=False) -> str:
+    def to_iptables_rule(self, intf_name: str="%i", drop_rule: bool=False, strict: bool=True) -> str:
         """get IPv4 rule as iptables statement
 
         :param intf_name: name of the interface that should be used for the rule which represents the interface in
@@ -306,6 +529,8 @@ class Ipv4FilterRuleModel(AbstractIpTableRuleModel):
         :type intf_name: str, optional
         :param drop_rule: if true, the resulting rule will be used to remove the rule from the chain, defaults to False
         :type drop_rule: bool, optional
+        :param strict: raise an error if a network set isn't fetched, otherwise the ID of the set is used, defaults to True
+        :type strict: bool, optional
         :return: iptables command based on the content of the instance
         :rtype: str
         """
@@ -321,11 +546,14 @@ class Ipv4FilterRuleModel(AbstractIpTableRuleModel):
             except_src=self.except_src,
             except_dst=self.except_dst,
             protocol=self.protocol,
-            dst_port_number=self.dst_port_number
+            dst_port_number=self.dst_port_number,
+            src_network_set=self._network_set_name("src_network_set", strict=strict),
+            dst_network_set=self._network_set_name("dst_network_set", strict=strict)
         )
 
     def __str__(self):
-        return self.to_iptables_rule()
+        # the network sets may not be fetched (e.g. if the rule is logged)
+        return self.to_iptables_rule(strict=False)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.pk} {self.src_network} {self.dst_network} {self.protocol} {self.dst_port_number} {self.action} {self.table}>"
@@ -339,7 +567,9 @@ class Ipv4FilterRuleModel(AbstractIpTableRuleModel):
             "policy_rule_list.ipv6_filter_rules",
             "policy_rule_list.ipv4_nat_rules",
             "policy_rule_list.ipv6_nat_rules",
-            "policy_rule_list.bound_interfaces"
+            "policy_rule_list.bound_interfaces",
+            "src_network_set",
+            "dst_network_set"
         )
 
 
@@ -353,6 +583,21 @@ class Ipv6FilterRuleModel(AbstractIpTableRuleModel):
         null=True,
         on_delete=tortoise.fields.CASCADE
     )
+    # network sets replace the src_network/dst_network (the network set must match the address family)
+    src_network_set = tortoise.fields.ForeignKeyField(
+        "models.NetworkSetModel",
+        related_name=False,
+        null=True,
+        on_delete=tortoise.fields.RESTRICT,
+        description="network set that is used instead of the src_network"
+    )
+    dst_network_set = tortoise.fields.ForeignKeyField(
+        "models.NetworkSetModel",
+        related_name=False,
+        null=True,
+        on_delete=tortoise.fields.RESTRICT,
+        description="network set that is used instead of the dst_network"
+    )
     src_network = tortoise.fields.CharField(
         max_length=64,
         null=False,
@@ -393,7 +638,7 @@ class Ipv6FilterRuleModel(AbstractIpTableRuleModel):
         ]
     )
 
-    def to_iptables_rule(self, intf_name: str="%i", drop_rule: bool=False) -> str:
+    def to_iptables_rule(self, intf_name: str="%i", drop_rule: bool=False, strict: bool=True) -> str:
         """get IPv6 rule as iptables statement
 
         :param intf_name: name of the interface that should be used for the rule which represents the interface in
@@ -401,6 +646,8 @@ class Ipv6FilterRuleModel(AbstractIpTableRuleModel):
         :type intf_name: str, optional
         :param drop_rule: if true, the resulting rule will be used to remove the rule from the chain, defaults to False
         :type drop_rule: bool, optional
+        :param strict: raise an error if a network set isn't fetched, otherwise the ID of the set is used, defaults to True
+        :type strict: bool, optional
         :return: iptables command based on the content of the instance
         :rtype: str
         """
@@ -416,11 +663,14 @@ class Ipv6FilterRuleModel(AbstractIpTableRuleModel):
             except_src=self.except_src,
             except_dst=self.except_dst,
             protocol=self.protocol,
-            dst_port_number=self.dst_port_number
+            dst_port_number=self.dst_port_number,
+            src_network_set=self._network_set_name("src_network_set", strict=strict),
+            dst_network_set=self._network_set_name("dst_network_set", strict=strict)
         )
 
     def __str__(self):
-        return self.to_iptables_rule()
+        # the network sets may not be fetched (e.g. if the rule is logged)
+        return self.to_iptables_rule(strict=False)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.pk} {self.src_network} {self.dst_network} {self.protocol} {self.dst_port_number} {self.action} {self.table}>"
@@ -434,7 +684,9 @@ class Ipv6FilterRuleModel(AbstractIpTableRuleModel):
             "policy_rule_list.ipv6_filter_rules",
             "policy_rule_list.ipv4_nat_rules",
             "policy_rule_list.ipv6_nat_rules",
-            "policy_rule_list.bound_interfaces"
+            "policy_rule_list.bound_interfaces",
+            "src_network_set",
+            "dst_network_set"
         )
 
 
@@ -550,3 +802,102 @@ class Ipv6NatRuleModel(AbstractIpTableRuleModel):
             "policy_rule_list.ipv6_nat_rules",
             "policy_rule_list.bound_interfaces"
         )
+
+
+async def _filter_rule_rows(model: Type[AbstractIpTableRuleModel], policy_rule_list_id, *extra_columns: str) -> List[Tuple]:
+    """get the filter rules of a policy as rows in the order of `utils.iptables.FILTER_RULE_COLUMNS` followed by the
+    extra columns (the network sets are resolved to their names)"""
+    from models.network_set import NetworkSetModel  # pylint: disable=import-outside-toplevel
+
+    # values_list is not used, it returns the columns in the wrong order if more than 10 columns are selected
+    columns = [f"{column}_id" if column.endswith("_network_set") else column for column in utils.iptables.FILTER_RULE_COLUMNS]
+    columns.extend(extra_columns)
+    rows = [
+        tuple(values[column] for column in columns)
+        for values in await model.filter(policy_rule_list_id=policy_rule_list_id).values(*columns)
+    ]
+
+    set_columns = [index for index, column in enumerate(utils.iptables.FILTER_RULE_COLUMNS) if column.endswith("_network_set")]
+    network_set_ids = {row[index] for row in rows for index in set_columns if row[index] is not None}
+    if not network_set_ids:
+        return rows
+
+    names = dict(await NetworkSetModel.filter(instance_id__in=network_set_ids).values_list("instance_id", "name"))
+    return [
+        tuple(names.get(value) if index in set_columns else value for index, value in enumerate(row))
+        for row in rows
+    ]
+
+
+async def _policy_rule_list_id_in_db(model: Type[AbstractIpTableRuleModel], instance_id, using_db: "Optional[BaseDBAsyncClient]"):
+    """get the policy of a rule as stored in the database (None if the rule is not stored)"""
+    result = await model.filter(instance_id=instance_id).using_db(using_db).values_list("policy_rule_list_id", flat=True)
+    return result[0] if result else None
+
+
+async def _validate_network_sets(model: Type[AbstractIpTableRuleModel], instance: AbstractIpTableRuleModel):
+    """verify that the network sets of a filter rule match the address family of the rule"""
+    from models.network_set import NetworkSetModel  # pylint: disable=import-outside-toplevel
+
+    expected_family = "inet" if model is Ipv4FilterRuleModel else "inet6"
+    for field_name in ("src_network_set", "dst_network_set"):
+        network_set_id = getattr(instance, f"{field_name}_id", None)
+        if network_set_id is None:
+            continue
+
+        families = await NetworkSetModel.filter(instance_id=network_set_id).values_list("family", flat=True)
+        if not families:
+            raise tortoise.exceptions.ValidationError(f"{field_name}: network set '{network_set_id}' not found")
+
+        if utils.iptables.raw_value(families[0]) != expected_family:
+            raise tortoise.exceptions.ValidationError(f"{field_name}: network set doesn't match the address family of the rule")
+
+
+@tortoise.signals.pre_save(Ipv4FilterRuleModel, Ipv6FilterRuleModel, Ipv4NatRuleModel, Ipv6NatRuleModel)
+async def iptablerulemodel_pre_save(
+    sender: "Type[AbstractIpTableRuleModel]",
+    instance: AbstractIpTableRuleModel,
+    using_db: "Optional[BaseDBAsyncClient]",
+    update_fields: List[str],
+) -> None:
+    """verify the network sets of a filter rule and invalidate the compiled policy if a rule is moved to another policy"""
+    if sender in (Ipv4FilterRuleModel, Ipv6FilterRuleModel):
+        await _validate_network_sets(sender, instance)
+
+    policy_rule_list_id = await _policy_rule_list_id_in_db(sender, instance.instance_id, using_db)
+    if policy_rule_list_id != instance.policy_rule_list_id:
+        await PolicyRuleListModel.invalidate_compiled_policy(policy_rule_list_id)
+
+
+@tortoise.signals.post_save(Ipv4FilterRuleModel, Ipv6FilterRuleModel, Ipv4NatRuleModel, Ipv6NatRuleModel)
+async def iptablerulemodel_post_save(
+    sender: "Type[AbstractIpTableRuleModel]",
+    instance: AbstractIpTableRuleModel,
+    created: bool,
+    using_db: "Optional[BaseDBAsyncClient]",
+    update_fields: List[str],
+) -> None:
+    """invalidate the compiled policy of the rule"""
+    await PolicyRuleListModel.invalidate_compiled_policy(instance.policy_rule_list_id)
+
+
+@tortoise.signals.post_delete(Ipv4FilterRuleModel, Ipv6FilterRuleModel, Ipv4NatRuleModel, Ipv6NatRuleModel)
+async def iptablerulemodel_post_delete(
+    sender: "Type[AbstractIpTableRuleModel]",
+    instance: AbstractIpTableRuleModel,
+    using_db: "Optional[BaseDBAsyncClient]"
+) -> None:
+    """invalidate the compiled policy of the rule"""
+    await PolicyRuleListModel.invalidate_compiled_policy(instance.policy_rule_list_id)
+
+
+@tortoise.signals.post_delete(PolicyRuleListModel)
+async def policyrulelistmodel_post_delete(
+    sender: "Type[PolicyRuleListModel]",
+    instance: PolicyRuleListModel,
+    using_db: "Optional[BaseDBAsyncClient]"
+) -> None:
+    """drop the compiled policy"""
+    await PolicyRuleListModel.invalidate_compiled_policy(instance.instance_id)
+    for cache_key in [key for key in PolicyRuleListModel._compiled_policies if key[0] == str(instance.instance_id)]:
+        del PolicyRuleListModel._compiled_policies[cache_key]
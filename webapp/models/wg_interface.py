@@ -14,12 +14,18 @@ import tortoise.validators
 import tortoise.signals
 import wgconfig.wgexec
 
+import app.peer_routes
 import app.wg_config_adapter
+import utils.coordination
 import utils.regex
+import utils.revision
 import utils.log
+import utils.wireguard
 import utils.tortoise.validators
 import models.rules
 import models.peer
+import models.reconcile
+import models.route
 
 
 class WgInterfaceTableEnum(str, Enum):
@@ -86,10 +92,18 @@ class WgInterfaceModel(tortoise.models.Model):
         max_length=2048,
         null=False,
         validators=[
-            utils.tortoise.validators.RegexOrNoneValidator(utils.regex.IPV4_OR_IPV6_INTERFACE_CSV_LIST_REGEX, re.I)
+            utils.tortoise.validators.IpInterfaceListOrNoneValidator()
         ],
         description="comma separated list of IPv4/IPv6 addresses that are used on the wireguard interface"
     )
+    peer_inactivity_timeout: int = tortoise.fields.IntField(
+        default=utils.wireguard.DEFAULT_PEER_INACTIVITY_TIMEOUT,
+        validators=[
+            tortoise.validators.MinValueValidator(10),
+            tortoise.validators.MaxValueValidator(86400)
+        ],
+        description="seconds without a handshake before a peer is considered inactive and its routes are removed"
+    )
     peers: tortoise.fields.ReverseRelation["WgPeerModel"]
 
     @property
@@ -99,7 +113,7 @@ class WgInterfaceModel(tortoise.models.Model):
         :return: [description]
         :rtype: List
         """
-        return [x.strip() for x in self.cidr_addresses.split(",")]
+        return models.route.split_cidr_list(self.cidr_addresses)
 
     @cidr_addresses_list.setter
     def cidr_addresses_list(self, value: list) -> None:
@@ -119,10 +133,27 @@ class WgInterfaceModel(tortoise.models.Model):
         """
         return wgconfig.wgexec.get_publickey(self.private_key)
 
+    # resource type of the API responses (see `models.resources`)
+    resource_type = "interfaces"
+
     class Meta:
         table = "wg_interfaces"
 
 
+async def load_inactivity_timeouts() -> None:
+    """load the inactivity timeouts of the interfaces into the `WgSystemInfoAdapter` (used for the active state of the
+    peers), the timeouts are loaded again if the revision of the interfaces changed. The peer tracking runs only within
+    the leader, every worker loads the timeouts before the active state is evaluated.
+    """
+    wg_si_adapter = utils.wireguard.WgSystemInfoAdapter()
+    revision = utils.revision.RevisionRegistry().get_resources([WgInterfaceModel.resource_type])[WgInterfaceModel.resource_type]
+    if wg_si_adapter.inactivity_timeouts_revision == revision:
+        return
+
+    timeouts = await WgInterfaceModel.all().values_list("intf_name", "peer_inactivity_timeout")
+    wg_si_adapter.set_inactivity_timeouts(dict(timeouts), revision)
+
+
 @tortoise.signals.post_save(WgInterfaceModel)
 async def wginterfacemodel_pre_save(
     sender: "Type[WgInterfaceModel]",
@@ -133,6 +164,11 @@ async def wginterfacemodel_pre_save(
 ) -> None:
     """trigger sync with wgconfig"""
     logger = utils.log.LoggingUtil().logger
+    await models.route.WgInterfaceAddressModel.replace_prefixes(instance.instance_id, instance.cidr_addresses_list)
+
+    if not utils.coordination.LeaderElection().is_leader:
+        await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.INTERFACE, instance.intf_name)
+        return
 
     logger.info(f"update interface config '{instance.intf_name}'")
     adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=instance)
@@ -142,6 +178,13 @@ async def wginterfacemodel_pre_save(
     await adapter.rebuild_peer_config()
     await adapter.apply_config(recreate_interface=True)
 
+    # the interface was recreated, all routes must be applied again
+    # imported here to avoid a circular import (the peer tracking depends on the models)
+    from app.peer_tracking import PeerTracker  # pylint: disable=import-outside-toplevel
+    PeerTracker().invalidate(instance.intf_name, reset_state=True)
+    # all interfaces are reloaded, an interface that was renamed is no longer tracked
+    PeerTracker().invalidate()
+
 @tortoise.signals.post_delete(WgInterfaceModel)
 async def wginterfacemodel_pre_delete(
     sender: "Type[WgInterfaceModel]",
@@ -152,4 +195,16 @@ async def wginterfacemodel_pre_delete(
     logger = utils.log.LoggingUtil().logger
 
     logger.info(f"remove interface '{instance.intf_name}'")
+    # the peers are removed by the database (no signals)
+    route_index = app.peer_routes.PeerRouteIndex()
+    route_index.begin_change(await utils.revision.RevisionRegistry().bump(route_index.revision_key))
+    route_index.invalidate(str(instance.instance_id))
+
+    if not utils.coordination.LeaderElection().is_leader:
+        await models.reconcile.ReconcileEventModel.enqueue(models.reconcile.ReconcileEventKindEnum.INTERFACE, instance.intf_name)
+        return
+
     await app.wg_config_adapter.WgConfigAdapter(wg_interface=instance).interface_down()
+    # imported here to avoid a circular import (the peer tracking depends on the models)
+    from app.peer_tracking import PeerTracker  # pylint: disable=import-outside-toplevel
+    PeerTracker().invalidate()
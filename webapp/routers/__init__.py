@@ -1,7 +1,14 @@
 """
 routers for the FastAPI object
 """
+import utils.startup_patches
+
+# the routes are registered with the patches of the startup time
+utils.startup_patches.apply("fastapi")
+
 from routers.healthcheck_router import healthcheck_router
 from routers.rules_router import rules_router
+from routers.network_set_router import network_set_router
 from routers.wireguard_router import wireguard_router
 from routers.utility_router import utility_router
+from routers.metrics_router import metrics_router
@@ -0,0 +1,123 @@
+"""
+conditional GET requests (`ETag` and `If-None-Match`) for the endpoints that return the tortoise schemas
+
+The ETag of a response is derived from the revisions of the resource types within the schema of the response
+(including the nested schemas), the revisions are bumped by the model signals (see `models.resources`). The ETag is
+verified after the authentication of the request and before the endpoint is called, a request with a matching
+`If-None-Match` header is answered with `304 Not Modified` without a database query.
+"""
+import typing
+from typing import Callable, Coroutine, Any, FrozenSet, Optional, Set
+
+import fastapi
+import fastapi.routing
+from fastapi import Request, Response
+from fastapi.dependencies.utils import get_parameterless_sub_dependant
+
+import utils.revision
+
+
+class NotModifiedException(Exception):
+    """
+    the content of the client is up-to-date (`If-None-Match` matches the current ETag)
+    """
+    def __init__(self, etag: str):
+        super().__init__(etag)
+        self.etag = etag
+
+
+def schema_resource_types(schema: Any) -> FrozenSet[str]:
+    """resource types of a schema that is created with `pydantic_model_creator` (including the nested schemas)
+
+    :param schema: pydantic schema or a list of the schema (e.g. `List[schemas.WgPeerSchema]`)
+    :type schema: Any
+    :return: names of the resource types, empty if the schema isn't based on a model
+    :rtype: FrozenSet[str]
+    """
+    result: Set[str] = set()
+    pending = [schema]
+    visited = set()
+    while pending:
+        current = pending.pop()
+        if typing.get_origin(current) in (list, typing.List):
+            pending.extend(typing.get_args(current))
+            continue
+
+        model = getattr(getattr(current, "__config__", None), "orig_model", None)
+        if model is None or current in visited:
+            continue
+
+        visited.add(current)
+        if getattr(model, "resource_type", None):
+            result.add(model.resource_type)
+
+        pending.extend(field.type_ for field in current.__fields__.values())
+
+    return frozenset(result)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """weak comparison of the `If-None-Match` header with an ETag (RFC 7232, section 3.2)
+
+    :param if_none_match: value of the header
+    :type if_none_match: Optional[str]
+    :param etag: current ETag
+    :type etag: str
+    :return: True if the ETag is listed in the header
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if (value[2:] if value.startswith("W/") else value) == opaque_tag:
+            return True
+
+    return False
+
+
+def _etag_dependency(resource_types: FrozenSet[str]) -> Callable:
+    async def verify_etag(request: Request) -> None:
+        etag = utils.revision.RevisionRegistry().etag(resource_types)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise NotModifiedException(etag)
+
+        request.state.etag = etag
+
+    return verify_etag
+
+
+class ConditionalGetRoute(fastapi.routing.APIRoute):
+    """
+    route class that adds the `ETag` header to the GET endpoints with a tortoise schema as response model
+    """
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        resource_types = schema_resource_types(self.response_model) if "GET" in self.methods else frozenset()
+        if not resource_types:
+            return handler
+
+        # the dependencies are solved in their order, the parameters of the endpoint (e.g. the authentication) are
+        # verified before the ETag
+        self.dependant.dependencies.append(
+            get_parameterless_sub_dependant(depends=fastapi.Depends(_etag_dependency(resource_types)), path=self.path_format)
+        )
+
+        async def conditional_route_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+
+            except NotModifiedException as ex:
+                return Response(status_code=304, headers={"ETag": ex.etag})
+
+            if response.status_code == 200:
+                response.headers["ETag"] = request.state.etag
+
+            return response
+
+        return conditional_route_handler
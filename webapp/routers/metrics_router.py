@@ -0,0 +1,43 @@
+"""
+FastAPI router for the OpenMetrics endpoint
+"""
+import fastapi
+from fastapi.exceptions import HTTPException
+
+import app.auth
+import app.metrics
+import utils.log
+import utils.wireguard
+from routers.response_models import DetailMessageResponseModel
+
+
+metrics_router = fastapi.APIRouter()
+
+
+@metrics_router.get(
+    "/metrics",
+    response_class=fastapi.Response,
+    responses={
+        200: {
+            "description": "metrics in OpenMetrics text format",
+            "content": {app.metrics.OPENMETRICS_CONTENT_TYPE: {}}
+        },
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        },
+        500: {"description": "unable to fetch the operational data"}
+    }
+)
+async def get_metrics(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    per-interface and per-peer metrics based on the cached operational data of wireguard
+    """
+    try:
+        content = await app.metrics.WgMetricsExporter().render()
+
+    except utils.wireguard.WgSystemInfoException as ex:
+        utils.log.LoggingUtil().logger.error(f"unable to render metrics: {ex}")
+        raise HTTPException(status_code=500, detail="unable to fetch operational data")
+
+    return fastapi.Response(content=content, media_type=app.metrics.OPENMETRICS_CONTENT_TYPE)
@@ -0,0 +1,207 @@
+"""
+FastAPI router for the network sets (rendered as ipset)
+"""
+from typing import List
+
+import fastapi
+from fastapi import HTTPException
+
+import app.auth
+import models
+import schemas
+import routers.conditional
+import routers.serialization
+from routers.response_models import MessageResponseModel, InstanceNotFoundErrorResponseModel, ValidationFailedResponseModel, DetailMessageResponseModel, \
+        NetworkSetEntriesRequestModel
+
+
+network_set_router = fastapi.APIRouter(route_class=routers.conditional.ConditionalGetRoute)
+
+
+@network_set_router.get(
+    "/",
+    response_model=List[schemas.NetworkSetSchema],
+    responses={
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_network_sets(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    return a list of NetworkSets
+    """
+    return await routers.serialization.schema_list_response(schemas.NetworkSetSchema, models.NetworkSetModel.all())
+
+
+@network_set_router.post(
+    "/",
+    response_model=schemas.NetworkSetSchema,
+    responses={
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def create_network_set(data: schemas.NetworkSetSchemaIn, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    create new NetworkSet
+    """
+    obj = await models.NetworkSetModel.create(**data.dict(exclude_unset=True))
+    return await schemas.NetworkSetSchema.from_tortoise_orm(obj)
+
+
+@network_set_router.get(
+    "/{instance_id}",
+    response_model=schemas.NetworkSetSchema,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_network_set_instance(instance_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    get NetworkSet instance
+    """
+    return await schemas.NetworkSetSchema.from_queryset_single(
+        models.NetworkSetModel.get(instance_id=instance_id)
+    )
+
+
+@network_set_router.put(
+    "/{instance_id}",
+    response_model=schemas.NetworkSetSchema,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def update_network_set_instance(instance_id: str, data: schemas.NetworkSetSchemaIn, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    update existing NetworkSet instance
+    """
+    # load and save the instance, so that the model signals update the ipset and the compiled policies
+    obj = await models.NetworkSetModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.NetworkSetSchema.from_tortoise_orm(obj)
+
+
+@network_set_router.delete(
+    "/{instance_id}",
+    response_model=MessageResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {
+            "description": "network set is used within a filter rule",
+            "model": ValidationFailedResponseModel
+        },
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def delete_network_set_instance(instance_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    delete NetworkSet instance (not possible as long as the network set is used within a filter rule)
+    """
+    obj = await models.NetworkSetModel.get_or_none(instance_id=instance_id)
+    if obj is None:
+        raise HTTPException(status_code=404, detail=f"NetworkSet {instance_id} not found")
+
+    await obj.delete()
+    return MessageResponseModel(message=f"Deleted NetworkSet {instance_id}")
+
+
+@network_set_router.get(
+    "/{instance_id}/entries",
+    response_model=List[schemas.NetworkSetEntrySchema],
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_network_set_entries(instance_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    return the entries of a NetworkSet
+    """
+    obj = await models.NetworkSetModel.get(instance_id=instance_id)
+    return await routers.serialization.schema_list_response(schemas.NetworkSetEntrySchema, models.NetworkSetEntryModel.filter(network_set_id=obj.instance_id))
+
+
+@network_set_router.post(
+    "/{instance_id}/entries",
+    response_model=schemas.NetworkSetEntrySchema,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def create_network_set_entry(instance_id: str, data: schemas.NetworkSetEntrySchemaIn, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    add a network to a NetworkSet
+    """
+    obj = await models.NetworkSetModel.get(instance_id=instance_id)
+    entry = await models.NetworkSetEntryModel.create(network_set=obj, **data.dict(exclude_unset=True))
+    return await schemas.NetworkSetEntrySchema.from_tortoise_orm(entry)
+
+
+@network_set_router.put(
+    "/{instance_id}/entries",
+    response_model=List[schemas.NetworkSetEntrySchema],
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def replace_network_set_entries(instance_id: str, data: NetworkSetEntriesRequestModel, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    replace all networks of a NetworkSet, the ipset is updated atomically once
+    """
+    obj = await models.NetworkSetModel.get(instance_id=instance_id)
+    await obj.replace_networks(data.networks)
+    return await routers.serialization.schema_list_response(schemas.NetworkSetEntrySchema, models.NetworkSetEntryModel.filter(network_set_id=obj.instance_id))
+
+
+@network_set_router.delete(
+    "/{instance_id}/entries/{entry_id}",
+    response_model=MessageResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def delete_network_set_entry(instance_id: str, entry_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    remove a network from a NetworkSet
+    """
+    entry = await models.NetworkSetEntryModel.get_or_none(instance_id=entry_id, network_set_id=instance_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"NetworkSetEntry {entry_id} not found")
+
+    await entry.delete()
+    return MessageResponseModel(message=f"Deleted NetworkSetEntry {entry_id}")
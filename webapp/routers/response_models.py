@@ -1,3 +1,4 @@
+import datetime
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 
@@ -9,6 +10,14 @@ class ActiveResponseModel(BaseModel):
     active: bool
 
 
+class PeerLookupResponseModel(BaseModel):
+    """
+    peers that receive the traffic to an address (most specific network of the peer routes)
+    """
+    network: Optional[str]
+    peer_ids: List[str]
+
+
 class DetailMessageResponseModel(BaseModel):
     """
     detail message as response
@@ -66,3 +75,115 @@ class UrlResponseModel(BaseModel):
     """
     content: str
     status: int
+
+
+class PolicyOptimizerActionModel(BaseModel):
+    """
+    filter rule that is removed or merged by the policy optimizer
+    """
+    action: str
+    rule_id: str
+    by_rule_id: Optional[str]
+
+
+class PolicyOptimizationResponseModel(BaseModel):
+    """
+    result of the policy optimizer
+    """
+    enabled: bool
+    ipv4: List[PolicyOptimizerActionModel]
+    ipv6: List[PolicyOptimizerActionModel]
+
+
+class PolicySimulationRequestModel(BaseModel):
+    """
+    packet that is evaluated against the filter rules of a policy (received on the wireguard interface)
+    """
+    src: str
+    dst: str
+    protocol: Optional[str]
+    dst_port: Optional[int]
+    chain: str = "FORWARD"
+
+
+class PolicySimulationResponseModel(BaseModel):
+    """
+    result of the policy simulation, rule_id is None if the default policy of the chain applies
+    """
+    action: str
+    rule_id: Optional[str]
+
+
+class NetworkSetEntriesRequestModel(BaseModel):
+    """
+    request model to replace all entries of a network set
+    """
+    networks: List[str]
+
+
+class ReconcileEventResponseModel(BaseModel):
+    """
+    change that is applied to the system by the leader or the reconciler process
+    """
+    id: int
+    kind: str
+    name: str
+    status: str
+    created_at: datetime.datetime
+    processed_at: Optional[datetime.datetime]
+    duration: Optional[float]
+    error: Optional[str]
+
+
+class ReconcilerStatusResponseModel(BaseModel):
+    """
+    state of the reconciliation, leader is None if no process holds the lease (or the election is disabled)
+    """
+    mode: str
+    leader: Optional[str]
+    pending: int
+    failed: int
+    events: List[ReconcileEventResponseModel]
+
+
+class ConfigJobStepResponseModel(BaseModel):
+    """
+    progress of a single step of a configuration job, output contains the error messages that were logged by the step
+    """
+    name: str
+    status: str
+    duration: Optional[float]
+    output: Optional[str]
+    error: Optional[str]
+
+
+class ConfigJobResponseModel(BaseModel):
+    """
+    configuration job that is executed in the background
+    """
+    instance_id: str
+    kind: str
+    intf_name: str
+    status: str
+    steps: List[ConfigJobStepResponseModel]
+    error: Optional[str]
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime]
+    finished_at: Optional[datetime.datetime]
+    duration: Optional[float]
+
+    @classmethod
+    def from_model(cls, job) -> "ConfigJobResponseModel":
+        """create the response from a `models.ConfigJobModel`"""
+        return cls(
+            instance_id=str(job.instance_id),
+            kind=job.kind.value,
+            intf_name=job.intf_name,
+            status=job.status.value,
+            steps=job.steps,
+            error=job.error,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            duration=(job.finished_at - job.started_at).total_seconds() if job.started_at and job.finished_at else None
+        )
@@ -9,10 +9,15 @@ from fastapi import HTTPException
 import app.auth
 import models
 import schemas
-from routers.response_models import MessageResponseModel, InstanceNotFoundErrorResponseModel,ValidationFailedResponseModel, DetailMessageResponseModel
+import routers.conditional
+import routers.serialization
+import utils.config
+import utils.revision
+from routers.response_models import MessageResponseModel, InstanceNotFoundErrorResponseModel,ValidationFailedResponseModel, DetailMessageResponseModel, \
+        PolicyOptimizationResponseModel, PolicySimulationRequestModel, PolicySimulationResponseModel
 
 
-rules_router = fastapi.APIRouter()
+rules_router = fastapi.APIRouter(route_class=routers.conditional.ConditionalGetRoute)
 
 
 @rules_router.get(
@@ -25,11 +30,11 @@ rules_router = fastapi.APIRouter()
         }
     }
 )
-async def get_filters_ipv4(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_filters_ipv4(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of IPv4FilterRules
     """
-    return await schemas.Ipv4FilterRuleSchema.from_queryset(models.Ipv4FilterRuleModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.Ipv4FilterRuleSchema, models.Ipv4FilterRuleModel.all())
 
 
 @rules_router.post(
@@ -87,12 +92,10 @@ async def update_filter_ipv4_instance(instance_id: str, data: schemas.Ipv4Filter
     """
     update existing IPv4FilterRule instance
     """
-    await models.Ipv4FilterRuleModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.Ipv4FilterRuleSchema.from_queryset_single(
-        models.Ipv4FilterRuleModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals invalidate the compiled policies
+    obj = await models.Ipv4FilterRuleModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.Ipv4FilterRuleSchema.from_tortoise_orm(obj)
 
 
 @rules_router.delete(
@@ -128,11 +131,11 @@ async def delete_filter_ipv4_instance(instance_id: str, username: str = fastapi.
         }
     }
 )
-async def get_filters_ipv6(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_filters_ipv6(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of IPv6FilterRuleModels
     """
-    return await schemas.Ipv6FilterRuleSchema.from_queryset(models.Ipv6FilterRuleModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.Ipv6FilterRuleSchema, models.Ipv6FilterRuleModel.all())
 
 
 @rules_router.post(
@@ -190,12 +193,10 @@ async def update_filter_ipv6_instance(instance_id: str, data: schemas.Ipv6Filter
     """
     update existing Ipv6FilterRuleModel instance
     """
-    await models.Ipv6FilterRuleModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.Ipv6FilterRuleSchema.from_queryset_single(
-        models.Ipv6FilterRuleModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals invalidate the compiled policies
+    obj = await models.Ipv6FilterRuleModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.Ipv6FilterRuleSchema.from_tortoise_orm(obj)
 
 
 @rules_router.delete(
@@ -231,11 +232,11 @@ async def delete_filter_ipv6_instance(instance_id: str, username: str = fastapi.
         }
     }
 )
-async def get_nat_ipv4_rules(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_nat_ipv4_rules(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of Ipv4NatRuleModel
     """
-    return await schemas.Ipv4NatRuleSchema.from_queryset(models.Ipv4NatRuleModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.Ipv4NatRuleSchema, models.Ipv4NatRuleModel.all())
 
 
 @rules_router.post(
@@ -293,12 +294,10 @@ async def update_nat_ipv4_rule(instance_id: str, data: schemas.Ipv4NatRuleSchema
     """
     update existing Ipv4NatRuleModel instance
     """
-    await models.Ipv4NatRuleModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.Ipv4NatRuleSchema.from_queryset_single(
-        models.Ipv4NatRuleModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals invalidate the compiled policies
+    obj = await models.Ipv4NatRuleModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.Ipv4NatRuleSchema.from_tortoise_orm(obj)
 
 
 @rules_router.delete(
@@ -334,11 +333,11 @@ async def delete_nat_ipv4_rule(instance_id: str, username: str = fastapi.Depends
         }
     }
 )
-async def get_nat_ipv6_rules(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_nat_ipv6_rules(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of Ipv6NatRuleModel
     """
-    return await schemas.Ipv6NatRuleSchema.from_queryset(models.Ipv6NatRuleModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.Ipv6NatRuleSchema, models.Ipv6NatRuleModel.all())
 
 
 @rules_router.post(
@@ -396,12 +395,10 @@ async def update_nat_ipv6_rule(instance_id: str, data: schemas.Ipv6NatRuleSchema
     """
     update existing Ipv6NatRuleModel instance
     """
-    await models.Ipv6NatRuleModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.Ipv6NatRuleSchema.from_queryset_single(
-        models.Ipv6NatRuleModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals invalidate the compiled policies
+    obj = await models.Ipv6NatRuleModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.Ipv6NatRuleSchema.from_tortoise_orm(obj)
 
 
 @rules_router.delete(
@@ -437,11 +434,11 @@ async def delete_nat_ipv6_rule(instance_id: str, username: str = fastapi.Depends
         }
     }
 )
-async def get_policy_rule_list_entries(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_policy_rule_list_entries(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of PolicyRuleLists
     """
-    return await schemas.PolicyRuleListSchema.from_queryset(models.PolicyRuleListModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.PolicyRuleListSchema, models.PolicyRuleListModel.all())
 
 
 @rules_router.post(
@@ -483,6 +480,51 @@ async def get_policy_rule_list(instance_id: str, username: str = fastapi.Depends
     )
 
 
+@rules_router.get(
+    "/policy_rule_list/{instance_id}/optimization",
+    response_model=PolicyOptimizationResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_policy_rule_list_optimization(instance_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    get the filter rules of the PolicyRuleList that are removed or merged by the policy optimizer (also reported
+    if the optimizer is disabled)
+    """
+    obj = await models.PolicyRuleListModel.get(instance_id=instance_id)
+    return PolicyOptimizationResponseModel(
+        enabled=utils.config.ConfigUtil().policy_optimizer,
+        **await obj.optimization_report()
+    )
+
+
+@rules_router.post(
+    "/policy_rule_list/{instance_id}/simulate",
+    response_model=PolicySimulationResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def simulate_policy_rule_list(instance_id: str, data: PolicySimulationRequestModel, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    evaluate a packet against the filter rules of the PolicyRuleList (without changing the system)
+    """
+    obj = await models.PolicyRuleListModel.get(instance_id=instance_id)
+    simulator = await obj.build_simulator()
+    result = simulator.evaluate(src=data.src, dst=data.dst, protocol=data.protocol, dst_port=data.dst_port, chain=data.chain)
+    return PolicySimulationResponseModel(action=result.action, rule_id=result.rule_id)
+
+
 @rules_router.put(
     "/policy_rule_list/{instance_id}",
     response_model=schemas.PolicyRuleListSchema,
@@ -502,6 +544,8 @@ async def update_policy_rule_list(instance_id: str, data: schemas.PolicyRuleList
     await models.PolicyRuleListModel.filter(instance_id=instance_id).update(
         **data.dict(exclude_unset=True)
     )
+    # the queryset update doesn't trigger the signals
+    await utils.revision.RevisionRegistry().bump_resources(models.PolicyRuleListModel.resource_type)
     return await schemas.PolicyRuleListSchema.from_queryset_single(
         models.PolicyRuleListModel.get(instance_id=instance_id)
     )
@@ -0,0 +1,63 @@
+"""
+fast serialization of the list endpoints
+
+The rows are built from `values()` queries (see `utils.tortoise.serializers`) and encoded with orjson. The response
+bypasses the validation of the response model, the response model of the route is still used for the OpenAPI schema.
+"""
+from typing import Type
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from tortoise.contrib.pydantic import PydanticModel
+from tortoise.queryset import QuerySet
+
+import app.response_cache
+import routers.conditional
+import utils.revision
+import utils.tortoise.serializers
+
+
+async def schema_list_response(schema: Type[PydanticModel], queryset: QuerySet) -> ORJSONResponse:
+    """create the response of a list endpoint, same content as `schema.from_queryset(queryset)`
+
+    :param schema: pydantic schema of the rows
+    :type schema: Type[PydanticModel]
+    :param queryset: queryset of the model of the schema
+    :type queryset: QuerySet
+    :return: JSON response
+    :rtype: ORJSONResponse
+    """
+    rows = await utils.tortoise.serializers.get_row_builder(schema).build(queryset)
+    return ORJSONResponse(rows)
+
+
+async def cached_schema_list_response(request: Request, schema: Type[PydanticModel], queryset: QuerySet) -> Response:
+    """create the response of a list endpoint with the response cache (`app.response_cache`), the response is only
+    created if the data was changed since the cached response was created
+
+    :param request: request of the endpoint (the path is the cache key)
+    :type request: Request
+    :param schema: pydantic schema of the rows
+    :type schema: Type[PydanticModel]
+    :param queryset: queryset of the model of the schema
+    :type queryset: QuerySet
+    :return: JSON response
+    :rtype: Response
+    """
+    cache = app.response_cache.ResponseCache()
+    if not cache.enabled:
+        return await schema_list_response(schema, queryset)
+
+    # the ETag is read before the database query by the conditional route, a response that is created during a change
+    # is stored for the outdated ETag
+    etag = getattr(request.state, "etag", None) or utils.revision.RevisionRegistry().etag(
+        routers.conditional.schema_resource_types(schema)
+    )
+    key = request.url.path
+    body = cache.get(key, etag)
+    if body is None:
+        body = orjson.dumps(await utils.tortoise.serializers.get_row_builder(schema).build(queryset))
+        cache.put(key, etag, body)
+
+    return Response(content=body, media_type="application/json")
@@ -2,13 +2,17 @@
 FastAPI router for common utilities
 """
 import fastapi
-import pythonping
-import requests
 
 import app.auth
-from routers.response_models import PingResponseModel, DetailMessageResponseModel, UrlRequestModel, UrlResponseModel
+import app.drift
+import app.response_cache
+import models
+from routers.response_models import PingResponseModel, DetailMessageResponseModel, UrlRequestModel, UrlResponseModel, \
+        ReconcilerStatusResponseModel
 import utils.wireguard
 import utils.config
+import utils.coordination
+import utils.instrumentation
 
 
 utility_router = fastapi.APIRouter()
@@ -79,6 +83,79 @@ async def get_wg_operational_data(username: str = fastapi.Depends(app.auth.get_c
     return data
 
 
+@utility_router.get(
+    "/instrumentation",
+    responses={
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_instrumentation_data(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """get the timing histograms of the internal operations (requires APP_INSTRUMENTATION)
+    """
+    return utils.instrumentation.InstrumentationUtil().to_dict()
+
+
+@utility_router.get(
+    "/drift",
+    responses={
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_drift_data(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """get the differences between the database and the system that were found by the last check and the number of
+    detected and repaired differences (only available within the process that changes the system)
+    """
+    return app.drift.DriftDetector().to_dict()
+
+
+@utility_router.get(
+    "/response_cache",
+    responses={
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_response_cache_data(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """get the memory use and the hit ratio of the response cache of the list endpoints (per worker process)
+    """
+    return app.response_cache.ResponseCache().to_dict()
+
+
+@utility_router.get(
+    "/reconciler",
+    response_model=ReconcilerStatusResponseModel,
+    responses={
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_reconciler_status(limit: int = 20, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """get the state of the changes that are applied to the system by the leader or the reconciler process
+    """
+    config = utils.config.ConfigUtil()
+    election = utils.coordination.LeaderElection()
+    events = await models.ReconcileEventModel.all().order_by("-id").limit(limit).values(
+        "id", "kind", "name", "status", "created_at", "processed_at", "duration", "error"
+    )
+    return ReconcilerStatusResponseModel(
+        mode=config.reconciler_mode,
+        leader=election.store.lease_owner(election.lease_name) if election.enabled else None,
+        pending=await models.ReconcileEventModel.filter(status=models.ReconcileEventStatusEnum.PENDING).count(),
+        failed=await models.ReconcileEventModel.filter(status=models.ReconcileEventStatusEnum.FAILED).count(),
+        events=events
+    )
+
+
 @utility_router.post(
     "/ping/{hostname}",
     response_model=PingResponseModel,
@@ -94,6 +171,9 @@ async def post_ping(hostname: str, username: str = fastapi.Depends(app.auth.get_
     """
     logger = utils.log.LoggingUtil().logger
     config = utils.config.ConfigUtil()
+    # pythonping and requests are only used by the test endpoints and imported on first use
+    import pythonping  # pylint: disable=import-outside-toplevel
+
     try:
         response = pythonping.ping(hostname, timeout=1, count=4, verbose=config.debug)
         return PingResponseModel(
@@ -133,6 +213,8 @@ async def post_get_url(data: UrlRequestModel, username: str = fastapi.Depends(ap
     """perform a HTTP get operation on the given URL and returns the text
     """
     logger = utils.log.LoggingUtil().logger
+    import requests  # pylint: disable=import-outside-toplevel
+
     try:
         response = requests.get(data.url, verify=data.ssl_verify, timeout=3)
         return UrlResponseModel(
@@ -5,15 +5,20 @@ from typing import List
 
 import fastapi
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 
 import app.auth
-import app.wg_config_adapter
+import app.jobs
+import app.peer_events
 import models
 import schemas
-from routers.response_models import MessageResponseModel, InstanceNotFoundErrorResponseModel, ValidationFailedResponseModel, ActiveResponseModel, DetailMessageResponseModel
+import routers.conditional
+import routers.serialization
+from routers.response_models import MessageResponseModel, InstanceNotFoundErrorResponseModel, ValidationFailedResponseModel, ActiveResponseModel, DetailMessageResponseModel, \
+        PeerLookupResponseModel, ConfigJobResponseModel
 
 
-wireguard_router = fastapi.APIRouter()
+wireguard_router = fastapi.APIRouter(route_class=routers.conditional.ConditionalGetRoute)
 
 
 @wireguard_router.get(
@@ -26,11 +31,11 @@ wireguard_router = fastapi.APIRouter()
         }
     }
 )
-async def get_wg_interface_list(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_wg_interface_list(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of WgInterface
     """
-    return await schemas.WgInterfaceSchema.from_queryset(models.WgInterfaceModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.WgInterfaceSchema, models.WgInterfaceModel.all())
 
 
 @wireguard_router.post(
@@ -74,7 +79,8 @@ async def get_wg_interface(instance_id: str, username: str = fastapi.Depends(app
 
 @wireguard_router.post(
     "/interfaces/{instance_id}/reconfigure",
-    response_model=MessageResponseModel,
+    response_model=ConfigJobResponseModel,
+    status_code=202,
     responses={
         404: {"model": InstanceNotFoundErrorResponseModel},
         401: {
@@ -85,17 +91,52 @@ async def get_wg_interface(instance_id: str, username: str = fastapi.Depends(app
 )
 async def reconfigure_wg_interface(instance_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
-    force apply interface configuration at system level (will temporary disrupt the wireguard connectivity)
+    force apply interface configuration at system level (will temporary disrupt the wireguard connectivity), the
+    configuration is applied in the background, the progress is available at `/jobs/{job_id}`
     """
     instance = await models.WgInterfaceModel.get(instance_id=instance_id)
-    adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=instance)
+    job = await app.jobs.JobRunner().submit(models.ConfigJobKindEnum.RECONFIGURE, instance)
+    return ConfigJobResponseModel.from_model(job)
+
 
-    # (re-)initialize configuration for wireguard configuration
-    await adapter.init_config(force_overwrite=True)
-    await adapter.rebuild_peer_config()
-    await adapter.apply_config(recreate_interface=True)
+@wireguard_router.get(
+    "/jobs/{job_id}",
+    response_model=ConfigJobResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_config_job(job_id: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    return the progress of a configuration job (status, duration and error output per step)
+    """
+    return ConfigJobResponseModel.from_model(await models.ConfigJobModel.get(instance_id=job_id))
 
-    return MessageResponseModel(message="configuration applied")
+
+@wireguard_router.get(
+    "/interfaces/{instance_id}/peer_lookup",
+    response_model=PeerLookupResponseModel,
+    responses={
+        404: {"model": InstanceNotFoundErrorResponseModel},
+        422: {"model": ValidationFailedResponseModel},
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def lookup_wg_interface_peer(instance_id: str, address: str, username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    get the peers of the WgInterface that receive the traffic to an address (based on the cidr_routes of the peers)
+    """
+    instance = await models.WgInterfaceModel.get(instance_id=instance_id)
+    route_index = await models.WgPeerModel.get_route_index(instance.instance_id)
+    network, peer_ids = route_index.lookup(address)
+    return PeerLookupResponseModel(network=network, peer_ids=peer_ids)
 
 
 @wireguard_router.put(
@@ -114,12 +155,10 @@ async def update_wg_interface(instance_id: str, data: schemas.WgInterfaceSchemaI
     """
     update existing WgInterface instance
     """
-    await models.WgInterfaceModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.WgInterfaceSchema.from_queryset_single(
-        models.WgInterfaceModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals update the addresses and the configuration
+    obj = await models.WgInterfaceModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.WgInterfaceSchema.from_tortoise_orm(obj)
 
 
 @wireguard_router.delete(
@@ -155,11 +194,11 @@ async def delete_wg_interface(instance_id: str, username: str = fastapi.Depends(
     },
     response_model=List[schemas.WgPeerSchema]
 )
-async def get_wg_interface_peer_list(username: str = fastapi.Depends(app.auth.get_current_username)):
+async def get_wg_interface_peer_list(request: fastapi.Request, username: str = fastapi.Depends(app.auth.get_current_username)):
     """
     return a list of all WgPeerModels
     """
-    return await schemas.WgPeerSchema.from_queryset(models.WgPeerModel.all())
+    return await routers.serialization.cached_schema_list_response(request, schemas.WgPeerSchema, models.WgPeerModel.all())
 
 
 @wireguard_router.post(
@@ -181,6 +220,31 @@ async def create_wg_peer(data: schemas.WgPeerSchemaIn, username: str = fastapi.D
     return await schemas.WgPeerSchema.from_tortoise_orm(obj)
 
 
+@wireguard_router.get(
+    "/interface/peers/events",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "stream of peer state changes (server-sent events)",
+            "content": {"text/event-stream": {}}
+        },
+        401: {
+            "description": "missing or invalid authentication provided on endpoint",
+            "model": DetailMessageResponseModel
+        }
+    }
+)
+async def get_wg_peer_events(username: str = fastapi.Depends(app.auth.get_current_username)):
+    """
+    stream an event whenever a peer changes the active state, the endpoint or the latest handshake
+    """
+    return StreamingResponse(
+        app.peer_events.PeerEventBroker().stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
 @wireguard_router.get(
     "/interface/peers/{instance_id}",
     response_model=schemas.WgPeerSchema,
@@ -238,12 +302,10 @@ async def update_wg_peer(instance_id: str, data: schemas.WgPeerSchemaIn, usernam
     """
     update existing WgPeerModel instance
     """
-    await models.WgPeerModel.filter(instance_id=instance_id).update(
-        **data.dict(exclude_unset=True)
-    )
-    return await schemas.WgPeerSchema.from_queryset_single(
-        models.WgPeerModel.get(instance_id=instance_id)
-    )
+    # load and save the instance, so that the model signals verify the routes and update the configuration
+    obj = await models.WgPeerModel.get(instance_id=instance_id)
+    await obj.update_from_dict(data.dict(exclude_unset=True)).save()
+    return await schemas.WgPeerSchema.from_tortoise_orm(obj)
 
 
 @wireguard_router.delete(
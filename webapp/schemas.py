@@ -1,7 +1,11 @@
 """
 pydantic schemas to build the bridge between the router and the models
+
+The schemas are created on first access (e.g. `schemas.WgPeerSchema`), the creation requires the initialized
+models and takes a noticeable part of the startup time. Modules that don't serve the API (reconciler process,
+command line utilities) don't pay for it.
 """
-from typing import Type
+from typing import Dict, Tuple, Type
 
 import tortoise
 from tortoise.contrib.pydantic import pydantic_model_creator, PydanticModel
@@ -9,117 +13,148 @@ from tortoise.contrib.pydantic import pydantic_model_creator, PydanticModel
 from models.wg_interface import WgInterfaceModel
 from models.peer import WgPeerModel
 from models.rules import PolicyRuleListModel, Ipv4FilterRuleModel, Ipv6FilterRuleModel, Ipv4NatRuleModel, Ipv6NatRuleModel
+from models.network_set import NetworkSetModel, NetworkSetEntryModel
 from utils.config import ConfigUtil
 
 
-_config_instance = ConfigUtil()
-tortoise.Tortoise.init_models(_config_instance.db_models, "models")
+# model and arguments of `pydantic_model_creator` per schema
+SCHEMA_DEFINITIONS: Dict[str, Tuple[Type[tortoise.models.Model], dict]] = {
+    "PolicyRuleListSchema": (PolicyRuleListModel, dict(
+        name="PolicyRuleListSchema"
+    )),
+    "PolicyRuleListSchemaIn": (PolicyRuleListModel, dict(
+        name="PolicyRuleListSchemaIn",
+        exclude_readonly=True,
+        exclude=(
+            "ipv4_filter_rules",
+            "ipv6_filter_rules",
+            "ipv4_nat_rules",
+            "ipv6_nat_rules"
+        )
+    )),
+    "Ipv4FilterRuleSchema": (Ipv4FilterRuleModel, dict(
+        name="Ipv4FilterRuleSchema"
+    )),
+    "Ipv4FilterRuleSchemaIn": (Ipv4FilterRuleModel, dict(
+        name="Ipv4FilterRuleModelIn",
+        exclude_readonly=True
+    )),
+    "Ipv6FilterRuleSchema": (Ipv6FilterRuleModel, dict(
+        name="Ipv6FilterRuleSchema"
+    )),
+    "Ipv6FilterRuleSchemaIn": (Ipv6FilterRuleModel, dict(
+        name="Ipv6FilterRuleSchemaIn",
+        exclude_readonly=True
+    )),
+    "Ipv4NatRuleSchema": (Ipv4NatRuleModel, dict(
+        name="Ipv4NatRuleSchema"
+    )),
+    "Ipv4NatRuleSchemaIn": (Ipv4NatRuleModel, dict(
+        name="Ipv4NatRuleSchemaIn",
+        exclude_readonly=True
+    )),
+    "Ipv6NatRuleSchema": (Ipv6NatRuleModel, dict(
+        name="Ipv6NatRuleSchema"
+    )),
+    "Ipv6NatRuleSchemaIn": (Ipv6NatRuleModel, dict(
+        name="Ipv6NatRuleSchemaIn",
+        exclude_readonly=True
+    )),
+    "NetworkSetSchema": (NetworkSetModel, dict(
+        name="NetworkSetSchema"
+    )),
+    "NetworkSetSchemaIn": (NetworkSetModel, dict(
+        name="NetworkSetSchemaIn",
+        exclude_readonly=True
+    )),
+    "NetworkSetEntrySchema": (NetworkSetEntryModel, dict(
+        name="NetworkSetEntrySchema"
+    )),
+    "NetworkSetEntrySchemaIn": (NetworkSetEntryModel, dict(
+        name="NetworkSetEntrySchemaIn",
+        exclude_readonly=True,
+        exclude=(
+            "network_set_id",
+        )
+    )),
+    "WgInterfaceSchema": (WgInterfaceModel, dict(
+        name="WgInterfaceSchema",
+        include=[
+            "public_key",
+            "peers",
+            "cidr_addresses",
+            "table",
+            "listen_port",
+            "peer_inactivity_timeout",
+            "description",
+            "policy_rule_list_id",
+            "policy_rule_list",
+            "intf_name",
+            "instance_id"
+        ],
+        computed=["public_key"],
+        exclude=[
+            "private_key",
+            "policy_rule_list.ipv4_filter_rules",
+            "policy_rule_list.ipv4_nat_rules",
+            "policy_rule_list.ipv6_filter_rules",
+            "policy_rule_list.ipv6_nat_rules",
+            "policy_rule_list.bound_interfaces"
+        ]
+    )),
+    "WgInterfaceSchemaIn": (WgInterfaceModel, dict(
+        name="WgInterfaceSchemaIn",
+        exclude_readonly=True
+    )),
+    "WgPeerSchema": (WgPeerModel, dict(
+        name="WgPeerSchema",
+        include=[
+            "instance_id",
+            "wg_interface_id",
+            "wg_interface",
+            "public_key",
+            "friendly_name",
+            "description",
+            "persistent_keepalives",
+            "preshared_key",
+            "endpoint",
+            "cidr_routes"
+        ]
+    )),
+    "WgPeerSchemaIn": (WgPeerModel, dict(
+        name="WgPeerSchemaIn",
+        exclude_readonly=True
+    )),
+}
+
+_schemas: Dict[str, Type[PydanticModel]] = dict()
+
+
+def _init_models() -> None:
+    """initialize the relations of the models (required to create the schemas), only once per process"""
+    if "models" not in tortoise.Tortoise.apps:
+        tortoise.Tortoise.init_models(ConfigUtil().db_models, "models")
 
-PolicyRuleListSchema: Type[PydanticModel] = pydantic_model_creator(
-    PolicyRuleListModel,
-    name="PolicyRuleListSchema"
-)
-PolicyRuleListSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    PolicyRuleListModel,
-    name="PolicyRuleListSchemaIn",
-    exclude_readonly=True,
-    exclude=(
-        "ipv4_filter_rules",
-        "ipv6_filter_rules",
-        "ipv4_nat_rules",
-        "ipv6_nat_rules"
-    )
-)
 
-Ipv4FilterRuleSchema: Type[PydanticModel] = pydantic_model_creator(
-    Ipv4FilterRuleModel,
-    name="Ipv4FilterRuleSchema"
-)
-Ipv4FilterRuleSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    Ipv4FilterRuleModel,
-    name="Ipv4FilterRuleModelIn",
-    exclude_readonly=True
-)
+def __getattr__(name: str) -> Type[PydanticModel]:
+    """create a schema on first access
 
-Ipv6FilterRuleSchema: Type[PydanticModel] = pydantic_model_creator(
-    Ipv6FilterRuleModel,
-    name="Ipv6FilterRuleSchema"
-)
-Ipv6FilterRuleSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    Ipv6FilterRuleModel,
-    name="Ipv6FilterRuleSchemaIn",
-    exclude_readonly=True
-)
+    :param name: name of the schema
+    :type name: str
+    :raises AttributeError: unknown schema
+    :return: pydantic model of the schema
+    :rtype: Type[PydanticModel]
+    """
+    if name not in SCHEMA_DEFINITIONS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-Ipv4NatRuleSchema: Type[PydanticModel] = pydantic_model_creator(
-    Ipv4NatRuleModel,
-    name="Ipv4NatRuleSchema"
-)
-Ipv4NatRuleSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    Ipv4NatRuleModel,
-    name="Ipv4NatRuleSchemaIn",
-    exclude_readonly=True
-)
+    if name not in _schemas:
+        _init_models()
+        model, kwargs = SCHEMA_DEFINITIONS[name]
+        _schemas[name] = pydantic_model_creator(model, **kwargs)
 
-Ipv6NatRuleSchema: Type[PydanticModel] = pydantic_model_creator(
-    Ipv6NatRuleModel,
-    name="Ipv6NatRuleSchema"
-)
-Ipv6NatRuleSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    Ipv6NatRuleModel,
-    name="Ipv6NatRuleSchemaIn",
-    exclude_readonly=True
-)
+    return _schemas[name]
 
-WgInterfaceSchema: Type[PydanticModel] = pydantic_model_creator(
-    WgInterfaceModel,
-    name="WgInterfaceSchema",
-    include = [
-        "public_key",
-        "peers",
-        "cidr_addresses",
-        "table",
-        "listen_port",
-        "description",
-        "policy_rule_list_id",
-        "policy_rule_list",
-        "intf_name",
-        "instance_id"
-    ],
-    computed = ["public_key"],
-    exclude = [
-        "private_key",
-        "policy_rule_list.ipv4_filter_rules",
-        "policy_rule_list.ipv4_nat_rules",
-        "policy_rule_list.ipv6_filter_rules",
-        "policy_rule_list.ipv6_nat_rules",
-        "policy_rule_list.bound_interfaces"
-    ]
-)
-WgInterfaceSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    WgInterfaceModel,
-    name="WgInterfaceSchemaIn",
-    exclude_readonly=True
-)
 
-WgPeerSchema: Type[PydanticModel] = pydantic_model_creator(
-    WgPeerModel,
-    name="WgPeerSchema",
-    include = [
-        "instance_id",
-        "wg_interface_id",
-        "wg_interface",
-        "public_key",
-        "friendly_name",
-        "description",
-        "persistent_keepalives",
-        "preshared_key",
-        "endpoint",
-        "cidr_routes"
-    ]
-)
-WgPeerSchemaIn: Type[PydanticModel] = pydantic_model_creator(
-    WgPeerModel,
-    name="WgPeerSchemaIn",
-    exclude_readonly=True
-)
+def __dir__():
+    return sorted(list(globals()) + list(SCHEMA_DEFINITIONS))
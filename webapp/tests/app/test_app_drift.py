@@ -0,0 +1,177 @@
+"""
+test app.drift module
+"""
+# pylint: disable=missing-function-docstring
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.drift
+import app.peer_tracking
+import models
+import utils.os_func
+import utils.wireguard
+
+
+PEER_A = "s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs="
+PEER_B = "6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E="
+PEER_C = "aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8="
+PEER_X = "yx0owjK+RWUD3ccSDBus7PA/B+WuVhSYUmEO9XAil0k="
+PRESHARED_KEY = "Ud/NQSsHDb7Z6BGPpHpqS1W8ukSdzj2GYUiKSE/0E2c="
+
+
+@pytest.fixture(scope="function")
+def detector():
+    """create a new drift detector for the test"""
+    instance = app.drift.DriftDetector.__new__(app.drift.DriftDetector)
+    instance.__init__()
+    yield instance
+
+
+@pytest.fixture(scope="function")
+def system(monkeypatch):
+    """record the commands and route changes, the filter rules are reported as missing"""
+    state = {"commands": [], "routes": []}
+
+    def run_subprocess(command: str, input_data=None, **kwargs):
+        state["commands"].append((command, input_data))
+        if command == "wg-json":
+            return "{}", "", True
+
+        return "", "", " --check " not in command
+
+    def configure_route(intf_name, ip_network, operation, **kwargs):
+        state["routes"].append((operation, ip_network))
+        return True
+
+    monkeypatch.setattr(utils.os_func, "run_subprocess", run_subprocess)
+    monkeypatch.setattr(utils.os_func, "configure_route", configure_route)
+    monkeypatch.setattr(utils.os_func, "get_interface_routes", lambda intf_name, **kwargs: [])
+    yield state
+
+
+def test_peer_fingerprint():
+    fingerprint = app.drift.peer_fingerprint(["10.1.1.1/32", "fd00::1/128"], 25, None)
+    assert app.drift.peer_fingerprint(["FD00::1/128", " 10.1.1.1 "], 25, "") == fingerprint
+    assert app.drift.peer_fingerprint(["10.1.1.1/32"], 25, None) != fingerprint
+    assert app.drift.peer_fingerprint(["10.1.1.1/32", "fd00::1/128"], 0, None) != fingerprint
+    # the model uses -1 for a disabled keepalive, wg-json doesn't report a disabled keepalive
+    assert app.drift.peer_fingerprint(["10.1.1.1/32"], -1, None) == app.drift.peer_fingerprint(["10.1.1.1/32"], None, None)
+
+
+class TestDriftDetector:
+    """
+    Test the detection and repair of the drift
+    """
+    async def test_drift(self, test_client: TestClient, clean_db, system, detector):
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="192.168.1.0/24", dst_network="192.168.2.0/24")
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=",
+            policy_rule_list=prl
+        )
+        for public_key, routes, preshared_key in (
+            (PEER_A, "10.1.1.2/32", None), (PEER_B, "10.1.1.3/32", None), (PEER_C, "10.1.1.4/32", PRESHARED_KEY)
+        ):
+            await models.WgPeerModel.create(
+                wg_interface=wgintf,
+                public_key=public_key,
+                cidr_routes=routes,
+                persistent_keepalives=25,
+                preshared_key=preshared_key
+            )
+
+        now = int(time.time())
+        snapshot = utils.wireguard.WgOperationalSnapshot(data={
+            "wg1": {
+                "listenPort": 51820,
+                "peers": {
+                    PEER_A: {"allowedIps": ["10.1.1.2/32"], "persistentKeepalive": 25, "latestHandshake": now},
+                    PEER_B: {"allowedIps": ["10.1.1.30/32"], "persistentKeepalive": 25},
+                    PEER_X: {"allowedIps": ["10.1.1.5/32"]},
+                }
+            }
+        }, timestamp=now, serial=1)
+        await app.peer_tracking.PeerTracker().run(snapshot)
+        system["commands"].clear()
+        system["routes"].clear()
+
+        # the check is not due directly after the start
+        assert await detector.run(snapshot) == {}
+
+        reports = await detector.run(snapshot, force=True)
+        drift = reports["wg1"]
+        assert drift.interface_missing is False
+        assert drift.missing_peers == [PEER_C]
+        assert drift.changed_peers == [PEER_B]
+        assert drift.unexpected_peers == [PEER_X]
+        assert drift.missing_routes == ["10.1.1.2/32"]
+        assert len(drift.firewall_rules) == 1
+
+        # only the drifted peers, routes and rules are repaired
+        commands = [command for command, _ in system["commands"] if " --check " not in command]
+        # only a peer with a preshared key reads it from the standard input, the key of a changed peer without a
+        # preshared key is cleared
+        assert (
+            f"wg set wg1 peer {PEER_C} allowed-ips 10.1.1.4/32 persistent-keepalive 25 preshared-key /dev/stdin",
+            f"{PRESHARED_KEY}\n"
+        ) in system["commands"]
+        assert (
+            f"wg set wg1 peer {PEER_B} allowed-ips 10.1.1.3/32 persistent-keepalive 25 preshared-key /dev/null", None
+        ) in system["commands"]
+        assert f"wg set wg1 peer {PEER_X} remove" in commands
+        assert not [command for command in commands if PEER_A in command]
+        assert [command.split(" ")[1] for command in commands if command.startswith("iptables")] == ["--delete", "--append"]
+        assert system["routes"] == [("add", "10.1.1.2/32")]
+
+        data = detector.to_dict()
+        assert data["interfaces"]["wg1"]["counts"] == {
+            "interface": 0, "missing_peer": 1, "unexpected_peer": 1, "changed_peer": 1, "missing_route": 1, "firewall": 1
+        }
+        assert data["repaired"] == data["detected"]
+        assert 'wgce_drift_detected_total{kind="changed_peer"} 1' in detector.to_openmetrics()
+
+        # a missing interface is recreated
+        system["commands"].clear()
+        snapshot = utils.wireguard.WgOperationalSnapshot(data={}, timestamp=now, serial=2)
+        reports = await detector.run(snapshot, force=True)
+        assert reports["wg1"].interface_missing is True
+        assert reports["wg1"].counts()["missing_peer"] == 0
+        assert any(command.startswith("wg-quick up") for command, _ in system["commands"])
+        assert detector.repaired["interface"] == 1
+
+    async def test_default_keepalive(self, test_client: TestClient, clean_db, system, detector):
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgPeerModel.create(wg_interface=wgintf, public_key=PEER_A, cidr_routes="10.1.1.2/32")
+        await models.WgPeerModel.create(wg_interface=wgintf, public_key=PEER_B, cidr_routes="10.1.1.3/32")
+
+        now = int(time.time())
+        snapshot = utils.wireguard.WgOperationalSnapshot(data={
+            "wg1": {
+                "listenPort": 51820,
+                "peers": {
+                    PEER_A: {"allowedIps": ["10.1.1.2/32"]},
+                }
+            }
+        }, timestamp=now, serial=1)
+        system["commands"].clear()
+
+        # a peer with the default keepalive (-1) matches a peer without keepalive on the system
+        drift = (await detector.run(snapshot, force=True))["wg1"]
+        assert drift.changed_peers == []
+        assert drift.missing_peers == [PEER_B]
+        # a missing peer without a preshared key doesn't read an empty key from the standard input
+        commands = [(command, input_data) for command, input_data in system["commands"] if command.startswith("wg set")]
+        assert commands == [(f"wg set wg1 peer {PEER_B} allowed-ips 10.1.1.3/32 persistent-keepalive off", None)]
+
+    async def test_api(self, test_client: TestClient, clean_db):
+        response = await test_client.get("/api/utils/drift")
+        assert response.status_code == 200, response.text
+        assert set(response.json()["detected"].keys()) == set(app.drift.DRIFT_KINDS)
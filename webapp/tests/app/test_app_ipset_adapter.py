@@ -0,0 +1,19 @@
+"""
+test app.ipset_adapter module
+"""
+# pylint: disable=missing-function-docstring
+import app.ipset_adapter
+
+
+def test_build_restore_script():
+    script = app.ipset_adapter.IpsetAdapter().build_restore_script("blocked", "inet", ["10.0.0.0/24", "10.0.1.0/24"])
+
+    assert script.splitlines() == [
+        "create blocked hash:net family inet maxelem 65536 -exist",
+        "create blocked_tmp hash:net family inet maxelem 65536 -exist",
+        "flush blocked_tmp",
+        "add blocked_tmp 10.0.0.0/24 -exist",
+        "add blocked_tmp 10.0.1.0/24 -exist",
+        "swap blocked_tmp blocked",
+        "destroy blocked_tmp",
+    ]
@@ -0,0 +1,79 @@
+"""
+test app.jobs module
+"""
+# pylint: disable=missing-function-docstring
+import pytest
+from fastapi.testclient import TestClient
+
+import app.jobs
+import app.peer_tracking
+import models
+import utils.os_func
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestJobRunner:
+    """
+    Test the execution of the configuration jobs
+    """
+    async def create_interface(self) -> models.WgInterfaceModel:
+        return await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+
+    async def test_failed_step(self, test_client: TestClient, clean_db, monkeypatch):
+        wgintf = await self.create_interface()
+
+        def run_subprocess(command: str, **kwargs):
+            if command.startswith("wg syncconf"):
+                return "", "Line unrecognized", False
+
+            return "{}" if command == "wg-json" else "", "", True
+
+        monkeypatch.setattr(utils.os_func, "run_subprocess", run_subprocess)
+        invalidated = []
+        monkeypatch.setattr(app.peer_tracking.PeerTracker(), "invalidate", lambda *args, **kwargs: invalidated.append((args, kwargs)))
+        job = await app.jobs.JobRunner().submit(models.ConfigJobKindEnum.RECONFIGURE, wgintf)
+        await app.jobs.JobRunner().wait()
+
+        await job.refresh_from_db()
+        assert job.status == models.ConfigJobStatusEnum.FAILED
+        assert job.error == "step 'apply_config' failed"
+        assert [step["status"] for step in job.steps] == ["done", "done", "failed"]
+        assert "Line unrecognized" in job.steps[2]["output"]
+        assert job.started_at is not None and job.finished_at is not None
+        # the routes are applied again after the interface was recreated
+        assert (("wg1",), {"reset_state": True}) in invalidated
+
+    async def test_resume(self, test_client: TestClient, clean_db):
+        wgintf = await self.create_interface()
+        interrupted = await models.ConfigJobModel.create(
+            kind=models.ConfigJobKindEnum.RECONFIGURE,
+            wg_interface=wgintf,
+            intf_name=wgintf.intf_name,
+            status=models.ConfigJobStatusEnum.RUNNING
+        )
+        queued = await models.ConfigJobModel.create(
+            kind=models.ConfigJobKindEnum.RECONFIGURE,
+            wg_interface=wgintf,
+            intf_name=wgintf.intf_name,
+            steps=[{"name": name, "status": "queued"} for name in app.jobs.JobRunner.step_names(models.ConfigJobKindEnum.RECONFIGURE)]
+        )
+
+        await app.jobs.JobRunner().resume()
+        await app.jobs.JobRunner().wait()
+        await interrupted.refresh_from_db()
+        await queued.refresh_from_db()
+        assert interrupted.status == models.ConfigJobStatusEnum.FAILED
+        assert interrupted.error == "job was interrupted"
+        assert queued.status == models.ConfigJobStatusEnum.DONE
+
+        # the name of the interface is kept if the interface is removed before the job is executed
+        job = await models.ConfigJobModel.create(kind=models.ConfigJobKindEnum.RECONFIGURE, wg_interface=wgintf, intf_name="wg1")
+        await wgintf.delete()
+        assert await app.jobs.JobRunner().run_pending() == 1
+        await job.refresh_from_db()
+        assert job.status == models.ConfigJobStatusEnum.FAILED
+        assert job.error == "interface 'wg1' no longer exists"
@@ -0,0 +1,122 @@
+"""
+test app.peer_events module
+"""
+# pylint: disable=missing-function-docstring
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.peer_events
+import utils.wireguard
+
+
+PEER_A = "s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs="
+PEER_B = "6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E="
+
+
+def create_snapshot(serial: int, peers: dict, now: int) -> utils.wireguard.WgOperationalSnapshot:
+    data = {
+        "wgvpn16": {
+            "listenPort": 51820,
+            "peers": peers
+        }
+    }
+    return utils.wireguard.WgOperationalSnapshot(data=data, timestamp=now, serial=serial)
+
+
+@pytest.fixture(scope="function")
+def broker():
+    """create a new broker for the test"""
+    instance = app.peer_events.PeerEventBroker.__new__(app.peer_events.PeerEventBroker)
+    instance.__init__()
+    yield instance
+
+
+class TestPeerEventBroker:
+    """
+    Test PeerEventBroker
+    """
+    def test_publish_snapshot(self, broker):
+        now = int(time.time())
+        queue = broker.subscribe()
+        assert broker.subscriber_count == 1
+
+        # first snapshot is the baseline
+        peers = {
+            PEER_A: {"endpoint": "172.29.0.1:62818", "latestHandshake": now - 10},
+            PEER_B: {"latestHandshake": now - 600},
+        }
+        assert broker.publish_snapshot(create_snapshot(1, peers, now)) == []
+
+        # unchanged snapshot, no events
+        assert broker.publish_snapshot(create_snapshot(2, peers, now + 10)) == []
+        assert queue.empty()
+
+        # peer A roams to a new endpoint, peer B becomes active
+        peers = {
+            PEER_A: {"endpoint": "172.29.0.2:62818", "latestHandshake": now - 10},
+            PEER_B: {"endpoint": "172.29.0.3:51820", "latestHandshake": now + 15},
+        }
+        events = broker.publish_snapshot(create_snapshot(3, peers, now + 20))
+        assert len(events) == 2
+        events = {e["public_key"]: e for e in events}
+        assert events[PEER_A]["changes"] == ["endpoint"]
+        assert events[PEER_A]["active"] is True
+        assert events[PEER_B]["changes"] == ["active", "endpoint", "handshake"]
+        assert events[PEER_B]["active"] is True
+        assert queue.qsize() == 2
+
+        message = queue.get_nowait()
+        assert message.startswith("event: peer_state\ndata: ")
+        assert message.endswith("\n\n")
+        assert json.loads(message.splitlines()[1][len("data: "):])["interface"] == "wgvpn16"
+
+        # peer A times out, peer B is removed from the operational data
+        peers = {
+            PEER_A: {"endpoint": "172.29.0.2:62818", "latestHandshake": now - 10},
+        }
+        events = broker.publish_snapshot(create_snapshot(4, peers, now + 300))
+        events = {e["public_key"]: e for e in events}
+        assert events[PEER_A]["changes"] == ["active"]
+        assert events[PEER_A]["active"] is False
+        assert events[PEER_B]["changes"] == ["active"]
+        assert events[PEER_B]["active"] is False
+
+        broker.unsubscribe(queue)
+        assert broker.subscriber_count == 0
+
+    def test_slow_subscriber(self, broker, monkeypatch):
+        now = int(time.time())
+        monkeypatch.setattr(broker, "max_queue_size", 2)
+        queue = broker.subscribe()
+
+        broker.publish_snapshot(create_snapshot(1, {}, now))
+        for serial in range(2, 6):
+            broker.publish_snapshot(create_snapshot(serial, {PEER_A: {"latestHandshake": now + serial}}, now + serial))
+
+        # only the latest events are kept
+        assert queue.qsize() == 2
+        assert json.loads(queue.get_nowait().splitlines()[1][len("data: "):])["latest_handshake"] == now + 4
+
+    async def test_stream(self, broker):
+        now = int(time.time())
+        stream = broker.stream(keepalive_interval=0.01)
+
+        # keepalive without events
+        assert await stream.__anext__() == ": keepalive\n\n"
+        assert broker.subscriber_count == 1
+
+        broker.publish_snapshot(create_snapshot(1, {}, now))
+        broker.publish_snapshot(create_snapshot(2, {PEER_A: {"latestHandshake": now}}, now))
+        message = await stream.__anext__()
+        assert message.startswith("event: peer_state\n")
+
+        await stream.aclose()
+        assert broker.subscriber_count == 0
+
+
+async def test_events_endpoint_without_authentication(unauth_test_client: TestClient):
+    response = await unauth_test_client.get("/api/wg/interface/peers/events")
+    assert response.status_code == 401
@@ -0,0 +1,193 @@
+"""
+test app.peer_tracking module
+"""
+# pylint: disable=missing-function-docstring
+import time
+
+import pytest
+
+import app.peer_tracking
+import utils.wireguard
+
+
+PEER_A = "s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs="
+PEER_B = "6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E="
+
+
+def create_snapshot(peers: dict, now: int) -> utils.wireguard.WgOperationalSnapshot:
+    data = {
+        "wgvpn16": {
+            "listenPort": 51820,
+            "peers": peers
+        }
+    }
+    return utils.wireguard.WgOperationalSnapshot(data=data, timestamp=now, serial=1)
+
+
+@pytest.fixture(scope="function")
+def tracker():
+    """create a new tracker for the test"""
+    instance = app.peer_tracking.PeerTracker.__new__(app.peer_tracking.PeerTracker)
+    instance.__init__()
+    yield instance
+
+
+@pytest.fixture(scope="function")
+def route_calls(monkeypatch):
+    """record the route changes instead of applying them"""
+    calls = []
+    ip_adapter = utils.wireguard.IpRouteAdapter()
+    monkeypatch.setattr(ip_adapter, "add_ip_route", lambda intf_name, ip_network: calls.append(("add", ip_network)))
+    monkeypatch.setattr(ip_adapter, "remove_ip_route", lambda intf_name, ip_network: calls.append(("del", ip_network)))
+    yield calls
+
+
+class TestInterfaceTrackingShard:
+    """
+    Test InterfaceTrackingShard
+    """
+    def test_load(self):
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, ["10.1.1.1/32", "10.2.0.0/24"]), (PEER_B, [])], now=100)
+        assert shard.peers[PEER_A].routes == ["10.1.1.1/32", "10.2.0.0/24"]
+        assert shard.peers[PEER_B].routes == []
+        assert shard.next_due == 100
+
+        # unchanged peers keep their state
+        shard.peers[PEER_A].active = True
+        shard.load([(PEER_A, ["10.1.1.1/32", "10.2.0.0/24"])], now=110)
+        assert shard.peers[PEER_A].active is True
+        assert PEER_B not in shard.peers
+
+        # changed routes reset the state
+        shard.load([(PEER_A, ["10.1.1.1/32"])], now=120)
+        assert shard.peers[PEER_A].active is None
+        assert shard.peers[PEER_A].stale_routes == ["10.2.0.0/24"]
+
+    def test_pop_due(self):
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, []), (PEER_B, [])], now=100)
+        shard.schedule(shard.peers[PEER_B], 200)
+
+        # outdated schedule entries are skipped
+        assert [e.public_key for e in shard.pop_due(150)] == [PEER_A]
+        assert shard.pop_due(150) == []
+        assert [e.public_key for e in shard.pop_due(200)] == [PEER_B]
+        assert shard.next_due is None
+
+
+class TestPeerTracker:
+    """
+    Test PeerTracker
+    """
+    def test_check_peer(self, tracker, route_calls):
+        now = int(time.time())
+        threshold = utils.wireguard.DEFAULT_PEER_INACTIVITY_TIMEOUT
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, ["10.1.1.1/32"])], now=now)
+        entry = shard.peers[PEER_A]
+
+        # active peer, route is added and the peer is checked again when it is about to time out
+        tracker._check_peer(shard, entry, create_snapshot({PEER_A: {"latestHandshake": now - 10}}, now))
+        assert route_calls == [("add", "10.1.1.1/32")]
+        assert entry.active is True
+        assert entry.next_check == now - 10 + threshold + 1
+
+        # no state change, no route change
+        tracker._check_peer(shard, entry, create_snapshot({PEER_A: {"latestHandshake": now}}, now + 5))
+        assert route_calls == [("add", "10.1.1.1/32")]
+
+        # inactive peer, route is removed and the peer is checked with the idle interval
+        later = now + threshold + 10
+        tracker._check_peer(shard, entry, create_snapshot({PEER_A: {"latestHandshake": now}}, later))
+        assert route_calls == [("add", "10.1.1.1/32"), ("del", "10.1.1.1/32")]
+        assert entry.active is False
+        assert entry.next_check == later + tracker.idle_interval
+
+    def test_check_peer_stale_routes(self, tracker, route_calls):
+        now = int(time.time())
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, ["10.1.1.1/32", "10.2.0.0/24"])], now=now)
+        shard.peers[PEER_A].active = False
+        shard.load([(PEER_A, ["10.1.1.1/32"])], now=now)
+
+        tracker._check_peer(shard, shard.peers[PEER_A], create_snapshot({}, now))
+        assert route_calls == [("del", "10.2.0.0/24"), ("del", "10.1.1.1/32")]
+        assert shard.peers[PEER_A].stale_routes == []
+
+    def test_check_peer_inactivity_timeout(self, tracker, route_calls):
+        now = int(time.time())
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16", inactivity_timeout=30)
+        shard.load([(PEER_A, ["10.1.1.1/32"])], now=now)
+        entry = shard.peers[PEER_A]
+
+        tracker._check_peer(shard, entry, create_snapshot({PEER_A: {"latestHandshake": now - 10}}, now))
+        assert entry.active is True
+        assert entry.next_check == now + 21
+
+        # peer expires with the timeout of the interface
+        assert shard.pop_due(now + 20) == []
+        assert shard.pop_due(now + 21) == [entry]
+        tracker._check_peer(shard, entry, create_snapshot({PEER_A: {"latestHandshake": now - 10}}, now + 21))
+        assert route_calls == [("add", "10.1.1.1/32"), ("del", "10.1.1.1/32")]
+
+    async def test_route_aggregation(self, tracker, route_calls, monkeypatch):
+        monkeypatch.setattr(tracker._config, "route_aggregation", True)
+        now = int(time.time())
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, ["10.1.0.0/25", "10.1.1.1/32"]), (PEER_B, ["10.1.0.128/25", "10.1.1.1/32"])], now=now)
+        tracker._shards = {"wgvpn16": shard}
+        tracker._invalidated = set()
+        shard.loaded_at = now
+
+        # the routes of both peers are collapsed
+        snapshot = create_snapshot({PEER_A: {"latestHandshake": now}, PEER_B: {"latestHandshake": now}}, now)
+        assert await tracker.run(snapshot) == 2
+        assert route_calls == [("add", "10.1.0.0/24"), ("add", "10.1.1.1/32")]
+        assert shard.installed_routes == {"10.1.0.0/24", "10.1.1.1/32"}
+
+        # the duplicate route of the inactive peer is kept for the active peer
+        route_calls.clear()
+        shard.peers[PEER_B].active = False
+        shard.routes_changed = True
+        tracker._apply_aggregated_routes(shard)
+        assert route_calls == [("add", "10.1.0.0/25"), ("del", "10.1.0.0/24")]
+        assert shard.installed_routes == {"10.1.0.0/25", "10.1.1.1/32"}
+
+    async def test_reset_state(self, tracker, route_calls, monkeypatch):
+        monkeypatch.setattr(tracker._config, "route_aggregation", True)
+        now = int(time.time())
+        shard = app.peer_tracking.InterfaceTrackingShard("wgvpn16")
+        shard.load([(PEER_A, ["10.1.1.1/32"]), (PEER_B, ["10.1.1.2/32"])], now=now)
+        tracker._shards = {"wgvpn16": shard}
+        tracker._invalidated = set()
+        shard.loaded_at = now
+
+        snapshot = create_snapshot({PEER_A: {"latestHandshake": now}}, now)
+        await tracker.run(snapshot)
+        assert route_calls == [("add", "10.1.1.1/32")]
+
+        # the routes of the active peers are applied again after the interface was recreated
+        route_calls.clear()
+        tracker.invalidate("wgvpn16", reset_state=True)
+        assert shard.installed_routes == set()
+        assert shard.peers[PEER_A].active is None
+        tracker._invalidated = set()
+        assert await tracker.run(create_snapshot({PEER_A: {"latestHandshake": now}}, now + 1)) == 2
+        assert route_calls == [("add", "10.1.1.1/32")]
+        assert shard.installed_routes == {"10.1.1.1/32"}
+
+    def test_invalidate(self, tracker):
+        assert tracker._invalidated is None
+        tracker._invalidated = set()
+        tracker.invalidate("wgvpn16")
+        assert tracker._invalidated == {"wgvpn16"}
+        tracker.invalidate()
+        assert tracker._invalidated is None
+        tracker.invalidate("wgvpn17")
+        assert tracker._invalidated is None
+
+
+def test_aggregate_routes():
+    routes = ["10.1.0.0/25", "10.1.0.128/25", "10.1.0.5/32", "10.1.1.1/24", "FD00::/65", "fd00:0:0:0:8000::/65", "10.1.1.0/24"]
+    assert app.peer_tracking.aggregate_routes(routes) == ["10.1.0.0/23", "fd00::/64"]
@@ -0,0 +1,212 @@
+"""
+test app.reconciler module
+"""
+# pylint: disable=missing-function-docstring
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.fast_api
+import app.jobs
+import app.reconciler
+import models
+import utils.config
+import utils.coordination
+import utils.os_func
+
+
+@pytest.fixture(scope="function")
+def leader_election(monkeypatch, tmp_path):
+    """enable the leader election with a separate coordination file"""
+    config_util = utils.config.ConfigUtil()
+    election = utils.coordination.LeaderElection()
+    monkeypatch.setattr(config_util, "leader_election", True)
+    monkeypatch.setattr(config_util, "coordination_file", str(tmp_path / "coordination.sqlite3"))
+    monkeypatch.setattr(election, "_store", None)
+    monkeypatch.setattr(election, "_is_leader", False)
+    monkeypatch.setattr(election, "candidate", True)
+    yield election
+    election.store.close()
+
+
+@pytest.fixture(scope="function")
+def subprocess_calls(monkeypatch):
+    """record the commands instead of executing them"""
+    calls = []
+
+    def run_subprocess(command: str, **kwargs):
+        calls.append(command)
+        if command == "wg-json":
+            return "{}", "", True
+
+        return "", "", True
+
+    monkeypatch.setattr(utils.os_func, "run_subprocess", run_subprocess)
+    yield calls
+
+
+async def pending_events():
+    return sorted(await models.ReconcileEventModel.filter(status=models.ReconcileEventStatusEnum.PENDING).values_list("kind", "name"))
+
+
+class TestReconciler:
+    """
+    Test the reconciliation of changes that are made by a follower
+    """
+    async def test_follower(self, test_client: TestClient, clean_db, leader_election, subprocess_calls):
+        await models.ReconcileEventModel.all().delete()
+        other_worker = utils.coordination.CoordinationStore(leader_election.store.path, worker_id="other-worker")
+        assert other_worker.try_acquire_lease(leader_election.lease_name, ttl=30) is True
+
+        # the worker is a follower, the changes are recorded for the leader
+        await app.fast_api.startup_app()
+        assert leader_election.is_leader is False
+        subprocess_calls.clear()
+
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32"
+        )
+        network_set = await models.NetworkSetModel.create(name="servers")
+        await network_set.replace_networks(["10.2.0.0/24"])
+        assert subprocess_calls == []
+        assert await pending_events() == [("interface", "wg1"), ("network_set", "servers"), ("network_set", "servers"), ("peers", "wg1")]
+
+        response = await test_client.post(f"/api/wg/interfaces/{wgintf.instance_id}/reconfigure")
+        assert response.status_code == 202, response.text
+        job_id = response.json()["instance_id"]
+        assert subprocess_calls == []
+
+        response = await test_client.get("/api/utils/reconciler")
+        assert response.status_code == 200, response.text
+        assert response.json()["leader"] == "other-worker"
+        assert response.json()["pending"] == 4
+
+        # the worker becomes the leader and reconciles the system, the pending events are part of it
+        other_worker.release_lease(leader_election.lease_name)
+        assert await app.reconciler.run_leader_tasks() is True
+        assert any(command.startswith("wg-quick up") for command in subprocess_calls)
+        assert any(command.startswith("ipset restore") for command in subprocess_calls)
+        assert await pending_events() == []
+
+        # the jobs of the followers are executed by the leader
+        await app.jobs.JobRunner().wait()
+        job = await models.ConfigJobModel.get(instance_id=job_id)
+        assert job.status == models.ConfigJobStatusEnum.DONE
+
+        # the events of the followers are applied once per interface or network set
+        subprocess_calls.clear()
+        assert await app.reconciler.Reconciler().apply_pending() == 0
+        await models.WgPeerModel.filter(wg_interface=wgintf).update(persistent_keepalives=25)
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.PEERS, "wg1")
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.PEERS, "wg1")
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET, "removed")
+        assert await app.reconciler.Reconciler().apply_pending() == 3
+        assert "ipset destroy removed" in subprocess_calls
+        assert len([command for command in subprocess_calls if command.startswith("wg syncconf wg1")]) == 1
+
+        response = await test_client.get("/api/utils/reconciler", params={"limit": 3})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["leader"] == leader_election.store.worker_id
+        assert data["pending"] == 0
+        assert [(event["kind"], event["name"], event["status"]) for event in data["events"]] == [
+            ("network_set", "removed", "done"), ("peers", "wg1", "done"), ("peers", "wg1", "done")
+        ]
+        assert data["events"][0]["duration"] is not None
+
+        # a renamed network set is renamed before the entries are applied
+        subprocess_calls.clear()
+        await models.NetworkSetModel.filter(instance_id=network_set.instance_id).update(name="renamed")
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET, "renamed")
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET_RENAME, "servers renamed")
+        assert await app.reconciler.Reconciler().apply_pending() == 2
+        assert subprocess_calls[0] == "ipset rename servers renamed"
+        assert not [command for command in subprocess_calls if command.startswith("ipset destroy")]
+
+        # the leader releases the lease on shutdown
+        await app.fast_api.shutdown_app()
+        assert leader_election.store.lease_owner(leader_election.lease_name) is None
+        await app.fast_api.startup_app()
+
+    async def test_failed_event(self, test_client: TestClient, clean_db, leader_election, subprocess_calls, monkeypatch):
+        await models.ReconcileEventModel.all().delete()
+        await leader_election.renew()
+
+        async def destroy_set(name):
+            raise RuntimeError("ipset not available")
+
+        monkeypatch.setattr(app.ipset_adapter.IpsetAdapter(), "destroy_set", destroy_set)
+        event = await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET, "removed")
+        assert await app.reconciler.Reconciler().apply_pending() == 1
+
+        await event.refresh_from_db()
+        assert event.status == models.ReconcileEventStatusEnum.FAILED
+        assert event.error == "ipset not available"
+
+    async def test_lease_lost(self, test_client: TestClient, clean_db, leader_election, subprocess_calls, monkeypatch):
+        await models.ReconcileEventModel.all().delete()
+        await leader_election.renew()
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET, "removed")
+
+        # another worker took over while the leader was busy (e.g. a long reconcile run)
+        leader_election.store.release_lease(leader_election.lease_name)
+        other_worker = utils.coordination.CoordinationStore(leader_election.store.path, worker_id="other-worker")
+        assert other_worker.try_acquire_lease(leader_election.lease_name, ttl=30) is True
+        monkeypatch.setattr(leader_election, "_renewed_at", 0.0)
+
+        # the lease is renewed before the next step, the worker stops changing the system
+        assert await app.reconciler.Reconciler().apply_pending() == 0
+        assert leader_election.is_leader is False
+        assert subprocess_calls == []
+        assert await pending_events() == [("network_set", "removed")]
+
+    async def test_concurrent_leader_tasks(self, test_client: TestClient, clean_db, leader_election, subprocess_calls, monkeypatch):
+        await models.ReconcileEventModel.all().delete()
+        await leader_election.renew()
+        calls = []
+
+        async def destroy_set(name):
+            calls.append(name)
+            await asyncio.sleep(0.01)
+            return True
+
+        monkeypatch.setattr(app.ipset_adapter.IpsetAdapter(), "destroy_set", destroy_set)
+        await models.ReconcileEventModel.enqueue(models.ReconcileEventKindEnum.NETWORK_SET, "removed")
+
+        # e.g. the regular peer tracking run and the main loop of the reconciler, the events are applied once
+        assert await asyncio.gather(app.reconciler.run_leader_tasks(), app.reconciler.run_leader_tasks()) == [True, True]
+        assert calls == ["removed"]
+        assert await pending_events() == []
+
+    async def test_external_mode(self, test_client: TestClient, clean_db, leader_election, subprocess_calls, monkeypatch):
+        monkeypatch.setattr(utils.config.ConfigUtil(), "leader_election", False)
+        monkeypatch.setattr(utils.config.ConfigUtil(), "reconciler_mode", "external")
+        monkeypatch.setattr(leader_election, "candidate", False)
+        await models.ReconcileEventModel.all().delete()
+
+        # the API worker never changes the system
+        assert await app.reconciler.run_leader_tasks() is False
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        assert await pending_events() == [("interface", "wg1")]
+        assert not [command for command in subprocess_calls if command != "wg-json"]
+
+        # a single run of the reconciler process
+        stop_event = asyncio.Event()
+        stop_event.set()
+        await app.reconciler.Reconciler().run(stop_event)
+        assert any(command.startswith("wg-quick up") for command in subprocess_calls)
+        assert await pending_events() == []
+        assert leader_election.store.lease_owner(leader_election.lease_name) is None
+        await wgintf.delete()
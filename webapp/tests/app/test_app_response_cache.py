@@ -0,0 +1,82 @@
+"""
+test app.response_cache module
+"""
+# pylint: disable=missing-function-docstring
+import pytest
+from fastapi.testclient import TestClient
+
+import app.response_cache
+import models
+
+
+@pytest.fixture(scope="function")
+def cache():
+    """create a new response cache with a budget of 100 bytes"""
+    instance = app.response_cache.ResponseCache.__new__(app.response_cache.ResponseCache)
+    instance.__init__()
+    instance.max_bytes = 100
+    yield instance
+
+
+def test_lookup(cache):
+    assert cache.get("/a", "e1") is None
+    cache.put("/a", "e1", b"[1]")
+    assert cache.get("/a", "e1") == b"[1]"
+    assert cache.hits == 1 and cache.misses == 1
+    assert cache.hit_ratio == 0.5
+    assert cache.size == len("/a") + len("e1") + len(b"[1]")
+
+    # an entry of an outdated ETag is dropped
+    assert cache.get("/a", "e2") is None
+    assert cache.invalidations == 1
+    assert cache.size == 0
+
+
+def test_eviction(cache):
+    cache.put("/a", "e", b"a" * 40)
+    cache.put("/b", "e", b"b" * 40)
+    # the least recently used entry is evicted
+    assert cache.get("/a", "e") is not None
+    cache.put("/c", "e", b"c" * 40)
+    assert cache.evictions == 1
+    assert cache.get("/b", "e") is None
+    assert cache.get("/a", "e") is not None
+    assert cache.size <= cache.max_bytes
+
+    # a response that exceeds the budget isn't cached
+    cache.put("/d", "e", b"d" * 200)
+    assert cache.get("/d", "e") is None
+    assert cache.to_dict()["entries"] == 2
+    assert "wgce_response_cache_entries 2" in cache.to_openmetrics()
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestResponseCacheApi:
+    """
+    Test the response cache of the list endpoints
+    """
+    async def test_list_endpoint(self, test_client: TestClient, clean_db):
+        cache = app.response_cache.ResponseCache()
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        await models.Ipv4NatRuleModel.create(policy_rule_list=prl, target_interface="eth0")
+
+        response = await test_client.get("/api/rules/nat/ipv4")
+        assert response.status_code == 200, response.text
+        hits = cache.hits
+        cached = await test_client.get("/api/rules/nat/ipv4")
+        assert cached.status_code == 200, cached.text
+        assert cached.content == response.content
+        assert cached.headers["etag"] == response.headers["etag"]
+        assert cache.hits == hits + 1
+
+        # the model signals invalidate the cached response
+        await models.Ipv4NatRuleModel.create(policy_rule_list=prl, target_interface="eth1")
+        response = await test_client.get("/api/rules/nat/ipv4")
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 2
+        assert cache.hits == hits + 1
+
+        response = await test_client.get("/api/utils/response_cache")
+        assert response.status_code == 200, response.text
+        assert response.json()["hits"] == cache.hits
+        assert response.json()["size"] > 0
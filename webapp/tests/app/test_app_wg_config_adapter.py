@@ -9,6 +9,8 @@ from fastapi.testclient import TestClient
 
 import app.wg_config_adapter
 import models
+import utils.config
+import utils.instrumentation
 import utils.os_func
 
 
@@ -281,11 +283,24 @@ PresharedKey = SscYJqiFCncZVzYAiW6X7DUeE8TiGHS0MULu6pUMiYc=
 """
         assert obj.get_config() == expected_configuration
 
-        peer_b = await models.WgPeerModel.create(
-            wg_interface=instance,
-            public_key="aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=",
-            cidr_routes="10.1.1.4/32"
-        )
+        instrumentation = utils.instrumentation.InstrumentationUtil()
+        old_state = instrumentation.enabled
+        instrumentation.enabled = True
+        instrumentation.reset()
+        try:
+            peer_b = await models.WgPeerModel.create(
+                wg_interface=instance,
+                public_key="aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=",
+                cidr_routes="10.1.1.4/32"
+            )
+
+            # the peer rebuild is timed under its own name
+            operations = [entry["operation"] for entry in instrumentation.to_dict()["operations"]]
+            assert "wg_adapter.rebuild_peer_config" in operations
+
+        finally:
+            instrumentation.enabled = old_state
+            instrumentation.reset()
 
         # rebuild peer configuration is called as part of the peer signal after creation
         #await obj.rebuild_peer_config()
@@ -327,13 +342,6 @@ AllowedIPs = 10.1.1.4/32
 
             return "", "", True
 
-        def mock_command_failed_wg_strip(command: str, **kwargs):
-            if command == "wg-json":
-                return json.dumps(data, indent=4), "", True
-
-            elif command.startswith("wg-quick strip"):
-                return "", "", False
-
         def mock_command_failed_wg_syncconf(command: str, **kwargs):
             if command == "wg-json":
                 return json.dumps(data, indent=4), "", True
@@ -358,11 +366,14 @@ AllowedIPs = 10.1.1.4/32
             )
             obj = app.wg_config_adapter.WgConfigAdapter(wg_interface=instance)
             await obj.init_config()
+            obj.discard_applied_state()
             assert await obj.apply_config() is True
 
-            m.setattr(utils.os_func, "run_subprocess", mock_command_failed_wg_strip)
-            assert await obj.apply_config() is False
+            # the configuration is unchanged, no subprocess is executed
+            m.setattr(utils.os_func, "run_subprocess", mock_command_exception)
+            assert await obj.apply_config() is True
 
+            obj.discard_applied_state()
             m.setattr(utils.os_func, "run_subprocess", mock_command_failed_wg_syncconf)
             assert await obj.apply_config() is False
 
@@ -411,3 +422,84 @@ AllowedIPs = 10.1.1.3/32
         await obj.delete_config()
 
         assert obj.get_config() == ""
+
+    async def test_write_config_unchanged(self, test_client: TestClient, clean_db, monkeypatch):
+        """test that an unchanged configuration is neither written nor applied
+        """
+        calls = []
+
+        def mock_command(command: str, **kwargs):
+            calls.append(command)
+            return "{}" if command == "wg-json" else "", "", True
+
+        monkeypatch.setattr(utils.os_func, "run_subprocess", mock_command)
+        instance = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgPeerModel.create(
+            wg_interface=instance,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32"
+        )
+        obj = app.wg_config_adapter.WgConfigAdapter(wg_interface=instance)
+        config_path = os.path.join(utils.config.ConfigUtil().wg_config_dir, "wg1.conf")
+        mtime = os.stat(config_path).st_mtime_ns
+        calls.clear()
+
+        await obj.init_config()
+        assert await obj.rebuild_peer_config() is True
+        assert await obj.apply_config() is True
+        assert calls == []
+        assert os.stat(config_path).st_mtime_ns == mtime
+
+        # a changed configuration replaces the file without leftovers
+        await models.WgPeerModel.filter(wg_interface=instance).update(persistent_keepalives=25)
+        await obj.init_config()
+        assert await obj.rebuild_peer_config() is True
+        assert "PersistentKeepalive = 25" in obj.get_config()
+        assert oct(os.stat(config_path).st_mode & 0o777) == oct(0o640)
+        assert not [name for name in os.listdir(os.path.dirname(config_path)) if name.endswith(".tmp")]
+
+        assert await obj.apply_config() is True
+        assert any(command.startswith("wg syncconf wg1") for command in calls)
+
+    async def test_strip_config(self, test_client: TestClient, clean_db, monkeypatch):
+        """test that the stripped configuration is passed to wg syncconf through the standard input
+        """
+        calls = []
+
+        def mock_command(command: str, input_data=None, **kwargs):
+            calls.append((command, input_data))
+            return "{}" if command == "wg-json" else "", "", True
+
+        monkeypatch.setattr(utils.os_func, "run_subprocess", mock_command)
+        instance = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgPeerModel.create(
+            wg_interface=instance,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32",
+            persistent_keepalives=25
+        )
+
+        # a new adapter reads the configuration from disk
+        obj = app.wg_config_adapter.WgConfigAdapter(wg_interface=instance)
+        obj.discard_applied_state()
+        calls.clear()
+        assert await obj.apply_config() is True
+        assert [command for command, _ in calls if command.startswith("wg ")] == ["wg syncconf wg1 /dev/stdin"]
+        assert [input_data for command, input_data in calls if command.startswith("wg ")][0] == """\
+[Interface]
+PrivateKey = cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=
+ListenPort = 51820
+[Peer]
+PublicKey = 6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=
+AllowedIPs = 10.1.1.3/32
+PersistentKeepalive = 25
+"""
+        assert not [command for command, _ in calls if command.startswith("wg-quick strip")]
@@ -0,0 +1,146 @@
+"""
+test network set models
+"""
+# pylint: disable=unused-argument
+import pytest
+from fastapi.testclient import TestClient
+from tortoise.exceptions import IntegrityError, ValidationError
+
+import app.ipset_adapter
+import app.wg_config_adapter
+import models
+import utils.os_func
+
+
+@pytest.fixture
+def applied_sets(monkeypatch):
+    """record the network sets that are applied to the system"""
+    result = list()
+
+    async def apply_set(self, name, family, networks):
+        result.append((name, family, sorted(networks)))
+        return True
+
+    monkeypatch.setattr(app.ipset_adapter.IpsetAdapter, "apply_set", apply_set)
+    return result
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestNetworkSetModel:
+    """
+    Test NetworkSetModel model
+    """
+    async def test_entries(self, test_client: TestClient, clean_db, applied_sets):
+        """test that the ipset is updated if the entries are changed
+        """
+        network_set = await models.NetworkSetModel.create(name="blocked")
+        assert applied_sets[-1] == ("blocked", "inet", [])
+
+        entry = await models.NetworkSetEntryModel.create(network_set=network_set, network="10.0.0.0/24")
+        await models.NetworkSetEntryModel.create(network_set=network_set, network="10.0.1.0/24")
+        assert applied_sets[-1] == ("blocked", "inet", ["10.0.0.0/24", "10.0.1.0/24"])
+
+        await entry.delete()
+        assert applied_sets[-1] == ("blocked", "inet", ["10.0.1.0/24"])
+
+        with pytest.raises(ValidationError):
+            await models.NetworkSetEntryModel.create(network_set=network_set, network="2001:db8::/64")
+
+        with pytest.raises(ValidationError):
+            await models.NetworkSetEntryModel.create(network_set=network_set, network="10.0.0.1/24")
+
+    async def test_replace_networks(self, test_client: TestClient, clean_db, applied_sets):
+        """test that all entries are replaced and the set is applied once
+        """
+        network_set = await models.NetworkSetModel.create(name="ipv6_set", family=models.NetworkSetFamilyEnum.INET6)
+        await models.NetworkSetEntryModel.create(network_set=network_set, network="2001:db8::/64")
+        applied_sets.clear()
+
+        networks = await network_set.replace_networks(["2001:db8:0:1::/64", "2001:db8:0:2::/64", "2001:db8:0:1::/64"])
+        assert networks == ["2001:db8:0:1::/64", "2001:db8:0:2::/64"]
+        assert applied_sets == [("ipv6_set", "inet6", ["2001:db8:0:1::/64", "2001:db8:0:2::/64"])]
+        assert sorted(await network_set.get_networks()) == ["2001:db8:0:1::/64", "2001:db8:0:2::/64"]
+
+        # invalid networks don't change the set
+        with pytest.raises(ValidationError):
+            await network_set.replace_networks(["10.0.0.0/24"])
+
+        assert len(await network_set.get_networks()) == 2
+
+    async def test_family_is_read_only(self, test_client: TestClient, clean_db, applied_sets):
+        """test that the family of an existing set can't be changed
+        """
+        network_set = await models.NetworkSetModel.create(name="blocked")
+        network_set.family = models.NetworkSetFamilyEnum.INET6
+        with pytest.raises(ValidationError):
+            await network_set.save()
+
+    async def test_filter_rule_with_network_set(self, test_client: TestClient, clean_db, applied_sets):
+        """test filter rules that use a network set
+        """
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        network_set = await models.NetworkSetModel.create(name="blocked")
+        rule = await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network_set=network_set)
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, dst_network_set=network_set, except_dst=True, action=models.IpTableActionEnum.ACCEPT)
+
+        # the ID is used if the network set isn't fetched
+        rule = await models.Ipv4FilterRuleModel.get(pk=rule.pk)
+        assert f"--match-set {network_set.instance_id} src" in str(rule)
+        with pytest.raises(ValueError):
+            rule.to_iptables_rule()
+
+        expected_rules = [
+            "iptables --append FORWARD --in-interface %i --match set --match-set blocked src --jump DROP",
+            "iptables --append FORWARD --in-interface %i --match set ! --match-set blocked dst --jump ACCEPT",
+        ]
+        assert (await prl.compile()).ipv4_add == expected_rules
+        ipv4_rules = await prl.to_ipv4_iptables_list()
+        assert "--match set --match-set blocked src" in ipv4_rules[0]
+        assert "--match set ! --match-set blocked dst" in ipv4_rules[1]
+
+        # the compiled policy is invalidated if the network set is renamed
+        network_set.name = "renamed"
+        await network_set.save()
+        assert (await prl.compile()).ipv4_add == [rule.replace("blocked", "renamed") for rule in expected_rules]
+
+        # the family of the network set must match the rule
+        with pytest.raises(ValidationError):
+            await models.Ipv6FilterRuleModel.create(policy_rule_list=prl, src_network_set=network_set)
+
+        # the network set can't be deleted while it's used
+        with pytest.raises(IntegrityError):
+            await network_set.delete()
+
+    async def test_rename(self, test_client: TestClient, clean_db, applied_sets, monkeypatch):
+        """test that the ipset of a renamed network set is renamed instead of destroyed (it's used by the active rules)
+        """
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        network_set = await models.NetworkSetModel.create(name="blocked")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network_set=network_set)
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=",
+            policy_rule_list=prl
+        )
+        adapter = app.wg_config_adapter.WgConfigAdapter(wg_interface=wgintf)
+        assert "--match-set blocked src" in adapter.get_config()
+
+        commands = list()
+
+        def run_subprocess(command: str, **kwargs):
+            commands.append(command)
+            return "", "", True
+
+        monkeypatch.setattr(utils.os_func, "run_subprocess", run_subprocess)
+        network_set.name = "renamed"
+        await network_set.save()
+
+        assert "ipset rename blocked renamed" in commands
+        assert not [command for command in commands if command.startswith("ipset destroy")]
+        assert applied_sets[-1] == ("renamed", "inet", [])
+
+        # the PostDown commands of the interface must remove the rules with the new name
+        config = adapter.get_config()
+        assert "--match-set renamed src" in config
+        assert "blocked" not in config
@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from tortoise.exceptions import ValidationError
 
 import models
+import utils.config
 
 
 @pytest.mark.usefixtures("disable_os_level_commands")
@@ -73,3 +74,44 @@ class TestWgPeerModel:
                 public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
                 cidr_routes=""
             )
+
+    async def test_route_overlaps(self, test_client: TestClient, clean_db, monkeypatch):
+        """test the detection of routes that are used by multiple peers of an interface
+        """
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        peer = await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32, 172.16.0.0/16"
+        )
+        route_index = await models.WgPeerModel.get_route_index(wgintf.instance_id)
+        assert route_index.lookup("172.16.1.1") == ("172.16.0.0/16", [str(peer.instance_id)])
+
+        # nested networks are valid, the most specific network is used
+        monkeypatch.setattr(utils.config.ConfigUtil(), "peer_overlap_policy", "reject")
+        other_peer = await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=",
+            cidr_routes="10.1.1.4/32, 172.16.1.0/24"
+        )
+        assert route_index.lookup("172.16.1.1") == ("172.16.1.0/24", [str(other_peer.instance_id)])
+        assert route_index.lookup("172.16.2.1") == ("172.16.0.0/16", [str(peer.instance_id)])
+
+        # the same network on multiple peers is rejected
+        other_peer.cidr_routes = "10.1.1.4/32, 10.1.1.3/32"
+        with pytest.raises(ValidationError):
+            await other_peer.save()
+
+        # and accepted with a warning by default
+        monkeypatch.setattr(utils.config.ConfigUtil(), "peer_overlap_policy", "warn")
+        await other_peer.save()
+        assert route_index.lookup("10.1.1.3") == ("10.1.1.3/32", sorted([str(peer.instance_id), str(other_peer.instance_id)]))
+        assert route_index.lookup("172.16.1.1") == ("172.16.0.0/16", [str(peer.instance_id)])
+
+        await peer.delete()
+        assert route_index.lookup("10.1.1.3") == ("10.1.1.3/32", [str(other_peer.instance_id)])
+        assert route_index.lookup("172.16.1.1") == (None, [])
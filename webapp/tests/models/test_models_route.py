@@ -0,0 +1,64 @@
+"""
+test models.route module
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+import models.route
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestCidrPrefixModels:
+    """
+    Test WgPeerRouteModel and WgInterfaceAddressModel models
+    """
+    async def test_prefixes_follow_cidr_lists(self, test_client: TestClient, clean_db):
+        """test that the prefix tables are updated with the CIDR lists
+        """
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24, FD00::1/64",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        peer = await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32, 172.16.0.0/16"
+        )
+
+        addresses = await models.WgInterfaceAddressModel.filter(wg_interface=wgintf).order_by("position")
+        assert [(x.cidr, x.family, x.prefixlen) for x in addresses] == [("10.1.1.1/24", 4, 24), ("FD00::1/64", 6, 64)]
+        assert addresses[0].network == "0000000000000000000000000a010100"
+        assert addresses[1].last_address == "fd00000000000000ffffffffffffffff"
+
+        routes = await models.WgPeerRouteModel.filter(peer=peer).order_by("position").values_list("cidr", flat=True)
+        assert routes == ["10.1.1.3/32", "172.16.0.0/16"]
+
+        peer.cidr_routes = "172.16.0.0/16, 2001:db8::/64"
+        await peer.save()
+        routes = await models.WgPeerRouteModel.filter(peer=peer).order_by("position").values_list("cidr", flat=True)
+        assert routes == ["172.16.0.0/16", "2001:db8::/64"]
+
+        await peer.delete()
+        assert await models.WgPeerRouteModel.all().count() == 0
+
+    async def test_sync_prefix_tables(self, test_client: TestClient, clean_db):
+        """test that missing prefixes are created from the CIDR lists (e.g. after an upgrade)
+        """
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        peer = await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32"
+        )
+        await models.WgPeerRouteModel.all().delete()
+        await models.WgInterfaceAddressModel.all().delete()
+
+        await models.route.sync_prefix_tables()
+        assert await models.WgPeerRouteModel.filter(peer=peer).values_list("cidr", flat=True) == ["10.1.1.3/32"]
+        assert await models.WgInterfaceAddressModel.filter(wg_interface=wgintf).values_list("cidr", flat=True) == ["10.1.1.1/24"]
@@ -7,6 +7,7 @@ from fastapi.testclient import TestClient
 from tortoise.exceptions import ValidationError
 
 import models
+import utils.config
 
 
 @pytest.mark.usefixtures("disable_os_level_commands")
@@ -342,3 +343,53 @@ class TestPolicyRuleListModel:
 
         result = await prl.to_ipv6_iptables_list(intf_name="%i", drop_rule=True)
         assert expected_drop_result_ipv6 == result
+
+    async def test_compile(self, test_client: TestClient, clean_db):
+        """test compiled policy cache
+        """
+        prl = await models.PolicyRuleListModel.create(name="test_policy")
+        other_prl = await models.PolicyRuleListModel.create(name="other_policy")
+        nat_rule = await models.Ipv4NatRuleModel.create(policy_rule_list=prl, target_interface="eth1")
+        await models.Ipv6NatRuleModel.create(policy_rule_list=prl, target_interface="eth8")
+
+        compiled_policy = await prl.compile()
+        assert compiled_policy.ipv4_add == ["iptables --append POSTROUTING --table nat --out-interface eth1 --jump MASQUERADE"]
+        assert compiled_policy.ipv4_delete == ["iptables --delete POSTROUTING --table nat --out-interface eth1 --jump MASQUERADE"]
+        assert compiled_policy.ipv6_add == ["ip6tables --append POSTROUTING --table nat --out-interface eth8 --jump MASQUERADE"]
+        assert compiled_policy.ipv6_delete == ["ip6tables --delete POSTROUTING --table nat --out-interface eth8 --jump MASQUERADE"]
+
+        # unchanged policy is not compiled again, also if loaded by another instance
+        same_prl = await models.PolicyRuleListModel.get(instance_id=prl.instance_id)
+        assert await same_prl.compile() is compiled_policy
+
+        # changes to the rules of other policies don't invalidate the compiled policy
+        await models.Ipv4NatRuleModel.create(policy_rule_list=other_prl, target_interface="eth2")
+        assert await prl.compile() is compiled_policy
+
+        # rule changed
+        nat_rule.target_interface = "eth3"
+        await nat_rule.save()
+        compiled_policy = await prl.compile()
+        assert compiled_policy.ipv4_add == ["iptables --append POSTROUTING --table nat --out-interface eth3 --jump MASQUERADE"]
+
+        # rule moved to another policy
+        nat_rule.policy_rule_list = other_prl
+        await nat_rule.save()
+        assert (await prl.compile()).ipv4_add == []
+        assert len((await other_prl.compile()).ipv4_add) == 2
+
+        # rule deleted
+        await nat_rule.delete()
+        assert len((await other_prl.compile()).ipv4_add) == 1
+
+    async def test_compile_with_policy_optimizer(self, test_client: TestClient, clean_db, monkeypatch):
+        """test compiled policy with enabled policy optimizer
+        """
+        monkeypatch.setattr(utils.config.ConfigUtil(), "policy_optimizer", True)
+        prl = await models.PolicyRuleListModel.create(name="test_policy")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.0.0/24")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.1.0/24")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.1.128/25")
+
+        compiled_policy = await prl.compile()
+        assert compiled_policy.ipv4_add == ["iptables --append FORWARD --in-interface %i --source 10.0.0.0/23 --jump DROP"]
@@ -7,6 +7,8 @@ from fastapi.testclient import TestClient
 from tortoise.exceptions import ValidationError, IntegrityError
 
 import models
+import models.wg_interface
+import utils.wireguard
 
 
 @pytest.mark.usefixtures("disable_os_level_commands")
@@ -26,6 +28,7 @@ class TestWgInterfaceModel():
         assert obj.description == ""
         assert obj.private_key is not None, "a random key is generated"
         assert obj.table == models.WgInterfaceTableEnum.AUTO
+        assert obj.peer_inactivity_timeout == 120
 
         with pytest.raises(ValidationError):
             await models.WgInterfaceModel.create(
@@ -144,3 +147,26 @@ class TestWgInterfaceModel():
             )
 
         assert ex.match("intf_name: Value '{}' does not match regex".format(test_value))
+
+    async def test_load_inactivity_timeouts(self, test_client: TestClient, clean_db):
+        """test that the inactivity timeouts are loaded from the database (the peer tracking runs only within the leader)"""
+        wg_si_adapter = utils.wireguard.WgSystemInfoAdapter()
+        obj = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=",
+            peer_inactivity_timeout=30
+        )
+        await models.wg_interface.load_inactivity_timeouts()
+        assert wg_si_adapter.get_inactivity_timeout("wg1") == 30
+        assert wg_si_adapter.get_inactivity_timeout("wg2") == utils.wireguard.DEFAULT_PEER_INACTIVITY_TIMEOUT
+
+        # the timeouts are loaded again if an interface is changed
+        obj.peer_inactivity_timeout = 60
+        await obj.save()
+        await models.wg_interface.load_inactivity_timeouts()
+        assert wg_si_adapter.get_inactivity_timeout("wg1") == 60
+
+        await obj.delete()
+        await models.wg_interface.load_inactivity_timeouts()
+        assert wg_si_adapter.get_inactivity_timeout("wg1") == utils.wireguard.DEFAULT_PEER_INACTIVITY_TIMEOUT
@@ -0,0 +1,89 @@
+"""
+test conditional GET requests (ETag and If-None-Match)
+"""
+# pylint: disable=missing-function-docstring
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+import routers.conditional
+import schemas
+import utils.revision
+
+
+def test_schema_resource_types():
+    assert routers.conditional.schema_resource_types(schemas.NetworkSetSchema) == {"network_sets"}
+    assert routers.conditional.schema_resource_types(List[schemas.Ipv4FilterRuleSchema]) == {"rules"}
+    assert routers.conditional.schema_resource_types(schemas.WgInterfaceSchema) == {"interfaces", "peers", "rules"}
+    assert routers.conditional.schema_resource_types(routers.conditional.NotModifiedException) == frozenset()
+
+
+def test_etag_matches():
+    etag = 'W/"abc"'
+    assert routers.conditional.etag_matches('W/"abc"', etag)
+    assert routers.conditional.etag_matches('"xyz", "abc"', etag)
+    assert routers.conditional.etag_matches("*", etag)
+    assert not routers.conditional.etag_matches('W/"xyz"', etag)
+    assert not routers.conditional.etag_matches(None, etag)
+
+
+def test_deleted_resource_types():
+    # the peers, routes, addresses and jobs of an interface are removed by the database
+    assert models.resources.deleted_resource_types(models.WgInterfaceModel) == {"interfaces", "peers", "jobs"}
+    assert models.resources.deleted_resource_types(models.NetworkSetEntryModel) == {"network_sets"}
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestConditionalGet:
+    """
+    Test the ETags of the list and detail endpoints
+    """
+    async def test_list_endpoint(self, test_client: TestClient, clean_db):
+        prl = await models.PolicyRuleListModel.create(name="foo")
+
+        response = await test_client.get("/api/rules/filters/ipv4")
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+        assert etag.startswith('W/"')
+
+        response = await test_client.get("/api/rules/filters/ipv4", headers={"If-None-Match": etag})
+        assert response.status_code == 304, response.text
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        # changes of other resource types don't change the ETag
+        await models.NetworkSetModel.create(name="blocked")
+        response = await test_client.get("/api/rules/filters/ipv4", headers={"If-None-Match": etag})
+        assert response.status_code == 304, response.text
+
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="192.168.1.0/24")
+        response = await test_client.get("/api/rules/filters/ipv4", headers={"If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+        assert response.headers["etag"] != etag
+
+    async def test_detail_endpoint(self, test_client: TestClient, clean_db):
+        network_set = await models.NetworkSetModel.create(name="blocked")
+        url = f"/api/network_sets/{network_set.instance_id}/entries"
+
+        response = await test_client.get(url)
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+
+        # bulk operations bump the revision explicitly
+        await network_set.replace_networks(["10.0.0.0/24"])
+        response = await test_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.json()[0]["network"] == "10.0.0.0/24"
+
+        # not found responses don't have an ETag
+        response = await test_client.get("/api/network_sets/00000000-0000-0000-0000-000000000000")
+        assert response.status_code == 404, response.text
+        assert "etag" not in response.headers
+
+    async def test_authentication(self, base_test_client: TestClient, clean_db):
+        etag = utils.revision.RevisionRegistry().etag({"network_sets"})
+        response = await base_test_client.get("/api/network_sets/", headers={"If-None-Match": etag})
+        assert response.status_code == 401, response.text
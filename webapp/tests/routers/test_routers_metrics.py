@@ -0,0 +1,105 @@
+"""
+test metrics API endpoint
+"""
+# pylint: disable=missing-function-docstring
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import utils.os_func
+import utils.wireguard
+
+
+class MockWgJsonCommand:
+    """mock for wg-json that counts the calls"""
+    def __init__(self):
+        self.calls = 0
+        self.now = int(time.time())
+
+    def __call__(self, command: str, **kwargs):
+        self.calls += 1
+        data = {
+            "wgvpn16": {
+                "privateKey": "4PSSsNFfYpqzJ3thGCeHd8pZWkZVdoJbm2G7oiA6TmQ=",
+                "publicKey": "yx0owjK+RWUD3ccSDBus7PA/B+WuVhSYUmEO9XAil0k=",
+                "listenPort": 51820,
+                "peers": {
+                    "s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs=": {
+                        "endpoint": "172.29.0.1:62818",
+                        "latestHandshake": self.now,
+                        "transferRx": 82224,
+                        "transferTx": 1680,
+                        "allowedIps": ["172.29.1.16/32"]
+                    },
+                    "6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=": {
+                        "latestHandshake": self.now - 600,
+                        "transferRx": 100,
+                        "transferTx": 200,
+                        "allowedIps": ["172.29.1.17/32"]
+                    },
+                    "aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=": {
+                        "allowedIps": ["172.29.1.18/32"]
+                    }
+                }
+            }
+        }
+        return json.dumps(data), "", True
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestMetricsEndpoint:
+    """
+    Test OpenMetrics endpoint
+    """
+    api_endpoint = "/metrics"
+
+    async def test_metrics(self, test_client: TestClient, monkeypatch):
+        """test content of the metrics endpoint"""
+        mock = MockWgJsonCommand()
+        with monkeypatch.context() as m:
+            m.setattr(utils.os_func, "run_subprocess", mock)
+            await utils.wireguard.WgSystemInfoAdapter().refresh_snapshot()
+
+            response = await test_client.get(self.api_endpoint)
+            assert response.status_code == 200, response.text
+            assert response.headers["content-type"].startswith("application/openmetrics-text")
+
+        lines = response.text.splitlines()
+        active_labels = '{interface="wgvpn16",public_key="s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs="}'
+        inactive_labels = '{interface="wgvpn16",public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E="}'
+        unknown_labels = '{interface="wgvpn16",public_key="aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8="}'
+
+        assert 'wireguard_interface_listen_port{interface="wgvpn16"} 51820' in lines
+        assert 'wireguard_interface_peers{interface="wgvpn16"} 3' in lines
+        assert 'wireguard_interface_active_peers{interface="wgvpn16"} 1' in lines
+        assert 'wireguard_interface_receive_bytes_total{interface="wgvpn16"} 82324' in lines
+        assert f"wireguard_peer_receive_bytes_total{active_labels} 82224" in lines
+        assert f"wireguard_peer_transmit_bytes_total{active_labels} 1680" in lines
+        assert f"wireguard_peer_active{active_labels} 1" in lines
+        assert f"wireguard_peer_active{inactive_labels} 0" in lines
+        assert f"wireguard_peer_active{unknown_labels} 0" in lines
+        assert f"wireguard_peer_latest_handshake_seconds{unknown_labels} 0" in lines
+        assert not any(line.startswith(f"wireguard_peer_handshake_age_seconds{unknown_labels}") for line in lines)
+        assert "privateKey" not in response.text
+        assert "4PSSsNFfYpqzJ3thGCeHd8pZWkZVdoJbm2G7oiA6TmQ=" not in response.text
+        assert lines[-1] == "# EOF"
+
+    async def test_metrics_use_cached_snapshot(self, test_client: TestClient, monkeypatch):
+        """the operational data must not be fetched per scrape"""
+        mock = MockWgJsonCommand()
+        with monkeypatch.context() as m:
+            m.setattr(utils.os_func, "run_subprocess", mock)
+            await utils.wireguard.WgSystemInfoAdapter().refresh_snapshot()
+            assert mock.calls == 1
+
+            for _ in range(5):
+                response = await test_client.get(self.api_endpoint)
+                assert response.status_code == 200, response.text
+
+            assert mock.calls == 1
+
+    async def test_metrics_without_authentication(self, unauth_test_client: TestClient):
+        response = await unauth_test_client.get(self.api_endpoint)
+        assert response.status_code == 401
@@ -0,0 +1,88 @@
+"""
+test network set API endpoints
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestNetworkSetApi:
+    """
+    Test NetworkSetModel API
+    """
+    list_api_endpoint = "/api/network_sets/"
+    detail_api_endpoint = "/api/network_sets/{instance_id}"
+    entries_api_endpoint = "/api/network_sets/{instance_id}/entries"
+    entry_detail_api_endpoint = "/api/network_sets/{instance_id}/entries/{entry_id}"
+
+    async def test_crud(self, test_client: TestClient, clean_db):
+        """
+        test CRUD operations on API endpoint
+        """
+        # create through API
+        response = await test_client.post(self.list_api_endpoint, json={
+            "name": "blocked",
+            "family": "inet"
+        })
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["name"] == "blocked"
+
+        response = await test_client.get(self.list_api_endpoint)
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+
+        # update through API
+        response = await test_client.put(self.detail_api_endpoint.format(instance_id=data["instance_id"]), json={
+            "name": "blocked",
+            "description": "blocked networks"
+        })
+        assert response.status_code == 200, response.text
+        network_set = await models.NetworkSetModel.get(instance_id=data["instance_id"])
+        assert network_set.description == "blocked networks"
+
+        # network set can't be deleted while it's used by a filter rule
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        rule = await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network_set=network_set)
+        response = await test_client.delete(self.detail_api_endpoint.format(instance_id=data["instance_id"]))
+        assert response.status_code == 422, response.text
+
+        # delete through API
+        await rule.delete()
+        response = await test_client.delete(self.detail_api_endpoint.format(instance_id=data["instance_id"]))
+        assert response.status_code == 200, response.text
+        assert await models.NetworkSetModel.all().count() == 0
+
+    async def test_entries(self, test_client: TestClient, clean_db):
+        """
+        test the management of the entries through the API
+        """
+        network_set = await models.NetworkSetModel.create(name="blocked")
+
+        response = await test_client.post(self.entries_api_endpoint.format(instance_id=network_set.instance_id), json={
+            "network": "10.0.0.0/24"
+        })
+        assert response.status_code == 200, response.text
+        entry_id = response.json()["instance_id"]
+
+        # wrong address family
+        response = await test_client.post(self.entries_api_endpoint.format(instance_id=network_set.instance_id), json={
+            "network": "2001:db8::/64"
+        })
+        assert response.status_code == 422, response.text
+
+        response = await test_client.delete(self.entry_detail_api_endpoint.format(instance_id=network_set.instance_id, entry_id=entry_id))
+        assert response.status_code == 200, response.text
+
+        # replace all entries
+        response = await test_client.put(self.entries_api_endpoint.format(instance_id=network_set.instance_id), json={
+            "networks": ["10.0.1.0/24", "10.0.2.0/24"]
+        })
+        assert response.status_code == 200, response.text
+        assert sorted(entry["network"] for entry in response.json()) == ["10.0.1.0/24", "10.0.2.0/24"]
+
+        response = await test_client.get(self.entries_api_endpoint.format(instance_id=network_set.instance_id))
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 2
@@ -50,7 +50,9 @@ class TestIpv4FilterRuleApi:
             "protocol": "tcp",
             "action": "DROP",
             "table": "FORWARD",
-            "dst_port_number": 4000
+            "dst_port_number": 4000,
+            "src_network_set_id": None,
+            "dst_network_set_id": None
         }
 
     async def test_crud(self, test_client: TestClient, clean_db):
@@ -496,3 +498,35 @@ class TestPolicyRuleList:
         """test delete with invalid id"""
         response = await test_client.delete(self.detail_api_endpoint.format(instance_id="Not Found"))
         assert response.status_code == 404
+
+    async def test_optimization_report(self, test_client: TestClient, clean_db):
+        """test the report of the policy optimizer"""
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        broad_rule = await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.0.0/16")
+        shadowed_rule = await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.1.0/24")
+        await models.Ipv6FilterRuleModel.create(policy_rule_list=prl, dst_network="2001:db8::/64")
+
+        response = await test_client.get(self.detail_api_endpoint.format(instance_id=prl.instance_id) + "/optimization")
+        assert response.status_code == 200, response.text
+        assert response.json() == {
+            "enabled": False,
+            "ipv4": [
+                {"action": "shadowed", "rule_id": str(shadowed_rule.instance_id), "by_rule_id": str(broad_rule.instance_id)}
+            ],
+            "ipv6": []
+        }
+
+    async def test_simulate(self, test_client: TestClient, clean_db):
+        """test the evaluation of a packet against the filter rules"""
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.0.0/16", protocol=models.FilterProtocolEnum.TCP, dst_port_number=22, action=models.IpTableActionEnum.ACCEPT)
+        drop_rule = await models.Ipv4FilterRuleModel.create(policy_rule_list=prl, src_network="10.0.0.0/16")
+        endpoint = self.detail_api_endpoint.format(instance_id=prl.instance_id) + "/simulate"
+
+        response = await test_client.post(endpoint, json={"src": "10.0.1.1", "dst": "172.16.0.1", "protocol": "udp", "dst_port": 22})
+        assert response.status_code == 200, response.text
+        assert response.json() == {"action": "DROP", "rule_id": str(drop_rule.instance_id)}
+
+        response = await test_client.post(endpoint, json={"src": "2001:db8::1", "dst": "2001:db8::2"})
+        assert response.status_code == 200, response.text
+        assert response.json() == {"action": "ACCEPT", "rule_id": None}
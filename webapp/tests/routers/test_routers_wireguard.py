@@ -4,6 +4,7 @@ test rules API endpoints
 import pytest
 from fastapi.testclient import TestClient
 
+import app.jobs
 import models
 
 
@@ -72,6 +73,17 @@ class TestWgInterfaceApi:
         )
         assert wim.listen_port == 51830
 
+        # the addresses of the interface follow the update
+        response = await test_client.put(self.detail_api_endpoint.format(instance_id=data["instance_id"]), json={
+            "intf_name": "wgvpn1",
+            "cidr_addresses": "192.168.2.1/24, fd00::1/64",
+            "private_key": "cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        })
+        assert response.status_code == 200, response.text
+        assert response.json()["cidr_addresses"] == "192.168.2.1/24, fd00::1/64"
+        addresses = await models.WgInterfaceAddressModel.filter(wg_interface_id=data["instance_id"]).order_by("position")
+        assert [x.cidr for x in addresses] == ["192.168.2.1/24", "fd00::1/64"]
+
         # delete through API
         response = await test_client.delete(self.detail_api_endpoint.format(instance_id=data["instance_id"]))
         assert response.status_code == 200
@@ -123,8 +135,22 @@ class TestWgInterfaceApi:
             ) + "/reconfigure",
             json={}
         )
+        assert response.status_code == 202, response.text
+        job = response.json()
+        assert job["intf_name"] == "wgvpn1"
+        assert [step["name"] for step in job["steps"]] == ["init_config", "rebuild_peer_config", "apply_config"]
+
+        await app.jobs.JobRunner().wait()
+        response = await test_client.get(f"/api/wg/jobs/{job['instance_id']}")
         assert response.status_code == 200, response.text
-        assert response.json()["message"] == "configuration applied"
+        job = response.json()
+        assert job["status"] == "done", job
+        assert [step["status"] for step in job["steps"]] == ["done", "done", "done"]
+        assert all(step["duration"] is not None for step in job["steps"])
+        assert job["duration"] is not None
+
+        response = await test_client.get("/api/wg/jobs/00000000-0000-0000-0000-000000000000")
+        assert response.status_code == 404, response.text
 
 
 @pytest.mark.usefixtures("disable_os_level_commands")
@@ -247,3 +273,32 @@ class TestWgPeerApi:
         """
         response = await test_client.delete(self.detail_api_endpoint.format(instance_id="IdNotFound"))
         assert response.status_code == 404
+
+    async def test_peer_lookup(self, test_client: TestClient, clean_db):
+        """test the lookup of the peer that receives the traffic to an address
+        """
+        wgintf = await models.WgInterfaceModel.create(
+            intf_name="wg1",
+            cidr_addresses="10.1.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        peer = await models.WgPeerModel.create(
+            wg_interface=wgintf,
+            public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=",
+            cidr_routes="10.1.1.3/32, 2001:db8::/64"
+        )
+        endpoint = f"/api/wg/interfaces/{wgintf.instance_id}/peer_lookup"
+
+        response = await test_client.get(endpoint, params={"address": "2001:db8::1"})
+        assert response.status_code == 200, response.text
+        assert response.json() == {"network": "2001:db8::/64", "peer_ids": [str(peer.instance_id)]}
+
+        response = await test_client.get(endpoint, params={"address": "10.1.1.4"})
+        assert response.status_code == 200, response.text
+        assert response.json() == {"network": None, "peer_ids": []}
+
+        response = await test_client.get(endpoint, params={"address": "invalid"})
+        assert response.status_code == 422, response.text
+
+        response = await test_client.get("/api/wg/interfaces/NotExist/peer_lookup", params={"address": "10.1.1.3"})
+        assert response.status_code == 404, response.text
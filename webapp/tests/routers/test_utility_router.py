@@ -10,6 +10,7 @@ from fastapi.testclient import TestClient
 import wgconfig.wgexec
 
 import utils.config
+import utils.instrumentation
 import utils.os_func
 
 
@@ -190,3 +191,26 @@ async def test_http_get_endpoint(test_client: TestClient, monkeypatch):
             "content": "destination not reachable",
             "status": 500
         }
+
+
+async def test_get_instrumentation_data(test_client: TestClient, monkeypatch):
+    """test instrumentation endpoint
+    """
+    instrumentation = utils.instrumentation.InstrumentationUtil()
+    with monkeypatch.context() as m:
+        m.setattr(instrumentation, "enabled", True)
+        m.setattr(utils.os_func, "run_subprocess", mock_wg_json_command)
+        instrumentation.reset()
+
+        response = await test_client.get("/api/utils/wg/operational")
+        assert response.status_code == 200
+
+        response = await test_client.get("/api/utils/instrumentation")
+        assert response.status_code == 200
+
+        json_data = response.json()
+        assert json_data["enabled"] is True
+        assert {"operation": "subprocess", "labels": {"verb": "wg-json"}} in [
+            {"operation": e["operation"], "labels": e["labels"]} for e in json_data["operations"]
+        ]
+        instrumentation.reset()
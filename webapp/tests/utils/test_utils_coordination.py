@@ -0,0 +1,129 @@
+"""
+test utils.coordination module
+"""
+# pylint: disable=missing-function-docstring
+import asyncio
+import socket
+
+import pytest
+
+import utils.config
+import utils.coordination
+import utils.revision
+
+
+@pytest.fixture(scope="function")
+def coordination_file(tmp_path):
+    yield str(tmp_path / "coordination.sqlite3")
+
+
+class TestCoordinationStore:
+    """
+    Test CoordinationStore
+    """
+    def test_lease(self, coordination_file):
+        worker_a = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-a")
+        worker_b = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-b")
+
+        assert worker_a.lease_owner("background") is None
+        assert worker_a.try_acquire_lease("background", ttl=30) is True
+        assert worker_b.try_acquire_lease("background", ttl=30) is False
+        assert worker_b.lease_owner("background") == "worker-a"
+
+        # the lease is renewed by the owner
+        assert worker_a.try_acquire_lease("background", ttl=30) is True
+
+        # only the owner can release the lease
+        worker_b.release_lease("background")
+        assert worker_b.lease_owner("background") == "worker-a"
+        worker_a.release_lease("background")
+        assert worker_b.try_acquire_lease("background", ttl=30) is True
+        assert worker_a.try_acquire_lease("background", ttl=30) is False
+
+    def test_lease_expired(self, coordination_file):
+        worker_a = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-a")
+        worker_b = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-b")
+
+        assert worker_a.try_acquire_lease("background", ttl=-1) is True
+        assert worker_b.lease_owner("background") is None
+        assert worker_b.try_acquire_lease("background", ttl=30) is True
+        assert worker_a.try_acquire_lease("background", ttl=30) is False
+
+    def test_lease_of_terminated_process(self, coordination_file):
+        # PIDs are limited to 2^22 on linux
+        terminated = utils.coordination.CoordinationStore(coordination_file, worker_id=f"{socket.gethostname()}:99999999")
+        remote = utils.coordination.CoordinationStore(coordination_file, worker_id="other-host:99999999")
+        worker = utils.coordination.CoordinationStore(coordination_file)
+
+        assert terminated.try_acquire_lease("background", ttl=30) is True
+        assert worker.try_acquire_lease("background", ttl=30) is True
+
+        # the processes of other hosts are not checked
+        worker.release_lease("background")
+        assert remote.try_acquire_lease("background", ttl=30) is True
+        assert worker.try_acquire_lease("background", ttl=30) is False
+
+    def test_revisions(self, coordination_file):
+        worker_a = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-a")
+        worker_b = utils.coordination.CoordinationStore(coordination_file, worker_id="worker-b")
+
+        assert worker_a.get_revision("policy:1") == 0
+        assert worker_a.bump_revision("policy:1") == 1
+        assert worker_b.bump_revision("policy:1") == 2
+        assert worker_a.get_revision("policy:1") == 2
+        worker_b.bump_revision("pending:interface:wg0")
+
+        assert worker_a.get_revisions() == {"policy:1": 2, "pending:interface:wg0": 1}
+        assert worker_a.get_revisions("pending:") == {"pending:interface:wg0": 1}
+
+    async def test_revisions_within_thread(self, coordination_file, monkeypatch):
+        config_util = utils.config.ConfigUtil()
+        election = utils.coordination.LeaderElection()
+        monkeypatch.setattr(config_util, "leader_election", True)
+        monkeypatch.setattr(config_util, "coordination_file", coordination_file)
+        monkeypatch.setattr(election, "_store", None)
+        registry = utils.revision.RevisionRegistry()
+        revision = registry.get("policy:1")
+
+        # another worker holds the write lock of the file, the event loop isn't blocked while the revision waits
+        other_worker = utils.coordination.CoordinationStore(coordination_file, worker_id="other-worker")
+        other_worker.get_revision("policy:1")
+        other_worker._connect().execute("BEGIN IMMEDIATE")  # pylint: disable=protected-access
+        bump = asyncio.ensure_future(registry.bump("policy:1"))
+        await asyncio.sleep(0.05)
+        assert not bump.done()
+
+        other_worker._connect().execute("COMMIT")  # pylint: disable=protected-access
+        assert await bump == revision + 1
+        assert registry.get("policy:1") == revision + 1
+        election.store.close()
+        other_worker.close()
+
+    async def test_lease_within_thread(self, coordination_file, monkeypatch):
+        config_util = utils.config.ConfigUtil()
+        election = utils.coordination.LeaderElection()
+        monkeypatch.setattr(config_util, "leader_election", True)
+        monkeypatch.setattr(config_util, "coordination_file", coordination_file)
+        monkeypatch.setattr(election, "_store", None)
+        monkeypatch.setattr(election, "_is_leader", False)
+        monkeypatch.setattr(election, "candidate", True)
+        monkeypatch.setattr(utils.coordination.CoordinationStore, "lease_busy_timeout", 0.2)
+
+        # another worker holds the write lock of the file, the event loop isn't blocked while the lease waits
+        other_worker = utils.coordination.CoordinationStore(coordination_file, worker_id="other-worker")
+        other_worker.get_revision("policy:1")
+        other_worker._connect().execute("BEGIN IMMEDIATE")  # pylint: disable=protected-access
+        renew = asyncio.ensure_future(election.renew())
+        await asyncio.sleep(0.05)
+        assert not renew.done()
+
+        # the lease waits only for a short time, the worker continues as follower
+        assert await asyncio.wait_for(renew, timeout=5) is False
+        assert election.is_leader is False
+
+        other_worker._connect().execute("COMMIT")  # pylint: disable=protected-access
+        assert await election.renew() is True
+        await election.release()
+        assert other_worker.lease_owner(election.lease_name) is None
+        election.store.close()
+        other_worker.close()
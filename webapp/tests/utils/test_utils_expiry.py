@@ -0,0 +1,40 @@
+"""
+test expiry utils
+"""
+# pylint: disable=missing-function-docstring
+import utils.expiry
+
+
+def test_expiry_index():
+    index = utils.expiry.ExpiryIndex()
+    assert index.next_due is None
+    assert index.pop_expired(100) == []
+
+    index.update("a", 10)
+    index.update("b", 20)
+    index.update(("wg0", "c"), 15)
+    assert len(index) == 3
+    assert "a" in index
+    assert index.get("b") == 20
+    assert index.next_due == 10
+
+    # reschedule and remove keys
+    index.update("a", 30)
+    index.remove("b")
+    index.remove("unknown")
+    assert index.next_due == 15
+    assert index.pop_expired(25) == [("wg0", "c")]
+    assert index.pop_expired(25) == []
+    assert index.pop_expired(30) == ["a"]
+    assert len(index) == 0
+    assert index.next_due is None
+
+
+def test_expiry_index_compact():
+    index = utils.expiry.ExpiryIndex()
+    for due in range(1000):
+        index.update("a", due)
+
+    assert len(index._heap) < 100
+    assert index.pop_expired(500) == []
+    assert index.pop_expired(999) == ["a"]
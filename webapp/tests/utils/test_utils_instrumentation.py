@@ -0,0 +1,91 @@
+"""
+test instrumentation utils
+"""
+# pylint: disable=missing-function-docstring
+import pytest
+
+import utils.instrumentation
+
+
+@pytest.fixture(scope="function")
+def instrumentation():
+    """enable the instrumentation for the test"""
+    instance = utils.instrumentation.InstrumentationUtil()
+    old_state = instance.enabled
+    instance.enabled = True
+    instance.reset()
+    yield instance
+    instance.enabled = old_state
+    instance.reset()
+
+
+def test_histogram():
+    histogram = utils.instrumentation.Histogram(buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert histogram.count == 3
+    assert histogram.sum == pytest.approx(5.55)
+    assert histogram.cumulative_counts() == [1, 2]
+
+
+def test_command_verb():
+    assert utils.instrumentation.command_verb("wg-json") == "wg-json"
+    assert utils.instrumentation.command_verb("wg syncconf wg0 /tmp/file") == "wg syncconf"
+    assert utils.instrumentation.command_verb("wg-quick up /etc/wireguard/wg0.conf") == "wg-quick up"
+    assert utils.instrumentation.command_verb("wg-quick strip /etc/wireguard/wg0.conf") == "wg-quick strip"
+    assert utils.instrumentation.command_verb("") is None
+
+
+def test_timer_disabled():
+    instance = utils.instrumentation.InstrumentationUtil()
+    old_state = instance.enabled
+    instance.enabled = False
+    try:
+        with instance.timer("test.disabled"):
+            pass
+
+        assert all(entry["operation"] != "test.disabled" for entry in instance.to_dict()["operations"])
+
+    finally:
+        instance.enabled = old_state
+
+
+def test_timer(instrumentation):
+    with instrumentation.timer("subprocess", verb="wg syncconf"):
+        pass
+
+    data = instrumentation.to_dict()
+    assert data["enabled"] is True
+    assert len(data["operations"]) == 1
+    assert data["operations"][0]["operation"] == "subprocess"
+    assert data["operations"][0]["labels"] == {"verb": "wg syncconf"}
+    assert data["operations"][0]["count"] == 1
+    assert data["operations"][0]["buckets"]["+Inf"] == 1
+
+    lines = instrumentation.to_openmetrics()
+    assert "# TYPE wgce_operation_duration_seconds histogram" in lines
+    assert 'wgce_operation_duration_seconds_count{operation="subprocess",verb="wg syncconf"} 1' in lines
+
+
+async def test_timed_decorator(instrumentation):
+    @utils.instrumentation.timed("test.coroutine")
+    async def coroutine(value):
+        return value
+
+    assert await coroutine(1) == 1
+    assert await coroutine(2) == 2
+
+    data = instrumentation.to_dict()
+    assert data["operations"][0]["operation"] == "test.coroutine"
+    assert data["operations"][0]["count"] == 2
+
+    @utils.instrumentation.timed("test.exception")
+    async def broken_coroutine():
+        raise ValueError("An Exception")
+
+    with pytest.raises(ValueError):
+        await broken_coroutine()
+
+    assert any(entry["operation"] == "test.exception" for entry in instrumentation.to_dict()["operations"])
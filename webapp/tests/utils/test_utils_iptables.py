@@ -0,0 +1,63 @@
+"""
+test iptables utils
+"""
+# pylint: disable=missing-function-docstring
+import utils.iptables
+
+
+def test_compile_filter_rules():
+    rows = [
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, "tcp", 3000, "DROP", "FORWARD"),
+        ("192.168.1.0/24", "192.168.2.0/24", False, False, None, None, "ACCEPT", "INPUT"),
+        ("192.168.1.0/24", "192.168.2.0/24", True, True, None, None, "DROP", "FORWARD"),
+        # ignored, the rule would apply to all traffic
+        ("0.0.0.0/0", "0.0.0.0/0", True, False, None, None, "DROP", "FORWARD"),
+    ]
+    columns = utils.iptables.to_columns(rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+
+    assert utils.iptables.compile_filter_rules(*columns) == [
+        "iptables --append FORWARD --in-interface %i --protocol tcp --dport 3000 --jump DROP",
+        "iptables --append INPUT --in-interface %i --source 192.168.1.0/24 --destination 192.168.2.0/24 --jump ACCEPT",
+        "iptables --append FORWARD --in-interface %i ! --source 192.168.1.0/24 ! --destination 192.168.2.0/24 --jump DROP",
+        "",
+    ]
+    assert utils.iptables.compile_filter_rules(*columns, intf_name=None, drop_rule=True)[0] == \
+        "iptables --delete FORWARD --protocol tcp --dport 3000 --jump DROP"
+
+
+def test_compile_filter_rules_ipv6():
+    rows = [
+        ("::/0", "2001:db8::/64", False, False, None, None, "DROP", "FORWARD"),
+        ("::/0", "::/0", False, False, None, None, "DROP", "FORWARD"),
+    ]
+    columns = utils.iptables.to_columns(rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+
+    assert utils.iptables.compile_filter_rules(*columns, base_command="ip6tables") == [
+        "ip6tables --append FORWARD --in-interface %i --destination 2001:db8::/64 --jump DROP",
+        "",
+    ]
+    assert utils.iptables.compile_filter_rules(*utils.iptables.to_columns([], len(utils.iptables.FILTER_RULE_COLUMNS))) == []
+
+
+def test_compile_nat_rules():
+    assert utils.iptables.compile_nat_rules(["eth1", ""], base_command="ip6tables", drop_rule=True) == [
+        "ip6tables --delete POSTROUTING --table nat --out-interface eth1 --jump MASQUERADE",
+        "",
+    ]
+
+
+def test_compile_filter_rules_with_network_sets():
+    rows = [
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", "blocked", None),
+        ("0.0.0.0/0", "192.168.2.0/24", True, False, "tcp", 22, "ACCEPT", "INPUT", "admins", None),
+        ("0.0.0.0/0", "0.0.0.0/0", False, True, None, None, "DROP", "FORWARD", None, "internal"),
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", None, None),
+    ]
+    columns = utils.iptables.to_columns(rows, len(utils.iptables.FILTER_RULE_COLUMNS))
+
+    assert utils.iptables.compile_filter_rules(*columns) == [
+        "iptables --append FORWARD --in-interface %i --match set --match-set blocked src --jump DROP",
+        "iptables --append INPUT --in-interface %i --protocol tcp --dport 22 --match set ! --match-set admins src --destination 192.168.2.0/24 --jump ACCEPT",
+        "iptables --append FORWARD --in-interface %i --match set ! --match-set internal dst --jump DROP",
+        "",
+    ]
@@ -0,0 +1,92 @@
+"""
+test policy optimizer utils
+"""
+# pylint: disable=missing-function-docstring
+import utils.iptables
+import utils.policy_optimizer
+
+
+def optimize(rows):
+    return utils.policy_optimizer.optimize_filter_rules(rows, utils.iptables.IPV4_ANY_NETWORK)
+
+
+def test_duplicate_and_shadowed_rules():
+    rows = [
+        ("10.0.0.0/16", "0.0.0.0/0", False, False, "tcp", 22, "DROP", "FORWARD"),
+        ("10.0.1.0/24", "0.0.0.0/0", False, False, "tcp", 22, "DROP", "FORWARD"),
+        ("10.0.0.0/16", "0.0.0.0/0", False, False, "tcp", 22, "DROP", "FORWARD"),
+        # other table, protocol or port are not shadowed
+        ("10.0.1.0/24", "0.0.0.0/0", False, False, "tcp", 22, "DROP", "INPUT"),
+        ("10.0.1.0/24", "0.0.0.0/0", False, False, "udp", 22, "DROP", "FORWARD"),
+        ("10.0.1.0/24", "0.0.0.0/0", False, False, "tcp", 80, "ACCEPT", "FORWARD"),
+        # ignored rule
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD"),
+    ]
+    result, actions = optimize(rows)
+
+    assert [index for index, _ in result] == [0, 3, 4, 5]
+    assert actions == [
+        utils.policy_optimizer.OptimizerAction("shadowed", 1, 0),
+        utils.policy_optimizer.OptimizerAction("duplicate", 2, 0),
+        utils.policy_optimizer.OptimizerAction("ignored", 6, None),
+    ]
+
+
+def test_shadowed_except_rules():
+    rows = [
+        ("10.0.0.0/8", "0.0.0.0/0", True, False, None, None, "DROP", "FORWARD"),
+        # outside of 10.0.0.0/8, shadowed
+        ("192.168.0.0/24", "0.0.0.0/0", False, False, None, None, "ACCEPT", "FORWARD"),
+        # everything except 10.0.0.0/16 contains 10.1.0.0/16, not shadowed
+        ("10.0.0.0/16", "0.0.0.0/0", True, False, None, None, "ACCEPT", "FORWARD"),
+        # everything except 10.0.0.0/24 contains 10.0.1.0/24, not shadowed
+        ("10.0.0.0/24", "0.0.0.0/0", True, False, None, None, "ACCEPT", "FORWARD"),
+        # everything except 172.16.0.0/12 is contained in everything except 10.0.0.0/16
+        ("172.16.0.0/12", "0.0.0.0/0", True, False, None, None, "ACCEPT", "FORWARD"),
+        # everything except 10.0.0.0/8 is contained in everything except 10.0.0.0/16
+        ("10.0.0.0/8", "0.0.0.0/0", True, False, None, None, "ACCEPT", "FORWARD"),
+    ]
+    result, actions = optimize(rows)
+
+    assert [index for index, _ in result] == [0, 2, 3, 4]
+    assert [(action.action, action.index, action.by) for action in actions] == [("shadowed", 1, 0), ("shadowed", 5, 0)]
+
+
+def test_merge_adjacent_networks():
+    rows = [
+        ("10.0.0.0/24", "172.16.0.0/24", False, False, None, None, "DROP", "FORWARD"),
+        ("10.0.1.0/24", "172.16.0.0/24", False, False, None, None, "DROP", "FORWARD"),
+        ("10.0.2.0/24", "172.16.0.0/24", False, False, None, None, "DROP", "FORWARD"),
+        # other action, not merged
+        ("10.0.3.0/24", "172.16.0.0/24", False, False, None, None, "ACCEPT", "FORWARD"),
+        ("0.0.0.0/0", "192.168.0.0/25", False, False, "tcp", 443, "ACCEPT", "INPUT"),
+        ("0.0.0.0/0", "192.168.0.128/25", False, False, "tcp", 443, "ACCEPT", "INPUT"),
+    ]
+    result, actions = optimize(rows)
+
+    assert result == [
+        (0, ("10.0.0.0/23", "172.16.0.0/24", False, False, None, None, "DROP", "FORWARD")),
+        (0, ("10.0.2.0/24", "172.16.0.0/24", False, False, None, None, "DROP", "FORWARD")),
+        (3, ("10.0.3.0/24", "172.16.0.0/24", False, False, None, None, "ACCEPT", "FORWARD")),
+        (4, ("0.0.0.0/0", "192.168.0.0/24", False, False, "tcp", 443, "ACCEPT", "INPUT")),
+    ]
+    assert [(action.action, action.index, action.by) for action in actions] == [("merged", 1, 0), ("merged", 2, 0), ("merged", 5, 4)]
+
+
+def test_network_set_rules():
+    rows = [
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", "blocked", None),
+        # same network set, shadowed
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, "tcp", 22, "DROP", "FORWARD", "blocked", None),
+        # the content of the network set is unknown, not shadowed and not merged
+        ("10.0.0.0/24", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", None, None),
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", "other", None),
+        ("0.0.0.0/0", "0.0.0.0/0", True, False, None, None, "DROP", "FORWARD", "blocked", None),
+        # a rule for the entire IP space covers the network set
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, "udp", None, "ACCEPT", "INPUT", None, None),
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, "udp", None, "ACCEPT", "INPUT", "other", None),
+    ]
+    result, actions = optimize(rows)
+
+    assert [index for index, _ in result] == [0, 2, 3, 4, 5]
+    assert [(action.action, action.index, action.by) for action in actions] == [("shadowed", 1, 0), ("shadowed", 6, 5)]
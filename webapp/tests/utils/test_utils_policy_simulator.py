@@ -0,0 +1,84 @@
+"""
+test policy simulator utils
+"""
+# pylint: disable=missing-function-docstring
+import ipaddress
+import random
+
+import pytest
+
+import utils.iptables
+import utils.policy_simulator
+
+
+def test_evaluate():
+    rows = [
+        ("10.0.0.0/16", "0.0.0.0/0", False, False, "tcp", 22, "ACCEPT", "FORWARD"),
+        ("10.0.0.0/16", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD"),
+        ("0.0.0.0/0", "172.16.0.0/12", False, True, None, None, "REJECT", "INPUT"),
+        # ignored rule
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD"),
+    ]
+    simulator = utils.policy_simulator.PolicySimulator(rows, [], rule_ids={4: ["a", "b", "c", "d"]})
+
+    assert simulator.evaluate("10.0.1.1", "192.168.0.1", "tcp", 22) == ("ACCEPT", 0, "a")
+    assert simulator.evaluate("10.0.1.1", "192.168.0.1", "udp", 22) == ("DROP", 1, "b")
+    assert simulator.evaluate("10.1.0.1", "192.168.0.1") == ("ACCEPT", None, None)
+    assert simulator.evaluate("10.1.0.1", "192.168.0.1", chain="INPUT") == ("REJECT", 2, "c")
+    assert simulator.evaluate("10.1.0.1", "172.16.0.1", chain="INPUT") == ("ACCEPT", None, None)
+    assert simulator.evaluate("2001:db8::1", "2001:db8::2") == ("ACCEPT", None, None)
+
+    with pytest.raises(ValueError):
+        simulator.evaluate("10.0.0.1", "2001:db8::1")
+
+
+def test_evaluate_with_network_sets():
+    rows = [
+        ("0.0.0.0/0", "0.0.0.0/0", False, True, None, None, "ACCEPT", "FORWARD", None, "allowed"),
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", "blocked", None),
+        ("0.0.0.0/0", "0.0.0.0/0", False, False, None, None, "DROP", "FORWARD", "unknown", None),
+    ]
+    network_sets = {"allowed": ["172.16.0.0/24", "172.16.1.0/24"], "blocked": ["10.0.0.0/8"]}
+    simulator = utils.policy_simulator.PolicySimulator(rows, [], network_sets=network_sets)
+
+    assert simulator.evaluate("10.0.0.1", "172.16.0.1") == ("DROP", 1, None)
+    assert simulator.evaluate("10.0.0.1", "172.16.2.1") == ("ACCEPT", 0, None)
+    assert simulator.evaluate("192.168.0.1", "172.16.1.1") == ("ACCEPT", None, None)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_compare_with_linear_scan(seed):
+    rnd = random.Random(seed)
+    networks = [
+        ipaddress.ip_network(f"10.{rnd.randint(0, 3)}.{rnd.randint(0, 3)}.0/{rnd.choice([8, 16, 24])}", strict=False)
+        for _ in range(20)
+    ] + [ipaddress.ip_network("0.0.0.0/0")]
+    network_sets = {"set_a": [str(network) for network in rnd.sample(networks[:-1], 3)], "set_b": []}
+
+    rows = []
+    for _ in range(200):
+        src_set = rnd.choice([None, None, None, "set_a", "set_b"])
+        rows.append((
+            str(rnd.choice(networks)),
+            str(rnd.choice(networks)),
+            rnd.random() < 0.2,
+            rnd.random() < 0.2,
+            rnd.choice([None, "tcp", "udp"]),
+            rnd.choice([None, 22, 443]),
+            rnd.choice(["ACCEPT", "DROP", "REJECT"]),
+            rnd.choice(["INPUT", "FORWARD"]),
+            src_set,
+            None,
+        ))
+
+    simulator = utils.policy_simulator.PolicySimulator(rows, [], network_sets=network_sets)
+    for _ in range(2000):
+        flow = (
+            ipaddress.IPv4Address(f"10.{rnd.randint(0, 4)}.{rnd.randint(0, 4)}.{rnd.randint(0, 255)}"),
+            ipaddress.IPv4Address(f"10.{rnd.randint(0, 4)}.{rnd.randint(0, 4)}.{rnd.randint(0, 255)}"),
+            rnd.choice([None, "tcp", "udp"]),
+            rnd.choice([None, 22, 80, 443]),
+            rnd.choice(["INPUT", "FORWARD"]),
+        )
+        expected = utils.policy_simulator.reference_evaluate(rows, utils.iptables.IPV4_ANY_NETWORK, *flow, network_sets=network_sets)
+        assert simulator.evaluate(*flow)[:2] == expected[:2], flow
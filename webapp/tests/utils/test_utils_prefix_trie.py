@@ -0,0 +1,55 @@
+"""
+test prefix trie utils
+"""
+# pylint: disable=missing-function-docstring
+import ipaddress
+
+import pytest
+
+import utils.prefix_trie
+
+
+def test_insert_and_remove():
+    trie = utils.prefix_trie.PrefixTrie()
+    trie.insert("10.0.0.0/8", "a")
+    trie.insert("10.0.0.0/24", "b")
+    trie.insert("10.0.0.0/8", "c")
+
+    assert len(trie) == 2
+    assert "10.0.0.0/8" in trie
+    assert "10.0.0.0/16" not in trie
+    assert trie.get("10.0.0.0/8") == "c"
+    assert trie.get("10.0.0.0/16", "default") == "default"
+
+    assert trie.remove("10.0.0.0/24") == "b"
+    assert len(trie) == 1
+    assert list(trie.items()) == [(ipaddress.ip_network("10.0.0.0/8"), "c")]
+    with pytest.raises(KeyError):
+        trie.remove("10.0.0.0/24")
+
+    with pytest.raises(ValueError):
+        trie.insert("2001:db8::/32")
+
+
+def test_matches():
+    trie = utils.prefix_trie.PrefixTrie(6)
+    trie.insert("::/0", 0)
+    trie.insert("2001:db8::/32", 1)
+    trie.insert("2001:db8::/64", 2)
+    trie.insert("2001:db8::1/128", 3)
+
+    assert [value for _, value in trie.matches("2001:db8::1")] == [0, 1, 2, 3]
+    assert [value for _, value in trie.matches("2001:db8:1::1")] == [0, 1]
+    assert trie.longest_match("2001:db8::2") == (ipaddress.ip_network("2001:db8::/64"), 2)
+    assert trie.longest_match(int(ipaddress.ip_address("2001:db9::1"))) == (ipaddress.ip_network("::/0"), 0)
+
+
+def test_overlaps():
+    trie = utils.prefix_trie.PrefixTrie()
+    for network in ("10.0.0.0/8", "10.1.0.0/16", "10.1.1.0/24", "10.2.0.0/16", "192.168.0.0/24"):
+        trie.insert(network, network)
+
+    assert sorted(value for _, value in trie.overlaps("10.1.0.0/16")) == ["10.0.0.0/8", "10.1.0.0/16", "10.1.1.0/24"]
+    assert sorted(value for _, value in trie.overlaps("10.1.2.0/24")) == ["10.0.0.0/8", "10.1.0.0/16"]
+    assert sorted(value for _, value in trie.overlaps("0.0.0.0/0")) == sorted(value for _, value in trie.items())
+    assert trie.overlaps("172.16.0.0/12") == []
@@ -0,0 +1,61 @@
+"""
+test utils.startup_patches module
+"""
+# pylint: disable=missing-function-docstring
+import json
+import os
+import subprocess
+import sys
+
+import fastapi
+import tortoise
+
+import utils.startup_patches
+
+
+OPENAPI_SCRIPT = """
+import json, sys
+import app.fast_api
+import utils.startup_patches
+with open(sys.argv[1], "w", encoding="utf-8") as f:
+    json.dump({"applied": utils.startup_patches.applied(), "openapi": app.fast_api.create().openapi()}, f, sort_keys=True)
+"""
+
+
+def create_openapi(tmp_path, patches: bool) -> dict:
+    """create the OpenAPI schema in a new interpreter (the patches are applied before the models and routers exist)"""
+    output = tmp_path / f"openapi_{patches}.json"
+    env = dict(os.environ, APP_STARTUP_PATCHES=str(patches))
+    subprocess.run(
+        [sys.executable, "-c", OPENAPI_SCRIPT, str(output)],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        env=env,
+        check=True,
+        capture_output=True
+    )
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_is_verified():
+    assert utils.startup_patches.is_verified("tortoise", "0.18.1")
+    assert not utils.startup_patches.is_verified("tortoise", "0.19.0")
+    assert not utils.startup_patches.is_verified("fastapi", "0.99.0")
+    assert not utils.startup_patches.is_verified("pydantic", "1.10.0")
+
+
+def test_applied():
+    expected = [
+        package for package, version in (("tortoise", tortoise.__version__), ("fastapi", fastapi.__version__))
+        if utils.startup_patches.is_verified(package, version)
+    ]
+    assert sorted(utils.startup_patches.applied()) == sorted(expected)
+
+
+def test_openapi_schema(tmp_path):
+    patched = create_openapi(tmp_path, patches=True)
+    unpatched = create_openapi(tmp_path, patches=False)
+
+    assert sorted(patched["applied"]) == sorted(utils.startup_patches.applied())
+    assert unpatched["applied"] == []
+    assert patched["openapi"] == unpatched["openapi"]
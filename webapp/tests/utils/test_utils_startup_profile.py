@@ -0,0 +1,50 @@
+"""
+test startup profile
+"""
+# pylint: disable=missing-function-docstring
+import subprocess
+import sys
+
+import utils.startup_profile
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+2026-10-19 18:36:57,519 | applog | INFO | create API application...
+import time:       120 |        120 |     utils.generics
+import time:       300 |        420 |   utils.config
+import time:      1000 |       1000 |     tortoise.models
+import time:       500 |       1500 |   tortoise
+import time:       200 |       2120 | app.fast_api
+"""
+
+
+def test_parse_importtime():
+    imports = utils.startup_profile.parse_importtime(IMPORTTIME_OUTPUT)
+    assert imports[0] == utils.startup_profile.ImportTime("utils.generics", 120, 120, 2)
+    assert imports[-1] == utils.startup_profile.ImportTime("app.fast_api", 200, 2120, 0)
+
+    profile = utils.startup_profile.StartupProfile(stages={}, imports=imports, status_code=200, total=0)
+    assert profile.top_imports(2) == [imports[2], imports[3]]
+    assert profile.imports_per_package() == [("tortoise", 1500), ("utils", 420), ("app", 200)]
+
+
+def test_deferred_imports():
+    # the import of the API server doesn't import the modules that are only used by the test endpoints
+    command = "import sys, app.fast_api; print(sorted(m for m in ('pyroute2', 'requests', 'pythonping') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", command], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+    # the schemas and the configuration (creates the data directories) are not created by the import of the models
+    command = "import schemas, models, utils.config; " \
+              "print(len(schemas._schemas), utils.config.ConfigUtil in utils.config.ConfigUtil._instances)"
+    result = subprocess.run([sys.executable, "-c", command], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "0 False"
+
+
+def test_run_profile():
+    profile = utils.startup_profile.run_profile()
+    assert profile.status_code == 200
+    assert list(profile.stages) == list(utils.startup_profile.STAGES)
+    assert profile.total >= sum(profile.stages.values())
+    assert "app.fast_api" in [entry.module for entry in profile.imports]
@@ -0,0 +1,87 @@
+"""
+test the rows that are built from values() queries
+"""
+# pylint: disable=missing-function-docstring
+from typing import List
+
+import fastapi.routing
+import fastapi.utils
+import orjson
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import models
+import schemas
+import utils.tortoise.serializers
+
+
+async def schema_response_body(schema, queryset) -> bytes:
+    """response of a list endpoint that returns `schema.from_queryset` (validated by the response model)"""
+    field = fastapi.utils.create_cloned_field(fastapi.utils.create_response_field(name="Response", type_=List[schema]))
+    content = await fastapi.routing.serialize_response(field=field, response_content=await schema.from_queryset(queryset))
+    return JSONResponse(content).body
+
+
+@pytest.mark.usefixtures("disable_os_level_commands")
+class TestSchemaRowBuilder:
+    """
+    the rows are encoded to the same JSON as the validated pydantic schemas
+    """
+    async def test_rows(self, test_client: TestClient, clean_db):
+        prl = await models.PolicyRuleListModel.create(name="foo")
+        await models.PolicyRuleListModel.create(name="bar")
+        await models.Ipv4FilterRuleModel.create(
+            policy_rule_list=prl, src_network="192.168.1.0/24", dst_network="192.168.2.0/24",
+            protocol=models.FilterProtocolEnum.TCP, dst_port_number=22
+        )
+        await models.Ipv6FilterRuleModel.create(policy_rule_list=prl)
+        await models.Ipv4NatRuleModel.create(policy_rule_list=prl, target_interface="eth0")
+        network_set = await models.NetworkSetModel.create(name="set1")
+        await models.NetworkSetEntryModel.create(network_set=network_set, network="10.0.0.0/8")
+        wg1 = await models.WgInterfaceModel.create(
+            intf_name="wg1", cidr_addresses="10.1.1.1/24, FD00::1/64", policy_rule_list=prl,
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        wg2 = await models.WgInterfaceModel.create(
+            intf_name="wg2", listen_port=51821, cidr_addresses="10.2.1.1/24",
+            private_key="cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI="
+        )
+        await models.WgPeerModel.create(
+            wg_interface=wg1, public_key="s5WDa5TV/DeXYLQZfXG4RD1/eGPt2rkDMGB1Z379ZQs=", cidr_routes="10.1.1.2/32, 10.1.1.3/32",
+            persistent_keepalives=25, friendly_name="peer a", description="Grüße"
+        )
+        await models.WgPeerModel.create(
+            wg_interface=wg2, public_key="6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=", cidr_routes="10.2.1.2/32"
+        )
+        await models.ConfigJobModel.create(kind=models.ConfigJobKindEnum.RECONFIGURE, wg_interface=wg1, intf_name="wg1", steps=[{"name": "x"}])
+
+        for schema, queryset in (
+            (schemas.WgInterfaceSchema, models.WgInterfaceModel.all()),
+            (schemas.WgPeerSchema, models.WgPeerModel.all()),
+            (schemas.PolicyRuleListSchema, models.PolicyRuleListModel.all()),
+            (schemas.Ipv4FilterRuleSchema, models.Ipv4FilterRuleModel.all()),
+            (schemas.Ipv6FilterRuleSchema, models.Ipv6FilterRuleModel.all()),
+            (schemas.Ipv4NatRuleSchema, models.Ipv4NatRuleModel.all()),
+            (schemas.Ipv6NatRuleSchema, models.Ipv6NatRuleModel.all()),
+            (schemas.NetworkSetSchema, models.NetworkSetModel.all()),
+            (schemas.NetworkSetEntrySchema, models.NetworkSetEntryModel.filter(network_set_id=network_set.instance_id)),
+        ):
+            rows = await utils.tortoise.serializers.get_row_builder(schema).build(queryset)
+            assert orjson.dumps(rows) == await schema_response_body(schema, queryset), schema.__name__
+
+        # the nested rows are queried in chunks
+        utils.tortoise.serializers.IN_CHUNK_SIZE = 1
+        try:
+            rows = await utils.tortoise.serializers.get_row_builder(schemas.WgInterfaceSchema).build(models.WgInterfaceModel.all())
+            assert orjson.dumps(rows) == await schema_response_body(schemas.WgInterfaceSchema, models.WgInterfaceModel.all())
+
+        finally:
+            utils.tortoise.serializers.IN_CHUNK_SIZE = 900
+
+    async def test_list_endpoint(self, test_client: TestClient, clean_db):
+        await models.PolicyRuleListModel.create(name="foo")
+        response = await test_client.get("/api/rules/policy_rule_list")
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/json"
+        assert [entry["name"] for entry in response.json()] == ["foo"]
@@ -0,0 +1,53 @@
+"""
+test custom tortoise validators
+"""
+# pylint: disable=missing-function-docstring
+import pytest
+from tortoise.exceptions import ValidationError
+
+import utils.tortoise.validators
+
+
+def test_ip_interface_list_validator():
+    valid_entries = [
+        "FD00:0:0:0:0:0:0:321/123,FD00::/64,0.0.0.0/10",
+        "2000::/8,2000::/8,2.3.4.5/8",
+        "10.1.1.1/24, FD00::1/64",
+        "FD00::/64",
+        "0.0.0.0/10",
+        "255.255.255.255/32",
+        None,
+    ]
+    invalid_entries = [
+        "FD00:0:0:45678:0:0:0:321/123,FG00::/64,0.0.0.0/10",
+        "2000:45678:/8,2000::/8, 2.3.4.5/8",
+        "FD00:FREAK:/64",
+        "0.0.0.999/10",
+        "255.255.255.256/32",
+        "10.1.1.1/33",
+        "FD00::1/129",
+        "10.1.1.1/024",
+        "10.1.1.1",
+        " 10.1.1.1/24",
+        "10.1.1.1/24,",
+        "FE80::1%eth0/64",
+        "",
+    ]
+
+    validator = utils.tortoise.validators.IpInterfaceListOrNoneValidator()
+    for valid_entry in valid_entries:
+        validator(valid_entry)
+
+    for invalid_entry in invalid_entries:
+        with pytest.raises(ValidationError):
+            validator(invalid_entry)
+
+
+def test_ip_interface_list_validator_adversarial_input():
+    # the list causes a backtracking of the regular expression
+    value = ",".join(f"fd00:{i:x}::1:2:3/128, 10.0.{i}.1/32" for i in range(100)) + ",fd00::1:2:3:4:5:6:7/128"
+    assert utils.tortoise.validators.find_invalid_ip_interface(value) == "fd00::1:2:3:4:5:6:7/128"
+
+    # digits that are not ASCII are rejected instead of raising an error
+    assert utils.tortoise.validators.find_invalid_ip_interface("10.0.0.1/²") == "10.0.0.1/²"
+    assert utils.tortoise.validators.find_invalid_ip_interface("10.0.0.1/32, 10.0.0.2/٣٢") == "10.0.0.2/٣٢"
@@ -0,0 +1,73 @@
+"""
+test wireguard configuration model
+"""
+# pylint: disable=missing-function-docstring
+import utils.wg_config
+
+
+CONFIGURATION = """\
+# configuration managed by script - please don't change -  (id)
+[Interface]
+PrivateKey = cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=
+Address = 10.1.1.1/24
+ListenPort = 51820
+Table = auto
+PostUp = iptables --append FORWARD --in-interface %i --jump DROP
+PostDown = iptables --delete FORWARD --in-interface %i --jump DROP
+
+# peer-a / None /
+[Peer]
+PublicKey = 6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=
+AllowedIPs = 10.1.1.3/32
+Endpoint = 10.1.1.1:51820
+PersistentKeepalive = 10
+
+# peer-b / None /
+[Peer]
+PublicKey = aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=
+AllowedIPs = 10.1.1.4/32
+"""
+
+
+def test_parse_and_render():
+    config = utils.wg_config.WgInterfaceConfig.parse(CONFIGURATION.splitlines(keepends=True))
+    assert config.listen_port == "51820"
+    assert config.post_up == ["iptables --append FORWARD --in-interface %i --jump DROP"]
+    assert list(config.peers) == ["6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=", "aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8="]
+    assert config.render() == CONFIGURATION
+
+    # same result as wg-quick strip
+    assert config.render(stripped=True) == """\
+[Interface]
+PrivateKey = cFWqYCq2NUwUE4hq6l6mvXN9sDiIvxg1pBudO+iZTnI=
+ListenPort = 51820
+[Peer]
+PublicKey = 6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=
+AllowedIPs = 10.1.1.3/32
+Endpoint = 10.1.1.1:51820
+PersistentKeepalive = 10
+[Peer]
+PublicKey = aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=
+AllowedIPs = 10.1.1.4/32
+"""
+
+
+def test_upsert_peer():
+    config = utils.wg_config.WgInterfaceConfig.parse(CONFIGURATION.splitlines())
+
+    peer_a = utils.wg_config.WgPeerConfig(**{
+        name: getattr(config.peers["6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E="], name)
+        for name in utils.wg_config.WgPeerConfig.__slots__
+    })
+    assert config.upsert_peer(peer_a) is False
+
+    peer_a.allowed_ips = "10.1.1.3/32, 10.1.2.0/24"
+    peer_c = utils.wg_config.WgPeerConfig(public_key="yx0owjK+RWUD3ccSDBus7PA/B+WuVhSYUmEO9XAil0k=", allowed_ips="10.1.1.5/32")
+    assert config.upsert_peer(peer_a) is True
+    assert config.upsert_peer(peer_c) is True
+    assert config.remove_peer("aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=") is True
+    assert config.remove_peer("aKFcOzSjFPHaX4dX3RteK1ziDFKOdAyy4FcReJa6MX8=") is False
+
+    # the changed peer keeps its position
+    assert list(config.peers) == ["6Prv1yQ2Fh99Xhi4eUmPZnGox0VrLH88MFtdNXfM52E=", "yx0owjK+RWUD3ccSDBus7PA/B+WuVhSYUmEO9XAil0k="]
+    assert "AllowedIPs = 10.1.1.3/32, 10.1.2.0/24" in config.render()
@@ -76,6 +76,15 @@ class ConfigUtil(metaclass=utils.generics.SingletonMeta):
     wg_config_dir: str
     wg_tmp_dir: str
     peer_tracking_timer: int
+    peer_tracking_idle_factor: int
+    instrumentation: bool
+    policy_optimizer: bool
+    leader_election: bool
+    coordination_file: str
+    reconciler_mode: str
+    reconciler_poll_interval: float
+    drift_check_interval: int
+    response_cache_size: int
     admin_user: str
     admin_password_file: str
 
@@ -133,11 +142,32 @@ class ConfigUtil(metaclass=utils.generics.SingletonMeta):
         self.cors_methods = os.environ.get("APP_CORS_METHODS", "*").split(",")
         self.cors_headers = os.environ.get("APP_CORS_HEADERS", "*").split(",")
         self.peer_tracking_timer = int(os.environ.get("APP_PEER_TRACKING_TIMER", "10"))
+        self.peer_tracking_idle_factor = int(os.environ.get("APP_PEER_TRACKING_IDLE_FACTOR", "1"))
+        self.instrumentation = ConfigUtil.str_to_bool(os.environ.get("APP_INSTRUMENTATION", "False"))
+        self.policy_optimizer = ConfigUtil.str_to_bool(os.environ.get("APP_POLICY_OPTIMIZER", "False"))
+        self.peer_overlap_policy = os.environ.get("APP_PEER_OVERLAP_POLICY", "warn").lower()
+        self.route_aggregation = ConfigUtil.str_to_bool(os.environ.get("APP_ROUTE_AGGREGATION", "False"))
         self.admin_user = os.environ.get("APP_ADMIN_USER", "admin")
+        # the election is required if uvicorn starts multiple workers
+        self.leader_election = ConfigUtil.str_to_bool(
+            os.environ.get("APP_LEADER_ELECTION", str(int(os.environ.get("WEB_CONCURRENCY", "1")) > 1))
+        )
+        self.coordination_file = os.environ.get("APP_COORDINATION_FILE", os.path.join(self.base_data_dir, "coordination.sqlite3"))
+        # "external" if the configuration is applied by a separate process (`cli.py run-reconciler`)
+        self.reconciler_mode = os.environ.get("APP_RECONCILER_MODE", "embedded").lower()
+        self.reconciler_poll_interval = float(os.environ.get("APP_RECONCILER_POLL_INTERVAL", "1"))
+        # 0 disables the comparison of the system state with the database
+        self.drift_check_interval = int(os.environ.get("APP_DRIFT_CHECK_INTERVAL", "60"))
+        # memory budget of the response cache in MiB, 0 disables the cache
+        self.response_cache_size = int(os.environ.get("APP_RESPONSE_CACHE_SIZE", "16"))
 
         self.db_models = [
             "models.rules",
+            "models.network_set",
             "models.peer",
+            "models.route",
+            "models.reconcile",
+            "models.job",
             "models.wg_interface",
             "aerich.models"
         ]
@@ -153,16 +183,22 @@ class ConfigUtil(metaclass=utils.generics.SingletonMeta):
         return True if value.lower() in true_values else False
 
 
-# required for aerich migrations
-_config_instance = ConfigUtil()
-TORTOISE_ORM = {
-    "connections": {
-        "default": _config_instance.db_url
-    },
-    "apps": {
-        "models": {
-            "models": _config_instance.db_models,
-            "default_connection": "default",
+def __getattr__(name: str) -> dict:
+    """create the tortoise configuration for aerich migrations on first access (`TORTOISE_ORM`), the configuration
+    utility is not created as a side effect of the import (it creates the data directories)
+    """
+    if name != "TORTOISE_ORM":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    config = ConfigUtil()
+    return {
+        "connections": {
+            "default": config.db_url
+        },
+        "apps": {
+            "models": {
+                "models": config.db_models,
+                "default_connection": "default",
+            },
         },
-    },
-}
+    }
@@ -0,0 +1,300 @@
+"""
+coordination of multiple uvicorn workers
+
+All workers serve the API, but only a single worker (the leader) changes the system (wireguard interfaces, routes,
+ipsets). The leader holds a lease with an expiry time in a shared SQLite file, the lease is renewed by the leader on
+every peer tracking run and between the steps of a long run (`LeaderElection.keep_alive`). If the leader stops, another worker takes over as soon as the lease expires (or immediately
+if the leader released the lease on shutdown or the process of the leader no longer exists).
+
+The same file stores revision counters that are shared between the workers (e.g. to invalidate caches). The lease and
+the counters are written within a thread (another worker may hold the write lock), the store uses a connection per
+thread. The reads and the lease use a short busy timeout, so a locked file doesn't stall the API for long.
+"""
+import os
+import asyncio
+import socket
+import sqlite3
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import utils.config
+import utils.generics
+
+
+class CoordinationStore:
+    """
+    leases and revision counters in an SQLite file that is shared between the worker processes
+    """
+    # seconds to wait for the lock of the file, the leases and the reads are time-critical and wait shorter
+    busy_timeout = 10.0
+    lease_busy_timeout = 2.0
+    read_busy_timeout = 1.0
+
+    def __init__(self, path: str, worker_id: Optional[str]=None):
+        """
+        :param path: path to the SQLite file
+        :type path: str
+        :param worker_id: ID of the worker, defaults to None (`<hostname>:<pid>`)
+        :type worker_id: Optional[str], optional
+        """
+        self.path = path
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _connect(self, busy_timeout: Optional[float]=None) -> sqlite3.Connection:
+        """open the connection of the current thread and create the tables on the first use
+
+        :param busy_timeout: seconds to wait for the lock of the file, defaults to None (`busy_timeout`)
+        :type busy_timeout: Optional[float], optional
+        """
+        busy_timeout = self.busy_timeout if busy_timeout is None else busy_timeout
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # autocommit mode, the transactions are started explicitly (the connection is closed by any thread)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS revisions (key TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+            self._local.connection = connection
+            self._local.busy_timeout = self.busy_timeout
+            with self._connections_lock:
+                self._connections.append(connection)
+
+        if self._local.busy_timeout != busy_timeout:
+            connection.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+            self._local.busy_timeout = busy_timeout
+
+        return connection
+
+    def close(self) -> None:
+        """close the connections of all threads"""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+
+            self._connections = []
+            self._local = threading.local()
+
+    @staticmethod
+    def _owner_is_gone(owner: str) -> bool:
+        """check if the owner of a lease is a process on this host that no longer exists"""
+        hostname, _, pid = owner.rpartition(":")
+        if hostname != socket.gethostname() or not pid.isdigit():
+            return False
+
+        try:
+            os.kill(int(pid), 0)
+
+        except ProcessLookupError:
+            return True
+
+        except PermissionError:
+            pass
+
+        return False
+
+    def try_acquire_lease(self, name: str, ttl: float) -> bool:
+        """acquire or renew a lease, a lease of another worker is taken over if it is expired
+
+        :param name: name of the lease
+        :type name: str
+        :param ttl: seconds until the lease expires
+        :type ttl: float
+        :return: True if the worker holds the lease
+        :rtype: bool
+        """
+        connection = self._connect(self.lease_busy_timeout)
+        now = time.time()
+        # the write lock is acquired immediately, the check and the update are atomic across the workers
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != self.worker_id and row[1] > now and not self._owner_is_gone(row[0]):
+                connection.execute("ROLLBACK")
+                return False
+
+            connection.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, self.worker_id, now + ttl)
+            )
+            connection.execute("COMMIT")
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        return True
+
+    def release_lease(self, name: str) -> None:
+        """release a lease (only if it is held by the worker)
+
+        :param name: name of the lease
+        :type name: str
+        """
+        self._connect(self.lease_busy_timeout).execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.worker_id))
+
+    def lease_owner(self, name: str) -> Optional[str]:
+        """get the worker that holds a lease
+
+        :param name: name of the lease
+        :type name: str
+        :return: ID of the worker or None if the lease is not held or expired
+        :rtype: Optional[str]
+        """
+        row = self._connect(self.read_busy_timeout).execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+
+        return row[0]
+
+    def get_revision(self, key: str) -> int:
+        """get the revision of a key
+
+        :param key: name of the key
+        :type key: str
+        :return: revision of the key (0 if the key was never changed)
+        :rtype: int
+        """
+        row = self._connect(self.read_busy_timeout).execute("SELECT revision FROM revisions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def get_revisions(self, prefix: str="") -> Dict[str, int]:
+        """get the revisions of all keys with the given prefix
+
+        :param prefix: prefix of the keys, defaults to "" (all keys)
+        :type prefix: str, optional
+        :return: revision per key
+        :rtype: Dict[str, int]
+        """
+        rows = self._connect(self.read_busy_timeout).execute(
+            "SELECT key, revision FROM revisions WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()
+        return dict(rows)
+
+    def bump_revision(self, key: str) -> int:
+        """increase the revision of a key
+
+        :param key: name of the key
+        :type key: str
+        :return: new revision of the key
+        :rtype: int
+        """
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO revisions (key, revision) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET revision = revision + 1",
+                (key,)
+            )
+            revision = connection.execute("SELECT revision FROM revisions WHERE key = ?", (key,)).fetchone()[0]
+            connection.execute("COMMIT")
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        return revision
+
+
+class LeaderElection(metaclass=utils.generics.SingletonMeta):
+    """
+    election of the worker that changes the system (always the current worker if the election is disabled)
+
+    With an external reconciler (`APP_RECONCILER_MODE=external`), the API workers are no candidates for the election,
+    the system is changed only by the reconciler process.
+    """
+    lease_name = "background"
+
+    def __init__(self):
+        self._config = utils.config.ConfigUtil()
+        self._logger = logging.getLogger("coordination")
+        self._store = None
+        self._is_leader = False
+        self._renewed_at = 0.0
+        # the reconciler process declares itself as candidate
+        self.candidate = self._config.reconciler_mode != "external"
+
+    @property
+    def enabled(self) -> bool:
+        """True if the leader is elected between multiple processes"""
+        return self._config.leader_election or self._config.reconciler_mode == "external"
+
+    @property
+    def store(self) -> CoordinationStore:
+        """shared state of the workers"""
+        if self._store is None:
+            self._store = CoordinationStore(self._config.coordination_file)
+
+        return self._store
+
+    @property
+    def lease_ttl(self) -> float:
+        """seconds until the lease of the leader expires (the lease is renewed on every peer tracking run and between the
+        steps of a long run)
+        """
+        return self._config.peer_tracking_timer * 3
+
+    @property
+    def is_leader(self) -> bool:
+        """True if the worker is responsible for the changes on the system"""
+        return not self.enabled or self._is_leader
+
+    async def renew(self) -> bool:
+        """acquire or renew the lease of the leader
+
+        :return: True if the worker became the leader with this call (always False if the election is disabled)
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+
+        if not self.candidate:
+            self._is_leader = False
+            return False
+
+        try:
+            # another worker may hold the write lock of the coordination file, the event loop must not wait for it
+            is_leader = await asyncio.to_thread(self.store.try_acquire_lease, self.lease_name, self.lease_ttl)
+
+        except sqlite3.Error:
+            # the lease expires if it is not renewed, the worker must stop changing the system
+            self._logger.error("unable to renew the lease, continue as follower", exc_info=True)
+            is_leader = False
+
+        became_leader = is_leader and not self._is_leader
+        if is_leader != self._is_leader:
+            self._logger.warning(f"worker {self.store.worker_id} is {'the leader' if is_leader else 'a follower'}")
+
+        if is_leader:
+            self._renewed_at = time.monotonic()
+
+        self._is_leader = is_leader
+        return became_leader
+
+    async def keep_alive(self) -> bool:
+        """renew the lease between the steps of a long run (e.g. reconcile all interfaces), the lease is renewed if a
+        third of its TTL has passed since the last renewal
+
+        :return: True if the worker is still the leader, the run must be stopped otherwise
+        :rtype: bool
+        """
+        if not self.enabled:
+            return True
+
+        if self._is_leader and time.monotonic() - self._renewed_at >= self.lease_ttl / 3:
+            await self.renew()
+
+        return self._is_leader
+
+    async def release(self) -> None:
+        """release the lease of the leader, another worker takes over on its next run"""
+        if self.enabled and self._is_leader:
+            await asyncio.to_thread(self.store.release_lease, self.lease_name)
+            self._logger.info(f"worker {self.store.worker_id} released the lease")
+
+        self._is_leader = False
+
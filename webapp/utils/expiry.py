@@ -0,0 +1,100 @@
+"""
+expiry index for keys with a due time
+"""
+import heapq
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryIndex:
+    """
+    min-heap of keys ordered by their due time
+
+    Updating or removing a key is O(log n) / O(1), outdated heap entries are skipped when the
+    expired keys are collected (lazy deletion). The heap is compacted if it contains too many
+    outdated entries.
+    """
+    _heap: List[Tuple[float, int, Hashable]]
+    _due: Dict[Hashable, Tuple[float, int]]
+
+    def __init__(self):
+        self._heap = list()
+        self._due = dict()
+        # tie breaker for keys with the same due time (keys don't need to be comparable)
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._due
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """get the due time of a key
+
+        :param key: key within the index
+        :type key: Hashable
+        :return: due time or None if the key is not part of the index
+        :rtype: Optional[float]
+        """
+        entry = self._due.get(key)
+        return entry[0] if entry else None
+
+    def update(self, key: Hashable, due: float) -> None:
+        """add a key or change the due time of an existing key
+
+        :param key: key within the index
+        :type key: Hashable
+        :param due: due time
+        :type due: float
+        """
+        entry = self._due.get(key)
+        if entry is not None and entry[0] == due:
+            return
+
+        self._counter += 1
+        self._due[key] = (due, self._counter)
+        heapq.heappush(self._heap, (due, self._counter, key))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def remove(self, key: Hashable) -> None:
+        """remove a key from the index (ignored if the key is not part of the index)
+
+        :param key: key within the index
+        :type key: Hashable
+        """
+        self._due.pop(key, None)
+
+    def pop_expired(self, now: float) -> List[Hashable]:
+        """remove and return all keys with a due time lower or equal than now (ordered by due time)
+
+        :param now: reference time
+        :type now: float
+        :return: list of expired keys
+        :rtype: List[Hashable]
+        """
+        result = []
+        while self._heap and self._heap[0][0] <= now:
+            due, counter, key = heapq.heappop(self._heap)
+            if self._due.get(key) == (due, counter):
+                del self._due[key]
+                result.append(key)
+
+        return result
+
+    @property
+    def next_due(self) -> Optional[float]:
+        """lowest due time within the index"""
+        while self._heap:
+            due, counter, key = self._heap[0]
+            if self._due.get(key) == (due, counter):
+                return due
+
+            heapq.heappop(self._heap)
+
+        return None
+
+    def _compact(self) -> None:
+        """rebuild the heap without outdated entries"""
+        self._heap = [(due, counter, key) for key, (due, counter) in self._due.items()]
+        heapq.heapify(self._heap)
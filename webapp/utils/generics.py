@@ -2,9 +2,8 @@
 generic utils for the application
 """
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
-import utils.config
 import utils.os_func
 
 
@@ -27,19 +26,27 @@ class AsyncSubProcessMixin:
     """
     _logger: logging.Logger
 
-    async def _execute_subprocess(self, command: str) -> Tuple[str, str, bool]:
+    async def _execute_subprocess(self, command: str, input_data: Optional[str] = None) -> Tuple[str, str, bool]:
         """execute a subprocess at os level
 
         :param command: command to execute
         :type command: str
+        :param input_data: data that is written to the standard input of the process, defaults to None
+        :type input_data: Optional[str], optional
         :return: stdout, stderr, success
         :rtype: Tuple[str, str, bool]
         """
-        # skip command execution when unit-testing
-        stdout, stderr, success_state = utils.os_func.run_subprocess(
-            command=command,
-            logger=self._logger
-        )
+        # imported here to avoid a circular import (utils.config -> utils.generics)
+        import utils.instrumentation  # pylint: disable=import-outside-toplevel
+
+        with utils.instrumentation.InstrumentationUtil().timer("subprocess", verb=utils.instrumentation.command_verb(command)):
+            # skip command execution when unit-testing
+            stdout, stderr, success_state = utils.os_func.run_subprocess(
+                command=command,
+                logger=self._logger,
+                input_data=input_data
+            )
+
         if stdout != "":
             self._logger.debug(f"standard-out of '{command}':\n{stdout}")
 
@@ -0,0 +1,204 @@
+"""
+lightweight timing instrumentation for the hot paths of the application
+"""
+import time
+import logging
+import functools
+import contextlib
+from typing import Dict, List, Optional, Tuple
+
+import utils.config
+import utils.generics
+
+
+# upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Histogram:
+    """
+    cumulative histogram for durations in seconds
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """add a value to the histogram
+
+        :param value: duration in seconds
+        :type value: float
+        """
+        self.sum += value
+        self.count += 1
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative_counts(self) -> List[int]:
+        """cumulative counts per bucket (without the +Inf bucket)
+
+        :return: list of counts
+        :rtype: List[int]
+        """
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+
+        return result
+
+
+class InstrumentationUtil(metaclass=utils.generics.SingletonMeta):
+    """
+    collects timing histograms for operations, disabled by default (see APP_INSTRUMENTATION)
+    """
+    enabled: bool
+    _histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram]
+
+    def __init__(self):
+        self.enabled = utils.config.ConfigUtil().instrumentation
+        self._logger = logging.getLogger("instrumentation")
+        self._histograms = dict()
+
+    def observe(self, operation: str, duration: float, **labels: str) -> None:
+        """record the duration of an operation
+
+        :param operation: name of the operation
+        :type operation: str
+        :param duration: duration in seconds
+        :type duration: float
+        """
+        key = (operation, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+
+        histogram.observe(duration)
+        self._logger.debug(
+            f"{operation} took {duration * 1000:.2f} ms",
+            extra={"operation": operation, "duration_ms": round(duration * 1000, 3), **labels}
+        )
+
+    @contextlib.contextmanager
+    def _timer(self, operation: str, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.observe(operation, time.perf_counter() - start, **labels)
+
+    def timer(self, operation: str, **labels: str):
+        """context manager to measure the duration of a code block (no-op if disabled)
+
+        :param operation: name of the operation
+        :type operation: str
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+
+        return self._timer(operation, **labels)
+
+    def reset(self) -> None:
+        """drop all recorded values
+        """
+        self._histograms.clear()
+
+    def to_dict(self) -> dict:
+        """get the recorded histograms as dictionary
+
+        :return: histograms per operation
+        :rtype: dict
+        """
+        operations = []
+        for (operation, labels), histogram in sorted(self._histograms.items()):
+            buckets = {str(le): count for le, count in zip(histogram.buckets, histogram.cumulative_counts())}
+            buckets["+Inf"] = histogram.count
+            operations.append({
+                "operation": operation,
+                "labels": dict(labels),
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "buckets": buckets
+            })
+
+        return {
+            "enabled": self.enabled,
+            "operations": operations
+        }
+
+    def to_openmetrics(self) -> List[str]:
+        """get the recorded histograms as OpenMetrics metric family
+
+        :return: lines of the metric family (empty if nothing was recorded)
+        :rtype: List[str]
+        """
+        if not self._histograms:
+            return []
+
+        lines = [
+            "# HELP wgce_operation_duration_seconds duration of internal operations",
+            "# TYPE wgce_operation_duration_seconds histogram",
+        ]
+        for (operation, labels), histogram in sorted(self._histograms.items()):
+            label_str = ",".join([f'operation="{operation}"'] + [f'{k}="{v}"' for k, v in labels])
+            for le, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                lines.append(f'wgce_operation_duration_seconds_bucket{{{label_str},le="{le}"}} {count}')
+
+            lines.append(f'wgce_operation_duration_seconds_bucket{{{label_str},le="+Inf"}} {histogram.count}')
+            lines.append(f"wgce_operation_duration_seconds_count{{{label_str}}} {histogram.count}")
+            lines.append(f"wgce_operation_duration_seconds_sum{{{label_str}}} {histogram.sum}")
+
+        return lines
+
+
+def timed(operation: str):
+    """decorator to measure the duration of a coroutine function (no-op if the instrumentation is disabled)
+
+    :param operation: name of the operation
+    :type operation: str
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            instrumentation = InstrumentationUtil()
+            if not instrumentation.enabled:
+                return await func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+
+            finally:
+                instrumentation.observe(operation, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def command_verb(command: str) -> Optional[str]:
+    """get the verb of a shell command that is used as label (e.g. "wg syncconf" or "wg-quick up")
+
+    :param command: shell command
+    :type command: str
+    :return: command verb
+    :rtype: str
+    """
+    tokens = command.split(maxsplit=2)
+    if not tokens:
+        return None
+
+    if len(tokens) > 1 and tokens[1].isalpha():
+        return f"{tokens[0]} {tokens[1]}"
+
+    return tokens[0]
@@ -0,0 +1,219 @@
+"""
+batch compiler for iptables commands
+
+The functions work on the rule rows of a policy as columns (e.g. the transposed result of `values_list`),
+all fragments that don't depend on a single rule are computed once per batch. The result is identical
+to the rendering of the rule models (see `models.rules.AbstractIpTableRuleModel._to_iptables_rule`),
+including the empty string for rules that would result in an invalid iptables statement.
+"""
+import ipaddress
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+
+# columns of the filter rule models in the order that is expected by compile_filter_rules (the network sets
+# are given by name)
+FILTER_RULE_COLUMNS = (
+    "src_network",
+    "dst_network",
+    "except_src",
+    "except_dst",
+    "protocol",
+    "dst_port_number",
+    "action",
+    "table",
+    "src_network_set",
+    "dst_network_set",
+)
+IPV4_ANY_NETWORK = "0.0.0.0/0"
+IPV6_ANY_NETWORK = "::/0"
+
+
+def raw_value(value) -> Optional[str]:
+    """get the raw value of an enum member (other values are returned unchanged)"""
+    return getattr(value, "value", value)
+
+
+class FilterRule:
+    """
+    parsed filter rule (row in the order of FILTER_RULE_COLUMNS)
+    """
+    __slots__ = (
+        "index", "row", "src", "dst", "except_src", "except_dst", "protocol", "dport", "action", "table", "src_set", "dst_set"
+    )
+
+    def __init__(self, index: int, row: Tuple, any_network: str):
+        self.index = index
+        self.row = row
+        src, dst, except_src, except_dst, protocol, dport, action, table, *network_sets = row
+        # a network set replaces the network of the rule (the network set columns are optional)
+        src_set, dst_set = (*network_sets, None, None)[:2]
+        self.src_set = src_set or None
+        self.dst_set = dst_set or None
+        # None represents the entire IP space (the except flag is ignored in this case)
+        self.src = ipaddress.ip_network(src, strict=False) if src != any_network and not self.src_set else None
+        self.dst = ipaddress.ip_network(dst, strict=False) if dst != any_network and not self.dst_set else None
+        self.except_src = bool(except_src) and (self.src is not None or self.src_set is not None)
+        self.except_dst = bool(except_dst) and (self.dst is not None or self.dst_set is not None)
+        self.protocol = raw_value(protocol) or None
+        self.dport = dport or None
+        self.action = raw_value(action)
+        self.table = raw_value(table)
+
+    @property
+    def key(self) -> Tuple:
+        """normalized representation of the rule"""
+        return (
+            self.src, self.dst, self.src_set, self.dst_set, self.except_src, self.except_dst,
+            self.protocol, self.dport, self.action, self.table
+        )
+
+    @property
+    def is_ignored(self) -> bool:
+        """True if the rule is not rendered by the compiler"""
+        return not (self.protocol or self.dport or self.src or self.dst or self.src_set or self.dst_set)
+
+
+def to_columns(rows: Sequence[Tuple], column_count: int) -> List[Tuple]:
+    """transpose the rows (e.g. from `values_list`) into columns
+
+    :param rows: list of rows
+    :type rows: Sequence[Tuple]
+    :param column_count: number of columns (required if there are no rows)
+    :type column_count: int
+    :return: list of columns
+    :rtype: List[Tuple]
+    """
+    if not rows:
+        return [tuple() for _ in range(column_count)]
+
+    return list(zip(*rows))
+
+
+def _network_fragment(network: Optional[str], network_set: Optional[str], except_rule: bool, option: str, direction: str) -> str:
+    """match statement for the source or destination of a rule (a network set replaces the network)"""
+    if network_set:
+        return f" --match set ! --match-set {network_set} {direction}" if except_rule else f" --match set --match-set {network_set} {direction}"
+
+    if network:
+        return f" ! {option} {network}" if except_rule else f" {option} {network}"
+
+    return ""
+
+
+def compile_filter_rules(
+    src_networks: Sequence[str],
+    dst_networks: Sequence[str],
+    except_src: Sequence[bool],
+    except_dst: Sequence[bool],
+    protocols: Sequence[Optional[str]],
+    dst_port_numbers: Sequence[Optional[int]],
+    actions: Sequence[str],
+    tables: Sequence[str],
+    src_network_sets: Sequence[Optional[str]]=None,
+    dst_network_sets: Sequence[Optional[str]]=None,
+    base_command: str="iptables",
+    intf_name: Optional[str]="%i",
+    drop_rule: bool=False
+) -> List[str]:
+    """compile filter rules (given as columns) to iptables commands
+
+    :param src_networks: source network per rule
+    :type src_networks: Sequence[str]
+    :param dst_networks: destination network per rule
+    :type dst_networks: Sequence[str]
+    :param except_src: except rule for the source per rule
+    :type except_src: Sequence[bool]
+    :param except_dst: except rule for the destination per rule
+    :type except_dst: Sequence[bool]
+    :param protocols: protocol per rule (tcp/udp or None)
+    :type protocols: Sequence[Optional[str]]
+    :param dst_port_numbers: destination port number per rule (or None)
+    :type dst_port_numbers: Sequence[Optional[int]]
+    :param actions: action per rule (ACCEPT/DROP)
+    :type actions: Sequence[str]
+    :param tables: table per rule (INPUT/FORWARD)
+    :type tables: Sequence[str]
+    :param src_network_sets: name of the source network set per rule (replaces the source network), defaults to None
+    :type src_network_sets: Sequence[Optional[str]], optional
+    :param dst_network_sets: name of the destination network set per rule (replaces the destination network), defaults to None
+    :type dst_network_sets: Sequence[Optional[str]], optional
+    :param base_command: iptables or ip6tables, defaults to "iptables"
+    :type base_command: str, optional
+    :param intf_name: name of the interface that should be used for the rule which represents the interface in
+                      wireguard configuration, defaults to "%i"
+    :type intf_name: str, optional
+    :param drop_rule: if true, the resulting rules will be used to remove the rules from the chain, defaults to False
+    :type drop_rule: bool, optional
+    :return: iptables command per rule (empty string if the rule is ignored)
+    :rtype: List[str]
+    """
+    any_network = IPV6_ANY_NETWORK if base_command == "ip6tables" else IPV4_ANY_NETWORK
+    operation = "--delete" if drop_rule else "--append"
+    rule_intf_name = f" --in-interface {intf_name}" if intf_name else ""
+
+    # fragments that only depend on a small set of values are computed once per batch
+    prefixes = dict()
+    suffixes = dict()
+    protocol_fragments = {None: ""}
+
+    if src_network_sets is None:
+        src_network_sets = [None] * len(src_networks)
+
+    if dst_network_sets is None:
+        dst_network_sets = [None] * len(dst_networks)
+
+    result = []
+    for src, dst, ex_src, ex_dst, protocol, dport, action, table, src_set, dst_set in zip(
+        src_networks, dst_networks, except_src, except_dst, protocols, dst_port_numbers, actions, tables,
+        src_network_sets, dst_network_sets
+    ):
+        protocol = raw_value(protocol) or None
+        src = src if src != any_network else None
+        dst = dst if dst != any_network else None
+        if not (protocol or dport or src or dst or src_set or dst_set):
+            # the rule would apply to all traffic of the interface
+            result.append("")
+            continue
+
+        prefix = prefixes.get(table)
+        if prefix is None:
+            prefix = f"{base_command} {operation} {raw_value(table)}{rule_intf_name}"
+            prefixes[table] = prefix
+
+        suffix = suffixes.get(action)
+        if suffix is None:
+            suffix = f" --jump {raw_value(action)}"
+            suffixes[action] = suffix
+
+        rule_protocol = protocol_fragments.get(protocol)
+        if rule_protocol is None:
+            rule_protocol = f" --protocol {protocol}"
+            protocol_fragments[protocol] = rule_protocol
+
+        result.append("".join((
+            prefix,
+            rule_protocol,
+            f" --dport {dport}" if dport else "",
+            _network_fragment(src, src_set, ex_src, "--source", "src"),
+            _network_fragment(dst, dst_set, ex_dst, "--destination", "dst"),
+            suffix
+        )))
+
+    return result
+
+
+def compile_nat_rules(target_interfaces: Iterable[str], base_command: str="iptables", drop_rule: bool=False) -> List[str]:
+    """compile NAT rules (always POSTROUTING with MASQUERADE) to iptables commands
+
+    :param target_interfaces: outgoing interface per rule
+    :type target_interfaces: Iterable[str]
+    :param base_command: iptables or ip6tables, defaults to "iptables"
+    :type base_command: str, optional
+    :param drop_rule: if true, the resulting rules will be used to remove the rules from the chain, defaults to False
+    :type drop_rule: bool, optional
+    :return: iptables command per rule (empty string if the rule is ignored)
+    :rtype: List[str]
+    """
+    operation = "--delete" if drop_rule else "--append"
+    prefix = f"{base_command} {operation} POSTROUTING --table nat --out-interface "
+    return [f"{prefix}{target} --jump MASQUERADE" if target else "" for target in target_interfaces]
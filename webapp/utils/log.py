@@ -53,9 +53,15 @@ class LoggingUtil(metaclass=utils.generics.SingletonMeta):
                 "wg_sysinfo": {
                     "propagate": True
                 },
+                "ipset_adapter": {
+                    "propagate": True
+                },
                 "peer_tracking": {
                     "propagate": True
                 },
+                "instrumentation": {
+                    "propagate": True
+                },
                 "aiosqlite": {
                     "level": "INFO",
                     "propagate": True
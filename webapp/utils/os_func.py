@@ -3,25 +3,33 @@ module that contains all os dependent functions which are normally mocked
 as part of the unittests
 """
 import shlex
+import socket
 import subprocess
 import logging
-from typing import Tuple
-from pyroute2 import IPRoute, NetlinkError
+from typing import List, Optional, Tuple
 
 
-def run_subprocess(command: str, logger: logging.Logger) -> Tuple[str, str, bool]:
+def run_subprocess(command: str, logger: logging.Logger, input_data: Optional[str] = None) -> Tuple[str, str, bool]:
     """function to start a subprocess on the linux os, implemented to allow mocking with unit-tests
 
     :param command: _description_
     :type command: str
     :param logger: _description_
     :type logger: logging.Logger
+    :param input_data: data that is written to the standard input of the process, defaults to None
+    :type input_data: Optional[str], optional
     :return: stdout, stderr and success state
     :rtype: Tuple[str, str, bool]
     """
     success_state = True
-    proc = subprocess.Popen(shlex.split(command), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
-    stdout, stderr = proc.communicate(input=None)
+    proc = subprocess.Popen(
+        shlex.split(command),
+        stdin=None if input_data is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=True
+    )
+    stdout, stderr = proc.communicate(input=None if input_data is None else input_data.encode("utf-8"))
     proc.wait()
     logger.debug(f"[{command!r} exited with {proc.returncode}]")
 
@@ -48,6 +56,9 @@ def configure_route(intf_name: str, ip_network: str, operation: str, logger: log
     if operation not in ["add", "del"]:
         raise AttributeError("operation must be add or del")
 
+    # pyroute2 is imported on first use, it takes a noticeable part of the startup time
+    from pyroute2 import IPRoute, NetlinkError  # pylint: disable=import-outside-toplevel
+
     # get data about the interface
     ip = IPRoute()
     intf_data_list = ip.link_lookup(ifname=intf_name)
@@ -85,3 +96,35 @@ def configure_route(intf_name: str, ip_network: str, operation: str, logger: log
 
     ip.close()
     return operation_performed
+
+
+def get_interface_routes(intf_name: str, logger: logging.Logger) -> Optional[List[str]]:
+    """get the routes of an interface from the main routing table
+
+    :param intf_name: name of the interface
+    :type intf_name: str
+    :param logger: logger for debug messages
+    :type logger: logging.Logger
+    :return: list of the destination networks (IPv4 and IPv6), None if the interface doesn't exist
+    :rtype: Optional[List[str]]
+    """
+    from pyroute2 import IPRoute  # pylint: disable=import-outside-toplevel
+
+    ip = IPRoute()
+    try:
+        intf_data_list = ip.link_lookup(ifname=intf_name)
+        if len(intf_data_list) != 1:
+            return None
+
+        routes = []
+        for family in (socket.AF_INET, socket.AF_INET6):
+            for route in ip.get_routes(family=family, oif=intf_data_list[0]):
+                destination = route.get_attr("RTA_DST")
+                if destination is not None:
+                    routes.append(f"{destination}/{route['dst_len']}")
+
+        logger.debug(f"got IP routes of interface {intf_name} from system: {routes}")
+        return routes
+
+    finally:
+        ip.close()
@@ -0,0 +1,157 @@
+"""
+optimizer for the filter rules of a policy
+
+The optimizer works on the rule rows in the order of `utils.iptables.FILTER_RULE_COLUMNS` and returns the minimal
+equivalent rule set (first match semantics per table) together with a report of the removed rules:
+
+* ignored: the rule is not rendered at all (it would apply to all traffic of the interface)
+* duplicate: an earlier rule in the same table is identical
+* shadowed: an earlier rule in the same table matches all packets of the rule
+* merged: consecutive rules in the same table with the same action that only differ in the source (or destination)
+  network are merged if the networks can be collapsed
+
+The content of a network set is not known to the optimizer, a network set is only equal to itself (same name and
+except flag) and rules with a network set are never merged.
+"""
+import ipaddress
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import utils.iptables
+
+
+class OptimizerAction(NamedTuple):
+    """
+    rule that was removed by the optimizer
+    """
+    action: str
+    index: int
+    by: Optional[int]
+
+
+def _network_covers(net_a, except_a: bool, net_b, except_b: bool, set_a: Optional[str]=None, set_b: Optional[str]=None) -> bool:
+    """check if the network match of rule A contains all addresses of the network match of rule B"""
+    if set_a is not None:
+        # the content of a network set is unknown, it only covers the same network set
+        return set_a == set_b and except_a == except_b
+
+    if net_a is None:
+        return True
+
+    if net_b is None:
+        # the entire IP space or a network set (unknown content) is not covered by a single network
+        return False
+
+    if not except_a and not except_b:
+        return net_b.subnet_of(net_a)
+
+    if except_a and except_b:
+        return net_a.subnet_of(net_b)
+
+    if except_a:
+        return not net_a.overlaps(net_b)
+
+    return False
+
+
+def covers(rule_a: utils.iptables.FilterRule, rule_b: utils.iptables.FilterRule) -> bool:
+    """check if rule A matches all packets that are matched by rule B (both in the same table)
+
+    :param rule_a: rule A
+    :type rule_a: utils.iptables.FilterRule
+    :param rule_b: rule B
+    :type rule_b: utils.iptables.FilterRule
+    :return: True if rule B is shadowed by rule A
+    :rtype: bool
+    """
+    return (
+        (rule_a.protocol is None or rule_a.protocol == rule_b.protocol)
+        and (rule_a.dport is None or rule_a.dport == rule_b.dport)
+        and _network_covers(rule_a.src, rule_a.except_src, rule_b.src, rule_b.except_src, rule_a.src_set, rule_b.src_set)
+        and _network_covers(rule_a.dst, rule_a.except_dst, rule_b.dst, rule_b.except_dst, rule_a.dst_set, rule_b.dst_set)
+    )
+
+
+def _merge_runs(rules: List[utils.iptables.FilterRule], field: str, any_network: str, actions: List[OptimizerAction]) -> List[utils.iptables.FilterRule]:
+    """merge consecutive rules that only differ in the given network field ("src" or "dst")"""
+    other = "dst" if field == "src" else "src"
+    result = []
+    run = []
+
+    def run_key(rule: utils.iptables.FilterRule):
+        if getattr(rule, field) is None or getattr(rule, f"except_{field}") or rule.src_set or rule.dst_set:
+            return None
+
+        return (getattr(rule, other), getattr(rule, f"except_{other}"), rule.protocol, rule.dport, rule.action)
+
+    def flush():
+        networks = list(ipaddress.collapse_addresses([getattr(rule, field) for rule in run]))
+        if len(networks) >= len(run):
+            result.extend(run)
+            return
+
+        first = run[0]
+        column = utils.iptables.FILTER_RULE_COLUMNS.index(f"{field}_network")
+        for network in networks:
+            row = list(first.row)
+            row[column] = str(network)
+            result.append(utils.iptables.FilterRule(first.index, tuple(row), any_network))
+
+        for rule in run[1:]:
+            actions.append(OptimizerAction("merged", rule.index, first.index))
+
+    for rule in rules:
+        key = run_key(rule)
+        if run and (key is None or key != run_key(run[0])):
+            flush()
+            run = []
+
+        if key is None:
+            result.append(rule)
+
+        else:
+            run.append(rule)
+
+    if run:
+        flush()
+
+    return result
+
+
+def optimize_filter_rules(rows: Sequence[Tuple], any_network: str) -> Tuple[List[Tuple[int, Tuple]], List[OptimizerAction]]:
+    """compute the minimal equivalent filter rule set
+
+    :param rows: filter rules in the order of `utils.iptables.FILTER_RULE_COLUMNS`
+    :type rows: Sequence[Tuple]
+    :param any_network: network that represents the entire IP space ("0.0.0.0/0" or "::/0")
+    :type any_network: str
+    :return: remaining rules (index of the original rule and the row) and the list of removed rules
+    :rtype: Tuple[List[Tuple[int, Tuple]], List[OptimizerAction]]
+    """
+    actions = []
+    tables: Dict[str, List[utils.iptables.FilterRule]] = dict()
+
+    for index, row in enumerate(rows):
+        rule = utils.iptables.FilterRule(index, row, any_network)
+        if rule.is_ignored:
+            actions.append(OptimizerAction("ignored", index, None))
+            continue
+
+        kept_rules = tables.setdefault(rule.table, [])
+        for kept_rule in kept_rules:
+            if covers(kept_rule, rule):
+                actions.append(OptimizerAction("duplicate" if kept_rule.key == rule.key else "shadowed", index, kept_rule.index))
+                break
+
+        else:
+            kept_rules.append(rule)
+
+    result = []
+    for kept_rules in tables.values():
+        kept_rules = _merge_runs(kept_rules, "src", any_network, actions)
+        kept_rules = _merge_runs(kept_rules, "dst", any_network, actions)
+        result.extend((rule.index, rule.row) for rule in kept_rules)
+
+    # the tables are independent chains, the original order is kept within each table
+    result.sort(key=lambda x: x[0])
+    actions.sort(key=lambda x: x.index)
+    return result, actions
@@ -0,0 +1,282 @@
+"""
+offline evaluation of the filter rules of a policy
+
+The filter rules (rows in the order of `utils.iptables.FILTER_RULE_COLUMNS`) are compiled into a decision structure
+per address family and chain: every rule is a bit, the prefix tries of the source and destination networks, the
+protocol and the port number map to bitsets of the rules that match. A packet is evaluated by combining the bitsets
+of its fields, the lowest remaining bit is the first matching rule (first match semantics of iptables).
+
+The prefix tries are flattened into one hash table per prefix length that is used within the tries, a lookup takes one
+dictionary access per prefix length instead of walking the bits of the address.
+
+All rules are applied with `--in-interface` of the wireguard interface, the simulated packets are always received on
+the interface. If no rule matches, the default policy of the chain applies (ACCEPT, the chains are not changed by the
+application).
+"""
+import ipaddress
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import utils.iptables
+import utils.prefix_trie
+
+
+DEFAULT_ACTION = "ACCEPT"
+
+
+class SimulationResult(NamedTuple):
+    """
+    result of the evaluation of a packet
+    """
+    action: str
+    # index of the matching rule within the rules of the address family (None if the default policy applies)
+    rule_index: Optional[int]
+    rule_id: Optional[str]=None
+
+
+class _ChainIndex:
+    """
+    decision structure for the rules of a single chain
+    """
+    __slots__ = (
+        "version", "rule_indexes", "actions", "src", "dst", "except_src", "except_dst", "any_src", "any_dst",
+        "except_src_mask", "except_dst_mask", "protocols", "any_protocol", "ports", "any_port", "_lookup"
+    )
+
+    def __init__(self, version: int):
+        self.version = version
+        self.rule_indexes = []
+        self.actions = []
+        self.src = utils.prefix_trie.PrefixTrie(version)
+        self.dst = utils.prefix_trie.PrefixTrie(version)
+        self.except_src = utils.prefix_trie.PrefixTrie(version)
+        self.except_dst = utils.prefix_trie.PrefixTrie(version)
+        self.any_src = 0
+        self.any_dst = 0
+        self.except_src_mask = 0
+        self.except_dst_mask = 0
+        self.protocols = dict()
+        self.any_protocol = 0
+        self.ports = dict()
+        self.any_port = 0
+        self._lookup = None
+
+    @staticmethod
+    def _add_networks(trie: utils.prefix_trie.PrefixTrie, networks: Iterable, bit: int):
+        for network in networks:
+            trie.insert(network, trie.get(network, 0) | bit)
+
+    def add(self, rule: utils.iptables.FilterRule, networks: Dict[str, List[str]]):
+        """add a rule to the end of the chain"""
+        bit = 1 << len(self.rule_indexes)
+        self.rule_indexes.append(rule.index)
+        self.actions.append(rule.action)
+
+        for network, network_set, except_rule, trie, except_trie, field in (
+            (rule.src, rule.src_set, rule.except_src, self.src, self.except_src, "src"),
+            (rule.dst, rule.dst_set, rule.except_dst, self.dst, self.except_dst, "dst"),
+        ):
+            if network is None and network_set is None:
+                setattr(self, f"any_{field}", getattr(self, f"any_{field}") | bit)
+                continue
+
+            # an unknown network set is handled as empty set
+            members = [network] if network_set is None else networks.get(network_set, [])
+            if except_rule:
+                setattr(self, f"except_{field}_mask", getattr(self, f"except_{field}_mask") | bit)
+                self._add_networks(except_trie, members, bit)
+
+            else:
+                self._add_networks(trie, members, bit)
+
+        if rule.protocol is None:
+            self.any_protocol |= bit
+
+        else:
+            self.protocols[rule.protocol] = self.protocols.get(rule.protocol, 0) | bit
+
+        if rule.dport is None:
+            self.any_port |= bit
+
+        else:
+            self.ports[rule.dport] = self.ports.get(rule.dport, 0) | bit
+
+    def _flatten(self, trie: utils.prefix_trie.PrefixTrie) -> Tuple[Tuple[int, Dict[int, int]], ...]:
+        """convert a trie into hash tables per prefix length (shift of the address and bitset per network)"""
+        max_prefixlen = 32 if self.version == 4 else 128
+        tables: Dict[int, Dict[int, int]] = dict()
+        for network, value in trie.items():
+            shift = max_prefixlen - network.prefixlen
+            tables.setdefault(shift, dict())[int(network.network_address) >> shift] = value
+
+        return tuple(sorted(tables.items(), reverse=True))
+
+    def evaluate(self, src: int, dst: int, protocol: Optional[str], dst_port: Optional[int]) -> Optional[int]:
+        """get the position of the first matching rule within the chain"""
+        if self._lookup is None:
+            self._lookup = tuple(self._flatten(trie) for trie in (self.src, self.except_src, self.dst, self.except_dst))
+
+        mask = self.any_protocol | self.protocols.get(protocol, 0)
+        mask &= self.any_port | self.ports.get(dst_port, 0)
+        if not mask:
+            return None
+
+        src_tables, except_src_tables, dst_tables, except_dst_tables = self._lookup
+        for address, tables, except_tables, any_mask, except_mask in (
+            (src, src_tables, except_src_tables, self.any_src, self.except_src_mask),
+            (dst, dst_tables, except_dst_tables, self.any_dst, self.except_dst_mask),
+        ):
+            matching = any_mask
+            for shift, table in tables:
+                matching |= table.get(address >> shift, 0)
+
+            if except_mask:
+                contained = 0
+                for shift, table in except_tables:
+                    contained |= table.get(address >> shift, 0)
+
+                matching |= except_mask & ~contained
+
+            mask &= matching
+            if not mask:
+                return None
+
+        return (mask & -mask).bit_length() - 1
+
+
+class PolicySimulator:
+    """
+    evaluate packets against the filter rules of a policy
+    """
+    def __init__(
+        self,
+        ipv4_rows: Sequence[Tuple],
+        ipv6_rows: Sequence[Tuple],
+        network_sets: Optional[Dict[str, List[str]]]=None,
+        rule_ids: Optional[Dict[int, Sequence[str]]]=None
+    ):
+        """
+        :param ipv4_rows: IPv4 filter rules in the order of `utils.iptables.FILTER_RULE_COLUMNS`
+        :type ipv4_rows: Sequence[Tuple]
+        :param ipv6_rows: IPv6 filter rules in the order of `utils.iptables.FILTER_RULE_COLUMNS`
+        :type ipv6_rows: Sequence[Tuple]
+        :param network_sets: networks per network set name, defaults to None
+        :type network_sets: Optional[Dict[str, List[str]]], optional
+        :param rule_ids: ID of the rules per IP version (same order as the rows), defaults to None
+        :type rule_ids: Optional[Dict[int, Sequence[str]]], optional
+        """
+        self.rows = {4: list(ipv4_rows), 6: list(ipv6_rows)}
+        self.network_sets = network_sets or dict()
+        self._rule_ids = rule_ids or dict()
+        self._chains: Dict[Tuple[int, str], _ChainIndex] = dict()
+        for version, rows, any_network in (
+            (4, self.rows[4], utils.iptables.IPV4_ANY_NETWORK),
+            (6, self.rows[6], utils.iptables.IPV6_ANY_NETWORK),
+        ):
+            for index, row in enumerate(rows):
+                rule = utils.iptables.FilterRule(index, row, any_network)
+                if rule.is_ignored:
+                    # the rule is not rendered by the compiler
+                    continue
+
+                chain = self._chains.get((version, rule.table))
+                if chain is None:
+                    chain = _ChainIndex(version)
+                    self._chains[(version, rule.table)] = chain
+
+                chain.add(rule, self.network_sets)
+
+    def evaluate(self, src, dst, protocol: Optional[str]=None, dst_port: Optional[int]=None, chain: str="FORWARD") -> SimulationResult:
+        """evaluate a packet that is received on the wireguard interface
+
+        :param src: source address
+        :type src: str or ipaddress.IPv4Address/IPv6Address
+        :param dst: destination address
+        :type dst: str or ipaddress.IPv4Address/IPv6Address
+        :param protocol: protocol of the packet (tcp/udp), defaults to None
+        :type protocol: Optional[str], optional
+        :param dst_port: destination port of the packet, defaults to None
+        :type dst_port: Optional[int], optional
+        :param chain: chain that handles the packet (INPUT/FORWARD), defaults to "FORWARD"
+        :type chain: str, optional
+        :raises ValueError: if the addresses are invalid or of different address families
+        :return: action and matching rule
+        :rtype: SimulationResult
+        """
+        if not isinstance(src, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            src = ipaddress.ip_address(src)
+
+        if not isinstance(dst, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            dst = ipaddress.ip_address(dst)
+
+        if src.version != dst.version:
+            raise ValueError(f"'{src}' and '{dst}' are not of the same address family")
+
+        chain_index = self._chains.get((src.version, utils.iptables.raw_value(chain)))
+        if chain_index is None:
+            return SimulationResult(DEFAULT_ACTION, None)
+
+        position = chain_index.evaluate(int(src), int(dst), utils.iptables.raw_value(protocol) or None, dst_port or None)
+        if position is None:
+            return SimulationResult(DEFAULT_ACTION, None)
+
+        rule_index = chain_index.rule_indexes[position]
+        rule_ids = self._rule_ids.get(src.version)
+        return SimulationResult(chain_index.actions[position], rule_index, str(rule_ids[rule_index]) if rule_ids else None)
+
+
+def _network_matches(network, network_set: Optional[str], except_rule: bool, address, network_sets: Dict[str, List[str]]) -> bool:
+    """check the source or destination of a rule with a linear scan"""
+    if network is None and network_set is None:
+        return True
+
+    members = [network] if network_set is None else [ipaddress.ip_network(value) for value in network_sets.get(network_set, [])]
+    contained = any(address in member for member in members)
+    return not contained if except_rule else contained
+
+
+def reference_evaluate(
+    rows: Sequence[Tuple],
+    any_network: str,
+    src, dst,
+    protocol: Optional[str]=None,
+    dst_port: Optional[int]=None,
+    chain: str="FORWARD",
+    network_sets: Optional[Dict[str, List[str]]]=None
+) -> SimulationResult:
+    """evaluate a packet with a linear scan over the rules of an address family (used to verify the simulator)
+
+    :param rows: filter rules in the order of `utils.iptables.FILTER_RULE_COLUMNS`
+    :type rows: Sequence[Tuple]
+    :param any_network: network that represents the entire IP space ("0.0.0.0/0" or "::/0")
+    :type any_network: str
+    :param src: source address
+    :param dst: destination address
+    :param protocol: protocol of the packet (tcp/udp), defaults to None
+    :type protocol: Optional[str], optional
+    :param dst_port: destination port of the packet, defaults to None
+    :type dst_port: Optional[int], optional
+    :param chain: chain that handles the packet (INPUT/FORWARD), defaults to "FORWARD"
+    :type chain: str, optional
+    :param network_sets: networks per network set name, defaults to None
+    :type network_sets: Optional[Dict[str, List[str]]], optional
+    :return: action and matching rule
+    :rtype: SimulationResult
+    """
+    network_sets = network_sets or dict()
+    src = ipaddress.ip_address(src)
+    dst = ipaddress.ip_address(dst)
+    protocol = utils.iptables.raw_value(protocol) or None
+    chain = utils.iptables.raw_value(chain)
+    for index, row in enumerate(rows):
+        rule = utils.iptables.FilterRule(index, row, any_network)
+        if (
+            not rule.is_ignored
+            and rule.table == chain
+            and (rule.protocol is None or rule.protocol == protocol)
+            and (rule.dport is None or rule.dport == dst_port)
+            and _network_matches(rule.src, rule.src_set, rule.except_src, src, network_sets)
+            and _network_matches(rule.dst, rule.dst_set, rule.except_dst, dst, network_sets)
+        ):
+            return SimulationResult(rule.action, index)
+
+    return SimulationResult(DEFAULT_ACTION, None)
@@ -0,0 +1,218 @@
+"""
+binary prefix trie for IPv4 and IPv6 networks
+"""
+import ipaddress
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+
+Network = Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]
+Address = Union[str, int, ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class _Node:
+    """
+    node of the trie, a node stores a value if a network with the prefix of the node was inserted
+    """
+    __slots__ = ("children", "network", "value")
+
+    def __init__(self):
+        self.children = [None, None]
+        self.network = None
+        self.value = None
+
+
+class PrefixTrie:
+    """
+    binary prefix trie for the networks of a single address family
+
+    Every network is stored at the depth of its prefix length, all operations walk the bits of the network or address
+    from the most significant bit and take O(prefix length) steps, independent of the number of stored networks.
+    """
+    def __init__(self, version: int=4):
+        if version not in (4, 6):
+            raise ValueError(f"invalid IP version {version}")
+
+        self.version = version
+        self.max_prefixlen = 32 if version == 4 else 128
+        self._root = _Node()
+        self._size = 0
+
+    def _network(self, network: Network):
+        """convert the value to a network of the address family of the trie"""
+        result = ipaddress.ip_network(network, strict=False)
+        if result.version != self.version:
+            raise ValueError(f"'{network}' is not an IPv{self.version} network")
+
+        return result
+
+    def _address(self, address: Address) -> int:
+        """convert the value to an integer address of the address family of the trie"""
+        if isinstance(address, int):
+            return address
+
+        result = ipaddress.ip_address(address)
+        if result.version != self.version:
+            raise ValueError(f"'{address}' is not an IPv{self.version} address")
+
+        return int(result)
+
+    def _walk(self, network, create: bool=False) -> List[_Node]:
+        """get the nodes from the root to the node of the network (shorter list if the node doesn't exist)"""
+        address = int(network.network_address)
+        node = self._root
+        nodes = [node]
+        for depth in range(network.prefixlen):
+            bit = (address >> (self.max_prefixlen - 1 - depth)) & 1
+            child = node.children[bit]
+            if child is None:
+                if not create:
+                    break
+
+                child = _Node()
+                node.children[bit] = child
+
+            node = child
+            nodes.append(node)
+
+        return nodes
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, network: Network) -> bool:
+        network = self._network(network)
+        nodes = self._walk(network)
+        return len(nodes) == network.prefixlen + 1 and nodes[-1].network is not None
+
+    def insert(self, network: Network, value: Any=None) -> None:
+        """add a network to the trie (the value of an existing network is replaced)
+
+        :param network: IPv4 or IPv6 network
+        :type network: Network
+        :param value: value that is stored for the network, defaults to None
+        :type value: Any, optional
+        """
+        network = self._network(network)
+        node = self._walk(network, create=True)[-1]
+        if node.network is None:
+            self._size += 1
+
+        node.network = network
+        node.value = value
+
+    def remove(self, network: Network) -> Any:
+        """remove a network from the trie
+
+        :param network: IPv4 or IPv6 network
+        :type network: Network
+        :raises KeyError: if the network is not part of the trie
+        :return: value of the network
+        :rtype: Any
+        """
+        network = self._network(network)
+        nodes = self._walk(network)
+        if len(nodes) != network.prefixlen + 1 or nodes[-1].network is None:
+            raise KeyError(str(network))
+
+        value = nodes[-1].value
+        nodes[-1].network = None
+        nodes[-1].value = None
+        self._size -= 1
+
+        # remove the nodes that are no longer required
+        for depth in range(len(nodes) - 1, 0, -1):
+            node = nodes[depth]
+            if node.network is not None or node.children[0] is not None or node.children[1] is not None:
+                break
+
+            parent = nodes[depth - 1]
+            parent.children[parent.children.index(node)] = None
+
+        return value
+
+    def get(self, network: Network, default: Any=None) -> Any:
+        """get the value of a network
+
+        :param network: IPv4 or IPv6 network
+        :type network: Network
+        :param default: value if the network is not part of the trie, defaults to None
+        :type default: Any, optional
+        :return: value of the network
+        :rtype: Any
+        """
+        network = self._network(network)
+        nodes = self._walk(network)
+        if len(nodes) != network.prefixlen + 1 or nodes[-1].network is None:
+            return default
+
+        return nodes[-1].value
+
+    def matches(self, address: Address) -> List[Tuple[Any, Any]]:
+        """get all networks that contain an address (shortest prefix first)
+
+        :param address: IPv4 or IPv6 address
+        :type address: Address
+        :return: list of networks and values
+        :rtype: List[Tuple[Any, Any]]
+        """
+        address = self._address(address)
+        result = []
+        node = self._root
+        shift = self.max_prefixlen - 1
+        while node is not None:
+            if node.network is not None:
+                result.append((node.network, node.value))
+
+            if shift < 0:
+                break
+
+            node = node.children[(address >> shift) & 1]
+            shift -= 1
+
+        return result
+
+    def longest_match(self, address: Address) -> Optional[Tuple[Any, Any]]:
+        """get the most specific network that contains an address
+
+        :param address: IPv4 or IPv6 address
+        :type address: Address
+        :return: network and value or None if no network contains the address
+        :rtype: Optional[Tuple[Any, Any]]
+        """
+        result = self.matches(address)
+        return result[-1] if result else None
+
+    def overlaps(self, network: Network) -> List[Tuple[Any, Any]]:
+        """get all networks that overlap with a network (supernets, the network itself and subnets)
+
+        :param network: IPv4 or IPv6 network
+        :type network: Network
+        :return: list of networks and values
+        :rtype: List[Tuple[Any, Any]]
+        """
+        network = self._network(network)
+        nodes = self._walk(network)
+        result = [(node.network, node.value) for node in nodes if node.network is not None]
+        if len(nodes) == network.prefixlen + 1:
+            # the subnets are stored below the node of the network
+            result.extend(item for item in self._items(nodes[-1]) if item[0] != network)
+
+        return result
+
+    def _items(self, node: _Node) -> Iterator[Tuple[Any, Any]]:
+        """iterate over the networks below a node (including the node)"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.network is not None:
+                yield node.network, node.value
+
+            stack.extend(child for child in reversed(node.children) if child is not None)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """iterate over all networks and values (ordered by address and prefix length)
+
+        :return: networks and values
+        :rtype: Iterator[Tuple[Any, Any]]
+        """
+        return self._items(self._root)
@@ -0,0 +1,102 @@
+"""
+revision counters for cached data that is derived from the database
+"""
+import asyncio
+import uuid
+import hashlib
+from typing import Dict, Iterable
+
+import utils.coordination
+import utils.generics
+
+
+# prefix of the revision keys of the resource types of the API (e.g. `resource:peers`)
+RESOURCE_KEY_PREFIX = "resource:"
+
+
+class RevisionRegistry(metaclass=utils.generics.SingletonMeta):
+    """
+    revision counter per key (e.g. `policy:<instance_id>`)
+
+    The counters are bumped by the model signals, a cache entry that was created for an older revision
+    of its key is outdated. If multiple workers are used (`APP_LEADER_ELECTION`), the counters are stored in the
+    coordination file, so a change within one worker invalidates the caches of all workers.
+    """
+    _revisions: Dict[str, int]
+    _epoch: str
+
+    def __init__(self):
+        self._revisions = dict()
+        # the local counters start at 0 after a restart, the ETags of the processes must differ
+        self._epoch = uuid.uuid4().hex
+
+    @property
+    def _shared_store(self):
+        election = utils.coordination.LeaderElection()
+        return election.store if election.enabled else None
+
+    def get(self, key: str) -> int:
+        """get the current revision of a key
+
+        :param key: name of the key
+        :type key: str
+        :return: revision of the key (0 if the key was never changed)
+        :rtype: int
+        """
+        store = self._shared_store
+        if store is not None:
+            return store.get_revision(key)
+
+        return self._revisions.get(key, 0)
+
+    async def bump(self, key: str) -> int:
+        """increase the revision of a key
+
+        :param key: name of the key
+        :type key: str
+        :return: new revision of the key
+        :rtype: int
+        """
+        store = self._shared_store
+        if store is not None:
+            # another worker may hold the write lock of the coordination file, the event loop must not wait for it
+            return await asyncio.to_thread(store.bump_revision, key)
+
+        revision = self._revisions.get(key, 0) + 1
+        self._revisions[key] = revision
+        return revision
+
+    def get_resources(self, resource_types: Iterable[str]) -> Dict[str, int]:
+        """get the current revisions of resource types (with a single query if the counters are shared)
+
+        :param resource_types: names of the resource types (e.g. `peers`)
+        :type resource_types: Iterable[str]
+        :return: revision per resource type
+        :rtype: Dict[str, int]
+        """
+        store = self._shared_store
+        revisions = store.get_revisions(RESOURCE_KEY_PREFIX) if store is not None else self._revisions
+        return {name: revisions.get(RESOURCE_KEY_PREFIX + name, 0) for name in resource_types}
+
+    async def bump_resources(self, *resource_types: str) -> None:
+        """increase the revisions of resource types (e.g. after a bulk operation that doesn't trigger the signals)
+
+        :param resource_types: names of the resource types
+        :type resource_types: str
+        """
+        for name in resource_types:
+            await self.bump(RESOURCE_KEY_PREFIX + name)
+
+    def etag(self, resource_types: Iterable[str]) -> str:
+        """weak ETag of a response that depends on the given resource types
+
+        :param resource_types: names of the resource types
+        :type resource_types: Iterable[str]
+        :return: ETag (e.g. `W/"4f1c..."`)
+        :rtype: str
+        """
+        # the shared counters are stored in the coordination file and are the same for all workers
+        epoch = "" if self._shared_store is not None else self._epoch
+        revisions = sorted(self.get_resources(resource_types).items())
+        value = epoch + ";" + ",".join(f"{name}={revision}" for name, revision in revisions)
+        return f'W/"{hashlib.blake2b(value.encode(), digest_size=12).hexdigest()}"'
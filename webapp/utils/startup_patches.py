@@ -0,0 +1,104 @@
+"""
+patches of private functions of third-party packages that reduce the startup time of the API server
+
+* tortoise-orm reads the field descriptions from `#:` comments in the source code of every model class, the source is
+  parsed once per class (about a third of the import time of the models). The models describe the fields with the
+  `description` argument, the comments are not used.
+* FastAPI clones the response model of every route (and again if the router is included in the application), the nested
+  schemas are cloned once per route. The clones are shared between the routes (as in later FastAPI versions), the
+  registration of the routes was the largest part of the startup time.
+
+The patches replace private functions and are applied only for the versions of the packages whose internals were
+verified (`VERIFIED_VERSIONS`), other versions are used without the patches. The patches are applied by `models` and
+`routers` before the classes are created, `APP_STARTUP_PATCHES=False` disables the patches.
+"""
+import os
+import weakref
+from typing import Callable, Dict, List, Tuple
+
+import utils.config
+
+
+# versions of the packages whose private functions are replaced
+VERIFIED_VERSIONS: Dict[str, Tuple[str, ...]] = {
+    "tortoise": ("0.18.1",),
+    "fastapi": ("0.73.0",),
+}
+
+_cloned_types = weakref.WeakKeyDictionary()
+_applied: Dict[str, bool] = dict()
+
+
+def _create_cloned_field(field, *, cloned_types=None):
+    # pylint: disable=import-outside-toplevel
+    import fastapi.utils
+    return fastapi.utils.create_cloned_field(field, cloned_types=_cloned_types if cloned_types is None else cloned_types)
+
+
+def _patch_tortoise() -> str:
+    # pylint: disable=import-outside-toplevel
+    import tortoise
+    import tortoise.models
+
+    if is_verified("tortoise", tortoise.__version__):
+        tortoise.models._get_comments = lambda cls: {}  # pylint: disable=protected-access
+
+    return tortoise.__version__
+
+
+def _patch_fastapi() -> str:
+    # pylint: disable=import-outside-toplevel
+    import fastapi
+    import fastapi.routing
+
+    if is_verified("fastapi", fastapi.__version__):
+        fastapi.routing.create_cloned_field = _create_cloned_field
+
+    return fastapi.__version__
+
+
+PATCHES: Dict[str, Callable[[], str]] = {
+    "tortoise": _patch_tortoise,
+    "fastapi": _patch_fastapi,
+}
+
+
+def is_verified(package: str, version: str) -> bool:
+    """check if the private functions of a package version were verified
+
+    :param package: name of the package (`tortoise` or `fastapi`)
+    :type package: str
+    :param version: installed version of the package
+    :type version: str
+    :return: True if the patch of the package can be applied
+    :rtype: bool
+    """
+    return version in VERIFIED_VERSIONS.get(package, ())
+
+
+def enabled() -> bool:
+    """False if the patches are disabled (`APP_STARTUP_PATCHES`)"""
+    return utils.config.ConfigUtil.str_to_bool(os.environ.get("APP_STARTUP_PATCHES", "True"))
+
+
+def apply(package: str) -> bool:
+    """apply the patch of a package once (`models` patches tortoise, `routers` patches FastAPI)
+
+    :param package: name of the package (`tortoise` or `fastapi`)
+    :type package: str
+    :return: True if the patch is applied
+    :rtype: bool
+    """
+    if package not in _applied:
+        _applied[package] = enabled() and is_verified(package, PATCHES[package]())
+
+    return _applied[package]
+
+
+def applied() -> List[str]:
+    """names of the patched packages
+
+    :return: list of package names
+    :rtype: List[str]
+    """
+    return [package for package, result in _applied.items() if result]
@@ -0,0 +1,197 @@
+"""
+cold start profile of the API server (imports, application factory, startup handlers and first request)
+
+The profile is measured in a new interpreter, the modules that are already imported by the caller would hide their
+import time. The new interpreter runs this module (`python -X importtime -m utils.startup_profile`), prints the
+duration of the stages as JSON on the standard output and the import times of the interpreter on the standard error.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import tempfile
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+# stages of the startup in the order of their execution
+STAGES = ("imports", "create", "startup", "first_request", "shutdown")
+
+# the first request doesn't require authentication or access to the system
+FIRST_REQUEST_PATH = "/api/utils/instance/info"
+
+
+class ImportTime(NamedTuple):
+    """import time of a module in microseconds (as reported by `python -X importtime`)"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+class StartupProfile(NamedTuple):
+    """result of a startup profile"""
+    stages: Dict[str, float]
+    imports: List[ImportTime]
+    status_code: int
+    total: float
+
+    def top_imports(self, count: int) -> List[ImportTime]:
+        """modules with the longest import time (excluding their own imports)
+
+        :param count: number of modules
+        :type count: int
+        :return: import times, sorted by the duration
+        :rtype: List[ImportTime]
+        """
+        return sorted(self.imports, key=lambda entry: entry.self_us, reverse=True)[:count]
+
+    def imports_per_package(self) -> List[Tuple[str, int]]:
+        """import time per top-level package (sum of the import time of the modules)
+
+        :return: package name and import time in microseconds, sorted by the duration
+        :rtype: List[Tuple[str, int]]
+        """
+        result: Dict[str, int] = dict()
+        for entry in self.imports:
+            package = entry.module.split(".")[0]
+            result[package] = result.get(package, 0) + entry.self_us
+
+        return sorted(result.items(), key=lambda item: item[1], reverse=True)
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """parse the output of `python -X importtime`, other lines (e.g. log messages) are ignored
+
+    :param output: standard error of the interpreter
+    :type output: str
+    :return: import time per module
+    :rtype: List[ImportTime]
+    """
+    result = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        values = line[len("import time:"):].split("|")
+        if len(values) != 3 or not values[0].strip().isdigit():
+            # header line
+            continue
+
+        name = values[2].rstrip()
+        module = name.lstrip()
+        result.append(ImportTime(
+            module=module,
+            self_us=int(values[0]),
+            cumulative_us=int(values[1]),
+            depth=(len(name) - len(module) - 1) // 2
+        ))
+
+    return result
+
+
+def run_profile(env: Optional[Dict[str, str]] = None, timeout: int = 120) -> StartupProfile:
+    """measure the startup in a new interpreter, the system is not changed (temporary data directory, the API server
+    runs as follower of an external reconciler and doesn't apply the initial configuration)
+
+    :param env: additional environment variables for the interpreter, defaults to None
+    :type env: Optional[Dict[str, str]], optional
+    :param timeout: timeout in seconds, defaults to 120
+    :type timeout: int, optional
+    :raises RuntimeError: profile failed
+    :return: result of the profile
+    :rtype: StartupProfile
+    """
+    with tempfile.TemporaryDirectory() as data_dir:
+        process_env = dict(os.environ)
+        process_env.update({
+            "DATA_DIR": data_dir,
+            "WG_CONFIG_DIR": os.path.join(data_dir, "wireguard"),
+            "DB_FILE_PATH": os.path.join(data_dir, "db.sqlite3"),
+            "APP_COORDINATION_FILE": os.path.join(data_dir, "coordination.sqlite3"),
+            "APP_RECONCILER_MODE": "external",
+            "APP_ADMIN_PASSWORD": "profile",
+            "SKIP_INIT_CONFIG": "1",
+            "LOG_LEVEL": "warning",
+        })
+        process_env.update(env or {})
+
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "utils.startup_profile"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=process_env,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            check=False
+        )
+        total = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise RuntimeError(f"startup profile failed: {process.stderr[-2000:]}")
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return StartupProfile(
+        stages=result["stages"],
+        imports=parse_importtime(process.stderr),
+        status_code=result["status_code"],
+        total=total
+    )
+
+
+async def _serve_first_request(fast_api) -> int:
+    """send a single request to the ASGI application (no HTTP client required)"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await fast_api({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": FIRST_REQUEST_PATH,
+        "raw_path": FIRST_REQUEST_PATH.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 8000),
+    }, receive, send)
+    return next(message["status"] for message in messages if message["type"] == "http.response.start")
+
+
+async def _measure() -> Tuple[Dict[str, float], int]:
+    stages = dict()
+    start = time.perf_counter()
+    import app.fast_api  # pylint: disable=import-outside-toplevel
+    stages["imports"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast_api = app.fast_api.create()
+    stages["create"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await fast_api.router.startup()
+    stages["startup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    status_code = await _serve_first_request(fast_api)
+    stages["first_request"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await fast_api.router.shutdown()
+    stages["shutdown"] = time.perf_counter() - start
+    return stages, status_code
+
+
+if __name__ == "__main__":
+    measured_stages, first_status_code = asyncio.run(_measure())
+    print(json.dumps({"stages": measured_stages, "status_code": first_status_code}))
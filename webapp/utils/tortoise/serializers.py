@@ -0,0 +1,176 @@
+"""
+build the rows of a pydantic schema (created with `pydantic_model_creator`) from `values()` queries
+
+`PydanticModel.from_queryset` creates a model instance per row, prefetches the relations and validates every
+instance (including the nested relations) with pydantic. The rows that are created here contain the same fields in
+the same order, but the values are taken from one `values()` query per relation without validation. The rows are
+plain dictionaries that can be encoded directly (e.g. with orjson).
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Type
+
+import tortoise.models
+import tortoise.queryset
+from tortoise.contrib.pydantic import PydanticModel
+
+
+# maximum number of values within an `IN` clause of a query (limit of SQLite for the parameters of a query)
+IN_CHUNK_SIZE = 900
+
+
+class SchemaRowBuilder:
+    """
+    query plan for the rows of a schema, the nested schemas of the relations are resolved with a separate query per
+    relation (forward and backward foreign keys and one-to-one relations)
+    """
+    __slots__ = ("schema", "model", "fields", "columns", "pk_attr", "computed", "relations")
+
+    def __init__(self, schema: Type[PydanticModel]):
+        self.schema = schema
+        self.model: Type[tortoise.models.Model] = getattr(schema.__config__, "orig_model")
+        meta = self.model._meta  # pylint: disable=protected-access
+
+        self.fields: List[str] = list(schema.__fields__)
+        self.pk_attr: str = meta.pk_attr
+        self.computed: List[str] = []
+        self.relations: List[_Relation] = []
+        columns = [self.pk_attr]
+        for name, field in schema.__fields__.items():
+            if name in meta.fetch_fields:
+                relation = _Relation(name, meta.fields_map[name], SchemaRowBuilder(field.type_))
+                self.relations.append(relation)
+                if relation.local_key not in columns:
+                    columns.append(relation.local_key)
+
+            elif name in meta.fields_db_projection:
+                if name not in columns:
+                    columns.append(name)
+
+            else:
+                # computed fields are methods of the model that may use any other field
+                self.computed.append(name)
+
+        if self.computed:
+            columns.extend(name for name in meta.fields_db_projection if name not in columns)
+
+        self.columns: List[str] = columns
+
+    def __repr__(self):
+        return f"<SchemaRowBuilder {self.schema.__name__}>"
+
+    async def build(self, queryset: tortoise.queryset.QuerySet) -> List[Dict[str, Any]]:
+        """query the rows of the schema
+
+        :param queryset: queryset of the model of the schema (e.g. `Model.all()` or `Model.filter(...)`)
+        :type queryset: tortoise.queryset.QuerySet
+        :return: rows with the fields of the schema
+        :rtype: List[Dict[str, Any]]
+        """
+        return await self._build_rows(await queryset.values(*self.columns))
+
+    async def _build_rows(self, values: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        resolved = []
+        for relation in self.relations:
+            resolved.append(await relation.resolve(values))
+
+        rows = []
+        for value in values:
+            if self.computed:
+                # the computed fields are called on an instance without database access
+                instance = self.model.__new__(self.model)
+                instance.__dict__.update(value)
+                for name in self.computed:
+                    value[name] = getattr(instance, name)()
+
+            for relation, related_rows in zip(self.relations, resolved):
+                value[relation.name] = related_rows.get(value[relation.local_key], relation.default())
+
+            rows.append({name: value[name] for name in self.fields})
+
+        return rows
+
+
+class _Relation:
+    """
+    relation of a schema with the nested schema of the related model
+    """
+    __slots__ = ("name", "builder", "local_key", "remote_key", "many")
+
+    def __init__(self, name: str, field_object: Any, builder: SchemaRowBuilder):
+        self.name = name
+        self.builder = builder
+        model_meta = field_object.model._meta  # pylint: disable=protected-access
+        if name in model_meta.fk_fields or name in model_meta.o2o_fields:
+            # the key of the related row is stored within the row (e.g. `policy_rule_list_id`)
+            self.local_key = field_object.source_field
+            self.remote_key = builder.pk_attr
+            self.many = False
+
+        elif name in model_meta.backward_fk_fields or name in model_meta.backward_o2o_fields:
+            # the related rows contain the key of the row (e.g. `wg_interface_id`)
+            self.local_key = model_meta.pk_attr
+            self.remote_key = field_object.relation_field
+            self.many = name in model_meta.backward_fk_fields
+
+        else:
+            raise NotImplementedError(f"relation '{name}' of {field_object.model.__name__} is not supported")
+
+        if self.remote_key not in builder.columns:
+            builder.columns.append(self.remote_key)
+
+    def default(self) -> Optional[list]:
+        """value if there are no related rows"""
+        return [] if self.many else None
+
+    async def resolve(self, values: List[Dict[str, Any]]) -> Dict[Any, Any]:
+        """query the related rows
+
+        :param values: rows of the parent schema (contain the local key)
+        :type values: List[Dict[str, Any]]
+        :return: related rows (or list of rows) per local key
+        :rtype: Dict[Any, Any]
+        """
+        keys = list(_unique(value[self.local_key] for value in values))
+        related_values = []
+        for offset in range(0, len(keys), IN_CHUNK_SIZE):
+            related_values.extend(await self.builder.model.filter(**{
+                f"{self.remote_key}__in": keys[offset:offset + IN_CHUNK_SIZE]
+            }).values(*self.builder.columns))
+
+        # the keys are taken from the values before the rows are built (the key may not be part of the schema)
+        related_keys = [value[self.remote_key] for value in related_values]
+        related_rows = await self.builder._build_rows(related_values)  # pylint: disable=protected-access
+
+        result: Dict[Any, Any] = dict()
+        for key, row in zip(related_keys, related_rows):
+            if self.many:
+                result.setdefault(key, []).append(row)
+
+            else:
+                result[key] = row
+
+        return result
+
+
+def _unique(values: Iterable[Any]) -> Iterable[Any]:
+    seen: Set[Any] = set()
+    for value in values:
+        if value is not None and value not in seen:
+            seen.add(value)
+            yield value
+
+
+_builders: Dict[Type[PydanticModel], SchemaRowBuilder] = dict()
+
+
+def get_row_builder(schema: Type[PydanticModel]) -> SchemaRowBuilder:
+    """query plan for a schema, created once per schema
+
+    :param schema: pydantic schema created with `pydantic_model_creator`
+    :type schema: Type[PydanticModel]
+    :return: row builder of the schema
+    :rtype: SchemaRowBuilder
+    """
+    if schema not in _builders:
+        _builders[schema] = SchemaRowBuilder(schema)
+
+    return _builders[schema]
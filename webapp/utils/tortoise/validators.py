@@ -2,7 +2,9 @@
 Custom validators for tortoise
 """
 import re
-from typing import Any, Union
+import socket
+import functools
+from typing import Any, Optional, Union
 import ipaddress
 from tortoise.validators import Validator
 from tortoise.exceptions import ValidationError
@@ -35,6 +37,19 @@ def validate_ipv6_network(value: str):
         raise ValidationError(f"'{value}' is not a valid IPv6 address.") from ValueError
 
 
+def validate_ip_network(value: str):
+    """
+    Validates that the given value is a valid IPv4 or IPv6 network address
+
+    :raises ValidationError: if value is invalid
+    """
+    try:
+        ipaddress.ip_network(value)
+
+    except ValueError:
+        raise ValidationError(f"'{value}' is not a valid IPv4/IPv6 network address.") from ValueError
+
+
 class RegexOrNoneValidator(Validator):
     """
     Validator that verifies a value if it matches a regular expression or is null
@@ -48,3 +63,45 @@ class RegexOrNoneValidator(Validator):
         if value is not None:
             if not self.regex.match(value):
                 raise ValidationError(f"Value '{value}' does not match regex '{self.regex.pattern}'")
+
+
+@functools.lru_cache(maxsize=4096)
+def find_invalid_ip_interface(value: str) -> Optional[str]:
+    """
+    Verify a comma separated list of IPv4/IPv6 interfaces (address and prefix length, whitespace is allowed after the
+    comma), the addresses are parsed with `inet_pton` and the result is cached per value
+
+    :return: first invalid element or None if the list is valid
+    """
+    for position, element in enumerate(value.split(",")):
+        if position > 0:
+            element = element.lstrip()
+
+        address, separator, prefixlen = element.partition("/")
+        # the prefix length is required (ASCII digits without leading zeros, `isdigit` accepts e.g. superscripts)
+        if not separator or not (prefixlen.isascii() and prefixlen.isdigit()) or str(int(prefixlen)) != prefixlen:
+            return element
+
+        family, max_prefixlen = (socket.AF_INET6, 128) if ":" in address else (socket.AF_INET, 32)
+        if int(prefixlen) > max_prefixlen:
+            return element
+
+        try:
+            socket.inet_pton(family, address)
+
+        except (OSError, ValueError):
+            return element
+
+    return None
+
+
+class IpInterfaceListOrNoneValidator(Validator):
+    """
+    Validator that verifies a comma separated list of IPv4/IPv6 interfaces (e.g. "10.1.1.1/24, FD00::1/64") or null
+    """
+
+    def __call__(self, value: Any):
+        if value is not None:
+            invalid_element = find_invalid_ip_interface(value)
+            if invalid_element is not None:
+                raise ValidationError(f"Value '{value}' is not a comma separated list of IPv4/IPv6 interfaces ('{invalid_element}' is invalid)")
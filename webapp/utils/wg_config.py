@@ -0,0 +1,224 @@
+"""
+in-memory representation of a wireguard configuration file (interface section and peers)
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class WgPeerConfig:
+    """
+    peer section of a wireguard configuration
+    """
+    __slots__ = ("public_key", "comment", "allowed_ips", "endpoint", "persistent_keepalive", "preshared_key")
+
+    def __init__(self, public_key: str, comment: Optional[str]=None, allowed_ips: Optional[str]=None,
+                 endpoint: Optional[str]=None, persistent_keepalive: Optional[str]=None, preshared_key: Optional[str]=None):
+        self.public_key = public_key
+        self.comment = comment
+        self.allowed_ips = allowed_ips
+        self.endpoint = endpoint
+        self.persistent_keepalive = persistent_keepalive
+        self.preshared_key = preshared_key
+
+    def _values(self) -> Tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, WgPeerConfig):
+            return NotImplemented
+
+        return self._values() == other._values()
+
+    def __repr__(self):
+        return f"<WgPeerConfig {self.public_key}>"
+
+    def iter_lines(self, stripped: bool=False) -> Iterator[str]:
+        """render the peer section
+
+        :param stripped: skip the comment, defaults to False
+        :type stripped: bool, optional
+        :return: lines of the peer section
+        :rtype: Iterator[str]
+        """
+        if self.comment and not stripped:
+            yield self.comment
+
+        yield "[Peer]"
+        yield f"PublicKey = {self.public_key}"
+        if self.allowed_ips:
+            yield f"AllowedIPs = {self.allowed_ips}"
+
+        if self.endpoint:
+            yield f"Endpoint = {self.endpoint}"
+
+        if self.persistent_keepalive:
+            yield f"PersistentKeepalive = {self.persistent_keepalive}"
+
+        if self.preshared_key:
+            yield f"PresharedKey = {self.preshared_key}"
+
+
+class WgInterfaceConfig:
+    """
+    wireguard configuration of an interface, the peers are indexed by their public key
+
+    The configuration is rendered in the format of `wg-quick`, the stripped variant (without comments and the
+    wg-quick specific keys) is accepted by `wg setconf` and `wg syncconf`.
+    """
+    __slots__ = ("comment", "private_key", "address", "listen_port", "table", "post_up", "post_down", "peers")
+
+    # attributes of the interface section that are read from a configuration file
+    _interface_attrs = {
+        "privatekey": "private_key",
+        "address": "address",
+        "listenport": "listen_port",
+        "table": "table",
+    }
+    _peer_attrs = {
+        "allowedips": "allowed_ips",
+        "endpoint": "endpoint",
+        "persistentkeepalive": "persistent_keepalive",
+        "presharedkey": "preshared_key",
+    }
+
+    def __init__(self, comment: Optional[str]=None, private_key: Optional[str]=None, address: Optional[str]=None,
+                 listen_port: Optional[str]=None, table: Optional[str]=None):
+        self.comment = comment
+        self.private_key = private_key
+        self.address = address
+        self.listen_port = listen_port
+        self.table = table
+        self.post_up: List[str] = []
+        self.post_down: List[str] = []
+        self.peers: Dict[str, WgPeerConfig] = dict()
+
+    def __repr__(self):
+        return f"<WgInterfaceConfig {len(self.peers)} peers>"
+
+    def upsert_peer(self, peer: WgPeerConfig) -> bool:
+        """add or replace a peer (a replaced peer keeps its position)
+
+        :param peer: configuration of the peer
+        :type peer: WgPeerConfig
+        :return: True if the configuration changed
+        :rtype: bool
+        """
+        if self.peers.get(peer.public_key) == peer:
+            return False
+
+        self.peers[peer.public_key] = peer
+        return True
+
+    def remove_peer(self, public_key: str) -> bool:
+        """remove a peer
+
+        :param public_key: public key of the peer
+        :type public_key: str
+        :return: True if the peer existed
+        :rtype: bool
+        """
+        return self.peers.pop(public_key, None) is not None
+
+    def iter_lines(self, stripped: bool=False) -> Iterator[str]:
+        """render the configuration line by line
+
+        :param stripped: skip the comments and the wg-quick specific keys (Address, Table, PostUp, PostDown),
+                         defaults to False
+        :type stripped: bool, optional
+        :return: lines of the configuration
+        :rtype: Iterator[str]
+        """
+        if self.comment and not stripped:
+            yield self.comment
+
+        yield "[Interface]"
+        if self.private_key:
+            yield f"PrivateKey = {self.private_key}"
+
+        if self.address and not stripped:
+            yield f"Address = {self.address}"
+
+        if self.listen_port:
+            yield f"ListenPort = {self.listen_port}"
+
+        if not stripped:
+            if self.table:
+                yield f"Table = {self.table}"
+
+            for command in self.post_up:
+                yield f"PostUp = {command}"
+
+            for command in self.post_down:
+                yield f"PostDown = {command}"
+
+        for peer in self.peers.values():
+            if not stripped:
+                yield ""
+
+            yield from peer.iter_lines(stripped=stripped)
+
+    def render(self, stripped: bool=False) -> str:
+        """render the configuration
+
+        :param stripped: skip the comments and the wg-quick specific keys, defaults to False
+        :type stripped: bool, optional
+        :return: content of the configuration
+        :rtype: str
+        """
+        return "".join(f"{line}\n" for line in self.iter_lines(stripped=stripped))
+
+    @classmethod
+    def parse(cls, lines: Iterable[str]) -> "WgInterfaceConfig":
+        """read a configuration that was rendered by `render`, unknown attributes are ignored
+
+        :param lines: lines of the configuration
+        :type lines: Iterable[str]
+        :return: configuration
+        :rtype: WgInterfaceConfig
+        """
+        config = cls()
+        section = None
+        comments = []
+        for raw_line in lines:
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            if line.startswith("#"):
+                # the comments are kept as they are (the comment of a peer may end with a whitespace)
+                comments.append(raw_line.rstrip("\r\n"))
+                continue
+
+            if line.startswith("["):
+                section = line.lower()
+                comment = "\n".join(comments) or None
+                comments = []
+                if section == "[interface]":
+                    config.comment = comment
+
+                elif section == "[peer]":
+                    # the public key is set by the next attribute
+                    section = WgPeerConfig(public_key="", comment=comment)
+
+                continue
+
+            attr, _, value = line.partition("=")
+            attr, value = attr.strip().lower(), value.strip()
+            if section == "[interface]":
+                if attr == "postup":
+                    config.post_up.append(value)
+
+                elif attr == "postdown":
+                    config.post_down.append(value)
+
+                elif attr in cls._interface_attrs:
+                    setattr(config, cls._interface_attrs[attr], value)
+
+            elif isinstance(section, WgPeerConfig):
+                if attr == "publickey":
+                    section.public_key = value
+                    config.peers[value] = section
+
+                elif attr in cls._peer_attrs:
+                    setattr(section, cls._peer_attrs[attr], value)
+
+        return config
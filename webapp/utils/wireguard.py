@@ -5,14 +5,20 @@ import json
 import time
 import ipaddress
 import logging
+from typing import Dict, List, Optional
 
 import wgconfig.wgexec
 
 import utils.generics
+import utils.instrumentation
 import utils.os_func
 import utils.config
 
 
+# default delta in seconds between the latest handshake and the current time before a peer is considered inactive
+DEFAULT_PEER_INACTIVITY_TIMEOUT = 60 * 2
+
+
 class WgSystemInfoException(Exception):
     """exception thrown if something is wrong within the WgSystemInfoAdapter class"""
     pass
@@ -70,44 +76,142 @@ class WgKeyUtils(metaclass=utils.generics.SingletonMeta):
         return public_key
 
 
+class WgOperationalSnapshot:
+    """
+    operational data of wireguard (result of wg-json) at a given point in time
+    """
+    __slots__ = ("data", "timestamp", "serial")
+
+    def __init__(self, data: dict, timestamp: float, serial: int):
+        self.data = data
+        self.timestamp = timestamp
+        self.serial = serial
+
+    def age(self, now: Optional[float]=None) -> float:
+        """age of the snapshot in seconds
+
+        :param now: reference time, defaults to the current time
+        :type now: float, optional
+        :return: age in seconds
+        :rtype: float
+        """
+        return (time.time() if now is None else now) - self.timestamp
+
+    def __repr__(self):
+        return f"<WgOperationalSnapshot {self.serial} {self.timestamp}>"
+
+
 class WgSystemInfoAdapter(utils.generics.AsyncSubProcessMixin, metaclass=utils.generics.SingletonMeta):
     """
     read operational data for wireguard and extend based on this one
     """
-    # delta in seconds between the handshake and the current time before the peer is considered inactive
-    _time_delta_to_be_down = 60 * 2
+    _snapshot: Optional[WgOperationalSnapshot]
+    _inactivity_timeouts: Dict[str, int]
+    inactivity_timeouts_revision: Optional[int]
 
     def __init__(self):
         self._logger = logging.getLogger("wg_sysinfo")
+        self._snapshot = None
+        self._inactivity_timeouts = dict()
+        # revision of the interfaces that the timeouts were loaded for (see `models.wg_interface.load_inactivity_timeouts`)
+        self.inactivity_timeouts_revision = None
+
+    def get_inactivity_timeout(self, intf_name: Optional[str]=None) -> int:
+        """delta in seconds between the handshake and the current time before a peer on the given interface is
+        considered inactive
+
+        :param intf_name: name of the interface, defaults to None (default timeout)
+        :type intf_name: str, optional
+        :return: inactivity timeout in seconds
+        :rtype: int
+        """
+        return self._inactivity_timeouts.get(intf_name, DEFAULT_PEER_INACTIVITY_TIMEOUT)
+
+    def set_inactivity_timeouts(self, timeouts: Dict[str, int], revision: Optional[int]=None) -> None:
+        """replace the inactivity timeouts of the interfaces (loaded from the database by every worker)
+
+        :param timeouts: inactivity timeout in seconds per interface name
+        :type timeouts: Dict[str, int]
+        :param revision: revision of the interfaces that the timeouts were loaded for, defaults to None
+        :type revision: Optional[int], optional
+        """
+        self._inactivity_timeouts = dict(timeouts)
+        self.inactivity_timeouts_revision = revision
+
+    async def refresh_snapshot(self) -> WgOperationalSnapshot:
+        """fetch the operational data from the system and store them as the latest snapshot
+
+        :return: new snapshot
+        :rtype: WgOperationalSnapshot
+        """
+        data = await self.get_wg_json()
+        serial = self._snapshot.serial + 1 if self._snapshot else 1
+        self._snapshot = WgOperationalSnapshot(data=data, timestamp=time.time(), serial=serial)
+        return self._snapshot
+
+    async def get_snapshot(self, max_age: Optional[float]=None) -> WgOperationalSnapshot:
+        """return the latest snapshot, a new snapshot is only fetched if no snapshot exists or
+        the cached snapshot is older than max_age
+
+        :param max_age: max. age of the cached snapshot in seconds, defaults to None (any age)
+        :type max_age: float, optional
+        :return: cached or new snapshot
+        :rtype: WgOperationalSnapshot
+        """
+        if self._snapshot is None or (max_age is not None and self._snapshot.age() > max_age):
+            return await self.refresh_snapshot()
+
+        return self._snapshot
+
+    def is_handshake_active(self, latest_handshake: int, now: Optional[float]=None, intf_name: Optional[str]=None) -> bool:
+        """check if a handshake timestamp is recent enough to consider the peer as active
 
-    async def is_peer_active(self, wg_interface_name: str, public_key: str) -> bool:
+        :param latest_handshake: unix timestamp of the latest handshake
+        :type latest_handshake: int
+        :param now: reference time, defaults to the current time
+        :type now: float, optional
+        :param intf_name: interface of the peer, defaults to None (default inactivity timeout)
+        :type intf_name: str, optional
+        :return: True if the handshake is within the inactivity timeout
+        :rtype: bool
+        """
+        now = int(time.time()) if now is None else int(now)
+        return self.get_inactivity_timeout(intf_name) >= now - latest_handshake
+
+    async def is_peer_active(self, wg_interface_name: str, public_key: str, snapshot: Optional[WgOperationalSnapshot]=None) -> bool:
         """guess if the given peer is active on the given interface, considered as inactive
-        if the the latest_handshake is more than two minutes ago
+        if the the latest_handshake is older than the inactivity timeout of the interface
 
         :param wg_interface_name: interface, where the client should be active
         :type wg_interface_name: str
         :param public_key: public key to look for
         :type public_key: str
+        :param snapshot: operational snapshot to use, a new snapshot is fetched if not set
+        :type snapshot: WgOperationalSnapshot, optional
         :return: _description_
         :rtype: bool
         """
         client_active = False
         try:
-            op_data = await self.get_wg_json()
+            if snapshot is None:
+                snapshot = await self.refresh_snapshot()
+
+            op_data = snapshot.data
             if wg_interface_name in op_data.keys():
                 peers_data = op_data[wg_interface_name]["peers"]
                 if public_key in peers_data.keys():
                     peer_data = peers_data[public_key]
                     if "latestHandshake" in peer_data:
-                        # if the peer handshake was within the last two minutes,
+                        # if the peer handshake was within the inactivity timeout,
                         # the client seems to be active
+                        timeout = self.get_inactivity_timeout(wg_interface_name)
                         time_delta = int(time.time()) - peer_data["latestHandshake"]
-                        if self._time_delta_to_be_down >= time_delta:
-                            self._logger.debug(f"peer '{public_key}' on interface '{wg_interface_name}' is considered ACTIVE (delta: {self._time_delta_to_be_down}>={time_delta})")
+                        if timeout >= time_delta:
+                            self._logger.debug(f"peer '{public_key}' on interface '{wg_interface_name}' is considered ACTIVE (delta: {timeout}>={time_delta})")
                             client_active = True
 
                         else:
-                            self._logger.debug(f"peer '{public_key}' on interface '{wg_interface_name}' is considered INACTIVE (delta: {self._time_delta_to_be_down}>={time_delta})")
+                            self._logger.debug(f"peer '{public_key}' on interface '{wg_interface_name}' is considered INACTIVE (delta: {timeout}>={time_delta})")
 
                     else:
                         self._logger.debug(f"latestHandshake not found for peer peer '{public_key}' on interface '{wg_interface_name}'")
@@ -182,12 +286,14 @@ class IpRouteAdapter(metaclass=utils.generics.SingletonMeta):
         """
         operation_performed = False
         try:
-            operation_performed = utils.os_func.configure_route(
-                intf_name=intf_name,
-                ip_network=self._clean_ip_network(ip_network),
-                operation="add",
-                logger=self.logger
-            )
+            with utils.instrumentation.InstrumentationUtil().timer("configure_route", action="add"):
+                operation_performed = utils.os_func.configure_route(
+                    intf_name=intf_name,
+                    ip_network=self._clean_ip_network(ip_network),
+                    operation="add",
+                    logger=self.logger
+                )
+
             if operation_performed:
                 self.logger.info(f"route {ip_network} for interface {intf_name} added")
 
@@ -209,12 +315,14 @@ class IpRouteAdapter(metaclass=utils.generics.SingletonMeta):
         """
         operation_performed = False
         try:
-            operation_performed = utils.os_func.configure_route(
-                intf_name=intf_name,
-                ip_network=self._clean_ip_network(ip_network),
-                operation="del",
-                logger=self.logger
-            )
+            with utils.instrumentation.InstrumentationUtil().timer("configure_route", action="del"):
+                operation_performed = utils.os_func.configure_route(
+                    intf_name=intf_name,
+                    ip_network=self._clean_ip_network(ip_network),
+                    operation="del",
+                    logger=self.logger
+                )
+
             if operation_performed:
                 self.logger.info(f"route {ip_network} for interface {intf_name} removed")
 
@@ -223,3 +331,24 @@ class IpRouteAdapter(metaclass=utils.generics.SingletonMeta):
             self.logger.error(f"unable to add route {ip_network} for {intf_name}", exc_info=self._config.debug)
 
         return operation_performed
+
+    def get_routes(self, intf_name: str) -> Optional[List[str]]:
+        """get the routes of an interface from the routing table
+
+        :param intf_name: name of the interface
+        :type intf_name: str
+        :return: list of normalized networks, None if the interface doesn't exist or the routes are not available
+        :rtype: Optional[List[str]]
+        """
+        try:
+            with utils.instrumentation.InstrumentationUtil().timer("configure_route", action="list"):
+                routes = utils.os_func.get_interface_routes(intf_name=intf_name, logger=self.logger)
+
+        except Exception:
+            self.logger.error(f"unable to get the routes of {intf_name}", exc_info=self._config.debug)
+            return None
+
+        if routes is None:
+            return None
+
+        return [self._clean_ip_network(route) for route in routes]